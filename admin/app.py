@@ -164,6 +164,26 @@ async def dashboard(request: Request, username: str = Depends(verify_admin)) ->
             overflow-y: auto;
         }
 
+        .job-filter {
+            float: right;
+            font-size: 14px;
+            padding: 4px 8px;
+            border-radius: 6px;
+            border: 1px solid #ddd;
+        }
+
+        .btn-more {
+            display: none;
+            width: 100%;
+            margin-top: 10px;
+            background: #f0f0f0;
+            color: #333;
+        }
+
+        .btn-more:hover {
+            background: #e2e2e2;
+        }
+
         .job-item {
             padding: 15px;
             margin-bottom: 10px;
@@ -381,7 +401,16 @@ async def dashboard(request: Request, username: str = Depends(verify_admin)) ->
 
         <div class="content">
             <div class="panel">
-                <h2>Job Queue</h2>
+                <h2>Job Queue
+                    <select class="job-filter" id="job-filter" onchange="filterJobs()">
+                        <option value="">All jobs</option>
+                        <option value="pending">Pending</option>
+                        <option value="running">Running</option>
+                        <option value="completed">Completed</option>
+                        <option value="failed">Failed</option>
+                        <option value="cancelled">Cancelled</option>
+                    </select>
+                </h2>
                 <div class="job-list" id="job-list">
                     <div class="empty-state">
                         <svg xmlns="http://www.w3.org/2000/svg" fill="none" viewBox="0 0 24 24" stroke="currentColor">
@@ -390,6 +419,7 @@ async def dashboard(request: Request, username: str = Depends(verify_admin)) ->
                         <div>Loading jobs...</div>
                     </div>
                 </div>
+                <button class="btn btn-more" id="load-more" onclick="loadMoreJobs()">Load more</button>
             </div>
 
             <div class="panel">
@@ -421,66 +451,112 @@ async def dashboard(request: Request, username: str = Depends(verify_admin)) ->
                 .replace(/'/g, "&#039;");
         }
 
+        function renderQueueStats(stats) {
+            document.getElementById('stat-pending').textContent = stats.pending;
+            document.getElementById('stat-running').textContent = stats.running;
+            document.getElementById('stat-completed').textContent = stats.completed;
+            document.getElementById('stat-failed').textContent = stats.failed;
+        }
+
         async function fetchQueueStatus() {
             try {
                 const response = await fetch(`${QUEUE_MANAGER_URL}/api/queue/status`);
                 const data = await response.json();
 
-                document.getElementById('stat-pending').textContent = data.pending_jobs;
-                document.getElementById('stat-running').textContent = data.running_jobs;
-                document.getElementById('stat-completed').textContent = data.completed_jobs;
-                document.getElementById('stat-failed').textContent = data.failed_jobs;
+                renderQueueStats({
+                    pending: data.pending_jobs,
+                    running: data.running_jobs,
+                    completed: data.completed_jobs,
+                    failed: data.failed_jobs
+                });
             } catch (error) {
                 console.error('Failed to fetch queue status:', error);
             }
         }
 
+        // Newest first, a page at a time: "Load more" follows the
+        // X-Next-Cursor header, refreshes re-read everything shown so far
+        const JOB_PAGE_SIZE = 50;
+        let shownJobs = [];
+        let nextCursor = null;
+
+        async function fetchJobPage(cursor, limit) {
+            const params = new URLSearchParams({ limit });
+            const status = document.getElementById('job-filter').value;
+            if (status) params.set('status', status);
+            if (cursor) params.set('cursor', cursor);
+            const response = await fetch(`${QUEUE_MANAGER_URL}/api/jobs?${params}`);
+            return { jobs: await response.json(), cursor: response.headers.get('X-Next-Cursor') };
+        }
+
         async function fetchJobs() {
             try {
-                const response = await fetch(`${QUEUE_MANAGER_URL}/api/jobs?limit=50`);
-                const jobs = await response.json();
-
-                const jobList = document.getElementById('job-list');
-
-                if (jobs.length === 0) {
-                    jobList.innerHTML = `
-                        <div class="empty-state">
-                            <svg xmlns="http://www.w3.org/2000/svg" fill="none" viewBox="0 0 24 24" stroke="currentColor">
-                                <path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M9 12l2 2 4-4m6 2a9 9 0 11-18 0 9 9 0 0118 0z" />
-                            </svg>
-                            <div>No jobs in queue</div>
-                        </div>
-                    `;
-                    return;
-                }
+                const page = await fetchJobPage(null, Math.max(shownJobs.length, JOB_PAGE_SIZE));
+                shownJobs = page.jobs;
+                nextCursor = page.cursor;
+                renderJobs();
+            } catch (error) {
+                console.error('Failed to fetch jobs:', error);
+            }
+        }
 
-                // Security: Use escapeHtml to prevent XSS attacks
-                jobList.innerHTML = jobs.map(job => `
-                    <div class="job-item ${escapeHtml(job.status)}">
-                        <div class="job-header">
-                            <div class="job-id">Job ${escapeHtml(job.id.substring(0, 8))}</div>
-                            <div class="job-status ${escapeHtml(job.status)}">${escapeHtml(job.status)}</div>
-                        </div>
-                        <div class="job-info">
-                            <span>👤 ${escapeHtml(job.user_id)}</span>
-                            <span>🕐 ${new Date(job.created_at).toLocaleTimeString()}</span>
-                            ${job.position_in_queue !== null ? `<span>📍 Position: ${escapeHtml(job.position_in_queue + 1)}</span>` : ''}
-                            ${job.worker_id ? `<span>🖥️ ${escapeHtml(job.worker_id)}</span>` : ''}
-                        </div>
-                        ${job.error ? `<div class="job-info" style="color: #dc3545; margin-top: 8px;">❌ ${escapeHtml(job.error)}</div>` : ''}
-                        ${job.status === 'pending' || job.status === 'running' ? `
-                            <div class="job-actions">
-                                ${job.status === 'pending' ? `<button class="btn btn-priority" onclick="updatePriority('${escapeHtml(job.id)}')">⚡ Prioritize</button>` : ''}
-                                <button class="btn btn-cancel" onclick="cancelJob('${escapeHtml(job.id)}')">✕ Cancel</button>
-                            </div>
-                        ` : ''}
-                    </div>
-                `).join('');
+        async function loadMoreJobs() {
+            if (!nextCursor) return;
+            try {
+                const page = await fetchJobPage(nextCursor, JOB_PAGE_SIZE);
+                shownJobs = shownJobs.concat(page.jobs);
+                nextCursor = page.cursor;
+                renderJobs();
             } catch (error) {
                 console.error('Failed to fetch jobs:', error);
             }
         }
 
+        function filterJobs() {
+            shownJobs = [];
+            fetchJobs();
+        }
+
+        function renderJobs() {
+            const jobList = document.getElementById('job-list');
+            document.getElementById('load-more').style.display = nextCursor ? 'block' : 'none';
+
+            if (shownJobs.length === 0) {
+                jobList.innerHTML = `
+                    <div class="empty-state">
+                        <svg xmlns="http://www.w3.org/2000/svg" fill="none" viewBox="0 0 24 24" stroke="currentColor">
+                            <path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M9 12l2 2 4-4m6 2a9 9 0 11-18 0 9 9 0 0118 0z" />
+                        </svg>
+                        <div>No jobs in queue</div>
+                    </div>
+                `;
+                return;
+            }
+
+            // Security: Use escapeHtml to prevent XSS attacks
+            jobList.innerHTML = shownJobs.map(job => `
+                <div class="job-item ${escapeHtml(job.status)}">
+                    <div class="job-header">
+                        <div class="job-id">Job ${escapeHtml(job.id.substring(0, 8))}</div>
+                        <div class="job-status ${escapeHtml(job.status)}">${escapeHtml(job.status)}</div>
+                    </div>
+                    <div class="job-info">
+                        <span>👤 ${escapeHtml(job.user_id)}</span>
+                        <span>🕐 ${new Date(job.created_at).toLocaleTimeString()}</span>
+                        ${job.position_in_queue !== null ? `<span>📍 Position: ${escapeHtml(job.position_in_queue + 1)}</span>` : ''}
+                        ${job.worker_id ? `<span>🖥️ ${escapeHtml(job.worker_id)}</span>` : ''}
+                    </div>
+                    ${job.error ? `<div class="job-info" style="color: #dc3545; margin-top: 8px;">❌ ${escapeHtml(job.error)}</div>` : ''}
+                    ${job.status === 'pending' || job.status === 'running' ? `
+                        <div class="job-actions">
+                            ${job.status === 'pending' ? `<button class="btn btn-priority" onclick="updatePriority('${escapeHtml(job.id)}')">⚡ Prioritize</button>` : ''}
+                            <button class="btn btn-cancel" onclick="cancelJob('${escapeHtml(job.id)}')">✕ Cancel</button>
+                        </div>
+                    ` : ''}
+                </div>
+            `).join('');
+        }
+
         async function cancelJob(jobId) {
             if (!confirm('Are you sure you want to cancel this job?')) return;
 
@@ -510,24 +586,38 @@ async def dashboard(request: Request, username: str = Depends(verify_admin)) ->
             }
         }
 
-        function updateWorkers() {
-            // Placeholder for worker status
-            // TODO: Implement worker tracking in queue manager
+        async function updateWorkers() {
+            try {
+                const response = await fetch(`${QUEUE_MANAGER_URL}/api/workers?include_offline=true`);
+                renderWorkers(await response.json());
+            } catch (error) {
+                console.error('Failed to fetch workers:', error);
+            }
+        }
+
+        function renderWorkers(workers) {
             const workerList = document.getElementById('worker-list');
-            workerList.innerHTML = `
+            if (workers.length === 0) {
+                workerList.innerHTML = '<div class="empty-state"><div>No workers connected</div></div>';
+                return;
+            }
+
+            workerList.innerHTML = workers.map(worker => `
                 <div class="worker-card">
                     <div class="worker-status">
-                        <div class="status-indicator"></div>
-                        <div class="worker-name">Worker 1 (GPU)</div>
+                        <div class="status-indicator ${worker.status === 'busy' ? '' : 'idle'}"></div>
+                        <div class="worker-name">${escapeHtml(worker.worker_id)}</div>
                     </div>
-                    <div class="worker-info">Status: Active</div>
-                    <div class="worker-info">Provider: Local H100</div>
+                    <div class="worker-info">Status: ${escapeHtml(worker.status)}${worker.current_job_id ? ` (job ${escapeHtml(worker.current_job_id.substring(0, 8))})` : ''}</div>
+                    <div class="worker-info">Provider: ${escapeHtml(worker.provider)}</div>
+                    <div class="worker-info">Jobs: ${escapeHtml(worker.jobs_completed)} completed, ${escapeHtml(worker.jobs_failed)} failed</div>
+                    <div class="worker-info">Last seen: ${new Date(worker.last_heartbeat).toLocaleTimeString()}</div>
                 </div>
-            `;
+            `).join('');
         }
 
         function connectWebSocket() {
-            const wsUrl = QUEUE_MANAGER_URL.replace('http', 'ws') + '/ws';
+            const wsUrl = QUEUE_MANAGER_URL.replace('http', 'ws') + '/ws?topics=admin:*';
             ws = new WebSocket(wsUrl);
 
             ws.onopen = () => {
@@ -538,9 +628,19 @@ async def dashboard(request: Request, username: str = Depends(verify_admin)) ->
 
             ws.onmessage = (event) => {
                 const message = JSON.parse(event.data);
-                if (message.type === 'job_updated' || message.type === 'job_created') {
+                // Events within the server's coalescing window arrive as one batch
+                const updates = message.type === 'batch' ? message.events : [message];
+                let jobsChanged = false;
+                for (const update of updates) {
+                    if (update.type === 'queue_stats') {
+                        renderQueueStats(update.data);
+                    } else if (update.type.startsWith('job')) {
+                        jobsChanged = true;
+                    }
+                }
+                // Counts come from queue_stats snapshots; only the job list is refetched
+                if (jobsChanged) {
                     fetchJobs();
-                    fetchQueueStatus();
                 }
             };
 
@@ -566,6 +666,7 @@ async def dashboard(request: Request, username: str = Depends(verify_admin)) ->
         setInterval(() => {
             fetchQueueStatus();
             fetchJobs();
+            updateWorkers();
         }, 5000);
     </script>
 </body>
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Benchmark: Redis memory over a multi-day workshop, with and without archiving.
+
+Replays --days days of --jobs-per-day jobs from --users users, each
+submitted, claimed and completed with a ComfyUI-sized output manifest
+(a few hundred frames for a share of video jobs). At the end of every day
+Redis memory is measured:
+  keep    - the previous behaviour, finished jobs stay in Redis forever
+  archive - archive_finished_jobs() with ARCHIVE_AFTER_SECONDS of one day,
+            moving older finished jobs to the SQLite archive
+
+Memory is measured as in bench_workflow_store.py: MEMORY USAGE summed over
+all keys on a real Redis (REDIS_URL set; the target DB is flushed), or the
+summed size of stored values on fakeredis. The clock is simulated.
+
+Usage:
+    python benchmarks/bench_archive.py [--days 3] [--jobs-per-day 1000]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+from pathlib import Path
+from unittest.mock import patch
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "queue-manager"))
+os.environ.setdefault("REDIS_PASSWORD", "benchmark")
+
+from bench_workflow_store import used_memory  # noqa: E402
+from models import Job  # noqa: E402
+
+DAY = 86400
+
+
+def make_servers():
+    """Sync and async connections to one Redis: REDIS_URL if set, otherwise a shared fakeredis server"""
+    url = os.getenv("REDIS_URL")
+    if url:
+        from redis import Redis
+        from redis.asyncio import Redis as AsyncRedis
+        server = Redis.from_url(url, decode_responses=True, encoding_errors="surrogateescape")
+        server.flushdb()
+        return server, AsyncRedis.from_url(url, decode_responses=True, encoding_errors="surrogateescape")
+    import fakeredis
+    shared = fakeredis.FakeServer()
+    return (
+        fakeredis.FakeRedis(server=shared, decode_responses=True, encoding_errors="surrogateescape"),
+        fakeredis.FakeAsyncRedis(server=shared, decode_responses=True, encoding_errors="surrogateescape"),
+    )
+
+
+def manifest(rng: random.Random, user_id: str) -> dict:
+    """Result payload shaped like a ComfyUI history entry"""
+    frames = 240 if rng.random() < 0.2 else 4
+    return {
+        "prompt_id": f"{rng.getrandbits(64):016x}",
+        "status": "completed",
+        "outputs": {"9": {"images": [
+            {"filename": f"out_{i:05d}_.png", "subfolder": user_id, "type": "output"} for i in range(frames)
+        ]}},
+        "execution_time": rng.uniform(5, 180),
+        "output_path": f"/outputs/{user_id}",
+    }
+
+
+async def run(archiving: bool, args) -> list:
+    sync_server, async_server = make_servers()
+    with patch("async_redis_client.Redis", return_value=async_server):
+        from async_redis_client import AsyncRedisClient
+        from archive import JobArchive, archive_finished_jobs
+        client = AsyncRedisClient()
+
+    workdir = tempfile.mkdtemp()
+    archive = JobArchive(os.path.join(workdir, "jobs.db"))
+    rng = random.Random(args.seed)
+    clock = 0.0
+    rows = []
+    for day in range(args.days):
+        for i in range(args.jobs_per_day):
+            clock = day * DAY + i * DAY / args.jobs_per_day
+            user_id = f"user{rng.randrange(args.users) + 1:03d}"
+            job = Job(user_id=user_id, workflow={"3": {"inputs": {"seed": rng.randrange(4)}}})
+            await client.create_job(job)
+            await client.claim_next_job("worker-1")
+            await client.move_job_to_completed(job.id, manifest(rng, user_id))
+            await client.redis.zadd(client.QUEUE_COMPLETED, {job.id: clock}, xx=True)
+
+        if archiving:
+            with patch("archive.time.time", return_value=clock):
+                await archive_finished_jobs(client, archive, DAY, batch_size=500)
+        rows.append({
+            "day": day + 1,
+            "redis_kb": used_memory(sync_server) / 1024,
+            "keys": len(list(sync_server.scan_iter(count=1000))),
+            "archived": archive.count(),
+            "archive_kb": os.path.getsize(os.path.join(workdir, "jobs.db")) / 1024,
+        })
+
+    archive.close()
+    await client.close()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=3)
+    parser.add_argument("--jobs-per-day", type=int, default=1000)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{args.jobs_per_day} jobs/day from {args.users} users over {args.days} days, archive after 1 day")
+    print(f"{'mode':>7} | {'day':>3} | {'Redis KB':>9} | {'keys':>6} | {'archived':>8} | archive KB")
+    for archiving in (False, True):
+        for r in asyncio.run(run(archiving, args)):
+            print(
+                f"{'archive' if archiving else 'keep':>7} | {r['day']:>3} | {r['redis_kb']:>9.0f} | "
+                f"{r['keys']:>6} | {r['archived']:>8} | {r['archive_kb'] if archiving else 0:.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
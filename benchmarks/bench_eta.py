@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Benchmark: queue ETA accuracy - global mean vs per-workflow replay.
+
+Replays a workshop against the real RedisClient on a simulated clock:
+bursts of submissions (a group pressing Queue Prompt together) mixing the
+workflows in data/workflows, each with its own lognormal runtime, drained
+by --workers workers. Every job's estimated wait is taken when it is
+submitted and compared with when it actually starts.
+
+The legacy estimate (reproduced below) was position * mean runtime of all
+completed jobs / NUM_WORKERS. The current one replays the queue ahead with
+each workflow's EWMA runtime, from the remaining time of the running jobs,
+across the live workers (eta.py).
+
+Jobs submitted before --warmup jobs have completed are left out (neither
+estimator has history then). A prediction counts as close when it is
+within 25% of the actual wait, or 10 s.
+
+Runs against fakeredis by default, or a real Redis when REDIS_URL is set
+(the target DB is flushed).
+
+Usage:
+    python benchmarks/bench_eta.py [--jobs 600] [--workers 3 4 6] [--seed 1]
+"""
+import argparse
+import heapq
+import json
+import os
+import random
+import sys
+import time
+import types
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List
+from unittest.mock import patch
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "queue-manager"))
+os.environ.setdefault("REDIS_PASSWORD", "benchmark")
+
+from bench_round_robin import make_server  # noqa: E402
+from eta import quantile  # noqa: E402
+from models import Job  # noqa: E402
+from redis_client import RedisClient, RedisClientBase  # noqa: E402
+
+# Median runtime (seconds) per workflow on one GPU, and the spread of
+# runtimes around it (lognormal sigma)
+WORKFLOW_RUNTIMES = {
+    "example_workflow.json": 8,
+    "flux2_klein_4b_text_to_image.json": 14,
+    "flux2_klein_9b_text_to_image.json": 28,
+    "ltx2_text_to_video_distilled.json": 65,
+    "ltx2_text_to_video.json": 190,
+}
+RUNTIME_SIGMA = 0.15
+
+
+class SimClock:
+    """Simulated wall clock, patched in for time.time() and datetime.now()"""
+
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def time(self) -> float:
+        return self.now
+
+    def datetime_class(self):
+        clock = self
+
+        class SimDatetime(datetime):
+            @classmethod
+            def now(cls, tz=None):
+                return datetime.fromtimestamp(clock.now, tz)
+
+        return SimDatetime
+
+
+def legacy_wait(client, rank: int, workers: int) -> float:
+    """The pre-signature ETA: jobs ahead * mean runtime / NUM_WORKERS"""
+    total_seconds, count = client.redis.hmget(client.STATS_JOB_RUNTIME, ["total_seconds", "count"])
+    mean = float(total_seconds) / int(count) if count else 60
+    return rank * mean / workers
+
+
+def arrivals(jobs: int, rng: random.Random) -> List[tuple]:
+    """(submit time, workflow) bursts: 3-20 jobs within a few seconds, then a pause"""
+    names = list(WORKFLOW_RUNTIMES)
+    weights = [4, 4, 3, 2, 1]
+    t, out = 0.0, []
+    while len(out) < jobs:
+        t += rng.expovariate(1 / 150)
+        for _ in range(rng.randint(3, 20)):
+            out.append((t + rng.uniform(0, 5), rng.choices(names, weights)[0]))
+    return sorted(out)[:jobs]
+
+
+def run(jobs: int, workers: int, warmup: int, seed: int) -> Dict[str, dict]:
+    rng = random.Random(seed)
+    workflows = {name: json.loads((ROOT / "data" / "workflows" / name).read_text()) for name in WORKFLOW_RUNTIMES}
+    names = {RedisClientBase._workflow_digest(workflow): name for name, workflow in workflows.items()}
+    clock = SimClock()
+    sim_time = types.SimpleNamespace(time=clock.time, monotonic=time.monotonic)
+
+    server = make_server()
+    with patch('redis_client.Redis', return_value=server):
+        client = RedisClient()
+
+    worker_ids = [f"worker-{i}" for i in range(workers)]
+    idle = list(worker_ids)
+    events = []  # (time, kind, payload) - completions before arrivals at the same instant
+    for i, (at, name) in enumerate(arrivals(jobs, rng)):
+        heapq.heappush(events, (clock.now + at, 1, (f"job-{i:05d}", name)))
+    predicted, started, completed = {}, {}, 0
+
+    with patch('redis_client.time', sim_time), patch('redis_client.datetime', clock.datetime_class()), \
+            patch('redis_client.settings.num_workers', workers):
+        while events:
+            clock.now, kind, payload = heapq.heappop(events)
+            for worker_id in worker_ids:
+                client.update_worker_heartbeat(worker_id)
+
+            if kind == 0:
+                job_id, worker_id = payload
+                client.move_job_to_completed(job_id, {"ok": True})
+                idle.append(worker_id)
+                completed += 1
+            else:
+                job_id, name = payload
+                job = Job(
+                    id=job_id, user_id=f"user{rng.randint(1, 20):03d}", workflow=workflows[name],
+                    created_at=datetime.fromtimestamp(clock.now, timezone.utc),
+                )
+                client.create_job(job)
+                if completed >= warmup:
+                    rank, wait = client.get_queue_estimates([job_id])[job_id]
+                    predicted[job_id] = (clock.now, wait, legacy_wait(client, rank, workers))
+
+            while idle:
+                job = client.claim_next_job(idle[-1])
+                if not job:
+                    break
+                worker_id = idle.pop()
+                started[job.id] = clock.now
+                runtime = WORKFLOW_RUNTIMES[names[job.workflow_hash]] * rng.lognormvariate(0, RUNTIME_SIGMA)
+                heapq.heappush(events, (clock.now + runtime, 0, (job.id, worker_id)))
+    server.flushdb()
+
+    results = {}
+    for index, name in ((1, "current"), (2, "legacy")):
+        errors, close = [], 0
+        for job_id, entry in predicted.items():
+            actual = started[job_id] - entry[0]
+            error = abs(entry[index] - actual)
+            errors.append(error)
+            close += error <= max(0.25 * actual, 10)
+        results[name] = {
+            "jobs": len(errors),
+            "mae": sum(errors) / len(errors),
+            "p50": quantile(errors, 0.5),
+            "p90": quantile(errors, 0.9),
+            "close": 100 * close / len(errors),
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs", type=int, default=600)
+    parser.add_argument("--workers", type=int, nargs="+", default=[3, 4, 6])
+    parser.add_argument("--warmup", type=int, default=20, help="completed jobs before predictions are scored")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{args.jobs} jobs, error of the wait estimated at submission (seconds)")
+    print(f"{'workers':>7} | {'estimator':>9} | {'jobs':>5} | {'MAE':>7} | {'p50':>7} | {'p90':>7} | within 25%")
+    for workers in args.workers:
+        for name, r in run(args.jobs, workers, args.warmup, args.seed).items():
+            print(
+                f"{workers:>7} | {name:>9} | {r['jobs']:>5} | {r['mae']:>7.1f} | {r['p50']:>7.1f} | "
+                f"{r['p90']:>7.1f} | {r['close']:.0f}%"
+            )
+
+
+if __name__ == "__main__":
+    main()
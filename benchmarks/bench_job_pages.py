@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Benchmark: GET /api/jobs for one user - load-and-filter vs history index.
+
+The previous listing (reproduced below) read every job the user ever
+submitted (SMEMBERS user:{id}:jobs, then every job summary), filtered by
+status in Python and cut the result to limit. The indexed listing reads one
+page from user:{id}:index:{status} and loads only the jobs on it.
+
+Each user history is --sizes jobs, three quarters completed; the timed
+request asks for the newest --limit completed jobs.
+
+Runs against fakeredis by default (relative numbers), or a real Redis when
+REDIS_URL is set (absolute numbers; the target DB is flushed).
+
+Usage:
+    python benchmarks/bench_job_pages.py [--sizes 100 1000 10000] [--limit 50]
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+from typing import List
+from unittest.mock import patch
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "queue-manager"))
+os.environ.setdefault("REDIS_PASSWORD", "benchmark")
+
+from bench_round_robin import make_server  # noqa: E402
+from models import Job, JobStatus  # noqa: E402
+
+
+def legacy_list_jobs(client, user_id: str, status: JobStatus, limit: int) -> List[Job]:
+    """The pre-index GET /api/jobs?user_id=...&status=..."""
+    jobs = client.get_user_jobs(user_id, include_workflow=False)
+    jobs = [j for j in jobs if j.status == status]
+    return jobs[:limit]
+
+
+def populate(client, size: int) -> None:
+    client.create_jobs([Job(id=f"job-{i:06d}", user_id="user001", workflow={"1": {}}) for i in range(size)])
+    for _ in range(size * 3 // 4):
+        job = client.claim_next_job("bench-worker")
+        client.move_job_to_completed(job.id, {"images": ["out.png"]})
+
+
+def run(size: int, limit: int, samples: int) -> dict:
+    server = make_server()
+    with patch('redis_client.Redis', return_value=server):
+        from redis_client import RedisClient
+        client = RedisClient()
+    populate(client, size)
+
+    results = {"jobs": size}
+    for name in ("legacy", "indexed"):
+        start = time.perf_counter()
+        for _ in range(samples):
+            if name == "legacy":
+                legacy_list_jobs(client, "user001", JobStatus.COMPLETED, limit)
+            else:
+                client.get_job_page("user001", JobStatus.COMPLETED, limit=limit)
+        elapsed = time.perf_counter() - start
+        results[name] = round(elapsed / samples * 1000, 2)
+    server.flushdb()
+    results["speedup"] = round(results["legacy"] / results["indexed"], 1)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--samples", type=int, default=5, help="requests timed per size")
+    args = parser.parse_args()
+
+    print(f"newest {args.limit} completed jobs of one user")
+    print(f"{'history':>8} | {'legacy ms':>10} | {'indexed ms':>10} | speedup")
+    for size in args.sizes:
+        r = run(size, args.limit, args.samples)
+        print(f"{size:>8} | {r['legacy']:>10} | {r['indexed']:>10} | {r['speedup']}x")
+
+
+if __name__ == "__main__":
+    main()
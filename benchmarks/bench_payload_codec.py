@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Benchmark: stored size and (de)serialization time - JSON text vs PayloadCodec.
+
+JSON is what earlier versions stored (json.dumps / json.loads of the payload).
+The codec writes a msgpack body, zstd-compressed above the threshold. Payloads
+are the workshop workflows (data/workflows/*.json) and a video job's output
+manifest (one entry per rendered frame, as in ComfyUI's /history).
+
+Usage:
+    python benchmarks/bench_payload_codec.py [--frames 2000] [--threshold 16384]
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "queue-manager"))
+
+from codec import PayloadCodec  # noqa: E402
+
+
+def video_result(frames: int) -> dict:
+    """Output manifest of a text-to-video job that also saved every frame"""
+    return {
+        "prompt_id": "5c0e7d8a-4f1b-4a53-9d54-9b0f8f0a5e21",
+        "status": "completed",
+        "outputs": {
+            "75": {"images": [
+                {"filename": f"LTX-2_{i:05d}_.png", "subfolder": "user001", "type": "output"}
+                for i in range(frames)
+            ]},
+            "76": {"gifs": [{
+                "filename": "LTX-2_00001.mp4", "subfolder": "user001", "type": "output",
+                "format": "video/h264-mp4", "frame_rate": 24.0, "workflow": "LTX-2_00001.png",
+                "fullpath": "/outputs/user001/LTX-2_00001.mp4",
+            }]},
+        },
+        "execution_time": 182.4,
+        "output_path": "/outputs/user001",
+        "timestamp": "2026-01-20T10:15:00+00:00",
+    }
+
+
+def timed(fn, repeat: int) -> float:
+    """Best-of-repeat milliseconds per call"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=2000, help="frames in the video result manifest")
+    parser.add_argument("--threshold", type=int, default=16384, help="compression threshold (bytes)")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    codec = PayloadCodec("msgpack", compression_threshold=args.threshold)
+    payloads = {
+        path.stem: json.loads(path.read_text())
+        for path in sorted((ROOT / "data" / "workflows").glob("*.json"))
+    }
+    payloads[f"video result ({args.frames} frames)"] = video_result(args.frames)
+
+    print(f"{'payload':<36} | {'JSON KB':>8} {'codec KB':>8} {'ratio':>6} | "
+          f"{'enc ms':>6} {'codec':>6} | {'dec ms':>6} {'codec':>6}")
+    for name, value in payloads.items():
+        text = json.dumps(value)
+        data = codec.encode(value)
+        json_enc = timed(lambda: json.dumps(value), args.repeat)
+        codec_enc = timed(lambda: codec.encode(value), args.repeat)
+        json_dec = timed(lambda: json.loads(text), args.repeat)
+        codec_dec = timed(lambda: codec.decode(data), args.repeat)
+        print(
+            f"{name:<36} | {len(text) / 1024:>8.1f} {len(data) / 1024:>8.1f} {len(text) / len(data):>5.1f}x | "
+            f"{json_enc:>6.2f} {codec_enc:>6.2f} | {json_dec:>6.2f} {codec_dec:>6.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
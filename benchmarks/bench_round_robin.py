@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Benchmark: round-robin job selection - legacy pending-queue scan vs indexed.
+
+The legacy scheduler (reproduced below) ran ZRANGE over all of queue:pending,
+loaded and validated every pending job (full workflow JSON), then read one
+completed-count key per user, and finally removed the candidate under
+WATCH/MULTI. The indexed scheduler picks the user from queue:round_robin and
+claims their next job in a single script call.
+
+Runs against fakeredis by default (relative numbers), or a real Redis when
+REDIS_URL is set (absolute numbers; the target DB is flushed).
+
+Usage:
+    python benchmarks/bench_round_robin.py [--sizes 100 1000 10000] [--users 20]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+from unittest.mock import patch
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "queue-manager"))
+os.environ.setdefault("REDIS_PASSWORD", "benchmark")
+
+from models import Job, QueueMode  # noqa: E402
+
+
+def make_server():
+    """Real Redis if REDIS_URL is set, otherwise fakeredis"""
+    url = os.getenv("REDIS_URL")
+    if url:
+        from redis import Redis
+        server = Redis.from_url(url, decode_responses=True, encoding_errors="surrogateescape")
+        server.flushdb()
+        return server
+    import fakeredis
+    return fakeredis.FakeRedis(decode_responses=True, encoding_errors="surrogateescape")
+
+
+class CommandCounter:
+    """Count client->server round trips by wrapping execute_command"""
+
+    def __init__(self, server):
+        self.count = 0
+        original = server.execute_command
+
+        def counting(*args, **kwargs):
+            self.count += 1
+            return original(*args, **kwargs)
+
+        server.execute_command = counting
+
+
+def legacy_round_robin_job(client) -> Optional[str]:
+    """Round-robin selection as it was before the index: a scan of every pending job"""
+    pending_job_ids = client.redis.zrange(client.QUEUE_PENDING, 0, -1)
+    if not pending_job_ids:
+        return None
+
+    user_jobs: Dict[str, List[str]] = {}
+    for job_id in pending_job_ids:
+        job = client.get_job(job_id)
+        if job:
+            user_jobs.setdefault(job.user_id, []).append(job_id)
+
+    min_completed = float('inf')
+    selected_user = None
+    for user_id in user_jobs.keys():
+        count_key = client.USER_COMPLETED_COUNT.format(user_id=user_id)
+        completed = int(client.redis.get(count_key) or 0)
+        if completed < min_completed:
+            min_completed = completed
+            selected_user = user_id
+
+    if selected_user and user_jobs[selected_user]:
+        return user_jobs[selected_user][0]
+    return None
+
+
+def legacy_dequeue(client) -> Optional[str]:
+    """Legacy round-robin dequeue: scan, then WATCH/MULTI removal"""
+    job_id = legacy_round_robin_job(client)
+    if not job_id:
+        return None
+    pipe = client.redis.pipeline()
+    pipe.watch(client.QUEUE_PENDING)
+    if pipe.zscore(client.QUEUE_PENDING, job_id) is None:
+        pipe.unwatch()
+        return None
+    pipe.multi()
+    pipe.zrem(client.QUEUE_PENDING, job_id)
+    pipe.execute()
+    return job_id
+
+
+def populate(client, size: int, users: int, workflow: dict) -> None:
+    for i in range(size):
+        job = Job(id=f"job-{i:06d}", user_id=f"user{i % users:03d}", workflow=workflow)
+        client.create_job(job)
+
+
+def run(size: int, users: int, samples: int, workflow: dict) -> dict:
+    results = {"pending": size}
+    for name in ("legacy", "indexed"):
+        server = make_server()
+        with patch('redis_client.Redis', return_value=server):
+            from redis_client import RedisClient
+            client = RedisClient()
+        populate(client, size, users, workflow)
+        counter = CommandCounter(server)
+
+        n = min(samples, size)
+        start = time.perf_counter()
+        for _ in range(n):
+            if name == "legacy":
+                legacy_dequeue(client)
+            else:
+                client.claim_next_job("bench-worker", QueueMode.ROUND_ROBIN)
+        elapsed = time.perf_counter() - start
+
+        results[name] = {
+            "ms_per_dequeue": round(elapsed / n * 1000, 3),
+            "round_trips_per_dequeue": round(counter.count / n, 1),
+        }
+        server.flushdb()
+    results["speedup"] = round(
+        results["legacy"]["ms_per_dequeue"] / results["indexed"]["ms_per_dequeue"], 1
+    )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--samples", type=int, default=5, help="dequeues timed per size")
+    parser.add_argument(
+        "--workflow",
+        default=str(ROOT / "data" / "workflows" / "example_workflow.json"),
+        help="workflow JSON stored in every job",
+    )
+    args = parser.parse_args()
+
+    workflow = json.loads(Path(args.workflow).read_text())
+    print(f"workflow: {Path(args.workflow).name} ({len(json.dumps(workflow))} bytes), users: {args.users}")
+    print(f"{'pending':>8} | {'legacy ms':>10} {'trips':>7} | {'indexed ms':>10} {'trips':>6} | speedup")
+    for size in args.sizes:
+        r = run(size, args.users, args.samples, workflow)
+        print(
+            f"{size:>8} | {r['legacy']['ms_per_dequeue']:>10} {r['legacy']['round_trips_per_dequeue']:>7} | "
+            f"{r['indexed']['ms_per_dequeue']:>10} {r['indexed']['round_trips_per_dequeue']:>6} | "
+            f"{r['speedup']}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
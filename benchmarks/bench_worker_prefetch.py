@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Benchmark: GPU idle gap between consecutive jobs, with and without prefetch.
+
+Runs the real queue manager (uvicorn, in a thread) and the real worker loop
+against a local ComfyUI stand-in that executes one prompt at a time for
+--job-seconds and records when each prompt starts and ends. A batch of jobs
+is queued up front, so any time the stand-in spends between prompts is
+dispatch overhead: the worker noticing completion (history polling),
+reporting it, claiming the next job and submitting it. With prefetch the
+next prompt is already in the stand-in's queue.
+
+--rtt adds latency to every worker -> queue manager request (a GPU instance
+reaching the VPS over the internet).
+
+Redis is fakeredis, or a real Redis when REDIS_URL is set (the target DB is
+flushed).
+
+Usage:
+    python benchmarks/bench_worker_prefetch.py [--jobs 10] [--job-seconds 3] [--prefetch 0 1]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest.mock import patch
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "queue-manager"))
+sys.path.insert(0, str(ROOT / "comfyui-worker"))
+os.environ.setdefault("REDIS_PASSWORD", "benchmark")
+
+QUEUE_MANAGER_PORT = 38000
+COMFYUI_PORT = 38188
+
+
+class ComfyUIStandIn:
+    """Minimal ComfyUI API: /prompt, /history, /queue, /interrupt - one prompt at a time"""
+
+    def __init__(self, job_seconds: float):
+        self.job_seconds = job_seconds
+        self.pending = []
+        self.running = None
+        self.done = {}
+        self.spans = []  # (start, end) per executed prompt
+        self.lock = threading.Condition()
+        self.stopped = False
+
+    def execute(self):
+        while True:
+            with self.lock:
+                while not self.pending and not self.stopped:
+                    self.lock.wait()
+                if self.stopped:
+                    return
+                self.running = self.pending.pop(0)
+            start = time.monotonic()
+            time.sleep(self.job_seconds)
+            with self.lock:
+                self.spans.append((start, time.monotonic()))
+                self.done[self.running] = True
+                self.running = None
+
+    def handler(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def reply(self, data):
+                body = json.dumps(data).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}")
+                with stand_in.lock:
+                    if self.path == "/prompt":
+                        prompt_id = str(uuid.uuid4())
+                        stand_in.pending.append(prompt_id)
+                        stand_in.lock.notify()
+                        return self.reply({"prompt_id": prompt_id})
+                    if self.path == "/queue":
+                        for prompt_id in body.get("delete", []):
+                            if prompt_id in stand_in.pending:
+                                stand_in.pending.remove(prompt_id)
+                    return self.reply({})
+
+            def do_GET(self):
+                with stand_in.lock:
+                    if self.path.startswith("/history/"):
+                        prompt_id = self.path.rsplit("/", 1)[1]
+                        if prompt_id in stand_in.done:
+                            return self.reply({prompt_id: {"status": {"completed": True}, "outputs": {}}})
+                        return self.reply({})
+                    running = [[0, stand_in.running]] if stand_in.running else []
+                    return self.reply({"queue_running": running, "queue_pending": []})
+
+        return Handler
+
+
+def make_server():
+    """Real Redis if REDIS_URL is set, otherwise a shared fakeredis server"""
+    url = os.getenv("REDIS_URL")
+    if url:
+        from redis import Redis
+        from redis.asyncio import Redis as AsyncRedis
+        Redis.from_url(url).flushdb()
+        return (
+            lambda **kwargs: Redis.from_url(url, decode_responses=True, encoding_errors="surrogateescape"),
+            lambda **kwargs: AsyncRedis.from_url(url, decode_responses=True, encoding_errors="surrogateescape"),
+        )
+    import fakeredis
+    server = fakeredis.FakeServer()
+    return (
+        lambda **kwargs: fakeredis.FakeRedis(
+            server=server, decode_responses=True, encoding_errors="surrogateescape"),
+        lambda **kwargs: fakeredis.FakeAsyncRedis(
+            server=server, decode_responses=True, encoding_errors="surrogateescape"),
+    )
+
+
+def run(jobs: int, job_seconds: float, prefetch: int, rtt: float) -> dict:
+    import httpx
+    import uvicorn
+
+    sync_redis, async_redis = make_server()
+    with patch("redis_client.Redis", side_effect=sync_redis), \
+            patch("async_redis_client.Redis", side_effect=async_redis):
+        from redis_client import RedisClient
+        from models import Job
+        import main
+
+        queue_manager = uvicorn.Server(uvicorn.Config(
+            main.app, host="127.0.0.1", port=QUEUE_MANAGER_PORT, log_level="warning"
+        ))
+        server_thread = threading.Thread(target=queue_manager.run, daemon=True)
+        server_thread.start()
+        while not queue_manager.started:
+            time.sleep(0.05)
+
+        RedisClient().create_jobs([
+            Job(user_id=f"user{i % 5 + 1:03d}", workflow={"1": {"seed": i}}) for i in range(jobs)
+        ])
+
+    stand_in = ComfyUIStandIn(job_seconds)
+    comfyui = ThreadingHTTPServer(("127.0.0.1", COMFYUI_PORT), stand_in.handler())
+    threading.Thread(target=comfyui.serve_forever, daemon=True).start()
+    threading.Thread(target=stand_in.execute, daemon=True).start()
+
+    import worker as worker_module
+    worker_module.PREFETCH = prefetch
+    worker_module.shutdown_requested = False
+    worker = worker_module.Worker()
+    worker.http_client = httpx.Client(
+        timeout=30.0, event_hooks={"request": [lambda request: time.sleep(rtt)]}
+    )
+
+    def stop_when_done():
+        while worker.jobs_completed + worker.jobs_failed < jobs:
+            time.sleep(0.05)
+        worker_module.shutdown_requested = True
+
+    threading.Thread(target=stop_when_done, daemon=True).start()
+    start = time.monotonic()
+    worker.run()
+    elapsed = time.monotonic() - start
+
+    with stand_in.lock:
+        stand_in.stopped = True
+        stand_in.lock.notify()
+    comfyui.shutdown()
+    comfyui.server_close()
+    queue_manager.should_exit = True
+    server_thread.join()
+
+    spans = sorted(stand_in.spans)
+    gaps = [b[0] - a[1] for a, b in zip(spans, spans[1:])]
+    busy = sum(end - begin for begin, end in spans)
+    return {
+        "executed": len(spans),
+        "elapsed": elapsed,
+        "gap_mean": statistics.mean(gaps) if gaps else 0.0,
+        "gap_max": max(gaps) if gaps else 0.0,
+        "utilization": 100 * busy / (spans[-1][1] - spans[0][0]) if spans else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs", type=int, default=10)
+    parser.add_argument("--job-seconds", type=float, default=3.0, help="execution time per prompt")
+    parser.add_argument("--prefetch", type=int, nargs="+", default=[0, 1], help="WORKER_PREFETCH values")
+    parser.add_argument("--rtt", type=float, default=0.05, help="seconds added to each queue manager request")
+    args = parser.parse_args()
+
+    os.environ["COMFYUI_URL"] = f"http://127.0.0.1:{COMFYUI_PORT}"
+    os.environ["QUEUE_MANAGER_URL"] = f"http://127.0.0.1:{QUEUE_MANAGER_PORT}"
+    os.environ["WORKER_LONG_POLL_WAIT"] = "1"
+    os.environ["OUTPUTS_PATH"] = tempfile.mkdtemp()
+    os.environ["WORKER_METRICS_PORT"] = "0"  # nothing scrapes the benchmark's worker
+
+    print(f"jobs: {args.jobs}, job time: {args.job_seconds}s, queue manager rtt: {args.rtt * 1000:.0f}ms")
+    print(f"{'prefetch':>8} | {'executed':>8} | {'elapsed s':>9} | {'mean gap s':>10} | {'max gap s':>9} | GPU busy")
+    for prefetch in args.prefetch:
+        r = run(args.jobs, args.job_seconds, prefetch, args.rtt)
+        print(
+            f"{prefetch:>8} | {r['executed']:>8} | {r['elapsed']:>9.1f} | {r['gap_mean']:>10.3f} | "
+            f"{r['gap_max']:>9.3f} | {r['utilization']:.1f}%"
+        )
+
+
+if __name__ == "__main__":
+    main()
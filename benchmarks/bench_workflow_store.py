@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Benchmark: Redis memory for workflows - inline per job vs content-addressed store.
+
+Replays a workshop session: every user picks one of the workshop workflows
+(data/workflows/*.json) and submits it repeatedly. A fraction of submissions
+(--edit-rates) change the seed or prompt first, which makes them distinct
+workflows; the rest are resubmitted unchanged. Each session is stored twice:
+  inline - the previous layout, the workflow JSON inside every job hash
+  store  - RedisClient.create_job, one workflow:{sha256} entry per distinct
+           workflow, referenced from the job hash
+
+Memory is MEMORY USAGE summed over all keys on a real Redis (REDIS_URL set;
+the target DB is flushed), or the summed size of stored values on fakeredis.
+
+Usage:
+    python benchmarks/bench_workflow_store.py [--users 20] [--submissions 30]
+"""
+import argparse
+import copy
+import json
+import os
+import random
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+from unittest.mock import patch
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "queue-manager"))
+os.environ.setdefault("REDIS_PASSWORD", "benchmark")
+
+from models import Job  # noqa: E402
+
+# Rough share of workshop submissions per workflow
+WORKFLOW_WEIGHTS = {
+    "flux2_klein_4b_text_to_image.json": 5,
+    "flux2_klein_9b_text_to_image.json": 3,
+    "ltx2_text_to_video_distilled.json": 2,
+    "ltx2_text_to_video.json": 1,
+}
+
+
+def make_server():
+    """Real Redis if REDIS_URL is set, otherwise fakeredis"""
+    url = os.getenv("REDIS_URL")
+    if url:
+        from redis import Redis
+        server = Redis.from_url(url, decode_responses=True, encoding_errors="surrogateescape")
+        server.flushdb()
+        return server
+    import fakeredis
+    return fakeredis.FakeRedis(decode_responses=True, encoding_errors="surrogateescape")
+
+
+def nbytes(value: str) -> int:
+    """Stored size of a value read back with surrogateescape"""
+    return len(value.encode("utf-8", "surrogateescape"))
+
+
+def used_memory(server) -> int:
+    """Bytes held by all keys (MEMORY USAGE, or value bytes on fakeredis)"""
+    total = 0
+    for key in server.scan_iter(count=1000):
+        if os.getenv("REDIS_URL"):
+            total += server.memory_usage(key, samples=0) or 0
+            continue
+        key_type = server.type(key)
+        if key_type == "hash":
+            total += sum(nbytes(k) + nbytes(v) for k, v in server.hgetall(key).items())
+        elif key_type == "zset":
+            total += sum(nbytes(m) + 8 for m, _ in server.zrange(key, 0, -1, withscores=True))
+        elif key_type == "set":
+            total += sum(nbytes(m) for m in server.smembers(key))
+        elif key_type == "string":
+            total += nbytes(server.get(key))
+    return total
+
+
+def edit_workflow(workflow: Dict, rng: random.Random) -> Dict:
+    """A user's tweak before resubmitting: new seed(s), or a changed prompt"""
+    edited = copy.deepcopy(workflow)
+    changed = False
+    for node in edited.get("nodes", []):
+        values = node.get("widgets_values")
+        if not isinstance(values, list):
+            continue
+        for i, value in enumerate(values):
+            if isinstance(value, int) and not isinstance(value, bool) and value >= 2 ** 32:
+                values[i] = rng.randrange(2 ** 32, 2 ** 50)
+                changed = True
+    if not changed:
+        edited.setdefault("extra", {})["prompt_note"] = f"variation {rng.random()}"
+    return edited
+
+
+def session(users: int, submissions: int, edit_rate: float, seed: int) -> List[Tuple[str, Dict]]:
+    """(user_id, workflow) for every submission in a replayed workshop session"""
+    rng = random.Random(seed)
+    templates = {
+        name: json.loads((ROOT / "data" / "workflows" / name).read_text())
+        for name in WORKFLOW_WEIGHTS
+    }
+    names, weights = list(WORKFLOW_WEIGHTS), list(WORKFLOW_WEIGHTS.values())
+
+    jobs = []
+    for u in range(users):
+        user_id = f"user{u + 1:03d}"
+        workflow = templates[rng.choices(names, weights)[0]]
+        for _ in range(submissions):
+            if rng.random() < edit_rate:
+                workflow = edit_workflow(workflow, rng)
+            jobs.append((user_id, workflow))
+    rng.shuffle(jobs)
+    return jobs
+
+
+def run(jobs: List[Tuple[str, Dict]]) -> dict:
+    results = {"jobs": len(jobs)}
+
+    server = make_server()
+    with patch('redis_client.Redis', return_value=server):
+        from redis_client import RedisClient
+        client = RedisClient()
+
+    # Inline: the job hash carries its own copy of the workflow
+    for i, (user_id, workflow) in enumerate(jobs):
+        job = Job(id=f"job-{i:06d}", user_id=user_id, workflow=workflow)
+        mapping, _ = client._job_to_hash(job)
+        mapping["workflow"] = json.dumps(workflow)
+        server.hset(client.JOB_KEY.format(job_id=job.id), mapping=mapping)
+    results["inline"] = used_memory(server)
+    server.flushdb()
+
+    # Store: one entry per distinct workflow
+    for i, (user_id, workflow) in enumerate(jobs):
+        client.create_job(Job(id=f"job-{i:06d}", user_id=user_id, workflow=workflow))
+    for key in client.redis.scan_iter(match="queue:*"):
+        server.delete(key)  # index keys are not part of the inline baseline
+    for key in client.redis.scan_iter(match="user:*"):
+        server.delete(key)
+    results["store"] = used_memory(server)
+    results["workflows"] = sum(1 for _ in server.scan_iter(match="workflow:*"))
+    server.flushdb()
+
+    results["saved"] = round(100 * (1 - results["store"] / results["inline"]), 1)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--submissions", type=int, default=30, help="submissions per user")
+    parser.add_argument(
+        "--edit-rates", type=float, nargs="+", default=[0.0, 0.1, 0.25, 0.5],
+        help="fraction of submissions that change the seed/prompt first",
+    )
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"users: {args.users}, submissions per user: {args.submissions}")
+    print(f"{'edit rate':>9} | {'jobs':>5} {'workflows':>9} | {'inline MB':>9} | {'store MB':>8} | saved")
+    for edit_rate in args.edit_rates:
+        r = run(session(args.users, args.submissions, edit_rate, args.seed))
+        print(
+            f"{edit_rate:>9} | {r['jobs']:>5} {r['workflows']:>9} | {r['inline'] / 1e6:>9.1f} | "
+            f"{r['store'] / 1e6:>8.1f} | {r['saved']}%"
+        )
+
+
+if __name__ == "__main__":
+    main()
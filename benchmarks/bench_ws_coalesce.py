@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Benchmark: admin dashboard REST calls during a submission burst, with and without coalescing.
+
+Replays a burst: --jobs submissions from --users users spread over
+--burst-seconds (an instructor releases a demo), while one worker claims and
+completes a job every --job-seconds. Events go through the real event
+stream and WebSocketManager to a simulated admin dashboard (admin:*), which
+reacts the way admin/app.py does and counts the REST calls it would make:
+  before - every event sent on its own; each job event triggers
+           fetchJobs() + fetchQueueStatus()
+  after  - events merged over WS_COALESCE_MS and queue_stats snapshots at
+           most every QUEUE_STATS_INTERVAL_MS; a message with job events
+           triggers one fetchJobs(), counts come from the snapshots
+
+Redis is fakeredis, or a real Redis when REDIS_URL is set (the target DB is
+flushed).
+
+Usage:
+    python benchmarks/bench_ws_coalesce.py [--jobs 100] [--coalesce-ms 100]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+from unittest.mock import patch
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "queue-manager"))
+os.environ.setdefault("REDIS_PASSWORD", "benchmark")
+
+from config import settings  # noqa: E402
+from models import Job  # noqa: E402
+
+GROUP = "benchmark"
+
+
+def make_redis():
+    """Real Redis if REDIS_URL is set, otherwise fakeredis"""
+    url = os.getenv("REDIS_URL")
+    if url:
+        from redis import Redis
+        from redis.asyncio import Redis as AsyncRedis
+        Redis.from_url(url).flushdb()
+        return AsyncRedis.from_url(url, decode_responses=True, encoding_errors="surrogateescape")
+    import fakeredis
+    return fakeredis.FakeAsyncRedis(decode_responses=True, encoding_errors="surrogateescape")
+
+
+class Dashboard:
+    """Admin dashboard stand-in: counts the REST calls its onmessage handler makes"""
+
+    def __init__(self, coalescing: bool):
+        self.coalescing = coalescing
+        self.calls = []  # (time, endpoint)
+        self.messages = 0
+
+    async def accept(self):
+        pass
+
+    async def close(self, code: int = 1000):
+        pass
+
+    async def send_text(self, text: str):
+        self.messages += 1
+        message = json.loads(text)
+        now = time.monotonic()
+        if not self.coalescing:
+            if message["type"] in ("job_updated", "job_created", "jobs_created"):
+                self.calls += [(now, "/api/jobs"), (now, "/api/queue/status")]
+            return
+        updates = message["events"] if message["type"] == "batch" else [message]
+        if any(update["type"].startswith("job") for update in updates):
+            self.calls.append((now, "/api/jobs"))
+
+
+async def poll_events(client, manager):
+    """Listener stand-in: non-blocking XREADGROUP (works on fakeredis too)"""
+    while True:
+        reply = await client.redis.xreadgroup(GROUP, "listener", {client.EVENT_STREAM: ">"}, count=100)
+        events = client._parse_events(reply)
+        if events:
+            await manager.events.put(events)
+        await asyncio.sleep(0.005)
+
+
+async def run(coalescing: bool, args) -> dict:
+    settings.ws_coalesce_ms = args.coalesce_ms if coalescing else 0
+    settings.queue_stats_interval_ms = args.stats_interval_ms if coalescing else 0
+
+    server = make_redis()
+    with patch("async_redis_client.Redis", return_value=server):
+        from async_redis_client import AsyncRedisClient
+        from websocket_manager import WebSocketManager
+        client = AsyncRedisClient()
+    await client.ensure_event_group(GROUP)
+
+    manager = WebSocketManager(client, group=GROUP)
+    manager.listener_task = asyncio.create_task(poll_events(client, manager))
+    dashboard = Dashboard(coalescing)
+    await manager.connect(dashboard, ["admin:*"])
+
+    rng = random.Random(args.seed)
+    offsets = sorted(rng.uniform(0, args.burst_seconds) for _ in range(args.jobs))
+    start = time.monotonic()
+
+    async def submit():
+        for i, offset in enumerate(offsets):
+            await asyncio.sleep(max(0.0, start + offset - time.monotonic()))
+            await client.create_job(Job(user_id=f"user{i % args.users + 1:03d}", workflow={"1": {"seed": i}}))
+
+    async def work():
+        job = None
+        while time.monotonic() - start < args.duration:
+            if job:
+                await client.move_job_to_completed(job.id, {"images": []})
+            job = await client.claim_next_job("worker-1")
+            await asyncio.sleep(args.job_seconds)
+
+    await asyncio.gather(submit(), work())
+    await asyncio.sleep(0.5)  # let the last window and snapshot go out
+
+    await manager.close()
+    await client.close()
+
+    seconds = Counter(int(at - start) for at, _ in dashboard.calls)
+    return {
+        "messages": dashboard.messages,
+        "calls": len(dashboard.calls),
+        "peak": max(seconds.values()) if seconds else 0,
+        "per_second": len(dashboard.calls) / args.duration,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs", type=int, default=100)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--burst-seconds", type=float, default=1.0, help="submissions spread over this long")
+    parser.add_argument("--job-seconds", type=float, default=0.5, help="worker completes a job this often")
+    parser.add_argument("--duration", type=float, default=3.0, help="seconds measured")
+    parser.add_argument("--coalesce-ms", type=int, default=100, help="WS_COALESCE_MS")
+    parser.add_argument("--stats-interval-ms", type=int, default=1000, help="QUEUE_STATS_INTERVAL_MS")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print(
+        f"{args.jobs} jobs from {args.users} users over {args.burst_seconds:g}s, "
+        f"one worker, {args.duration:g}s measured"
+    )
+    print(f"{'mode':>6} | {'WS messages':>11} | {'REST calls':>10} | {'calls/s':>7} | peak calls in 1s")
+    for coalescing in (False, True):
+        r = asyncio.run(run(coalescing, args))
+        print(
+            f"{'after' if coalescing else 'before':>6} | {r['messages']:>11} | {r['calls']:>10} | "
+            f"{r['per_second']:>7.1f} | {r['peak']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Benchmark: WebSocket fan-out with slow clients - sequential sends vs per-client queues.
+
+Simulates --clients browser connections, of which --slow-fraction take
+--slow-seconds per send (a laptop on saturated workshop Wi-Fi) and the rest
+--fast-seconds. The listener broadcasts --events queue updates at --rate per
+second. Each run is measured twice:
+  sequential - the previous broadcast(), awaiting send_text on every client
+               in turn before the listener can read the next event
+  queued     - WebSocketManager.broadcast(), which queues the message for
+               each client's writer task and returns
+
+Reported: time the listener spends inside broadcast() per event, and the
+delivery latency (broadcast to send complete) seen by the fast clients.
+
+Usage:
+    python benchmarks/bench_ws_fanout.py [--clients 1000] [--slow-fraction 0.05]
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "queue-manager"))
+os.environ.setdefault("REDIS_PASSWORD", "benchmark")
+
+from config import settings  # noqa: E402
+from websocket_manager import WebSocketManager  # noqa: E402
+
+
+class SimulatedClient:
+    """WebSocket stand-in whose sends take a fixed time"""
+
+    def __init__(self, send_seconds: float, slow: bool):
+        self.send_seconds = send_seconds
+        self.slow = slow
+        self.latencies = []
+        self.closed = False
+
+    async def accept(self):
+        pass
+
+    async def close(self, code: int = 1000):
+        self.closed = True
+
+    async def send_text(self, text: str):
+        await asyncio.sleep(self.send_seconds)
+        self.latencies.append(time.perf_counter() - json.loads(text)["sent"])
+
+
+async def sequential_broadcast(clients, message: dict):
+    """The previous broadcast: one send after another"""
+    message_str = json.dumps(message)
+    for client in clients:
+        await client.send_text(message_str)
+
+
+async def run(mode: str, args) -> dict:
+    slow_count = int(args.clients * args.slow_fraction)
+    clients = [
+        SimulatedClient(args.slow_seconds if i < slow_count else args.fast_seconds, i < slow_count)
+        for i in range(args.clients)
+    ]
+    manager = WebSocketManager(redis_client=None)
+    if mode == "queued":
+        manager.listener_task = manager.dispatch_task = asyncio.current_task()  # no Redis listener
+        for client in clients:
+            await manager.connect(client)
+
+    listener_times = []
+    start = time.perf_counter()
+    for i in range(args.events):
+        message = {"type": "job_updated", "data": {"id": f"job-{i % 20}"}, "sent": time.perf_counter()}
+        began = time.perf_counter()
+        if mode == "queued":
+            await manager.broadcast(message)
+        else:
+            await sequential_broadcast(clients, message)
+        listener_times.append(time.perf_counter() - began)
+        await asyncio.sleep(max(0.0, start + (i + 1) / args.rate - time.perf_counter()))
+
+    await asyncio.sleep(args.fast_seconds * 10)  # let the fast writers finish
+    fast = [latency for client in clients if not client.slow for latency in client.latencies]
+    delivered = sum(len(client.latencies) for client in clients if not client.slow)
+    result = {
+        "listener_ms": 1000 * statistics.mean(listener_times),
+        "fast_p50_ms": 1000 * statistics.median(fast) if fast else 0.0,
+        "fast_p99_ms": 1000 * statistics.quantiles(fast, n=100)[98] if len(fast) > 1 else 0.0,
+        "fast_delivered": 100 * delivered / ((args.clients - slow_count) * args.events),
+        "slow_disconnected": sum(client.closed for client in clients),
+    }
+    if mode == "queued":
+        manager.listener_task = manager.dispatch_task = None
+        await manager.close()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--slow-fraction", type=float, default=0.02)
+    parser.add_argument("--fast-seconds", type=float, default=0.001, help="send time for a healthy client")
+    parser.add_argument("--slow-seconds", type=float, default=0.25, help="send time for a slow client")
+    parser.add_argument("--events", type=int, default=10)
+    parser.add_argument("--rate", type=float, default=20.0, help="events per second")
+    parser.add_argument("--queue-size", type=int, default=settings.ws_send_queue_size, help="WS_SEND_QUEUE_SIZE")
+    parser.add_argument("--max-dropped", type=int, default=settings.ws_max_dropped, help="WS_MAX_DROPPED")
+    args = parser.parse_args()
+    settings.ws_send_queue_size = args.queue_size
+    settings.ws_max_dropped = args.max_dropped
+
+    print(
+        f"clients: {args.clients} ({int(args.clients * args.slow_fraction)} slow, "
+        f"{args.slow_seconds * 1000:.0f}ms/send), events: {args.events} at {args.rate:g}/s"
+    )
+    print(
+        f"{'mode':>10} | {'listener ms/event':>17} | {'fast p50 ms':>11} | {'fast p99 ms':>11} | "
+        f"{'fast delivered':>14} | slow disconnected"
+    )
+    for mode in ("sequential", "queued"):
+        r = asyncio.run(run(mode, args))
+        print(
+            f"{mode:>10} | {r['listener_ms']:>17.1f} | {r['fast_p50_ms']:>11.1f} | {r['fast_p99_ms']:>11.1f} | "
+            f"{r['fast_delivered']:>13.1f}% | {r['slow_disconnected']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -147,13 +147,23 @@ function hideJobStatus() {
     currentJobId = null;
 }
 
+// W3C traceparent for a new trace - the Queue Manager records the job's
+// spans under it (GET /api/jobs/{id}/timeline)
+function newTraceparent() {
+    const hex = (bytes) => Array.from(crypto.getRandomValues(new Uint8Array(bytes)),
+        (b) => b.toString(16).padStart(2, "0")).join("");
+    return `00-${hex(16)}-${hex(8)}-01`;
+}
+
 // Submit job to Queue Manager
 async function submitToQueueManager(workflow) {
     try {
+        const traceparent = newTraceparent();
         const response = await fetch(`${QUEUE_MANAGER_URL}/api/jobs`, {
             method: "POST",
             headers: {
                 "Content-Type": "application/json",
+                "traceparent": traceparent,
             },
             body: JSON.stringify({
                 user_id: USER_ID,
@@ -197,6 +207,26 @@ async function checkJobStatus(jobId) {
     }
 }
 
+// Find the user's newest running (or else pending) job
+async function findActiveJob() {
+    for (const status of ["running", "pending"]) {
+        try {
+            const params = new URLSearchParams({ user_id: USER_ID, status, limit: 1 });
+            const response = await fetch(`${QUEUE_MANAGER_URL}/api/jobs?${params}`);
+            if (!response.ok) {
+                continue;
+            }
+            const jobs = await response.json();
+            if (jobs.length > 0) {
+                return jobs[0];
+            }
+        } catch (error) {
+            console.error("Error listing jobs:", error);
+        }
+    }
+    return null;
+}
+
 // Poll job status
 function startStatusPolling(jobId) {
     if (statusCheckInterval) {
@@ -256,6 +286,15 @@ app.registerExtension({
 
         console.log(`Queue Redirect initialized for user: ${USER_ID}`);
         console.log(`Queue Manager URL: ${QUEUE_MANAGER_URL}`);
+
+        // Keep following a job submitted before the page was (re)loaded
+        const job = await findActiveJob();
+        if (job && !currentJobId) {
+            currentJobId = job.id;
+            showJobStatus(job.status, job.status === "running" ? "🔄 Processing your workflow..." : "⏳ Job queued...",
+                job.position_in_queue);
+            startStatusPolling(job.id);
+        }
     },
 
     async beforeRegisterNodeDef(nodeType, nodeData, app) {
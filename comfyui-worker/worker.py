@@ -3,14 +3,18 @@
 ComfyUI Worker - Polls queue and executes workflows on GPU
 """
 import os
+import re
 import sys
 import time
 import json
 import logging
+import secrets
 import signal
-from typing import Optional, Dict, Any
+from collections import deque
+from typing import Optional, Dict, Any, Callable, List
 from datetime import datetime, timezone
 import httpx
+from prometheus_client import Counter, Histogram, start_http_server
 from redis import Redis
 from redis.exceptions import RedisError
 
@@ -51,9 +55,14 @@ REDIS_HOST = os.getenv("REDIS_HOST", "redis")
 REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
 REDIS_PASSWORD = os.getenv("REDIS_PASSWORD", "")
 QUEUE_MANAGER_URL = os.getenv("QUEUE_MANAGER_URL", "http://queue-manager:3000")
+INFERENCE_PROVIDER = os.getenv("INFERENCE_PROVIDER", "local")  # reported to the worker registry
 COMFYUI_URL = os.getenv("COMFYUI_URL", "http://localhost:8188")
 POLL_INTERVAL = int(os.getenv("WORKER_POLL_INTERVAL", "2"))
+LONG_POLL_WAIT = int(os.getenv("WORKER_LONG_POLL_WAIT", "30"))  # seconds next-job may block (0 = sleep-and-poll)
+PREFETCH = int(os.getenv("WORKER_PREFETCH", "1"))  # jobs leased ahead and queued in ComfyUI (0 = off)
+JOB_TIMEOUT = int(os.getenv("WORKER_JOB_TIMEOUT", "3600"))  # longest a workflow may execute (seconds)
 OUTPUTS_PATH = os.getenv("OUTPUTS_PATH", "/outputs")
+METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", "9101"))  # Prometheus /metrics (0 = off)
 
 # Timeout configurations (configurable via environment)
 COMFYUI_TIMEOUT = int(os.getenv("COMFYUI_TIMEOUT", "300"))  # 5 minutes for ComfyUI requests
@@ -61,6 +70,112 @@ HTTP_CLIENT_TIMEOUT = int(os.getenv("HTTP_CLIENT_TIMEOUT", "30"))  # 30 seconds
 
 # Graceful shutdown flag
 shutdown_requested = False
+# Set once the /metrics server is up - it binds METRICS_PORT once per process
+metrics_server_started = False
+
+# Prometheus metrics, served on METRICS_PORT (seconds)
+FAST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+JOB_BUCKETS = (1, 5, 10, 20, 30, 60, 120, 300, 600, 1200, 1800, 3600, 7200)
+
+CLAIM_TIME = Histogram(
+    "comfy_worker_claim_seconds", "next-job and start-job requests, including any long-poll wait",
+    ["outcome"], buckets=FAST_BUCKETS,
+)
+SUBMIT_TIME = Histogram(
+    "comfy_worker_comfyui_submit_seconds", "Time to queue a workflow in ComfyUI", buckets=FAST_BUCKETS
+)
+HISTORY_POLL_TIME = Histogram(
+    "comfy_worker_comfyui_poll_seconds", "ComfyUI history request latency while waiting for a workflow",
+    buckets=FAST_BUCKETS,
+)
+EXECUTION_TIME = Histogram(
+    "comfy_worker_execution_seconds", "Time from waiting on a workflow to its completion or failure",
+    ["status"], buckets=JOB_BUCKETS,
+)
+REPORT_TIME = Histogram(
+    "comfy_worker_report_seconds", "Time to report a job's result to the queue manager",
+    ["status", "outcome"], buckets=FAST_BUCKETS,
+)
+JOBS = Counter("comfy_worker_jobs_total", "Jobs processed by this worker", ["status"])
+
+
+class LeaseLost(Exception):
+    """The running job's lease expired and the queue manager requeued it"""
+
+
+TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+
+class JobTrace:
+    """
+    Spans this worker times for one job, under the trace the queue manager
+    started for it (metadata["traceparent"]); sent back when the job ends
+    and shown by GET /api/jobs/{id}/timeline. Times are epoch seconds on
+    this worker's clock.
+    """
+
+    def __init__(self, job: Dict[str, Any]):
+        match = TRACEPARENT_RE.match(str((job.get("metadata") or {}).get("traceparent", "")))
+        self.trace_id, self.parent_span_id = match.groups() if match else (None, None)
+        self.created_at = self._epoch(job.get("created_at"))
+        self.submitted_at: Optional[float] = None  # workflow queued in ComfyUI
+        self.spans: List[Dict[str, Any]] = []
+
+    @staticmethod
+    def _epoch(value: Optional[str]) -> Optional[float]:
+        try:
+            return datetime.fromisoformat(value).timestamp() if value else None
+        except ValueError:
+            return None
+
+    def add(self, name: str, start: float, end: float, **attributes: Any) -> None:
+        """Record a span (ignored for jobs without a trace)"""
+        if not self.trace_id:
+            return
+        self.spans.append({
+            "name": name,
+            "service": f"worker:{WORKER_ID}",
+            "trace_id": self.trace_id,
+            "span_id": secrets.token_hex(8),
+            "parent_span_id": self.parent_span_id,
+            "start_time": datetime.fromtimestamp(start, timezone.utc).isoformat(),
+            "end_time": datetime.fromtimestamp(max(end, start), timezone.utc).isoformat(),
+            "attributes": attributes,
+        })
+
+    def add_execution(self, history: Dict[str, Any], detected: float, polls: int) -> None:
+        """
+        Spans from ComfyUI's own execution messages: time queued in ComfyUI,
+        execution, and how long polling took to notice the end
+        """
+        # messages: [["execution_start", {"prompt_id": ..., "timestamp": ms}], ...]
+        times = {}
+        for message in history.get("status", {}).get("messages", []):
+            name, data = message if len(message) == 2 else (None, None)
+            if isinstance(data, dict) and isinstance(data.get("timestamp"), (int, float)):
+                times[name] = data["timestamp"] / 1000
+        started = times.get("execution_start")
+        ended, outcome = next(
+            ((times[name], name[len("execution_"):]) for name in
+             ("execution_success", "execution_error", "execution_interrupted") if name in times),
+            (None, None)
+        )
+        if started and self.submitted_at:
+            self.add("comfyui.queued", self.submitted_at, started)
+        if started and ended:
+            self.add("comfyui.execute", started, ended, outcome=outcome)
+        if ended:
+            self.add("worker.poll_lag", ended, detected, polls=polls)
+
+
+def start_metrics_server():
+    """Serve /metrics on METRICS_PORT, unless off (0) or already serving"""
+    global metrics_server_started
+    if not METRICS_PORT or metrics_server_started:
+        return
+    start_http_server(METRICS_PORT)
+    metrics_server_started = True
+    logger.info(f"Metrics: http://0.0.0.0:{METRICS_PORT}/metrics")
 
 
 def signal_handler(signum, frame):
@@ -81,10 +196,11 @@ class ComfyUIClient:
     def queue_prompt(self, workflow: Dict[str, Any]) -> Optional[str]:
         """Submit workflow to ComfyUI"""
         try:
-            response = self.client.post(
-                f"{self.base_url}/prompt",
-                json={"prompt": workflow}
-            )
+            with SUBMIT_TIME.time():
+                response = self.client.post(
+                    f"{self.base_url}/prompt",
+                    json={"prompt": workflow}
+                )
             response.raise_for_status()
             data = response.json()
             prompt_id = data.get("prompt_id")
@@ -98,7 +214,8 @@ class ComfyUIClient:
     def get_history(self, prompt_id: str) -> Optional[Dict[str, Any]]:
         """Get workflow execution history"""
         try:
-            response = self.client.get(f"{self.base_url}/history/{prompt_id}")
+            with HISTORY_POLL_TIME.time():
+                response = self.client.get(f"{self.base_url}/history/{prompt_id}")
             response.raise_for_status()
             data = response.json()
             return data.get(prompt_id)
@@ -107,20 +224,45 @@ class ComfyUIClient:
             logger.error(f"Failed to get history for {prompt_id}: {e}")
             return None
 
-    def wait_for_completion(self, prompt_id: str, timeout: int = 3600) -> Dict[str, Any]:
-        """Wait for workflow to complete and return results"""
+    def cancel_prompt(self, prompt_id: str) -> None:
+        """Remove a prompt from ComfyUI's queue, interrupting it if it already started"""
+        try:
+            self.client.post(f"{self.base_url}/queue", json={"delete": [prompt_id]}).raise_for_status()
+            response = self.client.get(f"{self.base_url}/queue")
+            response.raise_for_status()
+            if any(item[1] == prompt_id for item in response.json().get("queue_running", [])):
+                self.client.post(f"{self.base_url}/interrupt").raise_for_status()
+            logger.info(f"Cancelled prompt {prompt_id}")
+
+        except Exception as e:
+            logger.error(f"Failed to cancel prompt {prompt_id}: {e}")
+
+    def wait_for_completion(
+        self, prompt_id: str, timeout: int = 3600, on_poll: Optional[Callable[[], None]] = None,
+        trace: Optional[JobTrace] = None
+    ) -> Dict[str, Any]:
+        """
+        Wait for workflow to complete and return results; on_poll runs
+        between polls. ComfyUI's execution timings are added to trace.
+        """
         start_time = time.time()
+        polls = 0
 
         while True:
             if time.time() - start_time > timeout:
+                EXECUTION_TIME.labels("timeout").observe(time.time() - start_time)
                 raise TimeoutError(f"Workflow {prompt_id} exceeded timeout of {timeout}s")
 
             history = self.get_history(prompt_id)
+            polls += 1
             if history:
                 status = history.get("status", {})
+                if trace and (status.get("completed", False) or "error" in status):
+                    trace.add_execution(history, time.time(), polls)
 
                 if status.get("completed", False):
                     logger.info(f"Workflow {prompt_id} completed successfully")
+                    EXECUTION_TIME.labels("completed").observe(time.time() - start_time)
                     return {
                         "prompt_id": prompt_id,
                         "status": "completed",
@@ -131,8 +273,11 @@ class ComfyUIClient:
                 if "error" in status:
                     error_msg = status.get("error", "Unknown error")
                     logger.error(f"Workflow {prompt_id} failed: {error_msg}")
+                    EXECUTION_TIME.labels("failed").observe(time.time() - start_time)
                     raise RuntimeError(f"Workflow execution failed: {error_msg}")
 
+            if on_poll:
+                on_poll()
             time.sleep(2)  # Poll every 2 seconds
 
     def close(self):
@@ -152,70 +297,239 @@ class Worker:
         self.jobs_failed = 0
         self.start_time = datetime.now(timezone.utc)
 
+        # Prefetched jobs, in the order they were queued in ComfyUI:
+        # {"job": job, "prompt_id": prompt_id or None}
+        self.prefetched = deque()
+        self.lease_seconds = 60
+        self.next_lease_check = 0.0
+
+        # The job being executed, and its lease period
+        self.current_job_id: Optional[str] = None
+        self.job_lease_seconds = 30
+
         logger.info(f"Worker {self.worker_id} initialized (http_timeout={HTTP_CLIENT_TIMEOUT}s)")
 
     def get_next_job(self) -> Optional[Dict[str, Any]]:
-        """Get next job from queue manager"""
+        """
+        Get next job from queue manager. With LONG_POLL_WAIT set the request
+        blocks server-side until a job is submitted or the wait expires.
+        """
+        start = time.perf_counter()
         try:
             response = self.http_client.get(
                 f"{self.queue_manager_url}/api/workers/next-job",
-                params={"worker_id": self.worker_id}
+                params={"worker_id": self.worker_id, "wait": LONG_POLL_WAIT, "provider": INFERENCE_PROVIDER},
+                timeout=HTTP_CLIENT_TIMEOUT + LONG_POLL_WAIT
             )
             response.raise_for_status()
             data = response.json()
-            return data.get("job")
+            self.job_lease_seconds = data.get("job_lease_seconds", self.job_lease_seconds)
+            job = data.get("job")
+            CLAIM_TIME.labels("job" if job else "empty").observe(time.perf_counter() - start)
+            return job
 
         except Exception as e:
+            CLAIM_TIME.labels("error").observe(time.perf_counter() - start)
             logger.error(f"Failed to get next job: {e}")
+            # Back off - with long polling the loop would otherwise retry at once
+            time.sleep(POLL_INTERVAL)
             return None
 
+    def lease_jobs(self, count: int) -> List[Dict[str, Any]]:
+        """Lease up to count more jobs to prefetch (never waits)"""
+        try:
+            response = self.http_client.post(
+                f"{self.queue_manager_url}/api/workers/lease-jobs",
+                params={"worker_id": self.worker_id, "count": count}
+            )
+            response.raise_for_status()
+            data = response.json()
+            self.lease_seconds = data.get("lease_seconds", self.lease_seconds)
+            return data.get("jobs", [])
+
+        except Exception as e:
+            logger.error(f"Failed to lease jobs: {e}")
+            return []
+
+    def start_leased_job(self, job_id: str) -> bool:
+        """Mark a leased job running; False if the lease was lost"""
+        start = time.perf_counter()
+        try:
+            response = self.http_client.post(
+                f"{self.queue_manager_url}/api/workers/start-job",
+                params={"job_id": job_id, "worker_id": self.worker_id}
+            )
+            response.raise_for_status()
+            self.job_lease_seconds = response.json().get("job_lease_seconds", self.job_lease_seconds)
+            CLAIM_TIME.labels("leased").observe(time.perf_counter() - start)
+            return True
+
+        except Exception as e:
+            CLAIM_TIME.labels("error").observe(time.perf_counter() - start)
+            logger.error(f"Failed to start leased job {job_id}: {e}")
+            return False
+
+    def renew_leases(self) -> None:
+        """
+        Renew the leases on the running and prefetched jobs; drop prefetched
+        jobs that were lost, and raise LeaseLost if the running job was
+        """
+        job_ids = [entry["job"]["id"] for entry in self.prefetched]
+        if self.current_job_id:
+            job_ids.insert(0, self.current_job_id)
+        if not job_ids:
+            return
+        try:
+            response = self.http_client.post(
+                f"{self.queue_manager_url}/api/workers/renew-leases",
+                params={"worker_id": self.worker_id},
+                json={"job_ids": job_ids}
+            )
+            response.raise_for_status()
+            data = response.json()
+            renewed = set(data.get("job_ids", []))
+            self.job_lease_seconds = data.get("job_lease_seconds", self.job_lease_seconds)
+
+        except Exception as e:
+            # Keep the jobs - the next renewal may get through in time
+            logger.error(f"Failed to renew leases: {e}")
+            return
+
+        for entry in list(self.prefetched):
+            if entry["job"]["id"] not in renewed:
+                logger.warning(f"Lease on job {entry['job']['id']} lost, dropping it")
+                self.drop_prefetched(entry)
+        if self.current_job_id and self.current_job_id not in renewed:
+            raise LeaseLost(f"Lease on job {self.current_job_id} lost")
+
+    def drop_prefetched(self, entry: Dict[str, Any]) -> None:
+        """Forget a prefetched job and take its prompt out of ComfyUI"""
+        if entry in self.prefetched:
+            self.prefetched.remove(entry)
+        if entry["prompt_id"]:
+            self.comfyui.cancel_prompt(entry["prompt_id"])
+
+    def heartbeat(self, force: bool = False) -> None:
+        """
+        Runs while a job executes: every third of the shorter lease period,
+        renew the running job's lease and the prefetch leases, then top up
+        the prefetched jobs.
+        """
+        if not force and time.monotonic() < self.next_lease_check:
+            return
+        self.next_lease_check = time.monotonic() + min(self.lease_seconds, self.job_lease_seconds) / 3
+
+        self.renew_leases()
+        self.maintain_prefetch()
+
+    def maintain_prefetch(self) -> None:
+        """
+        Keep PREFETCH jobs leased and queued in ComfyUI behind the running
+        one, so ComfyUI starts the next workflow the moment the current one
+        finishes.
+        """
+        if not PREFETCH:
+            return
+        missing = PREFETCH - len(self.prefetched)
+        if missing > 0:
+            lease_start = time.time()
+            jobs = self.lease_jobs(missing)
+            lease_end = time.time()
+            for job in jobs:
+                trace = JobTrace(job)
+                trace.add("worker.lease", lease_start, lease_end)
+                prompt_id = self.submit_workflow(job, trace)
+                self.prefetched.append({"job": job, "prompt_id": prompt_id, "trace": trace})
+                logger.info(f"Prefetched job {job.get('id')} (prompt {prompt_id})")
+
+    def submit_workflow(self, job: Dict[str, Any], trace: JobTrace) -> Optional[str]:
+        """Queue a job's workflow in ComfyUI, timed as comfyui.submit"""
+        start = time.time()
+        prompt_id = self.comfyui.queue_prompt(job.get("workflow"))
+        trace.submitted_at = time.time()
+        trace.add("comfyui.submit", start, trace.submitted_at, ok=prompt_id is not None)
+        return prompt_id
+
+    def report_spans(self, job_id: str, trace: JobTrace) -> None:
+        """Send the job's spans to the queue manager (best effort - tracing never fails a job)"""
+        if not trace.spans:
+            return
+        try:
+            response = self.http_client.post(
+                f"{self.queue_manager_url}/api/workers/job-spans",
+                params={"job_id": job_id, "worker_id": self.worker_id},
+                json={"spans": trace.spans}
+            )
+            response.raise_for_status()
+
+        except Exception as e:
+            logger.warning(f"Failed to report spans for job {job_id}: {e}")
+
     def complete_job(self, job_id: str, result: Dict[str, Any]) -> bool:
         """Mark job as completed"""
+        start = time.perf_counter()
         try:
             response = self.http_client.post(
                 f"{self.queue_manager_url}/api/workers/complete-job",
-                params={"job_id": job_id},
-                json=result
+                params={"job_id": job_id, "worker_id": self.worker_id},
+                json={"result": result}
             )
             response.raise_for_status()
+            REPORT_TIME.labels("completed", "ok").observe(time.perf_counter() - start)
             logger.info(f"Job {job_id} marked as completed")
             return True
 
         except Exception as e:
+            REPORT_TIME.labels("completed", "error").observe(time.perf_counter() - start)
             logger.error(f"Failed to mark job {job_id} as completed: {e}")
             return False
 
     def fail_job(self, job_id: str, error: str) -> bool:
         """Mark job as failed"""
+        start = time.perf_counter()
         try:
             response = self.http_client.post(
                 f"{self.queue_manager_url}/api/workers/fail-job",
-                params={"job_id": job_id, "error": error}
+                params={"job_id": job_id, "worker_id": self.worker_id},
+                json={"error": error}
             )
             response.raise_for_status()
+            REPORT_TIME.labels("failed", "ok").observe(time.perf_counter() - start)
             logger.error(f"Job {job_id} marked as failed: {error}")
             return True
 
         except Exception as e:
+            REPORT_TIME.labels("failed", "error").observe(time.perf_counter() - start)
             logger.error(f"Failed to mark job {job_id} as failed: {e}")
             return False
 
-    def process_job(self, job: Dict[str, Any]) -> bool:
-        """Process a single job"""
+    def process_job(
+        self, job: Dict[str, Any], prompt_id: Optional[str] = None, trace: Optional[JobTrace] = None
+    ) -> bool:
+        """
+        Process a single job (prompt_id: already queued in ComfyUI by
+        prefetch; trace: the job's spans so far)
+        """
         job_id = job.get("id")
-        workflow = job.get("workflow")
         user_id = job.get("user_id")
+        trace = trace or JobTrace(job)
 
         logger.info(f"Processing job {job_id} for user {user_id}")
+        self.current_job_id = job_id
 
         try:
             # Submit workflow to ComfyUI
-            prompt_id = self.comfyui.queue_prompt(workflow)
+            if not prompt_id:
+                prompt_id = self.submit_workflow(job, trace)
             if not prompt_id:
                 raise RuntimeError("Failed to queue workflow in ComfyUI")
 
-            # Wait for completion
-            result = self.comfyui.wait_for_completion(prompt_id)
+            # Queue the next jobs behind this one, then wait for completion,
+            # renewing the leases as the workflow runs
+            self.heartbeat(force=True)
+            result = self.comfyui.wait_for_completion(
+                prompt_id, timeout=JOB_TIMEOUT, on_poll=self.heartbeat, trace=trace
+            )
 
             # Save outputs to user directory
             user_output_dir = os.path.join(OUTPUTS_PATH, user_id)
@@ -225,45 +539,84 @@ class Worker:
             result["timestamp"] = datetime.now(timezone.utc).isoformat()
 
             # Mark job as completed
-            self.complete_job(job_id, result)
+            report_start = time.time()
+            reported = self.complete_job(job_id, result)
+            trace.add("worker.report", report_start, time.time(), status="completed", ok=reported)
             self.jobs_completed += 1
+            JOBS.labels("completed").inc()
 
             logger.info(f"Job {job_id} completed successfully")
             return True
 
+        except LeaseLost as e:
+            # Requeued for another worker - stop running it here
+            logger.warning(f"{e}, abandoning job {job_id}")
+            if prompt_id:
+                self.comfyui.cancel_prompt(prompt_id)
+            JOBS.labels("lease_lost").inc()
+            return False
+
         except Exception as e:
             error_msg = str(e)
             logger.error(f"Job {job_id} failed: {error_msg}")
 
             # Mark job as failed
-            self.fail_job(job_id, error_msg)
+            report_start = time.time()
+            reported = self.fail_job(job_id, error_msg)
+            trace.add("worker.report", report_start, time.time(), status="failed", ok=reported)
             self.jobs_failed += 1
+            JOBS.labels("failed").inc()
 
             return False
 
+        finally:
+            self.current_job_id = None
+            self.report_spans(job_id, trace)
+
     def run(self):
         """Main worker loop"""
         logger.info(f"Worker {self.worker_id} started")
         logger.info(f"Queue Manager: {self.queue_manager_url}")
         logger.info(f"ComfyUI: {self.comfyui.base_url}")
-        logger.info(f"Poll interval: {POLL_INTERVAL}s")
+        logger.info(f"Poll interval: {POLL_INTERVAL}s, long poll: {LONG_POLL_WAIT}s, prefetch: {PREFETCH}")
 
         # Register signal handlers
         signal.signal(signal.SIGINT, signal_handler)
         signal.signal(signal.SIGTERM, signal_handler)
 
+        start_metrics_server()
+
         while not shutdown_requested:
             try:
+                if self.prefetched:
+                    # Already queued in ComfyUI - and most likely executing
+                    entry = self.prefetched.popleft()
+                    start = time.time()
+                    if self.start_leased_job(entry["job"]["id"]):
+                        entry["trace"].add("worker.start", start, time.time())
+                        self.process_job(entry["job"], entry["prompt_id"], entry["trace"])
+                    else:
+                        self.drop_prefetched(entry)
+                    continue
+
                 # Get next job
+                claim_start = time.time()
                 job = self.get_next_job()
 
                 if job:
-                    # Process job
-                    self.process_job(job)
-                else:
+                    # Process job - the claim span starts no earlier than the
+                    # job's submission, however long the poll waited before it
+                    trace = JobTrace(job)
+                    trace.add(
+                        "worker.claim", max(claim_start, trace.created_at or claim_start), time.time(),
+                        long_poll=LONG_POLL_WAIT
+                    )
+                    self.process_job(job, trace=trace)
+                elif not LONG_POLL_WAIT:
                     # No jobs available, wait before polling again
                     logger.debug(f"No jobs available, sleeping for {POLL_INTERVAL}s")
                     time.sleep(POLL_INTERVAL)
+                # A long poll has already waited - ask again straight away
 
             except KeyboardInterrupt:
                 logger.info("Keyboard interrupt received")
@@ -278,6 +631,9 @@ class Worker:
     def shutdown(self):
         """Graceful shutdown"""
         logger.info("Worker shutting down...")
+        # Leases on prefetched jobs expire and the jobs are requeued
+        for entry in list(self.prefetched):
+            self.drop_prefetched(entry)
         logger.info(f"Total jobs completed: {self.jobs_completed}")
         logger.info(f"Total jobs failed: {self.jobs_failed}")
 
@@ -0,0 +1,111 @@
+"""
+On-disk archive for finished jobs
+
+Completed and failed jobs are moved out of Redis once they are older than
+ARCHIVE_AFTER_SECONDS (see "Archive" in redis_client.py) and kept here, in
+an append-only SQLite table: the columns needed to look a job up, plus the
+whole job encoded with the payload codec. GET /api/jobs/{id} falls back to
+the archive for jobs with a tombstone in Redis.
+
+sqlite3 calls block - the queue manager runs them with asyncio.to_thread.
+"""
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Iterable, Optional
+
+from codec import PayloadCodec
+from models import Job
+
+logger = logging.getLogger(__name__)
+
+COMPRESSION_THRESHOLD = 512  # bytes; zstd-compress encoded jobs above this
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    completed_at TEXT,
+    archived_at REAL NOT NULL,
+    data BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_user ON jobs (user_id, created_at);
+"""
+
+
+class JobArchive:
+    """Finished jobs on disk; safe to share between threads"""
+
+    def __init__(self, path: str, codec: Optional[PayloadCodec] = None):
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        # Archived jobs are cold: compress all but the smallest
+        self.codec = codec or PayloadCodec(compression_threshold=COMPRESSION_THRESHOLD)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript(SCHEMA)
+        logger.info(f"Job archive at {path}")
+
+    def put(self, jobs: Iterable[Job]) -> int:
+        """Store jobs, replacing earlier copies (a retried archive run); returns how many"""
+        now = time.time()
+        rows = [
+            (
+                job.id,
+                job.user_id,
+                job.status.value,
+                job.created_at.isoformat(),
+                job.completed_at.isoformat() if job.completed_at else None,
+                now,
+                self.codec.encode(job.model_dump(mode="json")),
+            )
+            for job in jobs
+        ]
+        with self.lock, self.db:
+            self.db.executemany("INSERT OR REPLACE INTO jobs VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        return len(rows)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """Read an archived job"""
+        with self.lock:
+            row = self.db.execute("SELECT data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return Job.model_validate(self.codec.decode(row[0])) if row else None
+
+    def count(self) -> int:
+        """Number of archived jobs"""
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+
+    def close(self) -> None:
+        """Close the database"""
+        with self.lock:
+            self.db.close()
+
+
+async def archive_finished_jobs(redis_client, archive: JobArchive, older_than: float, batch_size: int = 500) -> int:
+    """
+    Move jobs that finished more than older_than seconds ago from Redis to
+    the archive, a batch at a time. Each batch is committed to disk before
+    it is removed from Redis, so an interrupted run leaves jobs in both
+    places (and the next run archives them again) - never in neither.
+    """
+    finished_before = time.time() - older_than
+    total = 0
+    while True:
+        jobs = await redis_client.get_finished_jobs(finished_before, batch_size)
+        if not jobs:
+            break
+        await asyncio.to_thread(archive.put, jobs)
+        removed = await redis_client.remove_archived_jobs(jobs)
+        total += removed
+        if not removed or len(jobs) < batch_size:
+            break
+
+    if total:
+        logger.info(f"Archived {total} finished jobs")
+    return total
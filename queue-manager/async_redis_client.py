@@ -0,0 +1,75 @@
+"""
+Asyncio Redis client for job queue management
+
+Same API surface as RedisClient, backed by a redis.asyncio connection pool so
+Redis round trips never block the FastAPI event loop. The queue manager
+service uses this client; the sync RedisClient is kept for scripts and tests.
+Both run the operations written once in RedisClientBase.
+"""
+import asyncio
+import logging
+from typing import Callable, Generator
+from redis.asyncio import BlockingConnectionPool, Redis
+from config import settings
+import metrics
+from redis_client import RedisClientBase
+
+logger = logging.getLogger(__name__)
+
+
+# Long polls and blocking stream reads wait by design - dispatch is timed separately
+@metrics.timed_operations(exclude=("claim_next_job", "read_events", "subscribe_to_updates"))
+class AsyncRedisClient(RedisClientBase):
+    """Async Redis client wrapper for job queue operations"""
+
+    def __init__(self):
+        """Initialize async Redis connection pool with timeouts"""
+        self.redis = Redis(**self._connection_kwargs())
+        # Long polls block on connections from their own pool, so waiting
+        # workers can never use up the pool other requests need. Past
+        # worker_max_long_polls, claims wait without holding a connection.
+        self.long_poll_redis = Redis(connection_pool=BlockingConnectionPool(
+            **self._connection_kwargs(settings.worker_max_long_polls)
+        ))
+        self.long_polls = asyncio.Semaphore(settings.worker_max_long_polls)
+        self._register_scripts()
+        logger.info(
+            f"Connected to Redis (asyncio) at {settings.redis_host}:{settings.redis_port} "
+            f"(socket_timeout=10s, max_connections={settings.redis_max_connections}, "
+            f"long polls={settings.worker_max_long_polls})"
+        )
+
+    async def close(self) -> None:
+        """Close the connection pools"""
+        await self.redis.aclose()
+        await self.long_poll_redis.aclose()
+
+    @staticmethod
+    def _client_method(steps: Callable[..., Generator]) -> Callable:
+        """A coroutine method running an operation: every yielded Redis call is awaited"""
+        async def method(self, *args, **kwargs):
+            run = steps(self, *args, **kwargs)
+            try:
+                call = next(run)
+                while True:
+                    try:
+                        reply = await call
+                    except Exception as e:
+                        call = run.throw(e)
+                    else:
+                        call = run.send(reply)
+            except StopIteration as done:
+                return done.value
+        return method
+
+    async def _wait_for_wakeup(self, timeout: float) -> None:
+        """
+        Block up to timeout seconds for a wakeup token on the long-poll pool;
+        with worker_max_long_polls claims already blocking, sleep a poll
+        interval instead, holding no connection
+        """
+        if self.long_polls.locked():
+            await asyncio.sleep(min(timeout, settings.worker_poll_interval))
+            return
+        async with self.long_polls:
+            await self.long_poll_redis.blpop([self.QUEUE_WAKEUP], timeout=timeout)
@@ -0,0 +1,124 @@
+"""
+Binary encoding for large job payloads stored in Redis (workflows, results)
+
+Encoded values start with a 3-byte header - MAGIC, format version, body
+format - followed by a msgpack (or JSON) body, zstd-compressed above a size
+threshold. 0xC1 is never the first byte of JSON text, so values written
+before the codec existed (plain JSON) are told apart and read as before.
+
+msgpack and zstandard are optional: without them new values are written as
+uncompressed JSON bodies. Reading a value needs the libraries it was
+written with.
+"""
+import json
+import logging
+from typing import Any, Union
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional dependency
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+MAGIC = 0xC1  # never used by msgpack, never valid as the first byte of JSON
+VERSION = 1
+
+# Body formats (third header byte)
+FORMAT_JSON = 0x00
+FORMAT_MSGPACK = 0x01
+FLAG_ZSTD = 0x80
+
+
+class PayloadCodec:
+    """Encode JSON-compatible payloads for Redis storage, and read them back"""
+
+    def __init__(
+        self,
+        body_format: str = "msgpack",
+        compression_threshold: int = 16384,
+        compression_level: int = 3
+    ):
+        """
+        body_format: "msgpack" or "json"
+        compression_threshold: zstd-compress bodies at least this many bytes (0 = never)
+        """
+        if body_format not in ("msgpack", "json"):
+            raise ValueError(f"Unknown payload codec: {body_format}")
+        if body_format == "msgpack" and msgpack is None:
+            logger.warning("msgpack is not installed - storing payloads as JSON")
+            body_format = "json"
+        if compression_threshold > 0 and zstandard is None:
+            logger.warning("zstandard is not installed - storing payloads uncompressed")
+            compression_threshold = 0
+
+        self.body_format = body_format
+        self.compression_threshold = compression_threshold
+        self._compressor = (
+            zstandard.ZstdCompressor(level=compression_level) if compression_threshold > 0 else None
+        )
+        self._decompressor = zstandard.ZstdDecompressor() if zstandard is not None else None
+
+    @classmethod
+    def from_settings(cls, settings) -> "PayloadCodec":
+        """Codec configured by payload_codec / payload_compression_threshold"""
+        return cls(settings.payload_codec, settings.payload_compression_threshold)
+
+    @staticmethod
+    def _json_body(value: Any) -> bytes:
+        return json.dumps(value, separators=(",", ":")).encode("ascii")
+
+    def encode(self, value: Any) -> bytes:
+        """Header + body for a JSON-compatible value"""
+        body_format = FORMAT_JSON
+        if self.body_format == "msgpack":
+            try:
+                body = msgpack.packb(value, use_bin_type=True)
+                body_format = FORMAT_MSGPACK
+            except (OverflowError, TypeError, ValueError):
+                # e.g. integers beyond 64 bits - JSON has no such limit
+                body = self._json_body(value)
+        else:
+            body = self._json_body(value)
+
+        if self._compressor is not None and len(body) >= self.compression_threshold:
+            body = self._compressor.compress(body)
+            body_format |= FLAG_ZSTD
+
+        return bytes((MAGIC, VERSION, body_format)) + body
+
+    def decode(self, data: Union[str, bytes]) -> Any:
+        """
+        Value from encode(), or from plain JSON written before the codec.
+        Strings are read with surrogateescape, as returned by the Redis client.
+        """
+        if isinstance(data, str):
+            data = data.encode("utf-8", "surrogateescape")
+        if not data or data[0] != MAGIC:
+            return json.loads(data)
+
+        if len(data) < 3 or data[1] != VERSION:
+            raise ValueError(f"Unsupported payload version: {data[1:2].hex() or 'missing'}")
+        body_format, body = data[2], data[3:]
+
+        if body_format & FLAG_ZSTD:
+            if self._decompressor is None:
+                raise ValueError("Payload is zstd-compressed but zstandard is not installed")
+            try:
+                body = self._decompressor.decompress(body)
+            except zstandard.ZstdError as e:
+                raise ValueError(f"Corrupt compressed payload: {e}") from e
+            body_format &= ~FLAG_ZSTD
+
+        if body_format == FORMAT_MSGPACK:
+            if msgpack is None:
+                raise ValueError("Payload is msgpack-encoded but msgpack is not installed")
+            return msgpack.unpackb(body, raw=False, strict_map_key=False)
+        if body_format == FORMAT_JSON:
+            return json.loads(body)
+        raise ValueError(f"Unknown payload format: {body_format:#x}")
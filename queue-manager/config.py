@@ -1,6 +1,8 @@
 """
 Configuration management for Queue Manager
 """
+import socket
+from pydantic import Field, field_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from typing import Optional
 
@@ -13,12 +15,36 @@ class Settings(BaseSettings):
     redis_port: int = 6379
     redis_password: str
     redis_db: int = 0
+    redis_max_connections: int = 50  # command connection pool (long polls have their own)
 
     # Queue Configuration
     queue_mode: str = "fifo"
     enable_priority: bool = True
     job_timeout: int = 3600  # seconds
     max_queue_depth: int = 100
+    default_job_runtime: int = 60  # seconds, ETA basis until a job has completed
+    runtime_ewma_alpha: float = 0.3  # weight of the latest runtime in a workflow's ETA prediction
+    runtime_samples: int = 50  # recent runtimes kept per workflow, for quantiles
+    max_page_size: int = 500  # most jobs per GET /api/jobs page
+
+    # Job payload storage (workflows and results in Redis)
+    payload_codec: str = "msgpack"  # msgpack or json
+    payload_compression_threshold: int = 16384  # bytes; zstd above this, 0 = never
+
+    # Event bus (queue:events stream)
+    event_stream_maxlen: int = 10000  # entries kept, approximately
+    # Each replica needs its own group - replicas sharing one split the stream
+    # between them. Unset or "", it is queue-manager-{hostname}.
+    event_consumer_group: str = Field(default="", validate_default=True)
+    event_pubsub: bool = False  # also PUBLISH events on queue:updates
+
+    # WebSocket fan-out (per-client outbound queues)
+    ws_send_queue_size: int = 100  # messages buffered per client
+    ws_overflow_policy: str = "drop_oldest"  # drop_oldest, drop_newest or coalesce
+    ws_send_timeout: float = 5.0  # seconds; a longer send disconnects the client
+    ws_max_dropped: int = 500  # dropped since the queue last drained before disconnecting
+    ws_coalesce_ms: int = 100  # merge events per job for this long before sending (0 = off)
+    queue_stats_interval_ms: int = 1000  # queue_stats snapshots at most this often (0 = off)
 
     # Inference Provider
     inference_provider: str = "local"
@@ -33,6 +59,22 @@ class Settings(BaseSettings):
     # Worker Configuration
     worker_heartbeat_timeout: int = 60  # seconds
     worker_poll_interval: int = 1  # seconds
+    worker_max_wait: int = 30  # seconds, longest next-job long poll
+    worker_max_long_polls: int = 20  # long polls blocking in Redis at once (their pool size); the rest poll
+    worker_max_prefetch: int = 4  # jobs a worker may lease beyond the one it runs
+    worker_lease_seconds: int = 60  # prefetch lease, requeued unless renewed
+    job_lease_seconds: int = 30  # running-job lease, requeued unless renewed
+    max_job_attempts: int = 3  # lease expiries before a job fails instead of requeueing
+
+    # Archive (finished jobs moved out of Redis to SQLite)
+    archive_path: str = ""  # SQLite file, not a directory ("" = off; docker-compose sets /archive/jobs.db)
+    archive_after_seconds: int = 86400  # finished this long ago (0 = keep everything in Redis)
+    archive_interval_seconds: int = 300  # how often the archiver runs
+    archive_batch_size: int = 500  # jobs moved per Redis/disk round
+
+    # Tracing (job spans, see tracing.py)
+    trace_export_path: str = ""  # spans appended as JSON lines ("" = off; docker-compose sets /archive/traces.jsonl)
+    trace_retention_seconds: int = 604800  # spans kept in Redis for timelines after the last one
 
     # Storage paths
     outputs_path: str = "/outputs"
@@ -42,6 +84,12 @@ class Settings(BaseSettings):
     app_name: str = "ComfyUI Queue Manager"
     app_version: str = "0.1.0"
 
+    @field_validator("event_consumer_group")
+    @classmethod
+    def default_consumer_group(cls, value: str) -> str:
+        """A group of this replica's own unless one is set"""
+        return value or f"queue-manager-{socket.gethostname()}"
+
     model_config = SettingsConfigDict(
         env_file=".env",
         case_sensitive=False,
@@ -0,0 +1,101 @@
+"""
+Runtime statistics and queue ETAs
+
+Every job gets a workflow signature when it is submitted: a digest of its
+node types and of the inputs that drive runtime - steps, resolution, frame
+count, batch size and model files, but not prompts or seeds. Completed jobs
+fold their runtime into their signature's statistics in Redis (see "Runtime
+statistics" in redis_client.py): an EWMA used for predictions, and a window
+of recent runtimes for quantiles.
+
+A pending job's ETA is the time until it starts when the queue ahead of it
+is replayed in order across the live workers, each job taking its
+signature's predicted runtime (estimate_starts).
+"""
+import hashlib
+import heapq
+from typing import Any, Dict, Iterable, List, Sequence
+
+# Inputs that scale a node's runtime (API-format workflows name them)
+SIZE_INPUTS = frozenset({
+    "steps", "width", "height", "length", "frames", "num_frames", "video_frames", "batch_size", "duration",
+})
+MODEL_SUFFIXES = (".safetensors", ".ckpt", ".pt", ".pth", ".gguf", ".bin")
+# UI-format widget values are positional: integers up to this are taken as
+# sizes, larger ones are seeds
+MAX_SIZE_WIDGET = 16384
+# Muted and bypassed nodes (UI format) do not run
+SKIPPED_NODE_MODES = (2, 4)
+
+
+def _is_model(value: Any) -> bool:
+    return isinstance(value, str) and value.lower().endswith(MODEL_SUFFIXES)
+
+
+def _is_size(value: Any) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool) and 0 < value <= MAX_SIZE_WIDGET
+
+
+def _api_parts(workflow: Dict[str, Any]) -> Iterable[str]:
+    for node in workflow.values():
+        if not isinstance(node, dict) or "class_type" not in node:
+            continue
+        class_type = node["class_type"]
+        yield class_type
+        for name, value in (node.get("inputs") or {}).items():
+            if (name in SIZE_INPUTS and _is_size(value)) or _is_model(value):
+                yield f"{class_type}.{name}={value}"
+
+
+def _ui_parts(nodes: List[Any]) -> Iterable[str]:
+    for node in nodes:
+        if not isinstance(node, dict) or node.get("mode") in SKIPPED_NODE_MODES:
+            continue
+        node_type = str(node.get("type"))
+        yield node_type
+        widgets = node.get("widgets_values")
+        if isinstance(widgets, dict):
+            widgets = widgets.values()
+        for i, value in enumerate(widgets or ()):
+            if _is_size(value) or _is_model(value):
+                yield f"{node_type}#{i}={value}"
+
+
+def workflow_signature(workflow: Dict[str, Any]) -> str:
+    """Runtime statistics key for a workflow, in API or UI (graph) format"""
+    if isinstance(workflow.get("nodes"), list):
+        parts = list(_ui_parts(workflow["nodes"]))
+        # Nodes inside subgraphs; their sizes are exposed as widgets of the subgraph node
+        for subgraph in (workflow.get("definitions") or {}).get("subgraphs") or ():
+            parts.extend(f"~{part}" for part in _ui_parts(subgraph.get("nodes") or ()) if "#" not in part)
+    else:
+        parts = list(_api_parts(workflow))
+    return hashlib.sha256("\n".join(sorted(parts)).encode()).hexdigest()[:16]
+
+
+def quantile(samples: Sequence[float], q: float) -> float:
+    """q-quantile of samples, interpolating between the nearest two"""
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    position = q * (len(ordered) - 1)
+    low = int(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+def estimate_starts(queued: Sequence[float], running: Sequence[float], workers: int) -> List[float]:
+    """
+    Seconds until each queued job starts, in queue order. Each job takes the
+    first worker to free up; running holds the remaining seconds of the jobs
+    already running (every one of them occupies a worker).
+    """
+    free_at = sorted(running)
+    free_at.extend([0.0] * (max(workers, 1) - len(free_at)))
+    heapq.heapify(free_at)
+    starts = []
+    for runtime in queued:
+        start = heapq.heappop(free_at)
+        starts.append(start)
+        heapq.heappush(free_at, start + runtime)
+    return starts
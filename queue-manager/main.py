@@ -2,23 +2,28 @@
 Queue Manager - FastAPI Application
 Main entrypoint for the job queue management service
 """
+import json
 import logging
 import asyncio
 from datetime import datetime, timezone
 from typing import List, Optional
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect, BackgroundTasks
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect, BackgroundTasks, Response, Header
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 
 from models import (
-    Job, JobSubmitRequest, JobCompletionRequest, JobFailureRequest,
-    JobResponse, QueueStatus, HealthCheck, JobStatus, QueueMode, JobPriority
+    Job, JobSubmitRequest, JobBatchSubmitRequest, JobCompletionRequest, JobFailureRequest, JobStatusBulkRequest,
+    LeaseRenewalRequest, JobResponse, QueueStatus, HealthCheck, JobStatus, QueueMode, JobPriority, RuntimeStats,
+    WorkerStatus, TraceSpan, JobSpansRequest, JobTimeline, TimelineSpan
 )
 from config import settings
-from redis_client import RedisClient
+from async_redis_client import AsyncRedisClient
 from websocket_manager import WebSocketManager
+from archive import JobArchive, archive_finished_jobs
+import metrics
+import tracing
 
 # Configure logging
 logging.basicConfig(
@@ -28,23 +33,34 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # Global instances
-redis_client: Optional[RedisClient] = None
+redis_client: Optional[AsyncRedisClient] = None
 ws_manager: Optional[WebSocketManager] = None
+job_archive: Optional[JobArchive] = None  # finished jobs moved out of Redis (ARCHIVE_PATH set)
+span_exporter: Optional[tracing.SpanExporter] = None  # job spans as JSON lines (TRACE_EXPORT_PATH)
 app_start_time: datetime = datetime.now(timezone.utc)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan manager"""
-    global redis_client, ws_manager
+    global redis_client, ws_manager, job_archive, span_exporter
 
     # Startup
     logger.info(f"Starting {settings.app_name} v{settings.app_version}")
-    redis_client = RedisClient()
+    redis_client = AsyncRedisClient()
+    await redis_client.migrate_job_storage()
+    await redis_client.rebuild_round_robin_index()
+    await redis_client.rebuild_job_indexes()
     ws_manager = WebSocketManager(redis_client)
 
     # Start background tasks
     asyncio.create_task(cleanup_task())
+    asyncio.create_task(lease_reaper_task())
+    if settings.archive_path and settings.archive_after_seconds > 0:
+        job_archive = JobArchive(settings.archive_path)
+        asyncio.create_task(archive_task())
+    if settings.trace_export_path:
+        span_exporter = tracing.SpanExporter(settings.trace_export_path)
 
     logger.info("Queue Manager started successfully")
 
@@ -52,6 +68,12 @@ async def lifespan(app: FastAPI):
 
     # Shutdown
     logger.info("Shutting down Queue Manager")
+    await ws_manager.close()
+    await redis_client.close()
+    if job_archive:
+        job_archive.close()
+    if span_exporter:
+        span_exporter.close()
 
 
 # Initialize FastAPI app
@@ -71,9 +93,13 @@ app.add_middleware(
     ],
     allow_credentials=False,  # Disabled for security - no cookies needed
     allow_methods=["GET", "POST", "PUT", "DELETE", "PATCH", "OPTIONS"],
-    allow_headers=["Content-Type", "Authorization"],
+    allow_headers=["Content-Type", "Authorization", "traceparent"],  # traceparent: job tracing
+    expose_headers=["X-Next-Cursor"],  # GET /api/jobs pagination
 )
 
+# Request latency by route - outermost, so CORS handling is included
+app.add_middleware(metrics.RequestMetricsMiddleware)
+
 
 # ============================================================================
 # Health & Status Endpoints
@@ -83,14 +109,16 @@ app.add_middleware(
 async def health_check():
     """Health check endpoint"""
     uptime = (datetime.now(timezone.utc) - app_start_time).total_seconds()
+    redis_connected = await redis_client.ping()
 
     return HealthCheck(
-        status="healthy" if redis_client.ping() else "unhealthy",
+        status="healthy" if redis_connected else "unhealthy",
         version=settings.app_version,
-        redis_connected=redis_client.ping(),
-        workers_active=0,  # TODO: Track active workers
-        queue_depth=redis_client.get_queue_depth(),
-        uptime_seconds=int(uptime)
+        redis_connected=redis_connected,
+        workers_active=await redis_client.count_live_workers(),
+        queue_depth=await redis_client.get_queue_depth(),
+        uptime_seconds=int(uptime),
+        event_lag=await redis_client.get_event_lag(settings.event_consumer_group)
     )
 
 
@@ -99,7 +127,8 @@ async def get_queue_status():
     """Get overall queue status - optimized with batched Redis calls"""
     try:
         # Performance: Get all queue stats in single pipeline call (4→1 Redis commands)
-        stats = redis_client.get_all_queue_stats()
+        stats = await redis_client.get_all_queue_stats()
+        active_workers = await redis_client.count_live_workers()
 
         return QueueStatus(
             mode=QueueMode(settings.queue_mode),
@@ -108,7 +137,7 @@ async def get_queue_status():
             completed_jobs=stats["completed"],
             failed_jobs=stats["failed"],
             total_workers=settings.num_workers,
-            active_workers=0,  # TODO: Implement worker tracking
+            active_workers=active_workers,
             queue_depth=stats["pending"]
         )
     except Exception as e:
@@ -116,40 +145,61 @@ async def get_queue_status():
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus metrics; queue depths and live workers are read when scraped"""
+    stats = await redis_client.get_all_queue_stats()
+    for state, count in stats.items():
+        metrics.QUEUE_JOBS.labels(state).set(count)
+    metrics.WORKERS_LIVE.set(await redis_client.count_live_workers())
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
+
+@app.get("/api/queue/runtimes", response_model=List[RuntimeStats])
+async def get_runtime_stats(limit: int = 100):
+    """Runtime statistics behind the ETAs, per workflow signature, most recently completed first"""
+    try:
+        return await redis_client.get_runtime_stats(min(max(limit, 1), settings.max_page_size))
+    except Exception as e:
+        logger.error(f"Failed to get runtime stats: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e)) from e
+
+
 # ============================================================================
 # Job Management Endpoints
 # ============================================================================
 
 @app.post("/api/jobs", response_model=JobResponse, status_code=201)
-async def submit_job(request: JobSubmitRequest):
-    """Submit a new job to the queue"""
+async def submit_job(request: JobSubmitRequest, traceparent: Optional[str] = Header(default=None)):
+    """Submit a new job to the queue - in the caller's trace if it sends a traceparent header"""
+    received = datetime.now(timezone.utc)
+    trace_id, span_id, parent_span_id = tracing.start_trace(traceparent)
     try:
-        # Check queue depth limit
-        if settings.max_queue_depth > 0:
-            current_depth = redis_client.get_queue_depth()
-            if current_depth >= settings.max_queue_depth:
-                raise HTTPException(
-                    status_code=429,
-                    detail=f"Queue is full (max depth: {settings.max_queue_depth})"
-                )
-
         # Create job
         job = Job(
             user_id=request.user_id,
             workflow=request.workflow,
             priority=request.priority,
-            metadata=request.metadata
+            metadata={**request.metadata, "traceparent": tracing.format_traceparent(trace_id, span_id)}
         )
 
-        # Save to Redis
-        if not redis_client.create_job(job):
+        # Save to Redis - the depth limit is checked in the same atomic step
+        created = await redis_client.create_job(job, max(settings.max_queue_depth, 0))
+        if created is None:
             raise HTTPException(status_code=500, detail="Failed to create job")
+        if not created:
+            raise HTTPException(
+                status_code=429,
+                detail=f"Queue is full (max depth: {settings.max_queue_depth})"
+            )
 
-        # Get queue position
-        pending_jobs = redis_client.get_pending_jobs()
-        position = next((i for i, j in enumerate(pending_jobs) if j.id == job.id), None)
+        # Get queue position and ETA (ZRANK - no job bodies read)
+        estimates = await redis_client.get_queue_estimates([job.id])
+        position, wait_time = estimates.get(job.id, (None, None))
 
         logger.info(f"Job {job.id} submitted by user {job.user_id}")
+        await _record_spans(job.id, [tracing.submit_span(job, parent_span_id, received, datetime.now(timezone.utc))])
 
         return JobResponse(
             id=job.id,
@@ -162,7 +212,9 @@ async def submit_job(request: JobSubmitRequest):
             worker_id=None,
             result=None,
             error=None,
-            position_in_queue=position
+            version=job.version,
+            position_in_queue=position,
+            estimated_wait_time=wait_time
         )
 
     except HTTPException:
@@ -172,19 +224,71 @@ async def submit_job(request: JobSubmitRequest):
         raise HTTPException(status_code=500, detail=str(e)) from e
 
 
+@app.post("/api/jobs/batch", response_model=List[JobResponse], status_code=201)
+async def submit_jobs(request: JobBatchSubmitRequest, traceparent: Optional[str] = Header(default=None)):
+    """
+    Submit several jobs at once (class demo sets, parameter sweeps). All jobs
+    are queued in one atomic step - or none, if they would take the queue
+    past max_queue_depth. Each job gets its own trace, under the caller's
+    traceparent if one is sent.
+    """
+    received = datetime.now(timezone.utc)
+    parent = tracing.parse_traceparent(traceparent)
+    try:
+        jobs = [
+            Job(
+                user_id=item.user_id,
+                workflow=item.workflow,
+                priority=item.priority,
+                metadata={
+                    **item.metadata,
+                    "traceparent": tracing.format_traceparent(
+                        parent[0] if parent else tracing.new_trace_id(), tracing.new_span_id()
+                    ),
+                }
+            )
+            for item in request.jobs
+        ]
+
+        created = await redis_client.create_jobs(jobs, max(settings.max_queue_depth, 0))
+        if created is None:
+            raise HTTPException(status_code=500, detail="Failed to create jobs")
+        if not created:
+            raise HTTPException(
+                status_code=429,
+                detail=f"Queue is full: {len(jobs)} jobs would exceed max depth {settings.max_queue_depth}"
+            )
+
+        logger.info(f"Batch of {len(jobs)} jobs submitted")
+        submitted = datetime.now(timezone.utc)
+        await asyncio.gather(*(
+            _record_spans(job.id, [tracing.submit_span(job, parent[1] if parent else None, received, submitted)])
+            for job in jobs
+        ))
+        return await _job_responses(jobs)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to submit job batch: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e)) from e
+
+
 @app.get("/api/jobs/{job_id}", response_model=JobResponse)
 async def get_job(job_id: str):
-    """Get job status by ID"""
+    """Get job status by ID - finished jobs moved out of Redis are read from the archive"""
     try:
-        job = redis_client.get_job(job_id)
+        job = await redis_client.get_job(job_id, include_workflow=False)
+        if not job and job_archive and await redis_client.is_archived(job_id):
+            job = await asyncio.to_thread(job_archive.get, job_id)
         if not job:
             raise HTTPException(status_code=404, detail="Job not found")
 
-        # Calculate position in queue if pending
-        position = None
+        # Calculate position in queue and ETA if pending
+        position, wait_time = None, None
         if job.status == JobStatus.PENDING:
-            pending_jobs = redis_client.get_pending_jobs()
-            position = next((i for i, j in enumerate(pending_jobs) if j.id == job_id), None)
+            estimates = await redis_client.get_queue_estimates([job_id])
+            position, wait_time = estimates.get(job_id, (None, None))
 
         return JobResponse(
             id=job.id,
@@ -197,7 +301,10 @@ async def get_job(job_id: str):
             worker_id=job.worker_id,
             result=job.result,
             error=job.error,
-            position_in_queue=position
+            version=job.version,
+            attempts=job.attempts,
+            position_in_queue=position,
+            estimated_wait_time=wait_time
         )
 
     except HTTPException:
@@ -207,72 +314,134 @@ async def get_job(job_id: str):
         raise HTTPException(status_code=500, detail=str(e)) from e
 
 
+@app.get("/api/jobs/{job_id}/timeline", response_model=JobTimeline)
+async def get_job_timeline(job_id: str):
+    """
+    Where a job's time went: its trace spans from the queue manager and the
+    worker (queueing, claim, ComfyUI execution, result polling, reporting)
+    in start order, each with its offset from submission and duration.
+    """
+    try:
+        job = await redis_client.get_job(job_id, include_workflow=False)
+        if not job and job_archive and await redis_client.is_archived(job_id):
+            job = await asyncio.to_thread(job_archive.get, job_id)
+        if not job:
+            raise HTTPException(status_code=404, detail="Job not found")
+
+        spans = sorted(await redis_client.get_spans(job_id), key=lambda span: span.start_time)
+        trace = tracing.job_trace(job)
+        return JobTimeline(
+            job_id=job.id,
+            trace_id=trace[0] if trace else None,
+            status=job.status,
+            created_at=job.created_at,
+            spans=[
+                TimelineSpan(
+                    **span.model_dump(),
+                    offset_seconds=(span.start_time - job.created_at).total_seconds(),
+                    duration_seconds=(span.end_time - span.start_time).total_seconds(),
+                )
+                for span in spans
+            ],
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to get timeline for job {job_id}: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e)) from e
+
+
 @app.get("/api/jobs", response_model=List[JobResponse])
 async def list_jobs(
+    response: Response,
     user_id: Optional[str] = None,
     status: Optional[JobStatus] = None,
+    cursor: Optional[str] = None,
     limit: int = 100
 ):
-    """List jobs with optional filters"""
+    """
+    List jobs newest first, with optional filters. Returns one page of at
+    most limit jobs; if more follow, the X-Next-Cursor header holds the
+    cursor to pass for the next page. Archived jobs are not listed.
+    """
     try:
-        if user_id:
-            jobs = redis_client.get_user_jobs(user_id)
-        else:
-            # Get from all queues
-            jobs = redis_client.get_pending_jobs(limit)
-            # TODO: Add running, completed, failed
-
-        # Filter by status if specified
-        if status:
-            jobs = [j for j in jobs if j.status == status]
-
-        # Performance: Cache position lookup to avoid O(n²) - fetch once, not per job
-        pending_jobs = redis_client.get_pending_jobs()
-        job_positions = {j.id: i for i, j in enumerate(pending_jobs)}
-
-        # Convert to response models
-        responses = []
-        for job in jobs[:limit]:
-            # O(1) lookup instead of O(n) search
-            position = job_positions.get(job.id) if job.status == JobStatus.PENDING else None
-
-            responses.append(JobResponse(
-                id=job.id,
-                user_id=job.user_id,
-                status=job.status,
-                priority=job.priority,
-                created_at=job.created_at,
-                started_at=job.started_at,
-                completed_at=job.completed_at,
-                worker_id=job.worker_id,
-                result=job.result,
-                error=job.error,
-                position_in_queue=position
-            ))
-
-        return responses
+        limit = min(max(limit, 1), settings.max_page_size)
+        try:
+            jobs, next_cursor = await redis_client.get_job_page(user_id, status, cursor, limit)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e)) from e
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+
+        return await _job_responses(jobs)
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to list jobs: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e)) from e
 
 
+async def _job_responses(jobs: List[Job]) -> List[JobResponse]:
+    """Build responses for a job list - positions and ETAs in one round trip"""
+    estimates = await redis_client.get_queue_estimates(
+        [j.id for j in jobs if j.status == JobStatus.PENDING]
+    )
+
+    responses = []
+    for job in jobs:
+        position, wait_time = estimates.get(job.id, (None, None))
+
+        responses.append(JobResponse(
+            id=job.id,
+            user_id=job.user_id,
+            status=job.status,
+            priority=job.priority,
+            created_at=job.created_at,
+            started_at=job.started_at,
+            completed_at=job.completed_at,
+            worker_id=job.worker_id,
+            result=job.result,
+            error=job.error,
+            version=job.version,
+            attempts=job.attempts,
+            position_in_queue=position,
+            estimated_wait_time=wait_time
+        ))
+
+    return responses
+
+
+@app.post("/api/jobs/status", response_model=List[JobResponse])
+async def get_jobs_status(request: JobStatusBulkRequest):
+    """Get status of many jobs at once (unknown IDs are omitted)"""
+    try:
+        jobs = await redis_client.get_jobs(list(dict.fromkeys(request.job_ids)), include_workflow=False)
+        return await _job_responses(jobs)
+
+    except Exception as e:
+        logger.error(f"Failed to get bulk job status: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e)) from e
+
+
 @app.delete("/api/jobs/{job_id}", status_code=204)
 async def cancel_job(job_id: str):
     """Cancel a job"""
     try:
-        job = redis_client.get_job(job_id)
+        job = await redis_client.get_job(job_id, include_workflow=False)
         if not job:
             raise HTTPException(status_code=404, detail="Job not found")
 
         if job.status == JobStatus.RUNNING:
-            # Mark as cancelled, worker will handle cleanup
-            job.status = JobStatus.CANCELLED
-            redis_client.update_job(job)
+            # Mark as cancelled and drop its lease - the worker stops it when
+            # its next lease renewal leaves the job out
+            if not await redis_client.cancel_running_job(job):
+                raise HTTPException(status_code=409, detail="Job is no longer running")
             logger.info(f"Job {job_id} marked for cancellation")
         elif job.status == JobStatus.PENDING:
             # Remove from queue
-            redis_client.delete_job(job_id)
+            await redis_client.delete_job(job_id)
             logger.info(f"Job {job_id} cancelled and removed from queue")
         else:
             raise HTTPException(
@@ -293,7 +462,7 @@ async def cancel_job(job_id: str):
 async def update_job_priority(job_id: str, priority: JobPriority):
     """Update job priority (admin/instructor only)"""
     try:
-        job = redis_client.get_job(job_id)
+        job = await redis_client.get_job(job_id, include_workflow=False)
         if not job:
             raise HTTPException(status_code=404, detail="Job not found")
 
@@ -305,11 +474,10 @@ async def update_job_priority(job_id: str, priority: JobPriority):
 
         # Update priority
         job.priority = priority
-        redis_client.update_job(job)
+        await redis_client.update_job(job, ["priority"])
 
         # Re-score in queue
-        score = redis_client._get_priority_score(job)
-        redis_client.redis.zadd(redis_client.QUEUE_PENDING, {job_id: score})
+        await redis_client.update_pending_priority(job)
 
         logger.info(f"Updated job {job_id} priority to {priority}")
 
@@ -326,46 +494,180 @@ async def update_job_priority(job_id: str, priority: JobPriority):
 # Worker Endpoints
 # ============================================================================
 
+@app.get("/api/workers", response_model=List[WorkerStatus])
+async def list_workers(include_offline: bool = False):
+    """
+    Workers that sent a request within WORKER_HEARTBEAT_TIMEOUT; with
+    include_offline, also those silent for longer that are still registered.
+    """
+    try:
+        return await redis_client.get_workers(include_offline)
+    except Exception as e:
+        logger.error(f"Failed to list workers: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e)) from e
+
+
 @app.get("/api/workers/next-job")
-async def get_next_job(worker_id: str):
-    """Get next job for worker to process"""
+async def get_next_job(
+    worker_id: str, wait: float = 0, provider: Optional[str] = None, capacity: Optional[int] = None
+):
+    """
+    Get next job for worker to process. With wait > 0 (seconds, capped at
+    WORKER_MAX_WAIT) the request is held until a job is submitted or the
+    wait expires - workers long-poll instead of sleeping between requests.
+    The job is requeued unless its lease is renewed within JOB_LEASE_SECONDS.
+    provider and capacity (jobs the worker runs at once) are recorded in
+    the worker registry.
+    """
+    received = datetime.now(timezone.utc)
     try:
         # Update worker heartbeat
-        redis_client.update_worker_heartbeat(worker_id)
+        await redis_client.update_worker_heartbeat(
+            worker_id, provider, max(capacity, 1) if capacity is not None else None
+        )
 
-        # Get next job based on queue mode
+        # Atomically dequeue and mark running based on queue mode
         queue_mode = QueueMode(settings.queue_mode)
-        job = redis_client.get_next_job(queue_mode)
+        wait = min(max(wait, 0), settings.worker_max_wait)
+        job = await redis_client.claim_next_job(worker_id, queue_mode, wait=wait)
 
         if not job:
             return {"job": None}
 
-        # Move to running
-        redis_client.move_job_to_running(job.id, worker_id)
-
         logger.info(f"Assigned job {job.id} to worker {worker_id}")
+        await _record_spans(job.id, tracing.started_spans(job, dispatch_start=received))
+
+        return {"job": _worker_job(job), "job_lease_seconds": settings.job_lease_seconds}
+
+    except Exception as e:
+        logger.error(f"Failed to get next job for worker {worker_id}: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e)) from e
+
+
+def _worker_job(job: Job) -> dict:
+    """What a worker needs to run a job"""
+    return {
+        "id": job.id,
+        "workflow": job.workflow,
+        "user_id": job.user_id,
+        "metadata": job.metadata,  # metadata["traceparent"]: the job's trace
+        "created_at": job.created_at.isoformat()
+    }
+
+
+@app.post("/api/workers/lease-jobs")
+async def lease_jobs(worker_id: str, count: int = 1):
+    """
+    Lease up to count more jobs (capped at WORKER_MAX_PREFETCH) for a worker
+    to queue in ComfyUI behind the job it is running. Never waits. Leased
+    jobs stay pending until started, and go back to the queue unless renewed
+    within WORKER_LEASE_SECONDS.
+    """
+    try:
+        await redis_client.update_worker_heartbeat(worker_id)
+
+        count = min(max(count, 0), settings.worker_max_prefetch)
+        jobs = await redis_client.lease_jobs(
+            worker_id, count, QueueMode(settings.queue_mode), settings.worker_lease_seconds
+        )
+        if jobs:
+            logger.info(f"Leased {len(jobs)} jobs to worker {worker_id}")
+
+        return {"jobs": [_worker_job(job) for job in jobs], "lease_seconds": settings.worker_lease_seconds}
+
+    except Exception as e:
+        logger.error(f"Failed to lease jobs for worker {worker_id}: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e)) from e
 
+
+@app.post("/api/workers/start-job")
+async def start_leased_job(job_id: str, worker_id: str):
+    """Mark a leased job running - when the worker's ComfyUI starts executing it"""
+    try:
+        job = await redis_client.start_leased_job(job_id, worker_id)
+        if not job:
+            raise HTTPException(status_code=409, detail="Lease is no longer held by this worker")
+        await _record_spans(job_id, tracing.started_spans(job))
+
+        return {"status": "success", "job_id": job_id, "job_lease_seconds": settings.job_lease_seconds}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to start leased job {job_id}: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e)) from e
+
+
+@app.post("/api/workers/renew-leases")
+async def renew_leases(worker_id: str, request: LeaseRenewalRequest):
+    """Extend a worker's leases (prefetched and running jobs); returns the job IDs it still holds"""
+    try:
+        await redis_client.update_worker_heartbeat(worker_id)
+
+        renewed = await redis_client.renew_leases(worker_id, request.job_ids, settings.worker_lease_seconds)
         return {
-            "job": {
-                "id": job.id,
-                "workflow": job.workflow,
-                "user_id": job.user_id,
-                "metadata": job.metadata
-            }
+            "job_ids": renewed,
+            "lease_seconds": settings.worker_lease_seconds,
+            "job_lease_seconds": settings.job_lease_seconds,
         }
 
     except Exception as e:
-        logger.error(f"Failed to get next job for worker {worker_id}: {e}", exc_info=True)
+        logger.error(f"Failed to renew leases for worker {worker_id}: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e)) from e
+
+
+async def _not_held(job_id: str) -> HTTPException:
+    """
+    Error for a completion or failure the finish script refused: 404 if the
+    job does not exist, else 409 - it is no longer running for this worker
+    (lease expired, or cancelled)
+    """
+    if not await redis_client.get_job(job_id, include_workflow=False):
+        return HTTPException(status_code=404, detail="Job not found")
+    return HTTPException(status_code=409, detail="Job is no longer held by this worker")
+
+
+async def _record_finished(job: Job, received: datetime) -> None:
+    """Trace a completion or failure reported for a job"""
+    await _record_spans(job.id, tracing.finished_spans(job, received, datetime.now(timezone.utc)))
+
+
+@app.post("/api/workers/job-spans", status_code=204)
+async def record_job_spans(job_id: str, request: JobSpansRequest, worker_id: str):
+    """
+    Add the spans a worker timed (claim, ComfyUI execution, reporting) to
+    the job's trace - only from the worker that ran it (409 otherwise)
+    """
+    try:
+        job = await redis_client.get_job(job_id, include_workflow=False)
+        if not job:
+            raise HTTPException(status_code=404, detail="Job not found")
+        if job.worker_id != worker_id:
+            raise HTTPException(status_code=409, detail="Job was not run by this worker")
+        trace = tracing.job_trace(job)
+        if not trace or any(span.trace_id != trace[0] for span in request.spans):
+            raise HTTPException(status_code=400, detail="Spans do not belong to this job's trace")
+
+        await _record_spans(job_id, request.spans)
+        return Response(status_code=204)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to record spans for job {job_id}: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e)) from e
 
 
 @app.post("/api/workers/complete-job")
-async def complete_job(job_id: str, request: JobCompletionRequest):
-    """Mark job as completed - with validated result payload"""
+async def complete_job(job_id: str, request: JobCompletionRequest, worker_id: str):
+    """Mark job as completed - with validated result payload - if worker_id still runs it (409 otherwise)"""
+    received = datetime.now(timezone.utc)
     try:
         # Validation happens automatically via Pydantic model
-        if not redis_client.move_job_to_completed(job_id, request.result):
-            raise HTTPException(status_code=404, detail="Job not found")
+        job = await redis_client.move_job_to_completed(job_id, request.result, worker_id)
+        if not job:
+            raise await _not_held(job_id)
+        await _record_finished(job, received)
 
         logger.info(f"Job {job_id} completed successfully")
         return {"status": "success", "job_id": job_id}
@@ -382,12 +684,15 @@ async def complete_job(job_id: str, request: JobCompletionRequest):
 
 
 @app.post("/api/workers/fail-job")
-async def fail_job(job_id: str, request: JobFailureRequest):
-    """Mark job as failed - with validated error message"""
+async def fail_job(job_id: str, request: JobFailureRequest, worker_id: str):
+    """Mark job as failed - with validated error message - if worker_id still runs it (409 otherwise)"""
+    received = datetime.now(timezone.utc)
     try:
         # Validation happens automatically via Pydantic model
-        if not redis_client.move_job_to_failed(job_id, request.error):
-            raise HTTPException(status_code=404, detail="Job not found")
+        job = await redis_client.move_job_to_failed(job_id, request.error, worker_id)
+        if not job:
+            raise await _not_held(job_id)
+        await _record_finished(job, received)
 
         logger.error(f"Job {job_id} failed: {request.error}")
         return {"status": "success", "job_id": job_id}
@@ -408,20 +713,52 @@ async def fail_job(job_id: str, request: JobFailureRequest):
 # ============================================================================
 
 @app.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket):
-    """WebSocket endpoint for real-time updates"""
-    await ws_manager.connect(websocket)
+async def websocket_endpoint(websocket: WebSocket, topics: Optional[str] = None):
+    """
+    WebSocket endpoint for real-time updates.
+
+    ?topics=user:user001,job:{id} limits the events sent (queue:stats for
+    queue snapshots, admin:* for everything - the default). Subscriptions
+    can be changed with {"subscribe": [...]} / {"unsubscribe": [...]}
+    messages; both are answered with the current topics.
+    """
+    await ws_manager.connect(websocket, topics.split(",") if topics else None)
     try:
         while True:
             # Keep connection alive and handle incoming messages
             data = await websocket.receive_text()
+            try:
+                request = json.loads(data)
+            except ValueError:
+                request = None
+            if isinstance(request, dict) and ("subscribe" in request or "unsubscribe" in request):
+                ws_manager.subscribe(websocket, request.get("subscribe") or [])
+                current = ws_manager.unsubscribe(websocket, request.get("unsubscribe") or [])
+                ws_manager.send(websocket, json.dumps({"type": "subscribed", "topics": current}))
+                continue
             # Echo back for ping/pong
-            await websocket.send_text(f"pong: {data}")
+            ws_manager.send(websocket, f"pong: {data}")
     except WebSocketDisconnect:
         ws_manager.disconnect(websocket)
         logger.info("WebSocket client disconnected")
 
 
+# ============================================================================
+# Tracing
+# ============================================================================
+
+async def _record_spans(job_id: str, spans: List[TraceSpan]) -> None:
+    """Keep a job's spans for its timeline and export them - tracing never fails a request"""
+    if not spans:
+        return
+    try:
+        await redis_client.record_spans(job_id, spans, settings.trace_retention_seconds)
+        if span_exporter:
+            await asyncio.to_thread(span_exporter.export, spans)
+    except Exception as e:
+        logger.warning(f"Failed to record spans for job {job_id}: {e}")
+
+
 # ============================================================================
 # Background Tasks
 # ============================================================================
@@ -431,11 +768,34 @@ async def cleanup_task():
     while True:
         try:
             await asyncio.sleep(60)  # Run every minute
-            redis_client.cleanup_stale_jobs(settings.job_timeout)
+            await redis_client.cleanup_stale_jobs(settings.job_timeout)
         except Exception as e:
             logger.error(f"Cleanup task error: {e}")
 
 
+async def lease_reaper_task():
+    """Background task to requeue prefetched and running jobs whose lease ran out"""
+    while True:
+        try:
+            await asyncio.sleep(max(min(settings.worker_lease_seconds, settings.job_lease_seconds) / 4, 1))
+            await redis_client.requeue_expired_leases()
+            await redis_client.requeue_expired_jobs(settings.max_job_attempts)
+        except Exception as e:
+            logger.error(f"Lease reaper error: {e}")
+
+
+async def archive_task():
+    """Background task to move old finished jobs from Redis to the on-disk archive"""
+    while True:
+        try:
+            await asyncio.sleep(settings.archive_interval_seconds)
+            await archive_finished_jobs(
+                redis_client, job_archive, settings.archive_after_seconds, settings.archive_batch_size
+            )
+        except Exception as e:
+            logger.error(f"Archive task error: {e}")
+
+
 # ============================================================================
 # Error Handlers
 # ============================================================================
@@ -0,0 +1,154 @@
+"""
+Prometheus metrics for the queue manager
+
+GET /metrics exposes them in the Prometheus text format. Updates are
+in-process counter and histogram increments (a lock and a few float
+additions), cheap enough to leave on; queue depths and live workers are
+read from Redis only when scraped.
+
+Job lifecycle:
+    comfy_job_queue_wait_seconds    created -> started (claimed, or a leased job started)
+    comfy_job_run_seconds{status}   started -> completed / failed
+    comfy_job_dispatch_seconds      selecting and claiming a job for a worker
+Service:
+    comfy_http_request_seconds{method,route,status}
+    comfy_redis_operation_seconds{operation}   RedisClient / AsyncRedisClient methods
+    comfy_ws_connections, comfy_ws_broadcast_seconds,
+    comfy_ws_dropped_messages_total, comfy_ws_slow_disconnects_total
+    comfy_queue_jobs{state}, comfy_workers_live      (set at scrape time)
+"""
+import functools
+import inspect
+import time
+from typing import Any, Callable, Dict, Iterable
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+from models import Job
+
+# Seconds: sub-millisecond Redis calls up to slow HTTP requests
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Seconds: queue waits and runtimes, from image jobs to long video jobs
+JOB_BUCKETS = (1, 5, 10, 20, 30, 60, 120, 300, 600, 1200, 1800, 3600, 7200)
+
+JOB_QUEUE_WAIT = Histogram(
+    "comfy_job_queue_wait_seconds", "Time from job submission to start", buckets=JOB_BUCKETS
+)
+JOB_RUN_TIME = Histogram(
+    "comfy_job_run_seconds", "Time from job start to completion or failure", ["status"], buckets=JOB_BUCKETS
+)
+JOB_DISPATCH = Histogram(
+    "comfy_job_dispatch_seconds", "Time to select and claim a job for a worker", buckets=FAST_BUCKETS
+)
+HTTP_REQUEST = Histogram(
+    "comfy_http_request_seconds", "HTTP request latency by route template", ["method", "route", "status"],
+    buckets=FAST_BUCKETS,
+)
+REDIS_OPERATION = Histogram(
+    "comfy_redis_operation_seconds", "Redis client operation latency", ["operation"], buckets=FAST_BUCKETS
+)
+WS_CONNECTIONS = Gauge("comfy_ws_connections", "Open WebSocket connections")
+WS_BROADCAST = Histogram(
+    "comfy_ws_broadcast_seconds", "Time to queue an event (or a coalesced batch) for its subscribers",
+    buckets=FAST_BUCKETS,
+)
+WS_DROPPED = Counter("comfy_ws_dropped_messages_total", "WebSocket messages dropped by a full client queue")
+WS_SLOW_DISCONNECTS = Counter(
+    "comfy_ws_slow_disconnects_total", "WebSocket clients disconnected for falling behind"
+)
+QUEUE_JOBS = Gauge("comfy_queue_jobs", "Jobs per state (completed and failed include archived jobs)", ["state"])
+WORKERS_LIVE = Gauge("comfy_workers_live", "Workers with a request within WORKER_HEARTBEAT_TIMEOUT")
+
+
+def job_started(job: Job) -> None:
+    """Record a job's queue wait"""
+    if job.started_at:
+        JOB_QUEUE_WAIT.observe(max((job.started_at - job.created_at).total_seconds(), 0))
+
+
+def job_finished(job: Job) -> None:
+    """Record a completed or failed job's run time"""
+    if job.started_at and job.completed_at:
+        JOB_RUN_TIME.labels(job.status.value).observe(max((job.completed_at - job.started_at).total_seconds(), 0))
+
+
+def _timed(histogram: Histogram, method: Callable) -> Callable:
+    if inspect.iscoroutinefunction(method):
+        @functools.wraps(method)
+        async def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await method(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start)
+    else:
+        @functools.wraps(method)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start)
+    return timed
+
+
+def timed(histogram: Histogram) -> Callable[[Callable], Callable]:
+    """Decorator: observe each call's duration in histogram (unlike Histogram.time, awaits coroutines)"""
+    return functools.partial(_timed, histogram)
+
+
+def timed_operations(exclude: Iterable[str] = ()) -> Callable[[type], type]:
+    """
+    Class decorator: time every public method the class defines in
+    comfy_redis_operation_seconds, labelled with the method name. exclude
+    names methods that block by design (long polls, stream reads).
+    """
+    def decorate(cls: type) -> type:
+        for name, method in list(vars(cls).items()):
+            if not name.startswith("_") and name not in exclude and inspect.isfunction(method):
+                setattr(cls, name, _timed(REDIS_OPERATION.labels(name), method))
+        return cls
+    return decorate
+
+
+class RequestMetricsMiddleware:
+    """ASGI middleware timing HTTP requests, labelled by route template (not the raw path)"""
+
+    def __init__(self, app):
+        self.app = app
+        self.routes: Dict[Any, str] = {}  # endpoint -> path template
+
+    def _route(self, scope: Dict[str, Any]) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        if endpoint not in self.routes:
+            self.routes[endpoint] = next(
+                (route.path for route in scope["app"].routes if getattr(route, "endpoint", None) is endpoint),
+                "unmatched",
+            )
+        return self.routes[endpoint]
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_REQUEST.labels(scope["method"], self._route(scope), status).observe(time.perf_counter() - start)
+
+
+def render() -> tuple:
+    """The metrics in the Prometheus text format, and its content type"""
+    return generate_latest(), CONTENT_TYPE_LATEST
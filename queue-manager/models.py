@@ -15,6 +15,10 @@ MAX_WORKFLOW_SIZE_BYTES = 10 * 1024 * 1024  # 10MB
 MAX_METADATA_SIZE_BYTES = 1 * 1024 * 1024   # 1MB
 MAX_RESULT_SIZE_BYTES = 50 * 1024 * 1024     # 50MB
 MAX_ERROR_MESSAGE_LENGTH = 10000
+MAX_BULK_STATUS_JOBS = 500
+MAX_BATCH_JOBS = 100
+MAX_LEASE_RENEWAL_JOBS = 50
+MAX_JOB_SPANS = 100
 
 
 class JobStatus(str, Enum):
@@ -46,6 +50,8 @@ class Job(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid4()))
     user_id: str = Field(..., description="User who submitted the job")
     workflow: Dict[str, Any] = Field(..., description="ComfyUI workflow JSON")
+    workflow_hash: Optional[str] = Field(default=None, description="SHA-256 of the canonical workflow JSON")
+    signature: Optional[str] = Field(default=None, description="Runtime statistics key (eta.workflow_signature)")
     status: JobStatus = Field(default=JobStatus.PENDING)
     priority: JobPriority = Field(default=JobPriority.NORMAL)
 
@@ -62,6 +68,12 @@ class Job(BaseModel):
     # Metadata
     metadata: Dict[str, Any] = Field(default_factory=dict)
 
+    # Incremented by every stored change; carried by job events
+    version: int = Field(default=0, ge=0)
+
+    # Runs lost to an expired lease (worker died or stopped renewing)
+    attempts: int = Field(default=0, ge=0)
+
     # Pydantic 2.0: datetime fields automatically serialize to ISO format
     model_config = ConfigDict(
         json_schema_extra={
@@ -135,6 +147,16 @@ class JobSubmitRequest(BaseModel):
         return v
 
 
+class JobBatchSubmitRequest(BaseModel):
+    """Request model for batch job submission"""
+    jobs: List[JobSubmitRequest] = Field(
+        ...,
+        min_length=1,
+        max_length=MAX_BATCH_JOBS,
+        description="Jobs to queue together - all or none"
+    )
+
+
 class JobCompletionRequest(BaseModel):
     """Request model for job completion (worker endpoint)"""
     result: Dict[str, Any] = Field(..., description="Execution result payload")
@@ -175,6 +197,58 @@ class JobFailureRequest(BaseModel):
         return v.strip()
 
 
+class JobStatusBulkRequest(BaseModel):
+    """Request model for bulk job status lookup"""
+    job_ids: List[str] = Field(
+        ...,
+        min_length=1,
+        max_length=MAX_BULK_STATUS_JOBS,
+        description="Job IDs to look up"
+    )
+
+
+class LeaseRenewalRequest(BaseModel):
+    """Request model for renewing a worker's prefetch leases"""
+    job_ids: List[str] = Field(
+        ...,
+        min_length=1,
+        max_length=MAX_LEASE_RENEWAL_JOBS,
+        description="Leased job IDs to renew"
+    )
+
+
+class TraceSpan(BaseModel):
+    """One timed phase of a job (see tracing.py)"""
+    name: str = Field(..., min_length=1, max_length=100)
+    service: str = Field(..., min_length=1, max_length=100)  # queue-manager, worker:{id}
+    trace_id: str = Field(..., pattern=r"^[0-9a-f]{32}$")
+    span_id: str = Field(..., pattern=r"^[0-9a-f]{16}$")
+    parent_span_id: Optional[str] = Field(default=None, pattern=r"^[0-9a-f]{16}$")
+    start_time: datetime
+    end_time: datetime
+    attributes: Dict[str, Any] = Field(default_factory=dict)
+
+
+class JobSpansRequest(BaseModel):
+    """Request model for the spans a worker timed for a job"""
+    spans: List[TraceSpan] = Field(..., min_length=1, max_length=MAX_JOB_SPANS)
+
+
+class TimelineSpan(TraceSpan):
+    """A span placed on its job's timeline"""
+    offset_seconds: float  # from job submission
+    duration_seconds: float
+
+
+class JobTimeline(BaseModel):
+    """A job's spans, in start order"""
+    job_id: str
+    trace_id: Optional[str]
+    status: JobStatus
+    created_at: datetime
+    spans: List[TimelineSpan]
+
+
 class JobResponse(BaseModel):
     """Response model for job queries"""
     id: str
@@ -189,6 +263,8 @@ class JobResponse(BaseModel):
     error: Optional[str]
     position_in_queue: Optional[int] = None
     estimated_wait_time: Optional[int] = None  # seconds
+    version: int = 0  # compare with job event versions
+    attempts: int = 0  # runs lost to an expired lease
 
 
 class QueueStatus(BaseModel):
@@ -203,14 +279,25 @@ class QueueStatus(BaseModel):
     queue_depth: int
 
 
+class RuntimeStats(BaseModel):
+    """Completed-job runtimes for one workflow signature"""
+    signature: str
+    count: int  # completed jobs
+    ewma: float  # seconds; the ETA prediction
+    p50: float  # seconds, over the recent runtimes kept
+    p90: float
+
+
 class WorkerStatus(BaseModel):
     """Worker status information"""
     worker_id: str
     status: str  # idle, busy, offline
     current_job_id: Optional[str] = None
     jobs_completed: int
+    jobs_failed: int = 0
     last_heartbeat: datetime
     provider: str  # Inference provider name (e.g., "local", "verda", "runpod")
+    capacity: int = 1  # jobs the worker runs at once
     gpu_memory_used: Optional[int] = None  # MB
     gpu_memory_total: Optional[int] = None  # MB
 
@@ -230,3 +317,4 @@ class HealthCheck(BaseModel):
     workers_active: int
     queue_depth: int
     uptime_seconds: int
+    event_lag: Optional[int] = None  # events this replica has not broadcast yet
@@ -1,20 +1,41 @@
 """
 Redis client for job queue management
 """
+import hashlib
 import json
 import logging
-from typing import Optional, List, Dict, Any
+import time
+from typing import Optional, List, Dict, Any, Tuple, Iterable, Union, Callable, Generator
 from datetime import datetime, timezone
 from redis import Redis
-from redis.exceptions import RedisError, WatchError
-from models import Job, JobStatus, QueueMode
+from redis.exceptions import RedisError, WatchError, ResponseError
+from models import Job, JobStatus, QueueMode, RuntimeStats, TraceSpan, WorkerStatus
 from config import settings
+import metrics
+from codec import PayloadCodec
+from eta import estimate_starts, quantile, workflow_signature
 
 logger = logging.getLogger(__name__)
 
 
-class RedisClient:
-    """Redis client wrapper for job queue operations"""
+def operation(steps: Callable[..., Generator]) -> Callable[..., Generator]:
+    """
+    Mark a RedisClientBase generator method as a client operation. It yields
+    each Redis call (a reply, or an awaitable for the async client) and is
+    sent back the reply; every subclass turns it into a method of its own
+    kind with _client_method. The annotated return type is the operation's.
+    """
+    steps.is_operation = True
+    return steps
+
+
+class RedisClientBase:
+    """
+    Key layout, server-side scripts, pure helpers and the operations shared
+    by the sync RedisClient (scripts/tests) and AsyncRedisClient (queue
+    manager service). Operations are written once, as generators; a subclass
+    provides the connection, _client_method and _wait_for_wakeup.
+    """
 
     # Redis key patterns
     JOB_KEY = "job:{job_id}"
@@ -24,33 +45,1433 @@ class RedisClient:
     QUEUE_FAILED = "queue:failed"
     USER_JOBS = "user:{user_id}:jobs"
     USER_COMPLETED_COUNT = "user:{user_id}:completed"
-    WORKER_STATUS = "worker:{worker_id}:status"
-    WORKER_HEARTBEAT = "worker:{worker_id}:heartbeat"
-    PUBSUB_CHANNEL = "queue:updates"
+    USER_PENDING = "user:{user_id}:pending"
+    QUEUE_ROUND_ROBIN = "queue:round_robin"
+    WORKER_STATUS = "worker:{worker_id}:status"  # hash: provider, capacity, jobs_completed, jobs_failed
+    PUBSUB_CHANNEL = "queue:updates"  # optional fast path, see event_pubsub
+    EVENT_STREAM = "queue:events"  # stream: every event, capped at event_stream_maxlen
+    STATS_JOB_RUNTIME = "stats:job_runtime"  # hash: total_seconds, count
+    WORKFLOW_KEY = "workflow:{digest}"  # hash: data (codec-encoded), refs
+    QUEUE_WAKEUP = "queue:wakeup"  # list: a token per enqueued job, wakes long-polling workers
+    QUEUE_LEASED = "queue:leased"  # zset: prefetched job -> lease expiry (epoch)
+    QUEUE_RUNNING_LEASES = "queue:running_leases"  # zset: running job -> lease expiry (epoch)
+    QUEUE_ARCHIVED = "queue:archived"  # zset: tombstone per archived job -> archived at (epoch)
+    STATS_ARCHIVED = "stats:archived"  # hash: completed, failed - jobs moved to the archive
+    JOB_INDEX = "jobs:index:{status}"  # zset: job -> created at (epoch); status "all" = every job
+    USER_JOB_INDEX = "user:{user_id}:index:{status}"  # zset: the same, per user
+    RUNTIME_STATS = "stats:runtime:{signature}"  # hash: ewma, count - per workflow signature
+    RUNTIME_SAMPLES = "stats:runtime:{signature}:samples"  # list: recent runtimes, newest first
+    RUNTIME_SIGNATURES = "stats:runtime_signatures"  # zset: signature -> last completion (epoch)
+    WORKERS_ALIVE = "workers:alive"  # zset: worker_id -> last heartbeat (epoch)
+    JOB_SPANS = "spans:{job_id}"  # list: the job's trace spans (JSON), in arrival order
+
+    # Longest single BLPOP on QUEUE_WAKEUP - well under the 10s socket
+    # timeout; longer waits loop
+    WAKEUP_BLOCK_SECONDS = 5
+    # Heartbeat timeouts a silent worker stays registered (listed offline)
+    WORKER_RETENTION = 10
+
+    # Job storage
+    # -----------
+    # job:{id} is a hash with one field per Job attribute: scalars as plain
+    # strings, JOB_PAYLOAD_FIELDS encoded by the payload codec (msgpack,
+    # zstd above a size threshold), metadata as JSON, None as an absent
+    # field. Status transitions HSET only the fields they change, so the
+    # workflow (up to 10MB) and result (up to 50MB) are written once and
+    # never re-serialized. Metadata stays JSON because the claim script
+    # splices it into events.
+    # Jobs stored by earlier versions as one JSON string are converted on
+    # first read, and in bulk by migrate_job_storage() at startup.
+    #
+    # Workflows are not stored in the job hash: each distinct workflow is
+    # stored once under workflow:{sha256 of its canonical JSON} with a
+    # reference count, and the job keeps the digest in workflow_hash. A
+    # workshop resubmitting the same graph hundreds of times then costs one
+    # copy. Jobs written before the store existed keep an inline workflow
+    # field, which is still read.
+
+    # Encodes JOB_PAYLOAD_FIELDS and stored workflows; reads plain JSON
+    # written by earlier versions. Replace with another PayloadCodec (or a
+    # subclass) to change the storage format.
+    codec = PayloadCodec.from_settings(settings)
+    JOB_PAYLOAD_FIELDS = ("workflow", "result")
+    JOB_JSON_FIELDS = ("metadata",)
+    # Everything but the workflow - enough for status reads and responses
+    JOB_SUMMARY_FIELDS = tuple(field for field in Job.model_fields if field != "workflow")
+    # What a status transition may change (update_job default)
+    JOB_STATE_FIELDS = ("status", "priority", "started_at", "completed_at", "worker_id", "error")
+    # Carried by every job event (see Events)
+    JOB_EVENT_FIELDS = ("id", "user_id", "version", "status", "worker_id")
+    # Set at creation, reported in job_created events
+    JOB_CREATED_FIELDS = ("priority", "created_at")
+
+    # Round-robin fairness index
+    # ---------------------------
+    # Every pending job is also kept in a per-user sorted set
+    # (user:{id}:pending, same priority score as queue:pending), and every
+    # user with at least one pending job is kept in queue:round_robin scored
+    # by their completed-job count. Picking the next round-robin job is then
+    # ZRANGE queue:round_robin 0 0 + ZPOPMIN on that user's set - O(log U),
+    # without touching job bodies. The scripts below keep the index in sync.
+
+    # Events
+    # ------
+    # Every event is appended to the queue:events stream (approximate
+    # MAXLEN). Each queue-manager replica reads it through its own consumer
+    # group, so every replica sees every event, and a listener that restarts
+    # resumes after the last entry it acknowledged instead of losing what
+    # was published meanwhile. XINFO GROUPS gives each replica's lag.
+    # PUBLISH on queue:updates is kept as an optional fast path for
+    # external subscribers (event_pubsub).
+    #
+    # Job events are deltas: JOB_EVENT_FIELDS, the names of the changed
+    # fields (with their values, except payloads) and derived values such
+    # as the queue position at creation. Every write bumps the job's
+    # version, so a client can tell a stale event from a newer REST read;
+    # the full job is fetched on demand (GET /api/jobs/{id}).
+
+    # Prefetch leases
+    # --------------
+    # A worker may lease a few jobs beyond the one it is running, so it can
+    # hand the next workflow to ComfyUI before the current one finishes and
+    # the GPU never waits on the complete/claim round trip. A leased job
+    # moves from queue:pending to queue:leased (scored by lease expiry) and
+    # records the worker in worker_id, but stays pending until the worker
+    # starts it. Workers renew the leases they hold; leases that run out
+    # (the worker died) go back to the pending queue in their old place.
+
+    # Running-job leases
+    # ------------------
+    # A claimed (or started) job also holds a lease in queue:running_leases,
+    # expiring job_lease_seconds ahead. The worker renews it (with its
+    # prefetch leases) while ComfyUI executes the workflow, so a long job
+    # runs as long as it needs and a dead worker's job is noticed within
+    # one lease period. An expired lease sends the job back to the pending
+    # queue in its old place and counts an attempt; after max_job_attempts
+    # the job fails instead. A job is only requeued once its lease has run
+    # out, and completions from a worker that no longer holds the job are
+    # rejected, so a requeued job never runs twice at once. job_timeout
+    # only applies to running jobs without a lease.
+
+    # Archive
+    # -------
+    # Finished jobs older than archive_after_seconds are copied to the
+    # on-disk JobArchive (archive.py) and then removed from Redis: the job
+    # hash, its workflow reference and its queue/user index entries. A
+    # tombstone in queue:archived (a few dozen bytes) records that the job
+    # can be read from the archive, and stats:archived keeps the completed
+    # and failed totals. Redis memory then tracks active work.
+
+    # History indexes
+    # ---------------
+    # Every job in Redis is in jobs:index:all and jobs:index:{status}, and
+    # in the same two indexes per user, scored by created_at. Any
+    # user/status filter is then one sorted set, read a page at a time
+    # (JOB_PAGE_SCRIPT) newest first. A page starts after a cursor - the
+    # score and ID of the last job on the previous page - rather than at an
+    # offset, so jobs created or changing status meanwhile never make a
+    # page repeat or skip one. The scripts that change a job's status move
+    # it between indexes with the JOB_INDEX_LUA functions; archived and
+    # deleted jobs leave them.
+
+    # Runtime statistics
+    # ------------------
+    # Jobs carry a workflow signature (eta.workflow_signature) - the same
+    # for resubmissions that only change prompts or seeds. Each completed
+    # job folds its runtime into stats:runtime:{signature}: an EWMA
+    # (runtime_ewma_alpha) that predicts the next run, and the last
+    # runtime_samples runtimes for quantiles. stats:job_runtime keeps the
+    # overall mean for signatures not seen yet.
+    #
+    # A pending job's ETA replays the queue ahead of it - leased jobs, then
+    # pending jobs in order - across the capacity of the live workers (see
+    # Worker registry), starting from the remaining time of the running
+    # jobs (eta.estimate_starts). ETA_SNAPSHOT_SCRIPT reads everything that
+    # needs in one round trip.
+
+    # Worker registry
+    # ---------------
+    # Every worker request is a heartbeat: it scores the worker in
+    # workers:alive with the time, so the live workers are one
+    # ZRANGEBYSCORE - O(live workers), no key scans. worker:{id}:status
+    # holds what the worker reports about itself (provider, capacity: jobs
+    # it runs at once) and its completed/failed counts. A worker silent for
+    # worker_heartbeat_timeout is offline; after WORKER_RETENTION timeouts
+    # it is dropped from the set and its hash expires. The job a worker is
+    # running is read from the running jobs, not stored twice.
+
+    # Traces
+    # ------
+    # spans:{job_id} holds the job's trace spans (tracing.py) as JSON, from
+    # the queue manager and from the worker that ran it, for the job's
+    # timeline. Each append pushes the expiry out to span_retention, so
+    # spans outlive the job's move to the archive for a while and then go.
+
+    JOB_INDEX_LUA = """
+local function user_index(user_id, status)
+    return '{user_prefix}' .. user_id .. '{user_infix}' .. status
+end
+
+local function index_job(job_id, user_id, status, score)
+    redis.call('ZADD', '{prefix}all', score, job_id)
+    redis.call('ZADD', '{prefix}' .. status, score, job_id)
+    redis.call('ZADD', user_index(user_id, 'all'), score, job_id)
+    redis.call('ZADD', user_index(user_id, status), score, job_id)
+end
+
+local function unindex_job(job_id, user_id, status)
+    redis.call('ZREM', '{prefix}all', job_id)
+    redis.call('ZREM', '{prefix}' .. status, job_id)
+    redis.call('ZREM', user_index(user_id, 'all'), job_id)
+    redis.call('ZREM', user_index(user_id, status), job_id)
+end
+
+-- Jobs created before the indexes existed are left to rebuild_job_indexes()
+local function reindex_job(job_id, user_id, old, new)
+    local score = redis.call('ZSCORE', '{prefix}all', job_id)
+    if not score or not old or old == new then
+        return
+    end
+    redis.call('ZREM', '{prefix}' .. old, job_id)
+    redis.call('ZREM', user_index(user_id, old), job_id)
+    redis.call('ZADD', '{prefix}' .. new, score, job_id)
+    redis.call('ZADD', user_index(user_id, new), score, job_id)
+end
+""".format(
+        prefix=JOB_INDEX.format(status=""),
+        user_prefix=USER_JOB_INDEX.split("{user_id}")[0],
+        user_infix=USER_JOB_INDEX.split("{user_id}")[1].format(status=""),
+    )
+
+    # One page of a history index, newest first: jobs ordered by (created
+    # at, ID) descending, after the cursor job.
+    # KEYS[1] = history index
+    # ARGV = page size, cursor score ('' for the first page), cursor job_id
+    # Returns a flat job_id, score list.
+    JOB_PAGE_SCRIPT = """
+local limit = tonumber(ARGV[1])
+if ARGV[2] == '' then
+    return redis.call('ZREVRANGE', KEYS[1], 0, limit - 1, 'WITHSCORES')
+end
+-- Jobs created in the same instant as the cursor job follow it by
+-- descending ID
+local page = {}
+local ties = redis.call('ZREVRANGEBYSCORE', KEYS[1], ARGV[2], ARGV[2], 'WITHSCORES')
+for i = 1, #ties, 2 do
+    if ties[i] < ARGV[3] and #page < limit * 2 then
+        page[#page + 1] = ties[i]
+        page[#page + 1] = ties[i + 1]
+    end
+end
+local rest = limit - #page / 2
+if rest > 0 then
+    local older = redis.call(
+        'ZREVRANGEBYSCORE', KEYS[1], '(' .. ARGV[2], '-inf', 'WITHSCORES', 'LIMIT', 0, rest
+    )
+    for _, item in ipairs(older) do
+        page[#page + 1] = item
+    end
+end
+return page
+"""
 
-    def __init__(self):
-        """Initialize Redis connection with timeouts and connection pooling"""
-        self.redis = Redis(
+    # Fold a completed job's runtime into its signature's statistics and
+    # the overall mean.
+    # KEYS[1] = signature stats, KEYS[2] = signature samples, KEYS[3] =
+    # overall stats, KEYS[4] = signatures
+    # ARGV = runtime (seconds), EWMA alpha, samples kept, signature ('' for
+    # jobs without one: overall mean only), completed at (epoch)
+    RECORD_RUNTIME_SCRIPT = """
+local runtime = tonumber(ARGV[1])
+redis.call('HINCRBYFLOAT', KEYS[3], 'total_seconds', runtime)
+redis.call('HINCRBY', KEYS[3], 'count', 1)
+if ARGV[4] == '' then
+    return
+end
+local ewma = tonumber(redis.call('HGET', KEYS[1], 'ewma'))
+if ewma then
+    ewma = ewma + tonumber(ARGV[2]) * (runtime - ewma)
+else
+    ewma = runtime
+end
+redis.call('HSET', KEYS[1], 'ewma', string.format('%.6f', ewma))
+redis.call('HINCRBY', KEYS[1], 'count', 1)
+redis.call('LPUSH', KEYS[2], ARGV[1])
+redis.call('LTRIM', KEYS[2], 0, tonumber(ARGV[3]) - 1)
+redis.call('ZADD', KEYS[4], ARGV[5], ARGV[4])
+"""
+
+    # Everything a batch of ETAs needs, in one consistent read.
+    # KEYS[1] = pending queue, KEYS[2] = leased queue, KEYS[3] = running
+    # queue, KEYS[4] = live workers, KEYS[5] = overall stats
+    # ARGV = job key prefix, runtime stats key prefix, live since (epoch),
+    #        worker status key prefix and suffix, then the job_ids asked
+    #        about
+    # Returns {ranks (-1: not pending), signatures of the jobs to run before
+    # the last of them (leased, then pending up to and including it),
+    # running jobs as a flat started (epoch), signature list, flat
+    # signature, EWMA list, live worker capacity, {overall total, count}}.
+    # Jobs without a signature (or stored as legacy JSON) report ''.
+    ETA_SNAPSHOT_SCRIPT = """
+local function signature(job_id)
+    local sig = redis.pcall('HGET', ARGV[1] .. job_id, 'signature')
+    if type(sig) ~= 'string' then
+        return ''
+    end
+    return sig
+end
+
+local ranks = {}
+local last = -1
+for i = 6, #ARGV do
+    local rank = redis.call('ZRANK', KEYS[1], ARGV[i])
+    if rank then
+        ranks[#ranks + 1] = rank
+        if rank > last then
+            last = rank
+        end
+    else
+        ranks[#ranks + 1] = -1
+    end
+end
+if last < 0 then
+    return {ranks, {}, {}, {}, 0, {}}
+end
+
+local queued = {}
+for _, job_id in ipairs(redis.call('ZRANGE', KEYS[2], 0, -1)) do
+    queued[#queued + 1] = signature(job_id)
+end
+for _, job_id in ipairs(redis.call('ZRANGE', KEYS[1], 0, last)) do
+    queued[#queued + 1] = signature(job_id)
+end
+local running = {}
+local started = redis.call('ZRANGE', KEYS[3], 0, -1, 'WITHSCORES')
+for i = 1, #started, 2 do
+    running[#running + 1] = started[i + 1]
+    running[#running + 1] = signature(started[i])
+end
+
+local ewma = {}
+local seen = {}
+local function add_ewma(sig)
+    if sig ~= '' and not seen[sig] then
+        seen[sig] = true
+        local value = redis.call('HGET', ARGV[2] .. sig, 'ewma')
+        if value then
+            ewma[#ewma + 1] = sig
+            ewma[#ewma + 1] = value
+        end
+    end
+end
+for _, sig in ipairs(queued) do
+    add_ewma(sig)
+end
+for i = 2, #running, 2 do
+    add_ewma(running[i])
+end
+
+local workers = 0
+for _, worker_id in ipairs(redis.call('ZRANGEBYSCORE', KEYS[4], ARGV[3], '+inf')) do
+    workers = workers + (tonumber(redis.call('HGET', ARGV[4] .. worker_id .. ARGV[5], 'capacity')) or 1)
+end
+return {ranks, queued, running, ewma, workers, redis.call('HMGET', KEYS[5], 'total_seconds', 'count')}
+"""
+
+    # Store new jobs and index them in one atomic step - a single job
+    # (create_job) or a whole batch (create_jobs). Nothing is written if the
+    # batch would take the pending queue past max depth.
+    # KEYS[1] = pending queue, KEYS[2] = round-robin index,
+    # KEYS[3] = wakeup list, then per job: job key, user pending set,
+    # user jobs set, user completed counter, workflow key
+    # ARGV = max depth (0 = unlimited), then per job: job_id, score,
+    #        user_id, created_at (epoch), encoded workflow ('' when an
+    #        earlier job in the batch carries the same one), n, n job hash
+    #        field/value items
+    # Returns each job's rank in the pending queue, or nil if the queue is
+    # full.
+    ENQUEUE_JOBS_SCRIPT = JOB_INDEX_LUA + """
+local jobs = {}
+local a, k = 2, 4
+while a <= #ARGV do
+    local n = tonumber(ARGV[a + 5])
+    jobs[#jobs + 1] = {a, k, n}
+    a = a + 6 + n
+    k = k + 5
+end
+
+local max_depth = tonumber(ARGV[1])
+if max_depth > 0 and redis.call('ZCARD', KEYS[1]) + #jobs > max_depth then
+    return false
+end
+
+for _, job in ipairs(jobs) do
+    local a, k, n = job[1], job[2], job[3]
+    local job_id, score, user_id = ARGV[a], ARGV[a + 1], ARGV[a + 2]
+    if ARGV[a + 4] ~= '' then
+        redis.call('HSETNX', KEYS[k + 4], 'data', ARGV[a + 4])
+    end
+    redis.call('HINCRBY', KEYS[k + 4], 'refs', 1)
+    redis.call('DEL', KEYS[k])
+    redis.call('HSET', KEYS[k], unpack(ARGV, a + 6, a + 5 + n))
+    redis.call('ZADD', KEYS[1], score, job_id)
+    redis.call('ZADD', KEYS[k + 1], score, job_id)
+    redis.call('SADD', KEYS[k + 2], job_id)
+    index_job(job_id, user_id, 'pending', ARGV[a + 3])
+    local completed = tonumber(redis.call('GET', KEYS[k + 3]) or '0')
+    redis.call('ZADD', KEYS[2], 'NX', completed, user_id)
+    -- Wake one long-polling worker per job
+    redis.call('RPUSH', KEYS[3], job_id)
+end
+-- Keep at most 64 tokens for workers that are not waiting yet (a stale
+-- token costs one empty claim attempt)
+redis.call('LTRIM', KEYS[3], -64, -1)
+local ranks = {}
+for i, job in ipairs(jobs) do
+    ranks[i] = redis.call('ZRANK', KEYS[1], ARGV[job[1]])
+end
+return ranks
+"""
+
+    # Write changed job fields - only if the job still exists, so a late
+    # transition can never resurrect a deleted job as a partial hash. A new
+    # status moves the job between history indexes.
+    # KEYS[1] = job key
+    # ARGV = n, n field names to delete (None values), field/value pairs
+    # Returns the job's new version, or 0 if the job does not exist.
+    UPDATE_JOB_SCRIPT = JOB_INDEX_LUA + """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+local n = tonumber(ARGV[1])
+if n > 0 then
+    redis.call('HDEL', KEYS[1], unpack(ARGV, 2, n + 1))
+end
+for i = n + 2, #ARGV, 2 do
+    if ARGV[i] == 'status' then
+        local job = redis.call('HMGET', KEYS[1], 'id', 'user_id', 'status')
+        reindex_job(job[1], job[2], job[3], ARGV[i + 1])
+    end
+end
+if #ARGV > n + 1 then
+    redis.call('HSET', KEYS[1], unpack(ARGV, n + 2))
+end
+return redis.call('HINCRBY', KEYS[1], 'version', 1)
+"""
+
+    # Delete a job hash, drop it from the history indexes and release its
+    # workflow reference; the workflow is dropped with its last reference.
+    # Only the caller that actually deleted the job releases, so concurrent
+    # deletes cannot double-decrement.
+    # KEYS[1] = job key
+    # ARGV = workflow key prefix
+    # Returns 0 if the job did not exist.
+    DELETE_JOB_SCRIPT = JOB_INDEX_LUA + """
+local digest = false
+if redis.call('TYPE', KEYS[1])['ok'] == 'hash' then
+    local job = redis.call('HMGET', KEYS[1], 'workflow_hash', 'id', 'user_id', 'status')
+    digest = job[1]
+    if job[2] and job[3] and job[4] then
+        unindex_job(job[2], job[3], job[4])
+    end
+end
+if redis.call('DEL', KEYS[1]) == 0 then
+    return 0
+end
+if digest then
+    local workflow_key = ARGV[1] .. digest
+    if redis.call('HINCRBY', workflow_key, 'refs', -1) <= 0 then
+        redis.call('DEL', workflow_key)
+    end
+end
+return 1
+"""
+
+    # Drop a job from its user's pending set, and the user from the
+    # round-robin index once they have nothing left pending.
+    # KEYS[1] = user pending set, KEYS[2] = round-robin index
+    # ARGV = job_id, user_id
+    UNINDEX_PENDING_SCRIPT = """
+redis.call('ZREM', KEYS[1], ARGV[1])
+if redis.call('ZCARD', KEYS[1]) == 0 then
+    redis.call('ZREM', KEYS[2], ARGV[2])
+end
+return 1
+"""
+
+    # Atomically claim a job: pick it (queue head, round-robin choice, or a
+    # specific job ID), stamp status/started_at/worker_id, move it from
+    # pending to running, update the round-robin index and publish the
+    # event - one round trip. Only the three stamped fields (and the
+    # version) are written, and the job moves to the running history
+    # index. With a lease expiry the job is leased instead: it moves to the
+    # leased queue and only worker_id is stamped.
+    #
+    # The event is a delta like those built by _job_event. The returned
+    # fields include the workflow, loaded from the workflow store.
+    #
+    # KEYS[1] = pending queue, KEYS[2] = running queue,
+    # KEYS[3] = round-robin index, KEYS[4] = leased queue,
+    # KEYS[5] = running leases
+    # ARGV = job_id ('' to choose by mode), worker_id, started_at (ISO),
+    #        started_at (epoch score), job key prefix, pub/sub channel ('' =
+    #        stream only), event timestamp, user pending key prefix and
+    #        suffix, queue mode, workflow key prefix, lease expiry (epoch;
+    #        '' to run the job), event stream, event stream max length,
+    #        running lease expiry (epoch)
+    # Returns {hash field/value list, 1}, or nil if there was nothing to
+    # claim. {json, 0} means the job is still a legacy JSON string: it is
+    # already in the running (or leased) queue and the caller must stamp
+    # and convert it.
+    CLAIM_JOB_SCRIPT = JOB_INDEX_LUA + """
+local job_id = ARGV[1]
+local user_prefix, user_suffix = ARGV[8], ARGV[9]
+local lease_until = ARGV[12]
+if job_id == '' and ARGV[10] == 'round_robin' then
+    while true do
+        local users = redis.call('ZRANGE', KEYS[3], 0, 0)
+        if #users == 0 then
+            return nil
+        end
+        local popped = redis.call('ZPOPMIN', user_prefix .. users[1] .. user_suffix)
+        if #popped > 0 then
+            job_id = popped[1]
+            redis.call('ZREM', KEYS[1], job_id)
+            break
+        end
+        -- Stale index entry: user has nothing pending
+        redis.call('ZREM', KEYS[3], users[1])
+    end
+elseif job_id == '' then
+    local popped = redis.call('ZPOPMIN', KEYS[1])
+    if #popped == 0 then
+        return nil
+    end
+    job_id = popped[1]
+elseif redis.call('ZREM', KEYS[1], job_id) == 0 then
+    return nil
+end
+
+local job_key = ARGV[5] .. job_id
+local key_type = redis.call('TYPE', job_key)['ok']
+if key_type == 'none' then
+    return nil
+end
+
+if lease_until == '' then
+    redis.call('ZADD', KEYS[2], ARGV[4], job_id)
+    redis.call('ZADD', KEYS[5], ARGV[15], job_id)
+else
+    redis.call('ZADD', KEYS[4], lease_until, job_id)
+end
+
+if key_type ~= 'hash' then
+    return {redis.call('GET', job_key), 0}
+end
+
+local user_id = redis.call('HGET', job_key, 'user_id')
+local user_pending = user_prefix .. user_id .. user_suffix
+redis.call('ZREM', user_pending, job_id)
+if redis.call('ZCARD', user_pending) == 0 then
+    redis.call('ZREM', KEYS[3], user_id)
+end
+
+local data = {id = job_id, user_id = user_id, worker_id = ARGV[2]}
+if lease_until == '' then
+    reindex_job(job_id, user_id, redis.call('HGET', job_key, 'status'), 'running')
+    redis.call('HSET', job_key, 'status', 'running', 'started_at', ARGV[3], 'worker_id', ARGV[2])
+    data['status'] = 'running'
+    data['started_at'] = ARGV[3]
+    data['changed'] = {'status', 'started_at', 'worker_id'}
+else
+    redis.call('HSET', job_key, 'worker_id', ARGV[2])
+    data['status'] = redis.call('HGET', job_key, 'status')
+    data['changed'] = {'worker_id'}
+end
+data['version'] = redis.call('HINCRBY', job_key, 'version', 1)
+local fields = redis.call('HGETALL', job_key)
+
+local event = cjson.encode({type = 'job_updated', data = data, timestamp = ARGV[7]})
+redis.call('XADD', ARGV[13], 'MAXLEN', '~', ARGV[14], '*', 'event', event)
+if ARGV[6] ~= '' then
+    redis.call('PUBLISH', ARGV[6], event)
+end
+
+local digest = redis.call('HGET', job_key, 'workflow_hash')
+if digest then
+    fields[#fields + 1] = 'workflow'
+    fields[#fields + 1] = redis.call('HGET', ARGV[11] .. digest, 'data')
+end
+return {fields, 1}
+"""
+
+    # Start a leased job: move it from the leased to the running queue and
+    # stamp status/started_at - only if this worker still holds the lease.
+    # KEYS[1] = leased queue, KEYS[2] = running queue, KEYS[3] = job key,
+    # KEYS[4] = running leases
+    # ARGV = job_id, worker_id, started_at (ISO), started_at (epoch score),
+    #        running lease expiry (epoch)
+    # Returns the job's new version, or 0 if the lease was lost (expired
+    # and requeued, or cancelled).
+    START_LEASED_JOB_SCRIPT = JOB_INDEX_LUA + """
+if not redis.call('ZSCORE', KEYS[1], ARGV[1])
+    or redis.call('HGET', KEYS[3], 'worker_id') ~= ARGV[2] then
+    return 0
+end
+local job = redis.call('HMGET', KEYS[3], 'user_id', 'status')
+reindex_job(ARGV[1], job[1], job[2], 'running')
+redis.call('ZREM', KEYS[1], ARGV[1])
+redis.call('ZADD', KEYS[2], ARGV[4], ARGV[1])
+redis.call('ZADD', KEYS[4], ARGV[5], ARGV[1])
+redis.call('HSET', KEYS[3], 'status', 'running', 'started_at', ARGV[3])
+return redis.call('HINCRBY', KEYS[3], 'version', 1)
+"""
+
+    # Extend the leases a worker still holds - prefetched (still pending) or
+    # running jobs. A cancelled job is left out, which tells its worker to
+    # stop it.
+    # KEYS[1] = leased queue, KEYS[2] = running leases
+    # ARGV = new prefetch lease expiry (epoch), new running lease expiry,
+    #        job key prefix, worker_id, job IDs
+    # Returns the job IDs whose lease was renewed.
+    RENEW_LEASES_SCRIPT = """
+local renewed = {}
+for i = 5, #ARGV do
+    local job_id = ARGV[i]
+    local job = redis.call('HMGET', ARGV[3] .. job_id, 'worker_id', 'status')
+    if job[1] == ARGV[4] then
+        if job[2] == 'pending' and redis.call('ZSCORE', KEYS[1], job_id) then
+            redis.call('ZADD', KEYS[1], 'XX', ARGV[1], job_id)
+            renewed[#renewed + 1] = job_id
+        elseif job[2] == 'running' and redis.call('ZSCORE', KEYS[2], job_id) then
+            redis.call('ZADD', KEYS[2], 'XX', ARGV[2], job_id)
+            renewed[#renewed + 1] = job_id
+        end
+    end
+end
+return renewed
+"""
+
+    # Put a job whose lease ran out back in the pending queue with its old
+    # score, re-index it for round-robin, clear worker_id and wake a waiting
+    # worker. A no-op if the lease was renewed or started meanwhile.
+    # KEYS[1] = leased queue, KEYS[2] = pending queue,
+    # KEYS[3] = round-robin index, KEYS[4] = wakeup list, KEYS[5] = job key,
+    # KEYS[6] = user pending set, KEYS[7] = user completed counter
+    # ARGV = job_id, pending score, user_id, now (epoch)
+    # Returns the job's new version, or 0 if it was not requeued.
+    REQUEUE_LEASE_SCRIPT = """
+local expiry = redis.call('ZSCORE', KEYS[1], ARGV[1])
+if not expiry or tonumber(expiry) > tonumber(ARGV[4]) then
+    return 0
+end
+redis.call('ZREM', KEYS[1], ARGV[1])
+redis.call('HDEL', KEYS[5], 'worker_id')
+redis.call('ZADD', KEYS[2], ARGV[2], ARGV[1])
+redis.call('ZADD', KEYS[6], ARGV[2], ARGV[1])
+local completed = tonumber(redis.call('GET', KEYS[7]) or '0')
+redis.call('ZADD', KEYS[3], 'NX', completed, ARGV[3])
+redis.call('RPUSH', KEYS[4], ARGV[1])
+redis.call('LTRIM', KEYS[4], -64, -1)
+return redis.call('HINCRBY', KEYS[5], 'version', 1)
+"""
+
+    # Requeue a running job whose lease ran out: back to the pending queue
+    # with its old score (as REQUEUE_LEASE_SCRIPT does), status pending,
+    # started_at/worker_id cleared and one more attempt counted. Once the
+    # job has used up max attempts it is left in the running queue for the
+    # caller to fail. A no-op if the lease was renewed meanwhile; a job that
+    # is no longer running (cancelled) only loses its lease.
+    # KEYS[1] = running leases, KEYS[2] = running queue, KEYS[3] = pending
+    # queue, KEYS[4] = round-robin index, KEYS[5] = wakeup list,
+    # KEYS[6] = job key, KEYS[7] = user pending set,
+    # KEYS[8] = user completed counter
+    # ARGV = job_id, pending score, user_id, now (epoch), max attempts
+    # Returns {new version, attempts} - version 0 when the attempts are used
+    # up - or nil if the lease has not expired or the job is not running.
+    REQUEUE_RUNNING_SCRIPT = JOB_INDEX_LUA + """
+local expiry = redis.call('ZSCORE', KEYS[1], ARGV[1])
+if not expiry or tonumber(expiry) > tonumber(ARGV[4]) then
+    return nil
+end
+redis.call('ZREM', KEYS[1], ARGV[1])
+if redis.call('HGET', KEYS[6], 'status') ~= 'running' then
+    redis.call('ZREM', KEYS[2], ARGV[1])
+    return nil
+end
+local attempts = redis.call('HINCRBY', KEYS[6], 'attempts', 1)
+if attempts >= tonumber(ARGV[5]) then
+    return {0, attempts}
+end
+redis.call('ZREM', KEYS[2], ARGV[1])
+reindex_job(ARGV[1], ARGV[3], redis.call('HGET', KEYS[6], 'status'), 'pending')
+redis.call('HSET', KEYS[6], 'status', 'pending')
+redis.call('HDEL', KEYS[6], 'worker_id', 'started_at')
+redis.call('ZADD', KEYS[3], ARGV[2], ARGV[1])
+redis.call('ZADD', KEYS[7], ARGV[2], ARGV[1])
+local completed = tonumber(redis.call('GET', KEYS[8]) or '0')
+redis.call('ZADD', KEYS[4], 'NX', completed, ARGV[3])
+redis.call('RPUSH', KEYS[5], ARGV[1])
+redis.call('LTRIM', KEYS[5], -64, -1)
+return {redis.call('HINCRBY', KEYS[6], 'version', 1), attempts}
+"""
+
+    # Finish a running job: stamp status, completed_at and the result or
+    # error, move it from the running queue (and its lease) to the
+    # completed or failed queue and count it for its worker - only while it
+    # is running and, given a worker_id, run by that worker, so a late
+    # report for a cancelled or requeued job changes nothing. A completion
+    # also bumps the user's completed count and, if they are in the
+    # round-robin index, their fairness score (absolute value, so any drift
+    # from concurrent completions self-corrects).
+    # KEYS[1] = running queue, KEYS[2] = running leases, KEYS[3] = completed
+    # or failed queue, KEYS[4] = job key, KEYS[5] = round-robin index
+    # ARGV = job_id, new status, worker_id ('' = any), finished score
+    #        (epoch), worker status key prefix and suffix, user completed
+    #        counter prefix and suffix, then the fields as for
+    #        UPDATE_JOB_SCRIPT: n, n field names to delete, field/value pairs
+    # Returns the finished job's field/value list, 0 if the job does not
+    # exist, or 1 if it is not running (for that worker).
+    FINISH_JOB_SCRIPT = JOB_INDEX_LUA + """
+local job = redis.call('HMGET', KEYS[4], 'id', 'user_id', 'status', 'worker_id')
+if not job[1] then
+    return 0
+end
+if job[3] ~= 'running' or (ARGV[3] ~= '' and job[4] ~= ARGV[3]) then
+    return 1
+end
+reindex_job(job[1], job[2], job[3], ARGV[2])
+redis.call('ZREM', KEYS[1], ARGV[1])
+redis.call('ZREM', KEYS[2], ARGV[1])
+redis.call('ZADD', KEYS[3], ARGV[4], ARGV[1])
+local n = tonumber(ARGV[9])
+if n > 0 then
+    redis.call('HDEL', KEYS[4], unpack(ARGV, 10, n + 9))
+end
+redis.call('HSET', KEYS[4], unpack(ARGV, n + 10))
+if job[4] then
+    local counter = ARGV[2] == 'completed' and 'jobs_completed' or 'jobs_failed'
+    redis.call('HINCRBY', ARGV[5] .. job[4] .. ARGV[6], counter, 1)
+end
+if ARGV[2] == 'completed' then
+    local completed = redis.call('INCR', ARGV[7] .. job[2] .. ARGV[8])
+    redis.call('ZADD', KEYS[5], 'XX', completed, job[2])
+end
+redis.call('HINCRBY', KEYS[4], 'version', 1)
+return redis.call('HGETALL', KEYS[4])
+"""
+
+    # Cancel a running job: status cancelled, out of the running queue and
+    # its lease, so lease expiry cannot requeue it and its worker's next
+    # renewal leaves it out (the worker then stops it).
+    # KEYS[1] = job key, KEYS[2] = running queue, KEYS[3] = running leases
+    # ARGV = job_id
+    # Returns the job's new version, or 0 if it is not running.
+    CANCEL_JOB_SCRIPT = JOB_INDEX_LUA + """
+local job = redis.call('HMGET', KEYS[1], 'user_id', 'status')
+if job[2] ~= 'running' then
+    return 0
+end
+reindex_job(ARGV[1], job[1], job[2], 'cancelled')
+redis.call('ZREM', KEYS[2], ARGV[1])
+redis.call('ZREM', KEYS[3], ARGV[1])
+redis.call('HSET', KEYS[1], 'status', 'cancelled')
+return redis.call('HINCRBY', KEYS[1], 'version', 1)
+"""
+
+    # Replace an archived job with a tombstone: drop it from the finished
+    # queues, the user's jobs and the history indexes, count it in the
+    # archived totals, delete
+    # the hash and release its workflow (as DELETE_JOB_SCRIPT does). A no-op
+    # if the job left the finished queues meanwhile (deleted).
+    # KEYS[1] = completed queue, KEYS[2] = failed queue, KEYS[3] = archived
+    # tombstones, KEYS[4] = archived totals, KEYS[5] = job key,
+    # KEYS[6] = user jobs set
+    # ARGV = job_id, archived at (epoch), workflow key prefix
+    # Returns 1 if the job was archived, else 0.
+    ARCHIVE_JOB_SCRIPT = JOB_INDEX_LUA + """
+local status
+if redis.call('ZREM', KEYS[1], ARGV[1]) == 1 then
+    status = 'completed'
+elseif redis.call('ZREM', KEYS[2], ARGV[1]) == 1 then
+    status = 'failed'
+else
+    return 0
+end
+redis.call('SREM', KEYS[6], ARGV[1])
+redis.call('ZADD', KEYS[3], ARGV[2], ARGV[1])
+redis.call('HINCRBY', KEYS[4], status, 1)
+local digest = false
+if redis.call('TYPE', KEYS[5])['ok'] == 'hash' then
+    local job = redis.call('HMGET', KEYS[5], 'workflow_hash', 'user_id', 'status')
+    digest = job[1]
+    if job[2] and job[3] then
+        unindex_job(ARGV[1], job[2], job[3])
+    end
+end
+if redis.call('DEL', KEYS[5]) == 1 and digest then
+    local workflow_key = ARGV[3] .. digest
+    if redis.call('HINCRBY', workflow_key, 'refs', -1) <= 0 then
+        redis.call('DEL', workflow_key)
+    end
+end
+return 1
+"""
+
+    # Client attribute -> server-side script, registered by _register_scripts
+    SCRIPTS = {
+        "_enqueue_jobs_script": ENQUEUE_JOBS_SCRIPT,
+        "_unindex_pending_script": UNINDEX_PENDING_SCRIPT,
+        "_update_job_script": UPDATE_JOB_SCRIPT,
+        "_claim_job_script": CLAIM_JOB_SCRIPT,
+        "_delete_job_script": DELETE_JOB_SCRIPT,
+        "_start_leased_job_script": START_LEASED_JOB_SCRIPT,
+        "_renew_leases_script": RENEW_LEASES_SCRIPT,
+        "_requeue_lease_script": REQUEUE_LEASE_SCRIPT,
+        "_requeue_running_script": REQUEUE_RUNNING_SCRIPT,
+        "_finish_job_script": FINISH_JOB_SCRIPT,
+        "_cancel_job_script": CANCEL_JOB_SCRIPT,
+        "_archive_job_script": ARCHIVE_JOB_SCRIPT,
+        "_job_page_script": JOB_PAGE_SCRIPT,
+        "_record_runtime_script": RECORD_RUNTIME_SCRIPT,
+        "_eta_snapshot_script": ETA_SNAPSHOT_SCRIPT,
+    }
+
+    # get_all_queue_stats when Redis is unreachable
+    EMPTY_QUEUE_STATS = {"pending": 0, "leased": 0, "running": 0, "completed": 0, "failed": 0}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        for name, steps in vars(RedisClientBase).items():
+            if getattr(steps, "is_operation", False) and name not in vars(cls):
+                method = cls._client_method(steps)
+                method.__name__, method.__qualname__ = name, f"{cls.__qualname__}.{name}"
+                method.__doc__ = steps.__doc__
+                setattr(cls, name, method)
+
+    def _register_scripts(self) -> None:
+        """Register every server-side script on self.redis (SCRIPTS)"""
+        for attribute, script in self.SCRIPTS.items():
+            setattr(self, attribute, self.redis.register_script(script))
+
+    @staticmethod
+    def _connection_kwargs(max_connections: Optional[int] = None) -> Dict[str, Any]:
+        """Connection settings with timeouts and connection pooling"""
+        return dict(
             host=settings.redis_host,
             port=settings.redis_port,
             password=settings.redis_password,
             db=settings.redis_db,
             decode_responses=True,
+            # Codec-encoded payloads are binary: they round-trip through str
+            encoding_errors="surrogateescape",
             socket_connect_timeout=5,  # 5s to establish connection
             socket_timeout=10,  # 10s max for any Redis command (redis-py 7.x compatible)
             socket_keepalive=True,
             health_check_interval=30,
-            max_connections=50  # Connection pool limit
+            max_connections=max_connections or settings.redis_max_connections  # Connection pool limit
         )
-        logger.info(
-            f"Connected to Redis at {settings.redis_host}:{settings.redis_port} "
-            f"(socket_timeout=10s, max_connections=50)"
+
+    def _get_priority_score(self, job: Job) -> float:
+        """Calculate priority score for job (lower = higher priority)"""
+        # Priority level (0-3) * 1000000 + timestamp
+        # This ensures priority takes precedence, then FIFO within priority
+        priority_weight = job.priority.value * 1000000
+        timestamp = job.created_at.timestamp()
+        return priority_weight + timestamp
+
+    def _enqueue_params(self, jobs: List[Job], max_depth: int = 0) -> Tuple[List[str], List[Any]]:
+        """Keys and arguments for ENQUEUE_JOBS_SCRIPT; sets each job's workflow_hash and signature"""
+        keys = [self.QUEUE_PENDING, self.QUEUE_ROUND_ROBIN, self.QUEUE_WAKEUP]
+        args = [max_depth]
+        carried = set()
+        for job in jobs:
+            job.workflow_hash = self._workflow_digest(job.workflow)
+            job.signature = workflow_signature(job.workflow)
+            if job.workflow_hash in carried:
+                workflow_data = ""
+            else:
+                workflow_data = self.codec.encode(job.workflow)
+                carried.add(job.workflow_hash)
+
+            keys.extend((
+                self.JOB_KEY.format(job_id=job.id),
+                self.USER_PENDING.format(user_id=job.user_id),
+                self.USER_JOBS.format(user_id=job.user_id),
+                self.USER_COMPLETED_COUNT.format(user_id=job.user_id),
+                self.WORKFLOW_KEY.format(digest=job.workflow_hash),
+            ))
+            mapping, _ = self._job_to_hash(job)
+            args.extend((
+                job.id, self._get_priority_score(job), job.user_id, job.created_at.timestamp(), workflow_data,
+                len(mapping) * 2,
+            ))
+            for field, value in mapping.items():
+                args.extend((field, value))
+        return keys, args
+
+    def _update_args(self, job: Job, fields: Iterable[str]) -> List[Any]:
+        """Arguments for UPDATE_JOB_SCRIPT"""
+        mapping, removed = self._job_to_hash(job, fields)
+        args = [len(removed), *removed]
+        for field, value in mapping.items():
+            args.extend((field, value))
+        return args
+
+    def _unindex_keys(self, user_id: str) -> List[str]:
+        """Keys touched by UNINDEX_PENDING_SCRIPT for a user"""
+        return [self.USER_PENDING.format(user_id=user_id), self.QUEUE_ROUND_ROBIN]
+
+    def _claim_keys(self) -> List[str]:
+        """Keys touched by CLAIM_JOB_SCRIPT"""
+        return [
+            self.QUEUE_PENDING, self.QUEUE_RUNNING, self.QUEUE_ROUND_ROBIN, self.QUEUE_LEASED,
+            self.QUEUE_RUNNING_LEASES,
+        ]
+
+    def _claim_args(
+        self, job_id: str, worker_id: str, queue_mode: QueueMode, now: datetime,
+        lease_until: Optional[float] = None
+    ) -> List[Any]:
+        """Arguments for CLAIM_JOB_SCRIPT (lease_until: lease the job instead of running it)"""
+        user_prefix, user_suffix = self.USER_PENDING.split("{user_id}")
+        return [
+            job_id,
+            worker_id,
+            now.isoformat(),
+            now.timestamp(),
+            self.JOB_KEY.format(job_id=""),
+            self.PUBSUB_CHANNEL if settings.event_pubsub else "",
+            now.isoformat(),
+            user_prefix,
+            user_suffix,
+            queue_mode.value,
+            self.WORKFLOW_KEY.format(digest=""),
+            "" if lease_until is None else lease_until,
+            self.EVENT_STREAM,
+            settings.event_stream_maxlen,
+            now.timestamp() + settings.job_lease_seconds,
+        ]
+
+    @staticmethod
+    def _stamp_legacy_claim(
+        job_data: str, worker_id: str, now: datetime, lease_until: Optional[float] = None
+    ) -> Tuple[Job, Tuple[str, ...]]:
+        """
+        Stamp a legacy JSON job the claim script returned unconverted (it is
+        already in queue:running or leased). Returns the job - to be stored
+        as a hash - and the changed fields.
+        """
+        job = Job.model_validate_json(job_data)
+        if lease_until is None:
+            job.status = JobStatus.RUNNING
+            job.started_at = now
+        job.worker_id = worker_id
+        job.version += 1
+        changed = ("worker_id",) if lease_until is not None else ("status", "started_at", "worker_id")
+        return job, changed
+
+    def _start_leased_params(self, job_id: str, worker_id: str) -> Tuple[List[str], List[Any]]:
+        """Keys and arguments for START_LEASED_JOB_SCRIPT"""
+        now = datetime.now(timezone.utc)
+        keys = [self.QUEUE_LEASED, self.QUEUE_RUNNING, self.JOB_KEY.format(job_id=job_id), self.QUEUE_RUNNING_LEASES]
+        args = [job_id, worker_id, now.isoformat(), now.timestamp(), now.timestamp() + settings.job_lease_seconds]
+        return keys, args
+
+    def _renew_params(
+        self, worker_id: str, job_ids: List[str], lease_seconds: int
+    ) -> Tuple[List[str], List[Any]]:
+        """Keys and arguments for RENEW_LEASES_SCRIPT"""
+        now = time.time()
+        keys = [self.QUEUE_LEASED, self.QUEUE_RUNNING_LEASES]
+        args = [
+            now + lease_seconds, now + settings.job_lease_seconds, self.JOB_KEY.format(job_id=""), worker_id,
+            *job_ids,
+        ]
+        return keys, args
+
+    def _requeue_lease_params(self, job: Job, now: float) -> Tuple[List[str], List[Any]]:
+        """Keys and arguments for REQUEUE_LEASE_SCRIPT"""
+        keys = [
+            self.QUEUE_LEASED,
+            self.QUEUE_PENDING,
+            self.QUEUE_ROUND_ROBIN,
+            self.QUEUE_WAKEUP,
+            self.JOB_KEY.format(job_id=job.id),
+            self.USER_PENDING.format(user_id=job.user_id),
+            self.USER_COMPLETED_COUNT.format(user_id=job.user_id),
+        ]
+        return keys, [job.id, self._get_priority_score(job), job.user_id, now]
+
+    def _requeue_running_params(self, job: Job, now: float, max_attempts: int) -> Tuple[List[str], List[Any]]:
+        """Keys and arguments for REQUEUE_RUNNING_SCRIPT"""
+        keys = [
+            self.QUEUE_RUNNING_LEASES,
+            self.QUEUE_RUNNING,
+            self.QUEUE_PENDING,
+            self.QUEUE_ROUND_ROBIN,
+            self.QUEUE_WAKEUP,
+            self.JOB_KEY.format(job_id=job.id),
+            self.USER_PENDING.format(user_id=job.user_id),
+            self.USER_COMPLETED_COUNT.format(user_id=job.user_id),
+        ]
+        return keys, [job.id, self._get_priority_score(job), job.user_id, now, max_attempts]
+
+    @classmethod
+    def _lease_requeued(cls, job: Job, version: int) -> Dict[str, Any]:
+        """Apply a REQUEUE_LEASE_SCRIPT result to the job; returns the job_updated event"""
+        job.worker_id = None
+        job.version = version
+        return cls._job_event(job, ("worker_id",))
+
+    @classmethod
+    def _running_requeued(cls, job: Job, version: int, attempts: int) -> Dict[str, Any]:
+        """Apply a REQUEUE_RUNNING_SCRIPT result to the job; returns the job_updated event"""
+        job.status = JobStatus.PENDING
+        job.started_at = None
+        job.worker_id = None
+        job.attempts = attempts
+        job.version = version
+        return cls._job_event(job, ("status", "started_at", "worker_id", "attempts"))
+
+    def _finish_keys(self, job_id: str, status: JobStatus) -> List[str]:
+        """Keys touched by FINISH_JOB_SCRIPT"""
+        return [
+            self.QUEUE_RUNNING,
+            self.QUEUE_RUNNING_LEASES,
+            self.QUEUE_COMPLETED if status == JobStatus.COMPLETED else self.QUEUE_FAILED,
+            self.JOB_KEY.format(job_id=job_id),
+            self.QUEUE_ROUND_ROBIN,
+        ]
+
+    def _finish_args(self, job_id: str, status: JobStatus, worker_id: Optional[str], **fields: Any) -> List[Any]:
+        """Arguments for FINISH_JOB_SCRIPT; fields are the result or error"""
+        now = datetime.now(timezone.utc)
+        update = Job.model_construct(id=job_id, status=status, completed_at=now, **fields)
+        worker_prefix, worker_suffix = self.WORKER_STATUS.split("{worker_id}")
+        user_prefix, user_suffix = self.USER_COMPLETED_COUNT.split("{user_id}")
+        return [
+            job_id, status.value, worker_id or "", now.timestamp(),
+            worker_prefix, worker_suffix, user_prefix, user_suffix,
+            *self._update_args(update, ("status", "completed_at", *fields)),
+        ]
+
+    @classmethod
+    def _finished_job(cls, reply: Any) -> Optional[Job]:
+        """The job from a FINISH_JOB_SCRIPT reply; None if it was missing or not running"""
+        if not isinstance(reply, list):
+            return None
+        return cls._job_from_pairs(reply)
+
+    def _cancel_keys(self, job: Job) -> List[str]:
+        """Keys touched by CANCEL_JOB_SCRIPT"""
+        return [self.JOB_KEY.format(job_id=job.id), self.QUEUE_RUNNING, self.QUEUE_RUNNING_LEASES]
+
+    @classmethod
+    def _job_cancelled(cls, job: Job, version: int) -> Dict[str, Any]:
+        """Apply a CANCEL_JOB_SCRIPT result to the job; returns the job_updated event"""
+        job.status = JobStatus.CANCELLED
+        job.version = version
+        return cls._job_event(job, ("status",))
+
+    def _archive_keys(self, job: Job) -> List[str]:
+        """Keys touched by ARCHIVE_JOB_SCRIPT"""
+        return [
+            self.QUEUE_COMPLETED,
+            self.QUEUE_FAILED,
+            self.QUEUE_ARCHIVED,
+            self.STATS_ARCHIVED,
+            self.JOB_KEY.format(job_id=job.id),
+            self.USER_JOBS.format(user_id=job.user_id),
+        ]
+
+    def _archive_args(self, job: Job, now: float) -> List[Any]:
+        """Arguments for ARCHIVE_JOB_SCRIPT"""
+        return [job.id, now, self.WORKFLOW_KEY.format(digest="")]
+
+    def _job_index_key(self, user_id: Optional[str] = None, status: Optional[JobStatus] = None) -> str:
+        """History index for a user/status filter (either may be None)"""
+        index = status.value if status else "all"
+        if user_id:
+            return self.USER_JOB_INDEX.format(user_id=user_id, status=index)
+        return self.JOB_INDEX.format(status=index)
+
+    @staticmethod
+    def _page_args(cursor: Optional[str], limit: int) -> List[Any]:
+        """Arguments for JOB_PAGE_SCRIPT; one job beyond the page tells whether another follows"""
+        if not cursor:
+            return [limit + 1, "", ""]
+        score, sep, job_id = cursor.partition(":")
+        if not sep or not job_id:
+            raise ValueError(f"Invalid cursor: {cursor!r}")
+        float(score)
+        return [limit + 1, score, job_id]
+
+    @staticmethod
+    def _page_from_reply(reply: List[Any], limit: int) -> Tuple[List[str], Optional[str]]:
+        """Job IDs of a JOB_PAGE_SCRIPT reply, and the cursor for the next page (None on the last)"""
+        job_ids = reply[0::2]
+        if len(job_ids) <= limit:
+            return job_ids, None
+        return job_ids[:limit], f"{reply[2 * limit - 1]}:{job_ids[limit - 1]}"
+
+    @staticmethod
+    def _workflow_digest(workflow: Dict[str, Any]) -> str:
+        """SHA-256 of the canonical workflow JSON (sorted keys, no whitespace)"""
+        canonical = json.dumps(workflow, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    @classmethod
+    def _assign_workflow_hash(cls, job: Job) -> bytes:
+        """Set job.workflow_hash and return the encoded workflow to store"""
+        job.workflow_hash = cls._workflow_digest(job.workflow)
+        return cls.codec.encode(job.workflow)
+
+    def _queue_store_job(self, pipe, job: Job) -> None:
+        """
+        Queue the commands that write a whole job (replacing any previous
+        value) and take a reference on its workflow - for jobs that do not
+        hold one yet (legacy conversions).
+        """
+        workflow_data = self._assign_workflow_hash(job)
+        workflow_key = self.WORKFLOW_KEY.format(digest=job.workflow_hash)
+        job_key = self.JOB_KEY.format(job_id=job.id)
+        mapping, _ = self._job_to_hash(job)
+        pipe.hsetnx(workflow_key, "data", workflow_data)
+        pipe.hincrby(workflow_key, "refs", 1)
+        pipe.delete(job_key)
+        pipe.hset(job_key, mapping=mapping)
+
+    @staticmethod
+    def _missing_workflows(hashes: Iterable[Any]) -> List[str]:
+        """Distinct workflow digests to load for HGETALL results without an inline workflow"""
+        return list(dict.fromkeys(
+            data["workflow_hash"]
+            for data in hashes
+            if isinstance(data, dict) and data.get("workflow_hash") and "workflow" not in data
+        ))
+
+    @staticmethod
+    def _attach_workflows(hashes: Iterable[Any], workflows: Dict[str, Optional[str]]) -> None:
+        """Fill in the workflow field of HGETALL results from loaded workflow store entries"""
+        for data in hashes:
+            if isinstance(data, dict) and data.get("workflow_hash") in workflows and "workflow" not in data:
+                data["workflow"] = workflows[data["workflow_hash"]]
+
+    @classmethod
+    def _job_to_hash(
+        cls, job: Job, fields: Optional[Iterable[str]] = None
+    ) -> Tuple[Dict[str, Union[str, bytes]], List[str]]:
+        """
+        Encode job fields (default: all) as hash values; None fields are
+        returned separately. The workflow is never included - it lives in the
+        workflow store.
+        """
+        data = job.model_dump(
+            mode="json", include=set(fields) if fields is not None else None, exclude={"workflow"}
+        )
+        mapping, removed = {}, []
+        for field, value in data.items():
+            if value is None:
+                removed.append(field)
+            elif field in cls.JOB_PAYLOAD_FIELDS:
+                mapping[field] = cls.codec.encode(value)
+            elif field in cls.JOB_JSON_FIELDS:
+                mapping[field] = json.dumps(value)
+            else:
+                mapping[field] = str(value)
+        return mapping, removed
+
+    @classmethod
+    def _job_from_hash(cls, data: Dict[str, Optional[str]]) -> Optional[Job]:
+        """
+        Decode a job hash (HGETALL, or JOB_SUMMARY_FIELDS via HMGET).
+        Summary reads get an empty workflow - never write those back whole.
+        """
+        if not data or data.get("id") is None:
+            return None
+        fields = {}
+        for field, value in data.items():
+            if value is None:
+                continue
+            if field in cls.JOB_PAYLOAD_FIELDS:
+                fields[field] = cls.codec.decode(value)
+            elif field in cls.JOB_JSON_FIELDS:
+                fields[field] = json.loads(value)
+            else:
+                fields[field] = value
+        fields.setdefault("workflow", {})
+        return Job.model_validate(fields)
+
+    @classmethod
+    def _job_from_pairs(cls, reply: List[Any]) -> Optional[Job]:
+        """Decode a job hash returned by a script as a flat field/value list"""
+        return cls._job_from_hash(dict(zip(reply[::2], reply[1::2])))
+
+    @classmethod
+    def _job_from_read(cls, data: Any, include_workflow: bool = True) -> Optional[Job]:
+        """Decode an HGETALL (include_workflow) or JOB_SUMMARY_FIELDS HMGET reply"""
+        if include_workflow:
+            return cls._job_from_hash(data)
+        return cls._job_from_hash(dict(zip(cls.JOB_SUMMARY_FIELDS, data)))
+
+    def _queue_job_read(self, pipe, job_id: str, include_workflow: bool = True) -> None:
+        """Queue the read of a job - whole, or without its workflow - on a pipeline"""
+        job_key = self.JOB_KEY.format(job_id=job_id)
+        if include_workflow:
+            pipe.hgetall(job_key)
+        else:
+            pipe.hmget(job_key, self.JOB_SUMMARY_FIELDS)
+
+    @staticmethod
+    def _is_legacy_job_error(error: Exception) -> bool:
+        """True for the WRONGTYPE error a hash command gets on a JSON-string job"""
+        return isinstance(error, ResponseError) and str(error).startswith("WRONGTYPE")
+
+    def _queue_stats_reads(self, pipe) -> None:
+        """Queue the reads get_all_queue_stats needs on a pipeline"""
+        pipe.zcard(self.QUEUE_PENDING)
+        pipe.zcard(self.QUEUE_RUNNING)
+        pipe.zcard(self.QUEUE_COMPLETED)
+        pipe.zcard(self.QUEUE_FAILED)
+        pipe.hmget(self.STATS_ARCHIVED, "completed", "failed")
+        pipe.zcard(self.QUEUE_LEASED)
+
+    @staticmethod
+    def _queue_stats(results: List[Any]) -> Dict[str, int]:
+        """Queue sizes from the _queue_stats_reads replies; archived jobs count as completed/failed"""
+        archived_completed, archived_failed = results[4]
+        return {
+            "pending": results[0],
+            "leased": results[5],
+            "running": results[1],
+            "completed": results[2] + int(archived_completed or 0),
+            "failed": results[3] + int(archived_failed or 0),
+        }
+
+    def _eta_params(self, job_ids: List[str], now: float) -> Tuple[List[str], List[Any]]:
+        """Keys and arguments for ETA_SNAPSHOT_SCRIPT"""
+        keys = [
+            self.QUEUE_PENDING, self.QUEUE_LEASED, self.QUEUE_RUNNING, self.WORKERS_ALIVE, self.STATS_JOB_RUNTIME,
+        ]
+        args = [
+            self.JOB_KEY.format(job_id=""),
+            self.RUNTIME_STATS.format(signature=""),
+            now - settings.worker_heartbeat_timeout,
+            *self.WORKER_STATUS.split("{worker_id}"),
+            *job_ids,
+        ]
+        return keys, args
+
+    def _queue_estimates(self, job_ids: List[str], snapshot: List[Any], now: float) -> Dict[str, Tuple[int, int]]:
+        """
+        Turn an ETA_SNAPSHOT_SCRIPT reply into (position, estimated wait) per
+        pending job; jobs no longer pending are omitted. Each job ahead takes
+        its signature's EWMA runtime - or the overall mean, or
+        default_job_runtime before any job has completed - and the wait is
+        when the job starts once those are spread over the live workers'
+        capacity (num_workers when none has reported yet).
+        """
+        ranks = snapshot[0]
+        if not any(rank >= 0 for rank in ranks):
+            # the jobs left the pending queue since they were read
+            return {}
+        _, queued, running, ewma, capacity, (total_seconds, count) = snapshot
+
+        if count and int(count) > 0:
+            fallback = float(total_seconds) / int(count)
+        else:
+            fallback = settings.default_job_runtime
+        predicted = {sig: float(value) for sig, value in zip(ewma[::2], ewma[1::2])}
+
+        remaining = [
+            max(predicted.get(sig, fallback) - (now - float(started)), 0.0)
+            for started, sig in zip(running[::2], running[1::2])
+        ]
+        starts = estimate_starts(
+            [predicted.get(sig, fallback) for sig in queued], remaining, capacity or settings.num_workers
         )
+        # queued opens with the leased jobs, then pending ranks 0..max
+        leased = len(queued) - (max(ranks) + 1)
+        return {
+            job_id: (rank, int(starts[leased + rank]))
+            for job_id, rank in zip(job_ids, ranks)
+            if rank >= 0
+        }
+
+    def _record_runtime_params(self, job: Job) -> Optional[Tuple[List[str], List[Any]]]:
+        """
+        Keys and arguments for RECORD_RUNTIME_SCRIPT, or None for a job that
+        never started. The runtime is started_at..completed_at - how long the
+        job held its worker, which is what the jobs behind it wait for.
+        """
+        if not job.started_at or not job.completed_at:
+            return None
+        runtime = (job.completed_at - job.started_at).total_seconds()
+        signature = job.signature or ""
+        keys = [
+            self.RUNTIME_STATS.format(signature=signature),
+            self.RUNTIME_SAMPLES.format(signature=signature),
+            self.STATS_JOB_RUNTIME,
+            self.RUNTIME_SIGNATURES,
+        ]
+        args = [runtime, settings.runtime_ewma_alpha, settings.runtime_samples, signature, time.time()]
+        return keys, args
+
+    def _queue_runtime_reads(self, pipe, signatures: List[str]) -> None:
+        """Queue the HMGET ewma/count, LRANGE samples pair per signature (see _runtime_stats)"""
+        for signature in signatures:
+            pipe.hmget(self.RUNTIME_STATS.format(signature=signature), "ewma", "count")
+            pipe.lrange(self.RUNTIME_SAMPLES.format(signature=signature), 0, -1)
+
+    @staticmethod
+    def _runtime_stats(signatures: List[str], replies: List[Any]) -> List[RuntimeStats]:
+        """RuntimeStats from pipelined HMGET ewma/count, LRANGE samples pairs"""
+        stats = []
+        for signature, (ewma, count), samples in zip(signatures, replies[::2], replies[1::2]):
+            if ewma is None:
+                continue
+            runtimes = [float(sample) for sample in samples]
+            stats.append(RuntimeStats(
+                signature=signature,
+                count=int(count or 0),
+                ewma=round(float(ewma), 3),
+                p50=round(quantile(runtimes, 0.5), 3),
+                p90=round(quantile(runtimes, 0.9), 3),
+            ))
+        return stats
+
+    def _queue_spans(self, pipe, job_id: str, spans: List[TraceSpan], retention_seconds: int) -> None:
+        """Queue the append of trace spans, renewing the trace's expiry, on a pipeline"""
+        key = self.JOB_SPANS.format(job_id=job_id)
+        pipe.rpush(key, *(span.model_dump_json() for span in spans))
+        pipe.expire(key, retention_seconds)
+
+    @staticmethod
+    def _spans_from(entries: List[str]) -> List[TraceSpan]:
+        """Decode a trace list"""
+        return [TraceSpan.model_validate_json(entry) for entry in entries]
+
+    def _queue_heartbeat(
+        self, pipe, worker_id: str, provider: Optional[str] = None, capacity: Optional[int] = None
+    ) -> None:
+        """Queue the registry writes for a worker heartbeat on a pipeline"""
+        now = time.time()
+        key = self.WORKER_STATUS.format(worker_id=worker_id)
+        retention = self.WORKER_RETENTION * settings.worker_heartbeat_timeout
+        pipe.zadd(self.WORKERS_ALIVE, {worker_id: now})
+        reported = {name: value for name, value in (("provider", provider), ("capacity", capacity)) if value is not None}
+        if reported:
+            pipe.hset(key, mapping=reported)
+        pipe.expire(key, retention)
+        pipe.zremrangebyscore(self.WORKERS_ALIVE, "-inf", now - retention)
+
+    def _worker_cutoff(self, now: float, include_offline: bool = False) -> float:
+        """Oldest heartbeat (epoch) of a live - or, with include_offline, registered - worker"""
+        timeouts = self.WORKER_RETENTION if include_offline else 1
+        return now - timeouts * settings.worker_heartbeat_timeout
+
+    def _queue_worker_reads(self, pipe, seen: List[Tuple[str, float]]) -> None:
+        """Queue the status hash of every seen worker, then the running job IDs, on a pipeline"""
+        for worker_id, _ in seen:
+            pipe.hgetall(self.WORKER_STATUS.format(worker_id=worker_id))
+        pipe.zrange(self.QUEUE_RUNNING, 0, -1)
+
+    def _worker_statuses(
+        self, seen: List[Tuple[str, float]], reported: List[Dict[str, str]], running: List[Job], now: float
+    ) -> List[WorkerStatus]:
+        """WorkerStatus per (worker_id, last heartbeat), from its status hash and the running jobs"""
+        current = {job.worker_id: job.id for job in running if job.worker_id}
+        live_since = self._worker_cutoff(now)
+        workers = []
+        for (worker_id, heartbeat), info in zip(seen, reported):
+            if heartbeat < live_since:
+                status = "offline"
+            elif worker_id in current:
+                status = "busy"
+            else:
+                status = "idle"
+            workers.append(WorkerStatus(
+                worker_id=worker_id,
+                status=status,
+                current_job_id=current.get(worker_id) if status != "offline" else None,
+                jobs_completed=int(info.get("jobs_completed", 0)),
+                jobs_failed=int(info.get("jobs_failed", 0)),
+                last_heartbeat=datetime.fromtimestamp(heartbeat, timezone.utc),
+                provider=info.get("provider", "unknown"),
+                capacity=int(info.get("capacity", 1)),
+            ))
+        return sorted(workers, key=lambda worker: worker.worker_id)
+
+    def _queue_rescore(self, pipe, job: Job) -> None:
+        """Queue the re-score of a pending job (queue and round-robin index) on a pipeline"""
+        score = self._get_priority_score(job)
+        pipe.zadd(self.QUEUE_PENDING, {job.id: score}, xx=True)
+        pipe.zadd(self.USER_PENDING.format(user_id=job.user_id), {job.id: score}, xx=True)
+
+    def _queue_job_indexes(self, pipe, job: Job) -> None:
+        """Queue the history index entries (all and by status, global and per user) of a job"""
+        score = job.created_at.timestamp()
+        for index in ("all", job.status.value):
+            pipe.zadd(self.JOB_INDEX.format(status=index), {job.id: score})
+            pipe.zadd(self.USER_JOB_INDEX.format(user_id=job.user_id, status=index), {job.id: score})
+
+    @staticmethod
+    def _unleased(job_ids: List[str], leases: List[Optional[float]]) -> List[str]:
+        """The job IDs without a running lease (ZMSCORE replies in the same order)"""
+        return [job_id for job_id, lease in zip(job_ids, leases) if lease is None]
+
+    @staticmethod
+    def _parse_events(reply: Any) -> List[Tuple[str, Optional[Dict[str, Any]]]]:
+        """(entry ID, event) pairs from an XREADGROUP reply; None for an undecodable event"""
+        events = []
+        for _, entries in reply or []:
+            for entry_id, fields in entries:
+                try:
+                    events.append((entry_id, json.loads(fields["event"])))
+                except (KeyError, TypeError, ValueError) as e:
+                    logger.error(f"Failed to decode event {entry_id}: {e}")
+                    events.append((entry_id, None))
+        return events
+
+    @staticmethod
+    def _group_lag(groups: List[Dict[str, Any]], group: str) -> Optional[int]:
+        """Unread plus unacknowledged entries of a group (XINFO GROUPS), None if unknown"""
+        for info in groups:
+            if info.get("name") == group:
+                lag = info.get("lag")
+                return None if lag is None else int(lag) + int(info.get("pending") or 0)
+        return None
+
+    @classmethod
+    def _job_event(cls, job: Job, changed: Iterable[str], **derived: Any) -> Dict[str, Any]:
+        """Delta event payload: JOB_EVENT_FIELDS, changed fields (payloads by name only), derived values"""
+        changed = list(changed)
+        include = (set(cls.JOB_EVENT_FIELDS) | set(changed)) - set(cls.JOB_PAYLOAD_FIELDS)
+        data = job.model_dump(mode="json", include=include)
+        data["changed"] = changed
+        data.update(derived)
+        return data
+
+    @staticmethod
+    def _event_message(event_type: str, data: Dict[str, Any]) -> str:
+        """Serialize an event"""
+        message = {
+            "type": event_type,
+            "data": data,
+            "timestamp": datetime.now(timezone.utc).isoformat()
+        }
+        return json.dumps(message)
+
+    # ========================================================================
+    # Operations - a yield is a round trip (await, for the async client)
+    # ========================================================================
 
+    @operation
     def ping(self) -> bool:
         """Check Redis connection"""
         try:
-            return self.redis.ping()
+            return (yield self.redis.ping())
         except RedisError as e:
             logger.error(f"Redis ping failed: {e}")
             return False
@@ -59,87 +1480,252 @@ class RedisClient:
     # Job Operations
     # ========================================================================
 
-    def create_job(self, job: Job) -> bool:
-        """Create a new job and add to pending queue"""
+    @operation
+    def create_job(self, job: Job, max_depth: int = 0) -> Optional[bool]:
+        """
+        Create a new job and add it to the pending queue - unless that would
+        take the queue past max_depth (0 = no limit), checked in the same
+        atomic step. Returns True if queued, False if the queue is full,
+        None on error.
+        """
         try:
-            job_key = self.JOB_KEY.format(job_id=job.id)
-            job_data = job.model_dump_json()
-
-            # Store job data
-            self.redis.set(job_key, job_data)
-
-            # Add to pending queue with priority score
-            score = self._get_priority_score(job)
-            self.redis.zadd(self.QUEUE_PENDING, {job.id: score})
-
-            # Track user jobs
-            user_jobs_key = self.USER_JOBS.format(user_id=job.user_id)
-            self.redis.sadd(user_jobs_key, job.id)
+            # Store job data, add to pending queue with priority score, track
+            # user jobs and update the round-robin index atomically. The
+            # workflow is stored once per distinct content.
+            keys, args = self._enqueue_params([job], max_depth)
+            ranks = yield self._enqueue_jobs_script(keys=keys, args=args)
+            if ranks is None:
+                logger.warning(f"Rejected job {job.id}: queue is full (max depth {max_depth})")
+                return False
 
             # Publish event
-            self._publish_event("job_created", job.model_dump())
+            yield self._publish_event(
+                "job_created", self._job_event(job, self.JOB_CREATED_FIELDS, position=ranks[0])
+            )
 
             logger.info(f"Created job {job.id} for user {job.user_id}")
             return True
 
         except RedisError as e:
             logger.error(f"Failed to create job {job.id}: {e}")
-            return False
+            return None
 
-    def get_job(self, job_id: str) -> Optional[Job]:
-        """Retrieve job by ID"""
+    @operation
+    def create_jobs(self, jobs: List[Job], max_depth: int = 0) -> Optional[bool]:
+        """
+        Create several jobs in one atomic script call. Either all are queued
+        or, if they would take the pending queue past max_depth (0 = no
+        limit), none are. Publishes a single jobs_created event.
+        Returns True if queued, False if the queue is full, None on error.
+        """
         try:
-            job_key = self.JOB_KEY.format(job_id=job_id)
-            job_data = self.redis.get(job_key)
+            keys, args = self._enqueue_params(jobs, max_depth)
+            ranks = yield self._enqueue_jobs_script(keys=keys, args=args)
+            if ranks is None:
+                logger.warning(f"Rejected batch of {len(jobs)} jobs: queue is full (max depth {max_depth})")
+                return False
+
+            # One event for the whole batch
+            yield self._publish_event("jobs_created", {"jobs": [
+                self._job_event(job, self.JOB_CREATED_FIELDS, position=rank)
+                for job, rank in zip(jobs, ranks)
+            ]})
+
+            logger.info(f"Created {len(jobs)} jobs")
+            return True
 
-            if job_data:
-                return Job.model_validate_json(job_data)
+        except RedisError as e:
+            logger.error(f"Failed to create {len(jobs)} jobs: {e}")
             return None
 
+    @operation
+    def get_job(self, job_id: str, include_workflow: bool = True) -> Optional[Job]:
+        """
+        Retrieve job by ID. include_workflow=False reads every field except the
+        workflow (status reads and transitions); the returned workflow is empty.
+        """
+        try:
+            job_key = self.JOB_KEY.format(job_id=job_id)
+            if include_workflow:
+                data = yield self.redis.hgetall(job_key)
+                yield self._load_workflows([data])
+            else:
+                data = yield self.redis.hmget(job_key, self.JOB_SUMMARY_FIELDS)
+            return self._job_from_read(data, include_workflow)
+
+        except ResponseError as e:
+            if self._is_legacy_job_error(e):
+                return (yield self._migrate_legacy_job(job_id))
+            logger.error(f"Failed to get job {job_id}: {e}")
+            return None
         except (RedisError, ValueError) as e:
             logger.error(f"Failed to get job {job_id}: {e}")
             return None
 
-    def update_job(self, job: Job) -> bool:
-        """Update job data"""
+    @operation
+    def get_jobs(self, job_ids: List[str], include_workflow: bool = True) -> List[Job]:
+        """
+        Retrieve many jobs in one round trip (HGETALL/HMGET in a single pipeline),
+        plus one for their distinct workflows when include_workflow is set.
+        Missing or unreadable jobs are skipped; order follows job_ids.
+        """
+        if not job_ids:
+            return []
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for job_id in job_ids:
+                self._queue_job_read(pipe, job_id, include_workflow)
+            results = yield pipe.execute(raise_on_error=False)
+            if include_workflow:
+                yield self._load_workflows(results)
+
+            jobs = []
+            for job_id, data in zip(job_ids, results):
+                try:
+                    if isinstance(data, Exception):
+                        if not self._is_legacy_job_error(data):
+                            raise data
+                        job = yield self._migrate_legacy_job(job_id)
+                    else:
+                        job = self._job_from_read(data, include_workflow)
+                except (RedisError, ValueError) as e:
+                    logger.error(f"Failed to get job {job_id}: {e}")
+                    continue
+                if job:
+                    jobs.append(job)
+            return jobs
+
+        except RedisError as e:
+            logger.error(f"Failed to get {len(job_ids)} jobs: {e}")
+            return []
+
+    @operation
+    def update_job(self, job: Job, fields: Optional[Iterable[str]] = None) -> bool:
+        """
+        Write changed job fields (default: JOB_STATE_FIELDS). The workflow is
+        never rewritten. Returns False if the job no longer exists.
+        """
         try:
             job_key = self.JOB_KEY.format(job_id=job.id)
-            job_data = job.model_dump_json()
-            self.redis.set(job_key, job_data)
+            fields = tuple(fields or self.JOB_STATE_FIELDS)
+            version = yield self._update_job_script(keys=[job_key], args=self._update_args(job, fields))
+            if not version:
+                return False
+            job.version = version
 
             # Publish update event
-            self._publish_event("job_updated", job.model_dump())
+            yield self._publish_event("job_updated", self._job_event(job, fields))
 
-            logger.debug(f"Updated job {job.id}")
+            logger.debug(f"Updated job {job.id} ({', '.join(fields)})")
             return True
 
         except RedisError as e:
             logger.error(f"Failed to update job {job.id}: {e}")
             return False
 
+    @operation
+    def _store_job(self, job: Job) -> None:
+        """Write a whole job as a hash, replacing any previous value"""
+        pipe = self.redis.pipeline()
+        self._queue_store_job(pipe, job)
+        yield pipe.execute()
+
+    @operation
+    def _load_workflows(self, hashes: List[Any]) -> None:
+        """Attach stored workflows to HGETALL results (one round trip, each digest once)"""
+        digests = self._missing_workflows(hashes)
+        if not digests:
+            return
+        pipe = self.redis.pipeline(transaction=False)
+        for digest in digests:
+            pipe.hget(self.WORKFLOW_KEY.format(digest=digest), "data")
+        self._attach_workflows(hashes, dict(zip(digests, (yield pipe.execute()))))
+
+    @operation
+    def _migrate_legacy_job(self, job_id: str) -> Optional[Job]:
+        """Convert a job stored as a JSON string (pre-hash layout) to a hash"""
+        job_key = self.JOB_KEY.format(job_id=job_id)
+        try:
+            pipe = self.redis.pipeline()
+            try:
+                yield pipe.watch(job_key)
+                if (yield pipe.type(job_key)) != "string":
+                    # Converted (or deleted) concurrently
+                    yield pipe.unwatch()
+                    return (yield self.get_job(job_id))
+                job = Job.model_validate_json((yield pipe.get(job_key)))
+                pipe.multi()
+                self._queue_store_job(pipe, job)
+                yield pipe.execute()
+            finally:
+                yield pipe.reset()
+
+            logger.info(f"Migrated job {job_id} to hash storage")
+            return job
+
+        except WatchError:
+            return (yield self.get_job(job_id))
+        except (RedisError, ValueError) as e:
+            logger.error(f"Failed to migrate job {job_id}: {e}")
+            return None
+
+    @operation
+    def _scan_job_ids(self, key_type: str) -> List[str]:
+        """IDs of every job stored as key_type ("hash", or "string" for the pre-hash layout)"""
+        prefix = self.JOB_KEY.format(job_id="")
+        job_ids, cursor = [], 0
+        while True:
+            cursor, keys = yield self.redis.scan(cursor, match=f"{prefix}*", count=500, _type=key_type)
+            job_ids.extend(key[len(prefix):] for key in keys)
+            if not cursor:
+                return job_ids
+
+    @operation
+    def migrate_job_storage(self) -> int:
+        """Convert every job still stored as a JSON string to a hash (startup)"""
+        try:
+            count = 0
+            for job_id in (yield self._scan_job_ids("string")):
+                if (yield self._migrate_legacy_job(job_id)):
+                    count += 1
+
+            if count:
+                logger.info(f"Migrated {count} jobs to hash storage")
+            return count
+
+        except RedisError as e:
+            logger.error(f"Failed to migrate job storage: {e}")
+            return 0
+
+    @operation
     def delete_job(self, job_id: str) -> bool:
         """Delete a job"""
         try:
-            job = self.get_job(job_id)
+            job = yield self.get_job(job_id, include_workflow=False)
             if not job:
                 return False
 
             # Remove from all queues
-            self.redis.zrem(self.QUEUE_PENDING, job_id)
-            self.redis.zrem(self.QUEUE_RUNNING, job_id)
-            self.redis.zrem(self.QUEUE_COMPLETED, job_id)
-            self.redis.zrem(self.QUEUE_FAILED, job_id)
+            yield self.redis.zrem(self.QUEUE_PENDING, job_id)
+            yield self.redis.zrem(self.QUEUE_RUNNING, job_id)
+            yield self.redis.zrem(self.QUEUE_LEASED, job_id)
+            yield self.redis.zrem(self.QUEUE_RUNNING_LEASES, job_id)
+            yield self.redis.zrem(self.QUEUE_COMPLETED, job_id)
+            yield self.redis.zrem(self.QUEUE_FAILED, job_id)
+
+            yield self._unindex_pending(job_id, job.user_id)
 
             # Remove from user jobs
             user_jobs_key = self.USER_JOBS.format(user_id=job.user_id)
-            self.redis.srem(user_jobs_key, job_id)
+            yield self.redis.srem(user_jobs_key, job_id)
 
-            # Delete job data
-            job_key = self.JOB_KEY.format(job_id=job_id)
-            self.redis.delete(job_key)
+            # Delete job data and release its workflow
+            yield self._delete_job_script(
+                keys=[self.JOB_KEY.format(job_id=job_id)], args=[self.WORKFLOW_KEY.format(digest="")]
+            )
 
             # Publish event
-            self._publish_event("job_deleted", {"job_id": job_id})
+            yield self._publish_event("job_deleted", {"job_id": job_id, "user_id": job.user_id})
 
             logger.info(f"Deleted job {job_id}")
             return True
@@ -152,149 +1738,278 @@ class RedisClient:
     # Queue Operations
     # ========================================================================
 
-    def get_next_job(self, queue_mode: QueueMode = QueueMode.FIFO) -> Optional[Job]:
-        """
-        Get next job from queue based on mode.
-        Uses atomic operations to prevent race conditions between workers.
-        """
-        try:
-            if queue_mode == QueueMode.FIFO or queue_mode == QueueMode.PRIORITY:
-                # Atomic pop - zpopmin is atomic by design
-                result = self.redis.zpopmin(self.QUEUE_PENDING)
-                if result:
-                    job_id = result[0][0]
-                    return self.get_job(job_id)
-
-            elif queue_mode == QueueMode.ROUND_ROBIN:
-                # Use optimistic locking to prevent race conditions
-                max_attempts = 5
-                for attempt in range(max_attempts):
-                    try:
-                        # Get candidate job ID
-                        job_id = self._get_round_robin_job()
-                        if not job_id:
-                            return None
-
-                        # Use WATCH/MULTI/EXEC for atomic removal
-                        pipe = self.redis.pipeline()
-                        pipe.watch(self.QUEUE_PENDING)
-
-                        # Check if job still exists in queue
-                        score = pipe.zscore(self.QUEUE_PENDING, job_id)
-                        if score is None:
-                            # Job was already taken by another worker, retry
-                            pipe.unwatch()
-                            continue
-
-                        # Atomic removal
-                        pipe.multi()
-                        pipe.zrem(self.QUEUE_PENDING, job_id)
-                        pipe.execute()
-
-                        # Successfully removed, return the job
-                        return self.get_job(job_id)
-
-                    except WatchError:
-                        # Another worker modified the queue, retry
-                        logger.debug(f"Round-robin race detected (attempt {attempt + 1}/{max_attempts}), retrying...")
-                        continue
-
-                # Max attempts reached
-                logger.warning(f"Failed to get round-robin job after {max_attempts} attempts (high contention)")
-                return None
+    @operation
+    def claim_next_job(
+        self, worker_id: str, queue_mode: QueueMode = QueueMode.FIFO, wait: float = 0
+    ) -> Optional[Job]:
+        """
+        Claim the next job for a worker in a single atomic server-side script.
+        The job leaves queue:pending and enters queue:running in the same step,
+        so a crash can never leave it in neither queue.
 
+        With wait > 0, block up to wait seconds for a job to be submitted: the
+        enqueue script pushes a token to queue:wakeup, which wakes one waiting
+        claim immediately (BLPOP, see _wait_for_wakeup) - no polling.
+        """
+        try:
+            deadline = time.monotonic() + wait
+            while True:
+                with metrics.JOB_DISPATCH.time():
+                    job = yield self._claim_job("", worker_id, queue_mode)
+                remaining = deadline - time.monotonic()
+                if job:
+                    metrics.job_started(job)
+                    return job
+                if remaining <= 0:
+                    return None
+                yield self._wait_for_wakeup(min(remaining, self.WAKEUP_BLOCK_SECONDS))
+
+        except (RedisError, ValueError) as e:
+            logger.error(f"Failed to claim next job for worker {worker_id}: {e}")
             return None
 
-        except RedisError as e:
-            logger.error(f"Failed to get next job: {e}")
+    @operation
+    def _claim_job(
+        self, job_id: str, worker_id: str, queue_mode: QueueMode = QueueMode.FIFO,
+        lease_until: Optional[float] = None
+    ) -> Optional[Job]:
+        """
+        Run the claim script for a specific job ID ('' chooses by queue mode).
+        With lease_until (epoch) the job is leased to the worker instead.
+        """
+        now = datetime.now(timezone.utc)
+        result = yield self._claim_job_script(
+            keys=self._claim_keys(),
+            args=self._claim_args(job_id, worker_id, queue_mode, now, lease_until),
+        )
+        if not result:
             return None
 
-    def move_job_to_running(self, job_id: str, worker_id: str) -> bool:
-        """Move job from pending to running"""
+        job_data, stamped = result
+        if int(stamped):
+            job = self._job_from_pairs(job_data)
+        else:
+            # Legacy JSON string - stamp and convert it
+            job, changed = self._stamp_legacy_claim(job_data, worker_id, now, lease_until)
+            yield self._unindex_pending(job.id, job.user_id)
+            yield self._store_job(job)
+            yield self._publish_event("job_updated", self._job_event(job, changed))
+
+        logger.info(f"Job {job.id} {'claimed' if lease_until is None else 'leased'} by worker {worker_id}")
+        return job
+
+    @operation
+    def lease_jobs(
+        self, worker_id: str, count: int, queue_mode: QueueMode = QueueMode.FIFO,
+        lease_seconds: int = 60
+    ) -> List[Job]:
+        """
+        Lease up to count pending jobs for a worker to prefetch, chosen the
+        same way claims are. The jobs stay pending until start_leased_job;
+        a lease not renewed within lease_seconds is requeued.
+        """
+        jobs = []
         try:
-            job = self.get_job(job_id)
-            if not job:
-                return False
+            lease_until = time.time() + lease_seconds
+            for _ in range(count):
+                job = yield self._claim_job("", worker_id, queue_mode, lease_until=lease_until)
+                if not job:
+                    break
+                jobs.append(job)
+        except (RedisError, ValueError) as e:
+            logger.error(f"Failed to lease jobs for worker {worker_id}: {e}")
+        return jobs
 
-            job.status = JobStatus.RUNNING
-            job.started_at = datetime.now(timezone.utc)
-            job.worker_id = worker_id
+    @operation
+    def start_leased_job(self, job_id: str, worker_id: str) -> Optional[Job]:
+        """Move a leased job to running; None if the worker no longer holds the lease"""
+        try:
+            keys, args = self._start_leased_params(job_id, worker_id)
+            started = yield self._start_leased_job_script(keys=keys, args=args)
+            if not started:
+                logger.warning(f"Worker {worker_id} lost its lease on job {job_id}")
+                return None
 
-            self.update_job(job)
+            job = yield self.get_job(job_id, include_workflow=False)
+            if job:
+                metrics.job_started(job)
+                yield self._publish_event("job_updated", self._job_event(job, ("status", "started_at")))
+                logger.info(f"Leased job {job_id} started by worker {worker_id}")
+            return job
 
-            # Move between queues
-            score = datetime.now(timezone.utc).timestamp()
-            self.redis.zadd(self.QUEUE_RUNNING, {job_id: score})
+        except RedisError as e:
+            logger.error(f"Failed to start leased job {job_id}: {e}")
+            return None
 
-            logger.info(f"Job {job_id} started by worker {worker_id}")
-            return True
+    @operation
+    def renew_leases(self, worker_id: str, job_ids: List[str], lease_seconds: int = 60) -> List[str]:
+        """
+        Extend a worker's leases - lease_seconds for prefetched jobs,
+        job_lease_seconds for running ones; returns the job IDs it still holds
+        """
+        if not job_ids:
+            return []
+        try:
+            keys, args = self._renew_params(worker_id, job_ids, lease_seconds)
+            return (yield self._renew_leases_script(keys=keys, args=args))
+        except RedisError as e:
+            logger.error(f"Failed to renew leases for worker {worker_id}: {e}")
+            return []
+
+    @operation
+    def requeue_expired_leases(self) -> int:
+        """Return jobs whose lease ran out to the pending queue"""
+        try:
+            now = time.time()
+            job_ids = yield self.redis.zrangebyscore(self.QUEUE_LEASED, 0, now)
+            if not job_ids:
+                return 0
+
+            count = 0
+            for job in (yield self.get_jobs(job_ids, include_workflow=False)):
+                keys, args = self._requeue_lease_params(job, now)
+                requeued = yield self._requeue_lease_script(keys=keys, args=args)
+                if requeued:
+                    yield self._publish_event("job_updated", self._lease_requeued(job, requeued))
+                    count += 1
+
+            if count > 0:
+                logger.warning(f"Requeued {count} jobs with expired leases")
+            return count
 
         except RedisError as e:
-            logger.error(f"Failed to move job {job_id} to running: {e}")
-            return False
+            logger.error(f"Failed to requeue expired leases: {e}")
+            return 0
 
-    def move_job_to_completed(self, job_id: str, result: Dict[str, Any]) -> bool:
-        """Move job from running to completed"""
+    @operation
+    def requeue_expired_jobs(self, max_attempts: int = 3) -> int:
+        """
+        Requeue running jobs whose lease ran out (their worker died or lost
+        contact); a job that has lost max_attempts runs is failed instead
+        """
         try:
-            job = self.get_job(job_id)
-            if not job:
-                return False
+            now = time.time()
+            job_ids = yield self.redis.zrangebyscore(self.QUEUE_RUNNING_LEASES, 0, now)
+            if not job_ids:
+                return 0
+
+            count = 0
+            for job in (yield self.get_jobs(job_ids, include_workflow=False)):
+                keys, args = self._requeue_running_params(job, now, max_attempts)
+                requeued = yield self._requeue_running_script(keys=keys, args=args)
+                if not requeued:
+                    continue
+                version, attempts = requeued
+                if not version:
+                    yield self.move_job_to_failed(job.id, f"Worker lost the job {attempts} times (lease expired)")
+                    continue
+                yield self._publish_event("job_updated", self._running_requeued(job, version, attempts))
+                count += 1
 
-            job.status = JobStatus.COMPLETED
-            job.completed_at = datetime.now(timezone.utc)
-            job.result = result
+            if count > 0:
+                logger.warning(f"Requeued {count} running jobs with expired leases")
+            return count
 
-            self.update_job(job)
+        except RedisError as e:
+            logger.error(f"Failed to requeue expired jobs: {e}")
+            return 0
 
-            # Move between queues
-            self.redis.zrem(self.QUEUE_RUNNING, job_id)
-            score = datetime.now(timezone.utc).timestamp()
-            self.redis.zadd(self.QUEUE_COMPLETED, {job_id: score})
+    @operation
+    def _finish_job(
+        self, job_id: str, status: JobStatus, worker_id: Optional[str], **fields: Any
+    ) -> Optional[Job]:
+        """
+        Run FINISH_JOB_SCRIPT and publish the change. Returns the finished
+        job, or None if it does not exist or is not running (for worker_id).
+        """
+        keys = self._finish_keys(job_id, status)
+        args = self._finish_args(job_id, status, worker_id, **fields)
+        try:
+            reply = yield self._finish_job_script(keys=keys, args=args)
+        except ResponseError as e:
+            if not self._is_legacy_job_error(e) or not (yield self._migrate_legacy_job(job_id)):
+                raise
+            reply = yield self._finish_job_script(keys=keys, args=args)
+        job = self._finished_job(reply)
+        if not job:
+            return None
 
-            # Increment user completed count
-            user_count_key = self.USER_COMPLETED_COUNT.format(user_id=job.user_id)
-            self.redis.incr(user_count_key)
+        metrics.job_finished(job)
+        yield self._publish_event("job_updated", self._job_event(job, ("status", "completed_at", *fields)))
+        return job
+
+    @operation
+    def move_job_to_completed(
+        self, job_id: str, result: Dict[str, Any], worker_id: Optional[str] = None
+    ) -> Optional[Job]:
+        """
+        Move a running job to completed - given worker_id, only if that
+        worker runs it. Returns the job, or None if it does not exist or is
+        not running.
+        """
+        try:
+            job = yield self._finish_job(job_id, JobStatus.COMPLETED, worker_id, result=result)
+            if not job:
+                return None
+            yield self._record_runtime(job)
 
             logger.info(f"Job {job_id} completed")
-            return True
+            return job
 
         except RedisError as e:
             logger.error(f"Failed to move job {job_id} to completed: {e}")
-            return False
+            return None
 
-    def move_job_to_failed(self, job_id: str, error: str) -> bool:
-        """Move job from running to failed"""
+    @operation
+    def move_job_to_failed(
+        self, job_id: str, error: str, worker_id: Optional[str] = None
+    ) -> Optional[Job]:
+        """
+        Move a running job to failed - given worker_id, only if that worker
+        runs it. Returns the job, or None if it does not exist or is not
+        running.
+        """
         try:
-            job = self.get_job(job_id)
+            job = yield self._finish_job(job_id, JobStatus.FAILED, worker_id, error=error)
             if not job:
-                return False
+                return None
 
-            job.status = JobStatus.FAILED
-            job.completed_at = datetime.now(timezone.utc)
-            job.error = error
+            logger.error(f"Job {job_id} failed: {error}")
+            return job
 
-            self.update_job(job)
+        except RedisError as e:
+            logger.error(f"Failed to move job {job_id} to failed: {e}")
+            return None
 
-            # Move between queues
-            self.redis.zrem(self.QUEUE_RUNNING, job_id)
-            score = datetime.now(timezone.utc).timestamp()
-            self.redis.zadd(self.QUEUE_FAILED, {job_id: score})
+    @operation
+    def cancel_running_job(self, job: Job) -> bool:
+        """
+        Cancel a running job, dropping it from the running queue and its
+        lease. Returns False if it is no longer running.
+        """
+        try:
+            version = yield self._cancel_job_script(keys=self._cancel_keys(job), args=[job.id])
+            if not version:
+                return False
+            yield self._publish_event("job_updated", self._job_cancelled(job, version))
 
-            logger.error(f"Job {job_id} failed: {error}")
+            logger.info(f"Job {job.id} cancelled")
             return True
 
         except RedisError as e:
-            logger.error(f"Failed to move job {job_id} to failed: {e}")
+            logger.error(f"Failed to cancel job {job.id}: {e}")
             return False
 
+    @operation
     def get_queue_depth(self, queue: str = QUEUE_PENDING) -> int:
         """Get number of jobs in queue"""
         try:
-            return self.redis.zcard(queue)
+            return (yield self.redis.zcard(queue))
         except RedisError as e:
             logger.error(f"Failed to get queue depth: {e}")
             return 0
 
+    @operation
     def get_all_queue_stats(self) -> Dict[str, int]:
         """
         Get all queue statistics in a single Redis pipeline call.
@@ -302,156 +2017,364 @@ class RedisClient:
         """
         try:
             pipe = self.redis.pipeline()
-            pipe.zcard(self.QUEUE_PENDING)
-            pipe.zcard(self.QUEUE_RUNNING)
-            pipe.zcard(self.QUEUE_COMPLETED)
-            pipe.zcard(self.QUEUE_FAILED)
-            results = pipe.execute()
-
-            return {
-                "pending": results[0],
-                "running": results[1],
-                "completed": results[2],
-                "failed": results[3],
-            }
+            self._queue_stats_reads(pipe)
+            return self._queue_stats((yield pipe.execute()))
         except RedisError as e:
             logger.error(f"Failed to get queue stats: {e}")
-            return {"pending": 0, "running": 0, "completed": 0, "failed": 0}
+            return dict(self.EMPTY_QUEUE_STATS)
 
-    def get_pending_jobs(self, limit: int = 100) -> List[Job]:
+    @operation
+    def get_queue_estimates(self, job_ids: List[str]) -> Dict[str, Tuple[int, int]]:
+        """
+        Get (position_in_queue, estimated_wait_time) for pending jobs.
+        One script call - no job bodies are read.
+        """
+        if not job_ids:
+            return {}
+        try:
+            now = time.time()
+            keys, args = self._eta_params(job_ids, now)
+            return self._queue_estimates(job_ids, (yield self._eta_snapshot_script(keys=keys, args=args)), now)
+        except RedisError as e:
+            logger.error(f"Failed to get queue positions: {e}")
+            return {}
+
+    @operation
+    def _record_runtime(self, job: Job) -> None:
+        """Add a completed job's runtime to the ETA statistics"""
+        params = self._record_runtime_params(job)
+        if params:
+            keys, args = params
+            yield self._record_runtime_script(keys=keys, args=args)
+
+    @operation
+    def get_runtime_stats(self, limit: int = 100) -> List[RuntimeStats]:
+        """Runtime statistics of the most recently completed workflow signatures"""
+        try:
+            signatures = yield self.redis.zrevrange(self.RUNTIME_SIGNATURES, 0, limit - 1)
+            pipe = self.redis.pipeline()
+            self._queue_runtime_reads(pipe, signatures)
+            return self._runtime_stats(signatures, (yield pipe.execute()))
+        except RedisError as e:
+            logger.error(f"Failed to get runtime stats: {e}")
+            return []
+
+    @operation
+    def get_pending_jobs(self, limit: int = 100, include_workflow: bool = True) -> List[Job]:
         """Get list of pending jobs"""
         try:
-            job_ids = self.redis.zrange(self.QUEUE_PENDING, 0, limit - 1)
-            jobs = []
-            for job_id in job_ids:
-                job = self.get_job(job_id)
-                if job:
-                    jobs.append(job)
-            return jobs
+            job_ids = yield self.redis.zrange(self.QUEUE_PENDING, 0, limit - 1)
+            return (yield self.get_jobs(job_ids, include_workflow))
         except RedisError as e:
             logger.error(f"Failed to get pending jobs: {e}")
             return []
 
-    def get_user_jobs(self, user_id: str) -> List[Job]:
+    @operation
+    def get_user_jobs(self, user_id: str, include_workflow: bool = True) -> List[Job]:
         """Get all jobs for a user"""
         try:
-            user_jobs_key = self.USER_JOBS.format(user_id=user_id)
-            job_ids = self.redis.smembers(user_jobs_key)
-            jobs = []
-            for job_id in job_ids:
-                job = self.get_job(job_id)
-                if job:
-                    jobs.append(job)
-            return jobs
+            job_ids = yield self.redis.smembers(self.USER_JOBS.format(user_id=user_id))
+            return (yield self.get_jobs(list(job_ids), include_workflow))
         except RedisError as e:
             logger.error(f"Failed to get user jobs for {user_id}: {e}")
             return []
 
+    @operation
+    def get_job_page(
+        self, user_id: Optional[str] = None, status: Optional[JobStatus] = None,
+        cursor: Optional[str] = None, limit: int = 100
+    ) -> Tuple[List[Job], Optional[str]]:
+        """
+        One page of jobs (without workflows), newest first, optionally for one
+        user and/or status. Returns the jobs and the cursor for the next page,
+        None on the last. Raises ValueError for a malformed cursor.
+        """
+        args = self._page_args(cursor, limit)
+        try:
+            reply = yield self._job_page_script(keys=[self._job_index_key(user_id, status)], args=args)
+            job_ids, next_cursor = self._page_from_reply(reply, limit)
+            return (yield self.get_jobs(job_ids, include_workflow=False)), next_cursor
+        except RedisError as e:
+            logger.error(f"Failed to get job page: {e}")
+            return [], None
+
+    # ========================================================================
+    # Traces
+    # ========================================================================
+
+    @operation
+    def record_spans(self, job_id: str, spans: List[TraceSpan], retention_seconds: int) -> bool:
+        """Append spans to the job's trace, kept retention_seconds after the last append"""
+        if not spans:
+            return True
+        try:
+            pipe = self.redis.pipeline()
+            self._queue_spans(pipe, job_id, spans, retention_seconds)
+            yield pipe.execute()
+            return True
+        except RedisError as e:
+            logger.error(f"Failed to record spans for job {job_id}: {e}")
+            return False
+
+    @operation
+    def get_spans(self, job_id: str) -> List[TraceSpan]:
+        """The job's trace spans, in arrival order"""
+        try:
+            return self._spans_from((yield self.redis.lrange(self.JOB_SPANS.format(job_id=job_id), 0, -1)))
+        except RedisError as e:
+            logger.error(f"Failed to get spans for job {job_id}: {e}")
+            return []
+
     # ========================================================================
     # Worker Operations
     # ========================================================================
 
-    def update_worker_heartbeat(self, worker_id: str) -> bool:
-        """Update worker heartbeat timestamp"""
+    @operation
+    def update_worker_heartbeat(
+        self, worker_id: str, provider: Optional[str] = None, capacity: Optional[int] = None
+    ) -> bool:
+        """Mark a worker live, recording the provider and capacity it reports"""
         try:
-            key = self.WORKER_HEARTBEAT.format(worker_id=worker_id)
-            self.redis.setex(key, settings.worker_heartbeat_timeout, datetime.now(timezone.utc).isoformat())
+            pipe = self.redis.pipeline()
+            self._queue_heartbeat(pipe, worker_id, provider, capacity)
+            yield pipe.execute()
             return True
         except RedisError as e:
             logger.error(f"Failed to update worker heartbeat for {worker_id}: {e}")
             return False
 
+    @operation
     def is_worker_alive(self, worker_id: str) -> bool:
         """Check if worker is alive based on heartbeat"""
         try:
-            key = self.WORKER_HEARTBEAT.format(worker_id=worker_id)
-            return self.redis.exists(key) > 0
+            heartbeat = yield self.redis.zscore(self.WORKERS_ALIVE, worker_id)
+            return heartbeat is not None and heartbeat >= self._worker_cutoff(time.time())
         except RedisError as e:
             logger.error(f"Failed to check worker heartbeat for {worker_id}: {e}")
             return False
 
+    @operation
+    def count_live_workers(self) -> int:
+        """Number of workers with a heartbeat within worker_heartbeat_timeout"""
+        try:
+            return (yield self.redis.zcount(self.WORKERS_ALIVE, self._worker_cutoff(time.time()), "+inf"))
+        except RedisError as e:
+            logger.error(f"Failed to count live workers: {e}")
+            return 0
+
+    @operation
+    def get_workers(self, include_offline: bool = False) -> List[WorkerStatus]:
+        """Live workers (include_offline: every registered worker), by worker_id"""
+        try:
+            now = time.time()
+            seen = yield self.redis.zrangebyscore(
+                self.WORKERS_ALIVE, self._worker_cutoff(now, include_offline), "+inf", withscores=True
+            )
+            pipe = self.redis.pipeline()
+            self._queue_worker_reads(pipe, seen)
+            *reported, running_ids = yield pipe.execute()
+            running = yield self.get_jobs(running_ids, include_workflow=False)
+            return self._worker_statuses(seen, reported, running, now)
+        except RedisError as e:
+            logger.error(f"Failed to get workers: {e}")
+            return []
+
     # ========================================================================
-    # Pub/Sub Operations
+    # Events
     # ========================================================================
 
+    @operation
     def _publish_event(self, event_type: str, data: Dict[str, Any]) -> None:
-        """Publish event to pub/sub channel"""
+        """Append an event to the event stream (and pub/sub, if enabled)"""
         try:
-            message = {
-                "type": event_type,
-                "data": data,
-                "timestamp": datetime.now(timezone.utc).isoformat()
-            }
-            self.redis.publish(self.PUBSUB_CHANNEL, json.dumps(message))
+            message = self._event_message(event_type, data)
+            yield self.redis.xadd(
+                self.EVENT_STREAM, {"event": message}, maxlen=settings.event_stream_maxlen, approximate=True
+            )
+            if settings.event_pubsub:
+                yield self.redis.publish(self.PUBSUB_CHANNEL, message)
         except RedisError as e:
             logger.error(f"Failed to publish event {event_type}: {e}")
 
+    @operation
+    def ensure_event_group(self, group: str) -> None:
+        """Create a consumer group on the event stream (new events only) if it does not exist"""
+        try:
+            yield self.redis.xgroup_create(self.EVENT_STREAM, group, id="$", mkstream=True)
+            logger.info(f"Created event consumer group {group}")
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    @operation
+    def read_events(
+        self, group: str, consumer: str, last_id: str = ">", count: int = 100, block_ms: int = 5000
+    ) -> List[Tuple[str, Optional[Dict[str, Any]]]]:
+        """
+        Read events as a consumer group member: new ones (last_id ">"),
+        blocking up to block_ms, or this consumer's unacknowledged ones
+        after last_id (e.g. "0" after a restart).
+        """
+        reply = yield self.redis.xreadgroup(
+            group, consumer, {self.EVENT_STREAM: last_id}, count=count,
+            block=block_ms if last_id == ">" else None
+        )
+        return self._parse_events(reply)
+
+    @operation
+    def ack_events(self, group: str, entry_ids: List[str]) -> None:
+        """Acknowledge processed events"""
+        if entry_ids:
+            yield self.redis.xack(self.EVENT_STREAM, group, *entry_ids)
+
+    @operation
+    def get_event_lag(self, group: str) -> Optional[int]:
+        """Events a consumer group has not processed yet (unread + unacknowledged)"""
+        try:
+            return self._group_lag((yield self.redis.xinfo_groups(self.EVENT_STREAM)), group)
+        except RedisError as e:
+            logger.debug(f"Failed to get event lag for {group}: {e}")
+            return None
+
+    @operation
     def subscribe_to_updates(self):
-        """Subscribe to queue updates"""
+        """Subscribe to queue updates (pub/sub - only published with event_pubsub)"""
         pubsub = self.redis.pubsub()
-        pubsub.subscribe(self.PUBSUB_CHANNEL)
+        yield pubsub.subscribe(self.PUBSUB_CHANNEL)
         return pubsub
 
     # ========================================================================
     # Helper Methods
     # ========================================================================
 
-    def _get_priority_score(self, job: Job) -> float:
-        """Calculate priority score for job (lower = higher priority)"""
-        # Priority level (0-3) * 1000000 + timestamp
-        # This ensures priority takes precedence, then FIFO within priority
-        priority_weight = job.priority.value * 1000000
-        timestamp = job.created_at.timestamp()
-        return priority_weight + timestamp
+    @operation
+    def _unindex_pending(self, job_id: str, user_id: str) -> None:
+        """Remove a job that left queue:pending from the round-robin index"""
+        yield self._unindex_pending_script(keys=self._unindex_keys(user_id), args=[job_id, user_id])
 
-    def _get_round_robin_job(self) -> Optional[str]:
-        """Get next job using round-robin logic"""
+    @operation
+    def update_pending_priority(self, job: Job) -> bool:
+        """Re-score a pending job after a priority change"""
         try:
-            # Get all pending jobs
-            pending_job_ids = self.redis.zrange(self.QUEUE_PENDING, 0, -1)
-            if not pending_job_ids:
-                return None
+            pipe = self.redis.pipeline()
+            self._queue_rescore(pipe, job)
+            yield pipe.execute()
+            return True
+        except RedisError as e:
+            logger.error(f"Failed to re-score job {job.id}: {e}")
+            return False
 
-            # Group jobs by user and count completed jobs per user
-            user_jobs: Dict[str, List[str]] = {}
-            for job_id in pending_job_ids:
-                job = self.get_job(job_id)
-                if job:
-                    if job.user_id not in user_jobs:
-                        user_jobs[job.user_id] = []
-                    user_jobs[job.user_id].append(job_id)
+    @operation
+    def rebuild_round_robin_index(self) -> int:
+        """
+        Build the per-user pending sets and round-robin index for jobs that
+        were queued before the index existed. Runs once at startup; a no-op
+        when the index is already present or nothing is pending.
+        """
+        try:
+            if (yield self.redis.exists(self.QUEUE_ROUND_ROBIN)) or not (yield self.redis.zcard(self.QUEUE_PENDING)):
+                return 0
 
-            # Find user with fewest completed jobs
-            min_completed = float('inf')
-            selected_user = None
+            pending = yield self.redis.zrange(self.QUEUE_PENDING, 0, -1, withscores=True)
+            pipe = self.redis.pipeline()
+            users = set()
+            scores = dict(pending)
+            for job in (yield self.get_jobs(list(scores), include_workflow=False)):
+                pipe.zadd(self.USER_PENDING.format(user_id=job.user_id), {job.id: scores[job.id]})
+                users.add(job.user_id)
+            for user_id in users:
+                completed = int((yield self.redis.get(self.USER_COMPLETED_COUNT.format(user_id=user_id))) or 0)
+                pipe.zadd(self.QUEUE_ROUND_ROBIN, {user_id: completed}, nx=True)
+            yield pipe.execute()
+
+            logger.info(f"Rebuilt round-robin index for {len(pending)} pending jobs ({len(users)} users)")
+            return len(pending)
 
-            for user_id in user_jobs.keys():
-                count_key = self.USER_COMPLETED_COUNT.format(user_id=user_id)
-                completed = int(self.redis.get(count_key) or 0)
-                if completed < min_completed:
-                    min_completed = completed
-                    selected_user = user_id
+        except RedisError as e:
+            logger.error(f"Failed to rebuild round-robin index: {e}")
+            return 0
 
-            # Return first job from selected user
-            if selected_user and user_jobs[selected_user]:
-                return user_jobs[selected_user][0]
+    @operation
+    def rebuild_job_indexes(self) -> int:
+        """
+        Build the history indexes for jobs created before they existed. Runs
+        once at startup; a no-op when the indexes are already present.
+        """
+        try:
+            if (yield self.redis.exists(self.JOB_INDEX.format(status="all"))):
+                return 0
 
-            return None
+            job_ids = yield self._scan_job_ids("hash")
+            count = 0
+            for start in range(0, len(job_ids), 500):
+                pipe = self.redis.pipeline()
+                for job in (yield self.get_jobs(job_ids[start:start + 500], include_workflow=False)):
+                    self._queue_job_indexes(pipe, job)
+                    count += 1
+                yield pipe.execute()
+
+            if count:
+                logger.info(f"Rebuilt history indexes for {count} jobs")
+            return count
 
         except RedisError as e:
-            logger.error(f"Failed to get round-robin job: {e}")
-            return None
+            logger.error(f"Failed to rebuild history indexes: {e}")
+            return 0
+
+    @operation
+    def get_finished_jobs(self, finished_before: float, limit: int = 500) -> List[Job]:
+        """Up to limit completed and failed jobs (with workflows) that finished before an epoch time"""
+        try:
+            job_ids = yield self.redis.zrangebyscore(self.QUEUE_COMPLETED, 0, finished_before, start=0, num=limit)
+            if len(job_ids) < limit:
+                job_ids += (yield self.redis.zrangebyscore(
+                    self.QUEUE_FAILED, 0, finished_before, start=0, num=limit - len(job_ids)
+                ))
+            return (yield self.get_jobs(job_ids))
+
+        except RedisError as e:
+            logger.error(f"Failed to get finished jobs: {e}")
+            return []
+
+    @operation
+    def remove_archived_jobs(self, jobs: List[Job]) -> int:
+        """Replace jobs already written to the archive with tombstones; returns how many were removed"""
+        try:
+            now = time.time()
+            count = 0
+            for job in jobs:
+                count += (yield self._archive_job_script(keys=self._archive_keys(job), args=self._archive_args(job, now)))
+            return count
+
+        except RedisError as e:
+            logger.error(f"Failed to remove archived jobs: {e}")
+            return 0
+
+    @operation
+    def is_archived(self, job_id: str) -> bool:
+        """True if the job was moved to the archive"""
+        try:
+            return (yield self.redis.zscore(self.QUEUE_ARCHIVED, job_id)) is not None
+        except RedisError as e:
+            logger.error(f"Failed to check archive tombstone for job {job_id}: {e}")
+            return False
 
+    @operation
     def cleanup_stale_jobs(self, timeout_seconds: int = 3600) -> int:
-        """Cleanup jobs that have been running too long"""
+        """Cleanup jobs that have been running too long without a lease"""
         try:
             cutoff = datetime.now(timezone.utc).timestamp() - timeout_seconds
-            stale_job_ids = self.redis.zrangebyscore(self.QUEUE_RUNNING, 0, cutoff)
+            stale_job_ids = yield self.redis.zrangebyscore(self.QUEUE_RUNNING, 0, cutoff)
+            if stale_job_ids:
+                # Leased jobs run as long as their worker renews the lease
+                stale_job_ids = self._unleased(
+                    stale_job_ids, (yield self.redis.zmscore(self.QUEUE_RUNNING_LEASES, stale_job_ids))
+                )
 
             count = 0
             for job_id in stale_job_ids:
-                self.move_job_to_failed(job_id, "Job timeout exceeded")
-                count += 1
+                if (yield self.move_job_to_failed(job_id, "Job timeout exceeded")):
+                    count += 1
 
             if count > 0:
                 logger.warning(f"Cleaned up {count} stale jobs")
@@ -461,3 +2384,35 @@ class RedisClient:
         except RedisError as e:
             logger.error(f"Failed to cleanup stale jobs: {e}")
             return 0
+
+
+# Long polls and blocking stream reads wait by design - dispatch is timed separately
+@metrics.timed_operations(exclude=("claim_next_job", "read_events", "subscribe_to_updates"))
+class RedisClient(RedisClientBase):
+    """Redis client wrapper for job queue operations"""
+
+    def __init__(self):
+        """Initialize Redis connection with timeouts and connection pooling"""
+        self.redis = Redis(**self._connection_kwargs())
+        self._register_scripts()
+        logger.info(
+            f"Connected to Redis at {settings.redis_host}:{settings.redis_port} "
+            f"(socket_timeout=10s, max_connections={settings.redis_max_connections})"
+        )
+
+    @staticmethod
+    def _client_method(steps: Callable[..., Generator]) -> Callable:
+        """A blocking method running an operation: every yielded Redis call already holds its reply"""
+        def method(self, *args, **kwargs):
+            run = steps(self, *args, **kwargs)
+            try:
+                reply = next(run)
+                while True:
+                    reply = run.send(reply)
+            except StopIteration as done:
+                return done.value
+        return method
+
+    def _wait_for_wakeup(self, timeout: float) -> None:
+        """Block up to timeout seconds for a wakeup token"""
+        self.redis.blpop([self.QUEUE_WAKEUP], timeout=timeout)
@@ -0,0 +1,150 @@
+"""
+Job tracing
+
+Every job belongs to a trace. POST /api/jobs starts one - or continues the
+frontend's, when the request carries a W3C traceparent header - and keeps
+it in the job's metadata as metadata["traceparent"], whose span ID is the
+submit span. Workers receive it with the job (next-job, lease-jobs) and
+send back the spans they timed (POST /api/workers/job-spans).
+
+Spans are kept in Redis per job (spans:{job_id}, see record_spans) for
+GET /api/jobs/{id}/timeline, and appended to TRACE_EXPORT_PATH as JSON
+lines - a stand-in for a trace collector.
+
+Phases, queue manager:
+    queue.submit     POST /api/jobs, root of the job's spans
+    queue.wait       created -> started
+    queue.dispatch   next-job: job and worker both ready -> job handed out
+    queue.run        started -> completed / failed
+    queue.report     complete-job / fail-job request
+Worker (see comfyui-worker/worker.py):
+    worker.claim, worker.start, comfyui.submit, comfyui.queued,
+    comfyui.execute, worker.poll_lag, worker.report
+Worker spans use the worker's clock.
+
+File writes block - the queue manager runs SpanExporter.export with
+asyncio.to_thread.
+"""
+import json
+import logging
+import re
+import secrets
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Iterable, List, Optional, Tuple
+
+from models import Job, TraceSpan
+
+logger = logging.getLogger(__name__)
+
+SERVICE = "queue-manager"
+TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+
+def new_trace_id() -> str:
+    return secrets.token_hex(16)
+
+
+def new_span_id() -> str:
+    return secrets.token_hex(8)
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[Tuple[str, str]]:
+    """(trace_id, span_id) from a W3C traceparent, or None if it is missing or malformed"""
+    match = TRACEPARENT_RE.match((value or "").strip().lower())
+    if not match or set(match.group(1)) == {"0"} or set(match.group(2)) == {"0"}:
+        return None
+    return match.group(1), match.group(2)
+
+
+def format_traceparent(trace_id: str, span_id: str) -> str:
+    return f"00-{trace_id}-{span_id}-01"
+
+
+def start_trace(traceparent: Optional[str] = None) -> Tuple[str, str, Optional[str]]:
+    """
+    (trace_id, submit span ID, parent span ID) for a new job: continues the
+    caller's trace when traceparent is valid, starts a new one otherwise
+    """
+    parent = parse_traceparent(traceparent)
+    if parent:
+        return parent[0], new_span_id(), parent[1]
+    return new_trace_id(), new_span_id(), None
+
+
+def job_trace(job: Job) -> Optional[Tuple[str, str]]:
+    """(trace_id, submit span ID) of a job - None for jobs submitted before tracing"""
+    return parse_traceparent(job.metadata.get("traceparent"))
+
+
+def job_span(job: Job, name: str, start: datetime, end: datetime, **attributes: Any) -> Optional[TraceSpan]:
+    """A queue manager span under the job's submit span (None if the job has no trace)"""
+    trace = job_trace(job)
+    if not trace:
+        return None
+    return TraceSpan(
+        name=name,
+        service=SERVICE,
+        trace_id=trace[0],
+        span_id=new_span_id(),
+        parent_span_id=trace[1],
+        start_time=start,
+        end_time=max(end, start),
+        attributes=attributes,
+    )
+
+
+def submit_span(job: Job, parent_span_id: Optional[str], start: datetime, end: datetime) -> TraceSpan:
+    """queue.submit for a job just created with a traceparent - the parent of its other spans"""
+    trace_id, span_id = job_trace(job)
+    return TraceSpan(
+        name="queue.submit",
+        service=SERVICE,
+        trace_id=trace_id,
+        span_id=span_id,
+        parent_span_id=parent_span_id,
+        start_time=start,
+        end_time=end,
+        attributes={"user_id": job.user_id, "priority": job.priority.value},
+    )
+
+
+def started_spans(job: Job, dispatch_start: Optional[datetime] = None) -> List[TraceSpan]:
+    """queue.wait for a job that just started, and queue.dispatch when it was claimed by next-job"""
+    if not job.started_at:
+        return []
+    spans = [job_span(job, "queue.wait", job.created_at, job.started_at, attempts=job.attempts)]
+    if dispatch_start:
+        spans.append(job_span(job, "queue.dispatch", max(dispatch_start, job.created_at), job.started_at))
+    return [span for span in spans if span]
+
+
+def finished_spans(job: Job, report_start: datetime, report_end: datetime) -> List[TraceSpan]:
+    """queue.run and queue.report for a job that just completed or failed"""
+    spans = [job_span(job, "queue.report", report_start, report_end, status=job.status.value)]
+    if job.started_at and job.completed_at:
+        spans.append(job_span(
+            job, "queue.run", job.started_at, job.completed_at, status=job.status.value, worker_id=job.worker_id
+        ))
+    return [span for span in spans if span]
+
+
+class SpanExporter:
+    """Appends spans to a JSON-lines file; safe to share between threads"""
+
+    def __init__(self, path: str):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+        self.file = open(path, "a", encoding="utf-8")
+        logger.info(f"Exporting trace spans to {path}")
+
+    def export(self, spans: Iterable[TraceSpan]) -> None:
+        lines = "".join(json.dumps(span.model_dump(mode="json")) + "\n" for span in spans)
+        with self.lock:
+            self.file.write(lines)
+            self.file.flush()
+
+    def close(self) -> None:
+        with self.lock:
+            self.file.close()
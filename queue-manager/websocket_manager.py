@@ -4,108 +4,472 @@ WebSocket Manager for real-time queue updates
 import json
 import logging
 import asyncio
-from typing import List, Set
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, Iterable, List, Optional, Set, Tuple
 from fastapi import WebSocket
-from redis_client import RedisClient
+from async_redis_client import AsyncRedisClient
+from config import settings
+import metrics
 
 logger = logging.getLogger(__name__)
 
 
+class ClientConnection:
+    """
+    A WebSocket client with its own bounded outbound queue, drained by a
+    writer task, so a slow client only delays its own updates.
+    """
+
+    def __init__(self, websocket: WebSocket, queue_size: int, overflow_policy: str):
+        self.websocket = websocket
+        self.queue_size = queue_size
+        self.overflow_policy = overflow_policy
+        self.pending: Deque[Tuple[Optional[str], str]] = deque()  # (coalesce key, text)
+        self.ready = asyncio.Event()
+        self.dropped = 0  # since the queue last drained
+        self.topics: Set[str] = set()
+        self.writer_task: Optional[asyncio.Task] = None
+
+    def enqueue(self, text: str, key: Optional[str] = None):
+        """Queue a message, applying the overflow policy if the queue is full"""
+        if len(self.pending) >= self.queue_size:
+            self.dropped += 1
+            metrics.WS_DROPPED.inc()
+            if self.overflow_policy == "drop_newest":
+                return
+            if self.overflow_policy == "coalesce" and key is not None:
+                for i, (pending_key, _) in enumerate(self.pending):
+                    if pending_key == key:
+                        self.pending[i] = (key, text)  # latest state wins
+                        return
+            self.pending.popleft()
+        self.pending.append((key, text))
+        self.ready.set()
+
+    async def write(self, send_timeout: float):
+        """Send queued messages until a send fails or times out"""
+        while True:
+            await self.ready.wait()
+            _, text = self.pending.popleft()
+            if not self.pending:
+                self.ready.clear()
+                self.dropped = 0
+            await asyncio.wait_for(self.websocket.send_text(text), timeout=send_timeout)
+
+
+class EventCoalescer:
+    """
+    Merges the events received within one coalescing window: one event per
+    job (later fields win, changed field names accumulate, a job created in
+    the window stays job_created) and one per type for other events. Batch
+    events are split per job. Order follows each key's first event.
+    """
+
+    def __init__(self):
+        self.events: Dict[str, Dict[str, Any]] = {}
+
+    def __len__(self) -> int:
+        return len(self.events)
+
+    def add(self, message: Dict[str, Any]):
+        data = message.get("data")
+        if message.get("type") == "jobs_created" and isinstance(data, dict):
+            for job in data.get("jobs", []):
+                self.add(dict(message, type="job_created", data=job))
+            return
+
+        job_id = (data.get("id") or data.get("job_id")) if isinstance(data, dict) else None
+        key = f"job:{job_id}" if job_id else f"type:{message.get('type')}"
+        previous = self.events.get(key)
+        if previous is None or message.get("type") == "job_deleted" or not isinstance(data, dict):
+            self.events[key] = message
+            return
+
+        merged = {**previous["data"], **data}
+        if "changed" in previous["data"] or "changed" in data:
+            merged["changed"] = list(dict.fromkeys(previous["data"].get("changed", []) + data.get("changed", [])))
+        event_type = "job_created" if previous.get("type") == "job_created" else message.get("type")
+        self.events[key] = dict(message, type=event_type, data=merged)
+
+    def drain(self) -> List[Dict[str, Any]]:
+        events = list(self.events.values())
+        self.events = {}
+        return events
+
+
 class WebSocketManager:
     """Manages WebSocket connections and broadcasts queue updates"""
 
-    def __init__(self, redis_client: RedisClient):
+    # One listener per replica reads the event stream in the replica's
+    # consumer group
+    EVENT_CONSUMER = "listener"
+
+    # Batches read from the stream but not yet broadcast. The reader waits
+    # when this is full, leaving the rest in Redis until clients catch up.
+    EVENT_BUFFER = 64
+
+    # Topics: user:{id} and job:{id} receive that user's / job's events,
+    # queue:stats the queue snapshots, admin:* every event
+    FIREHOSE = "admin:*"
+    QUEUE_STATS = "queue:stats"
+    TOPIC_PREFIXES = ("user:", "job:")
+
+    def __init__(self, redis_client: AsyncRedisClient, group: str = settings.event_consumer_group):
         self.redis_client = redis_client
-        self.active_connections: List[WebSocket] = []
-        self.pubsub = None
+        self.group = group
+        self.connections: Dict[WebSocket, ClientConnection] = {}
+        self.subscribers: Dict[str, Set[ClientConnection]] = {}  # topic -> clients
+        self.closing: Set[asyncio.Task] = set()
+        self.events: asyncio.Queue = asyncio.Queue(maxsize=self.EVENT_BUFFER)
+        self.last_queued_id = "0"  # newest stream entry handed to the dispatcher
+        self.coalescer = EventCoalescer()
+        self.coalesced_acks: List[str] = []
+        self.stats_due = asyncio.Event()
         self.listener_task = None
+        self.dispatch_task = None
+        self.flush_task = None
+        self.stats_task = None
+
+    @property
+    def active_connections(self) -> List[WebSocket]:
+        return list(self.connections)
 
-    async def connect(self, websocket: WebSocket):
-        """Accept new WebSocket connection"""
+    async def connect(self, websocket: WebSocket, topics: Optional[Iterable[str]] = None):
+        """Accept new WebSocket connection, subscribed to topics (default: every event)"""
         await websocket.accept()
-        self.active_connections.append(websocket)
+        client = ClientConnection(websocket, settings.ws_send_queue_size, settings.ws_overflow_policy)
+        client.writer_task = asyncio.create_task(self._write(client))
+        self.connections[websocket] = client
+        metrics.WS_CONNECTIONS.inc()
+        self.subscribe(websocket, [self.FIREHOSE] if topics is None else topics)
         logger.info(f"WebSocket connected. Total connections: {len(self.active_connections)}")
 
         # Start listener if not already running
         if not self.listener_task:
             self.listener_task = asyncio.create_task(self._listen_to_redis())
+        if not self.dispatch_task:
+            self.dispatch_task = asyncio.create_task(self._dispatch_events())
+        if not self.stats_task and settings.queue_stats_interval_ms > 0:
+            self.stats_task = asyncio.create_task(self._push_queue_stats())
 
     def disconnect(self, websocket: WebSocket):
         """Remove WebSocket connection"""
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
-        logger.info(f"WebSocket disconnected. Total connections: {len(self.active_connections)}")
+        client = self.connections.pop(websocket, None)
+        if client:
+            metrics.WS_CONNECTIONS.dec()
+            self._unindex(client, list(client.topics))
+            if client.writer_task is not asyncio.current_task():
+                client.writer_task.cancel()
+        logger.info(f"WebSocket disconnected. Total connections: {len(self.connections)}")
+
+    @classmethod
+    def valid_topic(cls, topic: str) -> bool:
+        if topic in (cls.FIREHOSE, cls.QUEUE_STATS):
+            return True
+        return any(topic.startswith(prefix) and len(topic) > len(prefix) for prefix in cls.TOPIC_PREFIXES)
+
+    def subscribe(self, websocket: WebSocket, topics: Iterable[str]) -> List[str]:
+        """Add topics to a client's subscriptions; returns its current topics"""
+        client = self.connections.get(websocket)
+        if not client:
+            return []
+        for topic in topics:
+            if not self.valid_topic(topic):
+                logger.warning(f"Ignoring subscription to unknown topic {topic!r}")
+                continue
+            client.topics.add(topic)
+            self.subscribers.setdefault(topic, set()).add(client)
+        return sorted(client.topics)
+
+    def unsubscribe(self, websocket: WebSocket, topics: Iterable[str]) -> List[str]:
+        """Remove topics from a client's subscriptions; returns its current topics"""
+        client = self.connections.get(websocket)
+        if not client:
+            return []
+        self._unindex(client, topics)
+        return sorted(client.topics)
 
+    def _unindex(self, client: ClientConnection, topics: Iterable[str]):
+        for topic in topics:
+            client.topics.discard(topic)
+            subscribers = self.subscribers.get(topic)
+            if subscribers is not None:
+                subscribers.discard(client)
+                if not subscribers:
+                    del self.subscribers[topic]
+
+    def send(self, websocket: WebSocket, text: str):
+        """Queue a message for one client"""
+        client = self.connections.get(websocket)
+        if client:
+            client.enqueue(text)
+
+    @classmethod
+    def event_topics(cls, message: dict) -> Set[str]:
+        """Topics an event is delivered to, besides the firehose"""
+        if message.get("type") == "queue_stats":
+            return {cls.QUEUE_STATS}
+        data = message.get("data")
+        if not isinstance(data, dict):
+            return set()
+        topics = set()
+        for item in data.get("jobs", [data]):
+            job_id = item.get("id") or item.get("job_id")
+            if job_id:
+                topics.add(f"job:{job_id}")
+            if item.get("user_id"):
+                topics.add(f"user:{item['user_id']}")
+        return topics
+
+    @metrics.timed(metrics.WS_BROADCAST)
     async def broadcast(self, message: dict):
-        """Broadcast message to all connected clients"""
-        if not self.active_connections:
+        """
+        Queue a message for every client subscribed to it. Never waits on a
+        send: each client's writer task delivers it.
+        """
+        if not self.connections:
             return
 
-        message_str = json.dumps(message)
-        disconnected = []
+        firehose = self.subscribers.get(self.FIREHOSE, set())
+        deliveries = []
+        if firehose:
+            deliveries.append((message, firehose))
 
-        for connection in self.active_connections:
-            try:
-                await connection.send_text(message_str)
-            except Exception as e:
-                logger.error(f"Failed to send to WebSocket: {e}")
-                disconnected.append(connection)
+        # Topic subscribers of a batch event only see their own jobs
+        data = message.get("data")
+        if isinstance(data, dict) and isinstance(data.get("jobs"), list):
+            parts = [dict(message, data={"jobs": [job]}) for job in data["jobs"]]
+        else:
+            parts = [message]
+        for part in parts:
+            recipients = self._recipients(part) - firehose
+            if recipients:
+                deliveries.append((part, recipients))
+
+        slow = set()
+        for part, recipients in deliveries:
+            message_str = json.dumps(part)
+            key = self._coalesce_key(part)
+            for client in recipients:
+                client.enqueue(message_str, key)
+                if client.dropped > settings.ws_max_dropped:
+                    slow.add(client)
+        self._drop_slow(slow)
+
+    @metrics.timed(metrics.WS_BROADCAST)
+    async def broadcast_batch(self, events: List[Dict[str, Any]]):
+        """
+        Send each client one message holding the events it subscribes to
+        (the event itself when there is only one). Clients with the same
+        events share one serialization.
+        """
+        batches: Dict[ClientConnection, List[Dict[str, Any]]] = {}
+        for event in events:
+            for client in self._recipients(event):
+                batches.setdefault(client, []).append(event)
+
+        timestamp = datetime.now(timezone.utc).isoformat()
+        texts: Dict[Tuple[int, ...], Tuple[str, Optional[str]]] = {}
+        slow = set()
+        for client, client_events in batches.items():
+            key = tuple(map(id, client_events))
+            if key not in texts:
+                if len(client_events) == 1:
+                    text = json.dumps(client_events[0])
+                else:
+                    text = json.dumps({"type": "batch", "events": client_events, "timestamp": timestamp})
+                texts[key] = (text, self._batch_coalesce_key(client_events))
+            client.enqueue(*texts[key])
+            if client.dropped > settings.ws_max_dropped:
+                slow.add(client)
+        self._drop_slow(slow)
 
-        # Remove disconnected clients
-        for connection in disconnected:
-            self.disconnect(connection)
+    def _recipients(self, event: Dict[str, Any]) -> Set[ClientConnection]:
+        """Clients subscribed to an event: the firehose plus its topics' subscribers"""
+        recipients = set(self.subscribers.get(self.FIREHOSE, ()))
+        for topic in self.event_topics(event):
+            recipients |= self.subscribers.get(topic, set())
+        return recipients
+
+    def _drop_slow(self, slow: Iterable[ClientConnection]):
+        """Disconnect clients that could not keep up and close their sockets"""
+        for client in slow:
+            metrics.WS_SLOW_DISCONNECTS.inc()
+            logger.warning(
+                f"Disconnecting slow WebSocket client ({client.dropped} updates dropped)"
+            )
+            self.disconnect(client.websocket)
+            task = asyncio.create_task(self._close_slow(client.websocket))
+            self.closing.add(task)
+            task.add_done_callback(self.closing.discard)
+
+    @staticmethod
+    def _coalesce_key(message: dict) -> Optional[str]:
+        """Messages with the same key supersede each other (the same job's updates)"""
+        data = message.get("data")
+        job_id = data.get("id") or data.get("job_id") if isinstance(data, dict) else None
+        if job_id is None:
+            return None
+        return f"{message.get('type')}:{job_id}"
+
+    @classmethod
+    def _batch_coalesce_key(cls, events: List[Dict[str, Any]]) -> Optional[str]:
+        """
+        Key of a coalesced message: its event's key, or for a batch the keys
+        of all its events, so it only supersedes a batch of the same jobs
+        """
+        keys = [cls._coalesce_key(event) for event in events]
+        if None in keys:
+            return None
+        if len(keys) == 1:
+            return keys[0]
+        return "batch:" + ",".join(sorted(keys))
+
+    async def _write(self, client: ClientConnection):
+        """Writer task for one client; a failed or stalled send disconnects it"""
+        try:
+            await client.write(settings.ws_send_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"WebSocket send timed out after {settings.ws_send_timeout}s")
+            self.disconnect(client.websocket)
+        except Exception as e:
+            logger.error(f"Failed to send to WebSocket: {e}")
+            self.disconnect(client.websocket)
+
+    async def _close_slow(self, websocket: WebSocket):
+        """Close a client that could not keep up (1013: try again later)"""
+        try:
+            await asyncio.wait_for(websocket.close(code=1013), timeout=settings.ws_send_timeout)
+        except Exception as e:
+            logger.debug(f"Failed to close slow WebSocket: {e}")
+
+    async def close(self):
+        """Stop the event listener, client writers and slow-client closes (application shutdown)"""
+        tasks = [client.writer_task for client in self.connections.values()]
+        tasks += [self.listener_task, self.dispatch_task, self.flush_task, self.stats_task, *self.closing]
+        tasks = [task for task in tasks if task]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.listener_task = None
+        self.dispatch_task = None
+        self.flush_task = None
+        self.stats_task = None
 
     async def _listen_to_redis(self):
         """
-        Listen to Redis pub/sub and broadcast updates.
+        Read the event stream as this replica's consumer group and hand each
+        batch to the dispatcher. Only awaits Redis and the event buffer, so it
+        never holds up request handling or waits on a WebSocket send.
         Implements automatic reconnection with exponential backoff.
         """
         max_retries = 5
         retry_count = 0
         base_delay = 2  # seconds
 
-        try:
-            while retry_count < max_retries:
-                try:
-                    self.pubsub = self.redis_client.subscribe_to_updates()
-                    logger.info("Started Redis pub/sub listener")
-                    retry_count = 0  # Reset on successful connection
-
-                    for message in self.pubsub.listen():
-                        if message['type'] == 'message':
-                            try:
-                                data = json.loads(message['data'])
-                                await self.broadcast(data)
-                            except json.JSONDecodeError as e:
-                                logger.error(f"Failed to decode Redis message: {e}")
-
-                except Exception as e:
-                    retry_count += 1
-                    delay = base_delay ** retry_count  # Exponential backoff: 2s, 4s, 8s, 16s, 32s
-
-                    if retry_count >= max_retries:
-                        logger.error(
-                            f"Redis listener failed after {max_retries} attempts. "
-                            f"Real-time updates disabled. Error: {e}"
-                        )
-                        self.listener_task = None
-                        break
-
-                    logger.warning(
-                        f"Redis listener error (attempt {retry_count}/{max_retries}): {e}. "
-                        f"Retrying in {delay}s..."
+        while retry_count < max_retries:
+            try:
+                await self.redis_client.ensure_event_group(self.group)
+                logger.info(f"Started Redis event listener (group {self.group})")
+                retry_count = 0  # Reset on successful connection
+
+                # Entries read but not acknowledged before a restart come
+                # first - after a reconnect only those not already handed to
+                # the dispatcher, which acknowledges the rest
+                last_id = self.last_queued_id
+                while True:
+                    events = await self.redis_client.read_events(self.group, self.EVENT_CONSUMER, last_id)
+                    if not events and last_id != ">":
+                        last_id = ">"
+                        continue
+                    if last_id != ">":
+                        last_id = events[-1][0]
+
+                    await self.events.put(events)
+                    self.last_queued_id = events[-1][0]
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                retry_count += 1
+                delay = base_delay ** retry_count  # Exponential backoff: 2s, 4s, 8s, 16s, 32s
+
+                if retry_count >= max_retries:
+                    logger.error(
+                        f"Redis listener failed after {max_retries} attempts. "
+                        f"Real-time updates disabled. Error: {e}"
                     )
-                    await asyncio.sleep(delay)
-
-            # If we exit the loop, listener has failed
-            if retry_count >= max_retries:
-                logger.critical("WebSocket real-time updates permanently disabled due to Redis connection failure")
-
-        finally:
-            # Resource cleanup: Close pubsub connection
-            if self.pubsub:
-                try:
-                    self.pubsub.close()
-                    logger.info("Redis pub/sub connection closed")
-                except Exception as e:
-                    logger.error(f"Error closing pubsub connection: {e}")
+                    self.listener_task = None
+                    break
+
+                logger.warning(
+                    f"Redis listener error (attempt {retry_count}/{max_retries}): {e}. "
+                    f"Retrying in {delay}s..."
+                )
+                await asyncio.sleep(delay)
+
+        # If we exit the loop, listener has failed
+        if retry_count >= max_retries:
+            logger.critical("WebSocket real-time updates permanently disabled due to Redis connection failure")
+
+    async def _dispatch_events(self):
+        """
+        Broadcast batches handed over by the listener - each event at once,
+        or merged over a ws_coalesce_ms window. Entries are acknowledged
+        once broadcast, so events read but not delivered before a restart
+        are redelivered when the listener resumes.
+        """
+        while True:
+            events = await self.events.get()
+            try:
+                messages = [message for _, message in events if message is not None]
+                if any(message.get("type", "").startswith("job") for message in messages):
+                    self.stats_due.set()
+
+                if settings.ws_coalesce_ms > 0:
+                    for message in messages:
+                        self.coalescer.add(message)
+                    self.coalesced_acks.extend(entry_id for entry_id, _ in events)
+                    if not self.flush_task or self.flush_task.done():
+                        self.flush_task = asyncio.create_task(self._flush_coalesced())
+                    continue
+
+                for message in messages:
+                    await self.broadcast(message)
+                await self.redis_client.ack_events(self.group, [entry_id for entry_id, _ in events])
+            except Exception as e:
+                logger.error(f"Failed to dispatch events: {e}")
+            finally:
+                self.events.task_done()
+
+    async def _flush_coalesced(self):
+        """Send what the coalescing window collected, then acknowledge it"""
+        await asyncio.sleep(settings.ws_coalesce_ms / 1000)
+        events = self.coalescer.drain()
+        entry_ids, self.coalesced_acks = self.coalesced_acks, []
+        try:
+            await self.broadcast_batch(events)
+            await self.redis_client.ack_events(self.group, entry_ids)
+        except Exception as e:
+            logger.error(f"Failed to flush coalesced events: {e}")
+
+    async def _push_queue_stats(self):
+        """
+        Broadcast a queue_stats snapshot after job events, at most once per
+        queue_stats_interval_ms, so clients need not poll /api/queue/status.
+        """
+        while True:
+            await self.stats_due.wait()
+            self.stats_due.clear()
+            try:
+                if self.subscribers.get(self.QUEUE_STATS) or self.subscribers.get(self.FIREHOSE):
+                    stats = await self.redis_client.get_all_queue_stats()
+                    await self.broadcast({
+                        "type": "queue_stats",
+                        "data": stats,
+                        "timestamp": datetime.now(timezone.utc).isoformat()
+                    })
+            except Exception as e:
+                logger.error(f"Failed to push queue stats: {e}")
+            await asyncio.sleep(settings.queue_stats_interval_ms / 1000)
@@ -216,7 +216,7 @@ echo ""
 echo "Next Steps:"
 echo "  1. Download models: cd data/models/shared/checkpoints/"
 echo "  2. Test platform:   ./scripts/test.sh"
-echo "  3. Load test:       ./scripts/load-test.sh 5 1"
+echo "  3. Load test:       python scripts/load_test.py run --users 5 --jobs-per-user 1"
 echo ""
 echo "Admin Credentials:"
 echo "  Username: $ADMIN_USERNAME"
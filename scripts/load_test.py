@@ -0,0 +1,561 @@
+#!/usr/bin/env python3
+"""
+Load test - simulated workshop users against a running queue manager
+
+    run            N users submit workflows (a weighted mix of data/workflows),
+                   poll their job until it finishes, think, and submit again.
+                   Some or all users start together ("instructor says go").
+                   Every random choice comes from --seed, so a run is
+                   reproducible.
+    fake-comfyui   A stand-in ComfyUI API (POST /prompt, GET /history,
+                   /queue, /interrupt) that "executes" prompts one at a time
+                   with each workflow's runtime. Point a worker at it
+                   (COMFYUI_URL) to load-test the stack without a GPU.
+
+run reports, as JSON (--output) and as a summary table:
+  - latency percentiles: submit and status-poll requests (client side),
+    dispatch (jobs claimed through next-job; prefetched jobs have none) and
+    queue wait (from GET /api/jobs/{id}/timeline), and submit -> finished
+    as seen by polling
+  - throughput (jobs submitted and finished per second)
+  - queue depth over time (GET /api/queue/status every --sample-interval)
+  - request counts and error rates per operation
+Unfinished jobs are cancelled at the end (--keep to leave them). The exit
+status is 1 if any request errored or any job failed or did not finish.
+
+Headless run against a local stack:
+    docker compose up -d redis queue-manager
+    python scripts/load_test.py fake-comfyui --port 8188 &
+    COMFYUI_URL=http://localhost:8188 QUEUE_MANAGER_URL=http://localhost:3000 \\
+        WORKER_METRICS_PORT=0 OUTPUTS_PATH=/tmp/outputs python comfyui-worker/worker.py &
+    python scripts/load_test.py run --users 20 --jobs-per-user 3 --output results.json
+
+Requires httpx (pip install httpx).
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+WORKFLOWS_DIR = ROOT / "data" / "workflows"
+FINISHED = ("completed", "failed", "cancelled")
+PERCENTILES = (50, 90, 95, 99)
+
+# Median runtime (seconds) per workflow on one GPU, and the spread of
+# runtimes around it (lognormal sigma) - as in benchmarks/bench_eta.py
+WORKFLOW_RUNTIMES = {
+    "example_workflow": 8,
+    "flux2_klein_4b_text_to_image": 14,
+    "flux2_klein_9b_text_to_image": 28,
+    "ltx2_text_to_video_distilled": 65,
+    "ltx2_text_to_video": 190,
+}
+DEFAULT_RUNTIME = 10
+RUNTIME_SIGMA = 0.15
+
+
+def load_workflows(directory: Path) -> Dict[str, Dict[str, Any]]:
+    """Workflow name (file stem) -> workflow, for every JSON file in directory"""
+    return {path.stem: json.loads(path.read_text()) for path in sorted(directory.glob("*.json"))}
+
+
+def workflow_digest(workflow: Dict[str, Any]) -> str:
+    return hashlib.sha256(json.dumps(workflow, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+
+def percentile(values: Sequence[float], pct: float) -> float:
+    """Linear-interpolated percentile of values (0 <= pct <= 100)"""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    rank = (len(ordered) - 1) * pct / 100
+    low, high = math.floor(rank), math.ceil(rank)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(values: Sequence[float]) -> Dict[str, float]:
+    """count, mean, max and PERCENTILES of values (seconds)"""
+    summary = {"count": len(values), "mean": sum(values) / len(values) if values else 0.0}
+    summary.update({f"p{pct}": percentile(values, pct) for pct in PERCENTILES})
+    summary["max"] = max(values, default=0.0)
+    return summary
+
+
+# ============================================================================
+# Scenario
+# ============================================================================
+
+@dataclass
+class UserPlan:
+    """What one simulated user does: start after start seconds, then submit each workflow"""
+    user_id: str
+    start: float
+    workflows: List[str]
+    think_times: List[float]  # pause before each job after the first
+
+
+def parse_mix(items: Sequence[str], available: Sequence[str]) -> Dict[str, float]:
+    """name=weight items (bare names weigh 1); every available workflow, equally, when empty"""
+    if not items:
+        return {name: 1.0 for name in available}
+    mix = {}
+    for item in items:
+        name, _, weight = item.partition("=")
+        if name not in available:
+            raise SystemExit(f"Unknown workflow {name!r} (have: {', '.join(available)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def build_plan(
+    users: int, jobs_per_user: int, mix: Dict[str, float], think_time: float,
+    burst_fraction: float, burst_at: float, burst_window: float, ramp: float, seed: int
+) -> List[UserPlan]:
+    """
+    Each user's start time, workflows and think times. burst_fraction of the
+    users start within burst_window seconds of burst_at (the instructor says
+    go); the rest start spread over ramp seconds. Think times are
+    exponential with mean think_time.
+    """
+    rng = random.Random(seed)
+    names, weights = list(mix), list(mix.values())
+    bursting = set(rng.sample(range(users), round(users * burst_fraction)))
+    plan = []
+    for n in range(users):
+        if n in bursting:
+            start = burst_at + rng.uniform(0, burst_window)
+        else:
+            start = rng.uniform(0, ramp)
+        plan.append(UserPlan(
+            user_id=f"loadtest{n + 1:03d}",
+            start=start,
+            workflows=rng.choices(names, weights, k=jobs_per_user),
+            think_times=[rng.expovariate(1 / think_time) if think_time > 0 else 0.0 for _ in range(jobs_per_user)],
+        ))
+    return plan
+
+
+# ============================================================================
+# Load generator
+# ============================================================================
+
+@dataclass
+class JobRecord:
+    job_id: str
+    user_id: str
+    workflow: str
+    submitted: float  # seconds into the run
+    status: str = "pending"
+    finished: Optional[float] = None
+    dispatch: Optional[float] = None  # queue.dispatch span, seconds
+    queue_wait: Optional[float] = None  # queue.wait span, seconds
+
+
+@dataclass
+class RunStats:
+    start: float = field(default_factory=time.monotonic)
+    latencies: Dict[str, List[float]] = field(default_factory=lambda: {"submit": [], "poll": []})
+    requests: Dict[str, int] = field(default_factory=dict)
+    errors: Dict[str, int] = field(default_factory=dict)
+    rejected: int = 0  # submissions refused with 429 (queue full)
+    jobs: Dict[str, JobRecord] = field(default_factory=dict)
+    queue_depth: List[Dict[str, Any]] = field(default_factory=list)
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.start
+
+    async def request(self, operation: str, call) -> Optional[Any]:
+        """Await an httpx request, counting it; returns the response, or None on a network error"""
+        self.requests[operation] = self.requests.get(operation, 0) + 1
+        started = time.perf_counter()
+        try:
+            response = await call
+        except Exception:
+            self.errors[operation] = self.errors.get(operation, 0) + 1
+            return None
+        if operation in self.latencies:
+            self.latencies[operation].append(time.perf_counter() - started)
+        if response.status_code >= 500 or (response.status_code >= 400 and response.status_code != 429):
+            self.errors[operation] = self.errors.get(operation, 0) + 1
+        return response
+
+
+async def wait_for_job(client, stats: RunStats, record: JobRecord, poll_interval: float) -> None:
+    """Poll the job like the frontend does until it finishes, then read its timeline"""
+    while record.status not in FINISHED:
+        await asyncio.sleep(poll_interval)
+        response = await stats.request("poll", client.get(f"/api/jobs/{record.job_id}"))
+        if response is not None and response.status_code == 200:
+            record.status = response.json()["status"]
+    record.finished = stats.elapsed()
+
+    response = await stats.request("timeline", client.get(f"/api/jobs/{record.job_id}/timeline"))
+    if response is not None and response.status_code == 200:
+        durations = {span["name"]: span["duration_seconds"] for span in response.json()["spans"]}
+        record.dispatch = durations.get("queue.dispatch")
+        record.queue_wait = durations.get("queue.wait")
+
+
+async def simulate_user(
+    client, stats: RunStats, user: UserPlan, workflows: Dict[str, Dict[str, Any]], poll_interval: float, run_id: str
+) -> None:
+    await asyncio.sleep(max(user.start - stats.elapsed(), 0))
+    for n, (name, think) in enumerate(zip(user.workflows, user.think_times)):
+        if n:
+            await asyncio.sleep(think)
+        submitted = stats.elapsed()
+        response = await stats.request("submit", client.post("/api/jobs", json={
+            "user_id": user.user_id,
+            "workflow": workflows[name],
+            "priority": 2,
+            "metadata": {"test": "load_test", "run": run_id, "workflow": name, "job_num": n + 1},
+        }))
+        if response is None or response.status_code != 201:
+            if response is not None and response.status_code == 429:
+                stats.rejected += 1
+            continue
+        record = JobRecord(response.json()["id"], user.user_id, name, submitted)
+        stats.jobs[record.job_id] = record
+        await wait_for_job(client, stats, record, poll_interval)
+
+
+async def sample_queue(client, stats: RunStats, interval: float, stop: asyncio.Event) -> None:
+    """Record queue depth every interval until stop is set"""
+    while not stop.is_set():
+        response = await stats.request("queue_status", client.get("/api/queue/status"))
+        if response is not None and response.status_code == 200:
+            status = response.json()
+            stats.queue_depth.append({
+                "t": round(stats.elapsed(), 3),
+                "pending": status["pending_jobs"],
+                "running": status["running_jobs"],
+            })
+        try:
+            await asyncio.wait_for(stop.wait(), interval)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def run_load(args, plan: List[UserPlan], workflows: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    import httpx
+
+    run_id = uuid.uuid4().hex[:8]
+    limits = httpx.Limits(max_connections=args.max_connections)
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.http_timeout, limits=limits) as client:
+        stats = RunStats()
+        stop = asyncio.Event()
+        sampler = asyncio.create_task(sample_queue(client, stats, args.sample_interval, stop))
+        users = [
+            asyncio.create_task(simulate_user(client, stats, user, workflows, args.poll_interval, run_id))
+            for user in plan
+        ]
+        _, unfinished = await asyncio.wait(users, timeout=args.timeout)
+        for task in unfinished:
+            task.cancel()
+        await asyncio.gather(*unfinished, return_exceptions=True)
+        duration = stats.elapsed()
+        stop.set()
+        await sampler
+
+        if not args.keep:
+            for record in stats.jobs.values():
+                if record.status not in FINISHED:
+                    response = await stats.request("cancel", client.delete(f"/api/jobs/{record.job_id}"))
+                    if response is not None and response.status_code == 204:
+                        record.status = "cancelled"
+
+    return report(args, stats, duration, run_id)
+
+
+def report(args, stats: RunStats, duration: float, run_id: str) -> Dict[str, Any]:
+    records = list(stats.jobs.values())
+    statuses = {status: sum(record.status == status for record in records) for status in FINISHED}
+    finished = [record for record in records if record.finished is not None]
+    return {
+        "run_id": run_id,
+        "config": {
+            key: getattr(args, key) for key in (
+                "url", "users", "jobs_per_user", "mix", "think_time", "burst_fraction", "burst_at",
+                "burst_window", "ramp", "poll_interval", "timeout", "seed",
+            )
+        },
+        "duration_seconds": round(duration, 3),
+        "jobs": {
+            "submitted": len(records),
+            "rejected": stats.rejected,
+            **statuses,
+            "unfinished": len(records) - len(finished),
+        },
+        "throughput": {
+            "submitted_per_second": len(records) / duration if duration else 0.0,
+            "finished_per_second": len(finished) / duration if duration else 0.0,
+        },
+        "latency_seconds": {
+            "submit": summarize(stats.latencies["submit"]),
+            "poll": summarize(stats.latencies["poll"]),
+            "dispatch": summarize([r.dispatch for r in records if r.dispatch is not None]),
+            "queue_wait": summarize([r.queue_wait for r in records if r.queue_wait is not None]),
+            "end_to_end": summarize([r.finished - r.submitted for r in finished]),
+        },
+        "requests": {
+            operation: {
+                "count": count,
+                "errors": stats.errors.get(operation, 0),
+                "error_rate": stats.errors.get(operation, 0) / count,
+            }
+            for operation, count in sorted(stats.requests.items())
+        },
+        "queue_depth": stats.queue_depth,
+        "max_queue_depth": max((sample["pending"] for sample in stats.queue_depth), default=0),
+    }
+
+
+def print_summary(result: Dict[str, Any]) -> None:
+    jobs = result["jobs"]
+    print(f"Load test {result['run_id']}: {result['duration_seconds']:.1f}s, "
+          f"{result['config']['users']} users")
+    print(f"  Jobs: {jobs['submitted']} submitted, {jobs['completed']} completed, {jobs['failed']} failed, "
+          f"{jobs['cancelled']} cancelled, {jobs['unfinished']} unfinished, {jobs['rejected']} rejected (429)")
+    throughput = result["throughput"]
+    print(f"  Throughput: {throughput['submitted_per_second']:.2f} submitted/s, "
+          f"{throughput['finished_per_second']:.2f} finished/s")
+    print(f"  Max queue depth: {result['max_queue_depth']}")
+    print()
+    header = f"  {'latency (s)':<12}{'count':>7}{'mean':>9}" + "".join(f"{f'p{p}':>9}" for p in PERCENTILES) + f"{'max':>9}"
+    print(header)
+    for name, summary in result["latency_seconds"].items():
+        print(f"  {name:<12}{summary['count']:>7}{summary['mean']:>9.3f}"
+              + "".join(f"{summary[f'p{p}']:>9.3f}" for p in PERCENTILES) + f"{summary['max']:>9.3f}")
+    print()
+    print(f"  {'requests':<12}{'count':>7}{'errors':>9}{'rate':>9}")
+    for name, counts in result["requests"].items():
+        print(f"  {name:<12}{counts['count']:>7}{counts['errors']:>9}{counts['error_rate']:>9.1%}")
+
+
+# ============================================================================
+# Fake ComfyUI
+# ============================================================================
+
+class FakeComfyUI:
+    """
+    The parts of the ComfyUI API the worker uses. Prompts run one at a time,
+    each taking its workflow's runtime (runtimes: workflow digest -> median
+    seconds, lognormal spread, times scale); fail_rate of them fail.
+    """
+
+    def __init__(
+        self, runtimes: Dict[str, float], scale: float = 1.0, fail_rate: float = 0.0, seed: int = 1
+    ):
+        self.runtimes = runtimes
+        self.scale = scale
+        self.fail_rate = fail_rate
+        self.rng = random.Random(seed)
+        self.condition = threading.Condition()
+        self.pending: deque = deque()  # (number, prompt_id, workflow)
+        self.running: Optional[Tuple[int, str]] = None
+        self.interrupted = False
+        self.history: Dict[str, Dict[str, Any]] = {}
+        self.number = 0
+        self.server: Optional[ThreadingHTTPServer] = None
+
+    def queue_prompt(self, workflow: Dict[str, Any]) -> Dict[str, Any]:
+        with self.condition:
+            self.number += 1
+            prompt_id = str(uuid.uuid4())
+            self.pending.append((self.number, prompt_id, workflow))
+            self.condition.notify()
+            return {"prompt_id": prompt_id, "number": self.number, "node_errors": {}}
+
+    def runtime(self, workflow: Dict[str, Any]) -> float:
+        median = self.runtimes.get(workflow_digest(workflow), DEFAULT_RUNTIME)
+        return median * self.rng.lognormvariate(0, RUNTIME_SIGMA) * self.scale
+
+    def execute(self) -> None:
+        """Executor thread: run queued prompts in order"""
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
+                number, prompt_id, workflow = self.pending.popleft()
+                self.running, self.interrupted = (number, prompt_id), False
+                runtime, failed = self.runtime(workflow), self.rng.random() < self.fail_rate
+            started = time.time()
+            with self.condition:
+                self.condition.wait_for(lambda: self.interrupted, timeout=runtime)
+                outcome = "interrupted" if self.interrupted else "error" if failed else "success"
+                status = {
+                    "status_str": "success" if outcome == "success" else "error",
+                    "completed": outcome == "success",
+                    "messages": [
+                        ["execution_start", {"prompt_id": prompt_id, "timestamp": int(started * 1000)}],
+                        [f"execution_{outcome}", {"prompt_id": prompt_id, "timestamp": int(time.time() * 1000)}],
+                    ],
+                }
+                if outcome == "error":
+                    status["error"] = "Simulated failure (fake ComfyUI)"
+                self.history[prompt_id] = {"prompt": [number, prompt_id, workflow], "outputs": {}, "status": status}
+                self.running = None
+
+    def delete(self, prompt_ids: Sequence[str]) -> None:
+        with self.condition:
+            self.pending = deque(item for item in self.pending if item[1] not in prompt_ids)
+
+    def interrupt(self) -> None:
+        with self.condition:
+            self.interrupted = True
+            self.condition.notify_all()
+
+    def queue(self) -> Dict[str, Any]:
+        with self.condition:
+            return {
+                "queue_running": [[*self.running, {}, {}, []]] if self.running else [],
+                "queue_pending": [[number, prompt_id, {}, {}, []] for number, prompt_id, _ in self.pending],
+            }
+
+    def serve(self, host: str, port: int) -> ThreadingHTTPServer:
+        """Start the executor and the HTTP server in background threads; returns the server"""
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def reply(self, body: Any, status: int = 200) -> None:
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def read_json(self) -> Dict[str, Any]:
+                return json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+
+            def do_GET(self):
+                if self.path.startswith("/history/"):
+                    prompt_id = self.path[len("/history/"):]
+                    entry = fake.history.get(prompt_id)
+                    self.reply({prompt_id: entry} if entry else {})
+                elif self.path == "/queue":
+                    self.reply(fake.queue())
+                elif self.path == "/system_stats":
+                    self.reply({"system": {"comfyui_version": "fake"}, "devices": []})
+                else:
+                    self.reply({"error": "not found"}, 404)
+
+            def do_POST(self):
+                body = self.read_json()
+                if self.path == "/prompt":
+                    self.reply(fake.queue_prompt(body["prompt"]))
+                elif self.path == "/queue":
+                    fake.delete(body.get("delete", []))
+                    self.reply({})
+                elif self.path == "/interrupt":
+                    fake.interrupt()
+                    self.reply({})
+                else:
+                    self.reply({"error": "not found"}, 404)
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self.execute, daemon=True).start()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self.server
+
+
+def workflow_runtimes(workflows: Dict[str, Dict[str, Any]], overrides: Sequence[str]) -> Dict[str, float]:
+    """Workflow digest -> median runtime, from WORKFLOW_RUNTIMES and name=seconds overrides"""
+    medians = dict(WORKFLOW_RUNTIMES)
+    for item in overrides:
+        name, _, seconds = item.partition("=")
+        medians[name] = float(seconds)
+    return {workflow_digest(workflow): medians.get(name, DEFAULT_RUNTIME) for name, workflow in workflows.items()}
+
+
+# ============================================================================
+# Command line
+# ============================================================================
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--workflows", type=Path, default=WORKFLOWS_DIR, help="directory of workflow JSON files")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="simulate users against a queue manager")
+    run.add_argument("--url", default=os.getenv(
+        "QUEUE_MANAGER_URL", f"http://localhost:{os.getenv('QUEUE_MANAGER_PORT', '3000')}"
+    ))
+    run.add_argument("--users", type=int, default=20)
+    run.add_argument("--jobs-per-user", type=int, default=3)
+    run.add_argument("--mix", nargs="*", default=[], metavar="NAME[=WEIGHT]",
+                     help="workflows to submit and their weights (default: every workflow, equally)")
+    run.add_argument("--think-time", type=float, default=10.0, help="mean seconds between a user's jobs")
+    run.add_argument("--burst-fraction", type=float, default=1.0,
+                     help="share of users who start together at --burst-at (the rest ramp up)")
+    run.add_argument("--burst-at", type=float, default=0.0, help="seconds into the run")
+    run.add_argument("--burst-window", type=float, default=2.0, help="seconds the burst is spread over")
+    run.add_argument("--ramp", type=float, default=60.0, help="seconds the other users' starts are spread over")
+    run.add_argument("--poll-interval", type=float, default=2.0, help="seconds between a user's status polls")
+    run.add_argument("--sample-interval", type=float, default=1.0, help="seconds between queue depth samples")
+    run.add_argument("--timeout", type=float, default=600.0, help="seconds before unfinished users are stopped")
+    run.add_argument("--http-timeout", type=float, default=30.0)
+    run.add_argument("--max-connections", type=int, default=100)
+    run.add_argument("--seed", type=int, default=1)
+    run.add_argument("--keep", action="store_true", help="leave unfinished jobs in the queue")
+    run.add_argument("--output", type=Path, help="write the JSON report here")
+
+    fake = commands.add_parser("fake-comfyui", help="serve a stand-in ComfyUI API for a worker")
+    fake.add_argument("--host", default="127.0.0.1")
+    fake.add_argument("--port", type=int, default=8188)
+    fake.add_argument("--runtime", nargs="*", default=[], metavar="NAME=SECONDS",
+                      help="median runtime per workflow (default: workshop GPU timings)")
+    fake.add_argument("--runtime-scale", type=float, default=0.05,
+                      help="multiply runtimes by this (0.05: a 190s video takes ~10s)")
+    fake.add_argument("--fail-rate", type=float, default=0.0, help="share of prompts that fail")
+    fake.add_argument("--seed", type=int, default=1)
+
+    args = parser.parse_args(argv)
+    workflows = load_workflows(args.workflows)
+    if not workflows:
+        parser.error(f"no workflow JSON files in {args.workflows}")
+
+    if args.command == "fake-comfyui":
+        comfyui = FakeComfyUI(workflow_runtimes(workflows, args.runtime), args.runtime_scale, args.fail_rate, args.seed)
+        server = comfyui.serve(args.host, args.port)
+        print(f"Fake ComfyUI on http://{args.host}:{server.server_address[1]} (Ctrl-C to stop)")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            server.shutdown()
+        return 0
+
+    mix = parse_mix(args.mix, list(workflows))
+    args.mix = mix
+    plan = build_plan(
+        args.users, args.jobs_per_user, mix, args.think_time,
+        args.burst_fraction, args.burst_at, args.burst_window, args.ramp, args.seed
+    )
+    result = asyncio.run(run_load(args, plan, workflows))
+    if args.output:
+        args.output.write_text(json.dumps(result, indent=2))
+    print_summary(result)
+
+    jobs = result["jobs"]
+    errors = sum(counts["errors"] for counts in result["requests"].values())
+    return 1 if errors or jobs["failed"] or jobs["unfinished"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -61,6 +61,7 @@ mkdir -p "$PROJECT_DIR/data/models/custom"
 mkdir -p "$PROJECT_DIR/data/outputs"
 mkdir -p "$PROJECT_DIR/data/inputs"
 mkdir -p "$PROJECT_DIR/data/workflows"
+mkdir -p "$PROJECT_DIR/data/archive"
 
 # Create user directories (outputs + user_data for workflows/settings)
 for i in $(seq 1 20); do
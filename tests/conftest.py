@@ -34,12 +34,21 @@ class Settings(BaseSettings):
     redis_port: int = 6379
     redis_password: str
     redis_db: int = 0
+    redis_max_connections: int = 50
 
     # Queue Configuration
     queue_mode: str = "fifo"
     enable_priority: bool = True
     job_timeout: int = 3600
     max_queue_depth: int = 100
+    default_job_runtime: int = 60
+    runtime_ewma_alpha: float = 0.3
+    runtime_samples: int = 50
+    max_page_size: int = 500
+
+    # Job payload storage
+    payload_codec: str = "msgpack"
+    payload_compression_threshold: int = 16384
 
     # Inference Provider
     inference_provider: str = "local"
@@ -54,6 +63,27 @@ class Settings(BaseSettings):
     # Worker Configuration
     worker_heartbeat_timeout: int = 60
     worker_poll_interval: int = 1
+    worker_max_wait: int = 30
+    worker_max_long_polls: int = 20
+    event_stream_maxlen: int = 10000
+    event_consumer_group: str = "queue-manager"
+    event_pubsub: bool = False
+    ws_send_queue_size: int = 100
+    ws_overflow_policy: str = "drop_oldest"
+    ws_send_timeout: float = 5.0
+    ws_max_dropped: int = 500
+    ws_coalesce_ms: int = 100
+    queue_stats_interval_ms: int = 1000
+    worker_max_prefetch: int = 4
+    worker_lease_seconds: int = 60
+    job_lease_seconds: int = 30
+    max_job_attempts: int = 3
+    archive_path: str = ""
+    archive_after_seconds: int = 86400
+    archive_interval_seconds: int = 300
+    archive_batch_size: int = 500
+    trace_export_path: str = ""
+    trace_retention_seconds: int = 604800
 
     # Storage paths
     outputs_path: str = "/outputs"
@@ -195,18 +225,18 @@ def mock_redis_client(mocker):
     mock.get_queue_depth.return_value = 0
     mock.get_all_queue_stats.return_value = {
         "pending": 0,
+        "leased": 0,
         "running": 0,
         "completed": 0,
         "failed": 0
     }
     mock.get_pending_jobs.return_value = []
     mock.get_user_jobs.return_value = []
-    mock.move_job_to_running.return_value = True
     mock.move_job_to_completed.return_value = True
     mock.move_job_to_failed.return_value = True
     mock.update_worker_heartbeat.return_value = True
     mock.is_worker_alive.return_value = True
-    mock.get_next_job.return_value = None
+    mock.claim_next_job.return_value = None
     mock._publish_event = MagicMock()
     mock._get_priority_score.return_value = 2000020.0
     mock.redis = MagicMock()
@@ -217,6 +247,54 @@ def mock_redis_client(mocker):
     return mock
 
 
+async def idle_event_stream(*args, **kwargs):
+    """read_events() stand-in for a stream with no new events: blocks until cancelled"""
+    await asyncio.Event().wait()
+
+
+@pytest.fixture
+def mock_async_redis_client(mocker):
+    """Mock asyncio Redis client (used by the FastAPI app)"""
+    mock = AsyncMock()
+    mock.ping.return_value = True
+    mock.create_job.return_value = True
+    mock.get_job.return_value = None
+    mock.update_job.return_value = True
+    mock.delete_job.return_value = True
+    mock.get_queue_depth.return_value = 0
+    mock.get_all_queue_stats.return_value = {
+        "pending": 0,
+        "leased": 0,
+        "running": 0,
+        "completed": 0,
+        "failed": 0
+    }
+    mock.get_pending_jobs.return_value = []
+    mock.get_user_jobs.return_value = []
+    mock.move_job_to_completed.return_value = True
+    mock.move_job_to_failed.return_value = True
+    mock.update_worker_heartbeat.return_value = True
+    mock.is_worker_alive.return_value = True
+    mock.claim_next_job.return_value = None
+    mock.update_pending_priority.return_value = True
+    mock.get_queue_estimates.return_value = {}
+    mock.get_runtime_stats.return_value = []
+    mock.count_live_workers.return_value = 0
+    mock.get_workers.return_value = []
+    mock.get_jobs.return_value = []
+    mock.get_job_page.return_value = ([], None)
+    mock.create_jobs.return_value = True
+    mock.lease_jobs.return_value = []
+    mock.get_event_lag.return_value = 0
+    mock.read_events.side_effect = idle_event_stream
+    mock.start_leased_job.return_value = None
+    mock.renew_leases.return_value = []
+    mock.is_archived.return_value = False
+    mock._get_priority_score = MagicMock(return_value=2000020.0)
+
+    return mock
+
+
 @pytest.fixture
 def mock_ws_manager(mock_redis_client):
     """Mock WebSocket Manager"""
@@ -0,0 +1,116 @@
+"""
+Tests for the on-disk job archive
+"""
+import pytest
+from unittest.mock import patch
+
+from archive import JobArchive, archive_finished_jobs
+from codec import PayloadCodec
+from models import Job, JobStatus
+
+
+@pytest.fixture
+def archive(tmp_path):
+    archive = JobArchive(str(tmp_path / "archive" / "jobs.db"), PayloadCodec("json", compression_threshold=0))
+    yield archive
+    archive.close()
+
+
+@pytest.fixture
+def fake_async_client():
+    """AsyncRedisClient backed by async fakeredis"""
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    server = fakeredis.FakeAsyncRedis(decode_responses=True, encoding_errors="surrogateescape")
+    with patch('async_redis_client.Redis', return_value=server):
+        from async_redis_client import AsyncRedisClient
+        client = AsyncRedisClient()
+    return client, server
+
+
+def finished_job(job_id, status=JobStatus.COMPLETED):
+    return Job(
+        id=job_id, user_id="user001", workflow={"1": {"class_type": "KSampler"}}, status=status,
+        result={"images": ["out.png"]} if status == JobStatus.COMPLETED else None,
+    )
+
+
+class TestJobArchive:
+    """Test the SQLite archive"""
+
+    def test_put_and_get(self, archive):
+        """Test archived jobs read back whole"""
+        job = finished_job("job-1")
+
+        assert archive.put([job]) == 1
+
+        stored = archive.get("job-1")
+        assert stored == job
+        assert archive.get("missing") is None
+
+    def test_put_replaces(self, archive):
+        """Test archiving a job again (a retried run) keeps one copy"""
+        archive.put([finished_job("job-1")])
+        archive.put([finished_job("job-1", JobStatus.FAILED)])
+
+        assert archive.count() == 1
+        assert archive.get("job-1").status == JobStatus.FAILED
+
+
+class TestArchiveFinishedJobs:
+    """Test moving finished jobs out of Redis against fakeredis"""
+
+    async def finish(self, client, server, job_id, fail=False):
+        await client.create_job(Job(id=job_id, user_id="user001", workflow={"1": {"class_type": "KSampler"}}))
+        await client.claim_next_job("worker-1")
+        if fail:
+            await client.move_job_to_failed(job_id, "boom")
+        else:
+            await client.move_job_to_completed(job_id, {"images": ["out.png"]})
+
+    @pytest.mark.asyncio
+    async def test_moves_old_finished_jobs(self, fake_async_client, archive):
+        """Test old finished jobs leave only a tombstone in Redis and read back from the archive"""
+        client, server = fake_async_client
+        await self.finish(client, server, "job-1")
+        await self.finish(client, server, "job-2", fail=True)
+        await client.create_job(Job(id="job-3", user_id="user001", workflow={"1": {"class_type": "KSampler"}}))
+
+        assert await archive_finished_jobs(client, archive, older_than=-1) == 2
+
+        assert not await server.exists("job:job-1", "job:job-2")
+        assert await server.zcard(client.QUEUE_COMPLETED) == 0
+        assert await server.zcard(client.QUEUE_FAILED) == 0
+        assert await server.smembers("user:user001:jobs") == {"job-3"}
+        assert await client.is_archived("job-1") and not await client.is_archived("job-3")
+        # Only job-3 still references the shared workflow
+        digest = (await client.get_job("job-3")).workflow_hash
+        assert await server.hget(f"workflow:{digest}", "refs") == "1"
+
+        stats = await client.get_all_queue_stats()
+        assert stats == {"pending": 1, "leased": 0, "running": 0, "completed": 1, "failed": 1}
+        job = archive.get("job-1")
+        assert job.status == JobStatus.COMPLETED
+        assert job.result == {"images": ["out.png"]}
+        assert job.workflow == {"1": {"class_type": "KSampler"}}
+
+    @pytest.mark.asyncio
+    async def test_keeps_recent_jobs(self, fake_async_client, archive):
+        """Test jobs finished within the retention age stay in Redis"""
+        client, server = fake_async_client
+        await self.finish(client, server, "job-1")
+
+        assert await archive_finished_jobs(client, archive, older_than=3600) == 0
+
+        assert await client.get_job("job-1") is not None
+        assert archive.count() == 0
+
+    @pytest.mark.asyncio
+    async def test_batches(self, fake_async_client, archive):
+        """Test a backlog larger than the batch size is archived in one run"""
+        client, server = fake_async_client
+        for i in range(5):
+            await self.finish(client, server, f"job-{i}")
+
+        assert await archive_finished_jobs(client, archive, older_than=-1, batch_size=2) == 5
+        assert archive.count() == 5
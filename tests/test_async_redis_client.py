@@ -0,0 +1,507 @@
+"""
+Tests for the asyncio Redis client used by the queue manager service
+"""
+import pytest
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, patch
+from redis.exceptions import RedisError
+
+from models import Job, JobStatus, JobPriority, QueueMode, TraceSpan
+
+
+@pytest.fixture
+def fake_async_client():
+    """Create an AsyncRedisClient backed by async fakeredis"""
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    server = fakeredis.FakeAsyncRedis(decode_responses=True, encoding_errors="surrogateescape")
+    with patch('async_redis_client.Redis', return_value=server):
+        from async_redis_client import AsyncRedisClient
+        client = AsyncRedisClient()
+    return client, server
+
+
+def make_job(job_id, user_id="user-1", priority=JobPriority.NORMAL):
+    return Job(id=job_id, user_id=user_id, workflow={"1": {"class_type": "test"}}, priority=priority)
+
+
+class TestAsyncJobOperations:
+    """Test job CRUD through the async client"""
+
+    @pytest.mark.asyncio
+    async def test_create_and_get_job(self, fake_async_client):
+        """Test a created job is queued and readable"""
+        client, server = fake_async_client
+        assert await client.create_job(make_job("job-1")) is True
+
+        job = await client.get_job("job-1")
+        assert job.id == "job-1"
+        assert job.status == JobStatus.PENDING
+        assert await client.get_queue_depth() == 1
+
+    @pytest.mark.asyncio
+    async def test_get_nonexistent_job(self, fake_async_client):
+        """Test missing jobs return None"""
+        client, _ = fake_async_client
+        assert await client.get_job("missing") is None
+
+    @pytest.mark.asyncio
+    async def test_delete_job(self, fake_async_client):
+        """Test deleting a pending job removes it everywhere"""
+        client, server = fake_async_client
+        await client.create_job(make_job("job-1"))
+
+        assert await client.delete_job("job-1") is True
+        assert await client.get_job("job-1") is None
+        assert await server.zcard(client.QUEUE_ROUND_ROBIN) == 0
+
+    @pytest.mark.asyncio
+    async def test_shared_workflow_stored_once(self, fake_async_client):
+        """Test identical workflows are stored once and released with the last job"""
+        client, server = fake_async_client
+        await client.create_job(make_job("job-1"))
+        await client.create_job(make_job("job-2"))
+
+        assert len(await server.keys("workflow:*")) == 1
+        assert (await client.get_jobs(["job-1", "job-2"]))[1].workflow == {"1": {"class_type": "test"}}
+
+        await client.delete_job("job-1")
+        await client.delete_job("job-2")
+        assert await server.keys("workflow:*") == []
+
+    @pytest.mark.asyncio
+    async def test_create_job_redis_error(self, fake_async_client):
+        """Test Redis errors are reported as failure, not raised"""
+        client, _ = fake_async_client
+        client._enqueue_jobs_script = AsyncMock(side_effect=RedisError("down"))
+
+        assert await client.create_job(make_job("job-1")) is None
+
+
+class TestAsyncQueueOperations:
+    """Test claiming and state transitions through the async client"""
+
+    @pytest.mark.asyncio
+    async def test_claim_next_job(self, fake_async_client):
+        """Test a claim moves the job to running and stamps the worker"""
+        client, server = fake_async_client
+        await client.create_job(make_job("job-1"))
+
+        job = await client.claim_next_job("worker-1", QueueMode.FIFO)
+
+        assert job.status == JobStatus.RUNNING
+        assert job.worker_id == "worker-1"
+        stats = await client.get_all_queue_stats()
+        assert stats == {"pending": 0, "leased": 0, "running": 1, "completed": 0, "failed": 0}
+
+    @pytest.mark.asyncio
+    async def test_round_robin_claim(self, fake_async_client):
+        """Test round-robin claims alternate between users"""
+        client, server = fake_async_client
+        await server.set("user:alice:completed", 2)
+        await client.create_job(make_job("a-1", "alice"))
+        await client.create_job(make_job("b-1", "bob"))
+
+        job = await client.claim_next_job("worker-1", QueueMode.ROUND_ROBIN)
+        assert job.id == "b-1"
+
+    @pytest.mark.asyncio
+    async def test_concurrent_claims_are_exclusive(self, fake_async_client):
+        """Test concurrent claims never hand out the same job twice"""
+        client, _ = fake_async_client
+        for i in range(5):
+            await client.create_job(make_job(f"job-{i}", f"user-{i % 2}"))
+
+        claimed = await asyncio.gather(
+            *(client.claim_next_job(f"worker-{i}", QueueMode.ROUND_ROBIN) for i in range(8))
+        )
+
+        ids = [job.id for job in claimed if job]
+        assert len(ids) == 5
+        assert len(set(ids)) == 5
+
+    @pytest.mark.asyncio
+    async def test_complete_and_fail(self, fake_async_client):
+        """Test completion and failure bookkeeping"""
+        client, server = fake_async_client
+        await client.create_job(make_job("job-1"))
+        await client.create_job(make_job("job-2"))
+        await client.claim_next_job("worker-1")
+        await client.claim_next_job("worker-1")
+
+        assert (await client.move_job_to_completed("job-1", {"ok": True}, "worker-1")).result == {"ok": True}
+        assert await client.move_job_to_failed("job-2", "boom", "worker-2") is None
+        assert (await client.move_job_to_failed("job-2", "boom")).status == JobStatus.FAILED
+
+        assert (await client.get_job("job-1")).status == JobStatus.COMPLETED
+        assert (await client.get_job("job-2")).error == "boom"
+        assert await server.get("user:user-1:completed") == "1"
+
+    @pytest.mark.asyncio
+    async def test_update_pending_priority(self, fake_async_client):
+        """Test re-scoring a pending job changes claim order"""
+        client, _ = fake_async_client
+        await client.create_job(make_job("job-1"))
+        job = make_job("job-2")
+        await client.create_job(job)
+
+        job.priority = JobPriority.INSTRUCTOR
+        assert await client.update_pending_priority(job) is True
+
+        claimed = await client.claim_next_job("worker-1", QueueMode.PRIORITY)
+        assert claimed.id == "job-2"
+
+    @pytest.mark.asyncio
+    async def test_long_poll_wakes_on_submit(self, fake_async_client):
+        """Test a waiting claim picks up a job as soon as it is submitted"""
+        client, _ = fake_async_client
+        loop = asyncio.get_running_loop()
+
+        async def submit_later():
+            await asyncio.sleep(0.2)
+            await client.create_job(make_job("job-1"))
+            return loop.time()
+
+        waiter = asyncio.ensure_future(client.claim_next_job("worker-1", wait=5))
+        submitted_at = await submit_later()
+        job = await waiter
+
+        assert job.id == "job-1"
+        assert loop.time() - submitted_at < 0.05
+
+    @pytest.mark.asyncio
+    async def test_long_poll_times_out(self, fake_async_client):
+        """Test a waiting claim returns None after the wait, and stale tokens are harmless"""
+        client, server = fake_async_client
+        await server.rpush(client.QUEUE_WAKEUP, "already-claimed")
+        loop = asyncio.get_running_loop()
+
+        start = loop.time()
+        assert await client.claim_next_job("worker-1", wait=0.3) is None
+        assert 0.25 <= loop.time() - start < 1.0
+
+    @pytest.mark.asyncio
+    async def test_long_poll_uses_own_pool(self, fake_async_client):
+        """Test a waiting claim blocks on the long-poll pool, not the command pool"""
+        client, _ = fake_async_client
+        client.long_poll_redis = AsyncMock()
+        client.long_poll_redis.blpop.return_value = None
+
+        assert await client.claim_next_job("worker-1", wait=0.05) is None
+
+        client.long_poll_redis.blpop.assert_awaited()
+        assert client.long_poll_redis.blpop.call_args.args[0] == [client.QUEUE_WAKEUP]
+        assert not client.long_polls.locked()
+
+    @pytest.mark.asyncio
+    async def test_long_polls_capped(self, fake_async_client):
+        """Test claims past worker_max_long_polls wait without holding a connection"""
+        import async_redis_client
+        client, _ = fake_async_client
+        client.long_poll_redis = AsyncMock()
+        client.long_polls = asyncio.Semaphore(0)  # every long-poll slot taken
+        loop = asyncio.get_running_loop()
+
+        with patch.object(async_redis_client.settings, "worker_poll_interval", 0.02):
+            waiter = asyncio.ensure_future(client.claim_next_job("worker-1", wait=2))
+            await asyncio.sleep(0.05)
+            await client.create_job(make_job("job-1"))
+            submitted_at = loop.time()
+            job = await waiter
+
+        assert job.id == "job-1"
+        assert loop.time() - submitted_at < 0.1
+        client.long_poll_redis.blpop.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_wakeup_tokens_bounded(self, fake_async_client):
+        """Test tokens do not pile up while no worker is waiting"""
+        client, server = fake_async_client
+        for i in range(100):
+            await client.create_job(make_job(f"job-{i}"))
+
+        assert await server.llen(client.QUEUE_WAKEUP) == 64
+
+    @pytest.mark.asyncio
+    async def test_queue_estimates(self, fake_async_client):
+        """Test positions for pending jobs only, waiting behind the running job"""
+        client, _ = fake_async_client
+        await client.create_job(make_job("job-1"))
+        await client.create_job(make_job("job-2"))
+        await client.claim_next_job("worker-1")
+        await client.update_worker_heartbeat("worker-1")
+
+        estimates = await client.get_queue_estimates(["job-1", "job-2"])
+
+        assert list(estimates) == ["job-2"]
+        position, wait_time = estimates["job-2"]
+        assert position == 0
+        assert 58 <= wait_time <= 60  # default_job_runtime, minus the time job-1 has run
+
+
+class TestAsyncPrefetchLeases:
+    """Test prefetch leases through the async client"""
+
+    @pytest.mark.asyncio
+    async def test_lease_start_and_requeue(self, fake_async_client):
+        """Test leasing, starting and requeueing an expired lease"""
+        client, server = fake_async_client
+        await client.create_job(make_job("job-1"))
+        await client.create_job(make_job("job-2"))
+
+        leased = await client.lease_jobs("worker-1", 1)
+        await client.lease_jobs("worker-2", 1, lease_seconds=-1)
+        assert [job.id for job in leased] == ["job-1"]
+        assert await client.renew_leases("worker-1", ["job-1", "job-2"]) == ["job-1"]
+
+        started = await client.start_leased_job("job-1", "worker-1")
+        assert started.status == JobStatus.RUNNING
+        assert await client.requeue_expired_leases() == 1
+        assert await server.zrange(client.QUEUE_PENDING, 0, -1) == ["job-2"]
+        assert await server.zcard(client.QUEUE_LEASED) == 0
+
+    @pytest.mark.asyncio
+    async def test_running_lease_requeue(self, fake_async_client):
+        """Test renewing a running job's lease, then requeueing it once expired"""
+        client, server = fake_async_client
+        await client.create_job(make_job("job-1"))
+        await client.claim_next_job("worker-1")
+
+        assert await client.renew_leases("worker-1", ["job-1"]) == ["job-1"]
+        assert await client.requeue_expired_jobs() == 0
+        await server.zadd(client.QUEUE_RUNNING_LEASES, {"job-1": time.time() - 1})
+        assert await client.requeue_expired_jobs() == 1
+
+        job = await client.get_job("job-1")
+        assert job.status == JobStatus.PENDING
+        assert job.attempts == 1
+        assert await server.zrange(client.QUEUE_PENDING, 0, -1) == ["job-1"]
+
+    @pytest.mark.asyncio
+    async def test_cancelled_job_not_requeued(self, fake_async_client):
+        """Test cancelling drops the running lease, so expiry cannot requeue the job"""
+        client, server = fake_async_client
+        await client.create_job(make_job("job-1"))
+        job = await client.claim_next_job("worker-1")
+
+        assert await client.cancel_running_job(job) is True
+        assert await server.zcard(client.QUEUE_RUNNING) == 0
+        assert await server.zcard(client.QUEUE_RUNNING_LEASES) == 0
+        assert await client.renew_leases("worker-1", ["job-1"]) == []
+        await server.zadd(client.QUEUE_RUNNING_LEASES, {"job-1": time.time() - 1})
+        assert await client.requeue_expired_jobs() == 0
+
+        assert (await client.get_job("job-1")).status == JobStatus.CANCELLED
+        assert await server.zcard(client.QUEUE_PENDING) == 0
+        assert await client.move_job_to_completed("job-1", {"ok": True}, "worker-1") is None
+
+    @pytest.mark.asyncio
+    async def test_job_pages(self, fake_async_client):
+        """Test paging a user's history through the async client"""
+        client, server = fake_async_client
+        for i in range(3):
+            await client.create_job(make_job(f"job-{i}"))
+        await client.claim_next_job("worker-1")
+        await server.delete(*await server.keys("*index*"))
+        assert await client.rebuild_job_indexes() == 3
+
+        jobs, cursor = await client.get_job_page(user_id="user-1", limit=2)
+        rest, last = await client.get_job_page(user_id="user-1", cursor=cursor, limit=2)
+
+        assert [job.id for job in jobs + rest] == ["job-2", "job-1", "job-0"]
+        assert last is None
+        running, _ = await client.get_job_page(status=JobStatus.RUNNING)
+        assert [job.id for job in running] == ["job-0"]
+
+
+class TestAsyncPubSub:
+    """Test pub/sub through the async client"""
+
+    @pytest.mark.asyncio
+    async def test_job_events_published(self, fake_async_client):
+        """Test job creation is published to subscribers when the pub/sub fast path is on"""
+        client, _ = fake_async_client
+        pubsub = await client.subscribe_to_updates()
+        await pubsub.get_message(timeout=0.1)  # subscribe confirmation
+
+        with patch('redis_client.settings.event_pubsub', True):
+            await client.create_job(make_job("job-1"))
+
+        message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+        assert message is not None
+        assert '"job_created"' in message["data"]
+        await pubsub.aclose()
+
+    @pytest.mark.asyncio
+    async def test_read_events(self, fake_async_client):
+        """Test a consumer group reads and acknowledges job events"""
+        client, _ = fake_async_client
+        await client.ensure_event_group("replica-a")
+
+        await client.create_job(make_job("job-1"))
+        events = await client.read_events("replica-a", "listener", block_ms=100)
+
+        assert [event["type"] for _, event in events] == ["job_created"]
+        await client.ack_events("replica-a", [entry_id for entry_id, _ in events])
+        assert await client.get_event_lag("replica-a") == 0
+
+    @pytest.mark.asyncio
+    async def test_job_events_are_deltas(self, fake_async_client):
+        """Test job events carry changed fields and the job's version, not its payloads"""
+        client, _ = fake_async_client
+        await client.ensure_event_group("replica-a")
+
+        await client.create_job(make_job("job-1"))
+        await client.claim_next_job("worker-1")
+        await client.move_job_to_completed("job-1", {"images": ["x" * 1000]})
+        events = await client.read_events("replica-a", "listener", block_ms=100)
+
+        completed = events[-1][1]["data"]
+        assert completed["status"] == "completed"
+        assert completed["version"] == 2
+        assert "result" in completed["changed"] and "result" not in completed
+        assert (await client.get_job("job-1")).version == 2
+
+
+class TestAsyncRuntimeStats:
+    """Test runtime recording and ETAs through the async client"""
+
+    @staticmethod
+    async def run_job(client, server, runtime):
+        """Claim and complete the next job, as if it had run for runtime seconds"""
+        job = await client.claim_next_job("worker-1")
+        started = datetime.now(timezone.utc) - timedelta(seconds=runtime)
+        await server.hset(client.JOB_KEY.format(job_id=job.id), "started_at", started.isoformat())
+        await client.move_job_to_completed(job.id, {"ok": True})
+
+    @pytest.mark.asyncio
+    async def test_runtime_statistics(self, fake_async_client):
+        """Test completed runtimes feed a per-signature EWMA and quantiles"""
+        client, server = fake_async_client
+        for i, runtime in enumerate((10, 20, 30)):
+            await client.create_job(make_job(f"job-{i}"))
+            await self.run_job(client, server, runtime)
+
+        stats = await client.get_runtime_stats()
+
+        assert len(stats) == 1
+        assert stats[0].signature == (await client.get_job("job-0")).signature
+        assert stats[0].count == 3
+        assert stats[0].ewma == pytest.approx(10 + 0.3 * 10 + 0.3 * (30 - 13), abs=0.1)
+        assert stats[0].p50 == pytest.approx(20, abs=0.1)
+        assert await server.hget(client.STATS_JOB_RUNTIME, "count") == "3"
+
+    @pytest.mark.asyncio
+    async def test_wait_time_uses_recorded_runtime(self, fake_async_client):
+        """Test ETAs use the recorded runtime of the workflow ahead"""
+        client, server = fake_async_client
+        await client.create_job(make_job("job-0"))
+        await self.run_job(client, server, 90)
+        for i in (1, 2):
+            await client.create_job(make_job(f"job-{i}"))
+        await client.update_worker_heartbeat("worker-1")
+
+        estimates = await client.get_queue_estimates(["job-1", "job-2"])
+
+        assert estimates["job-1"] == (0, 0)
+        assert estimates["job-2"][0] == 1
+        assert estimates["job-2"][1] == pytest.approx(90, abs=1)
+
+
+class TestAsyncWorkerRegistry:
+    """Test the worker registry through the async client"""
+
+    @pytest.mark.asyncio
+    async def test_live_workers(self, fake_async_client):
+        """Test heartbeats register workers with what they report, and running jobs make them busy"""
+        client, _ = fake_async_client
+        assert await client.update_worker_heartbeat("worker-1", provider="verda", capacity=1)
+        assert await client.update_worker_heartbeat("worker-2", provider="runpod", capacity=2)
+        await client.create_job(make_job("job-1"))
+        await client.claim_next_job("worker-2")
+        await client.move_job_to_completed("job-1", {}, "worker-2")
+        await client.create_job(make_job("job-2"))
+        await client.claim_next_job("worker-2")
+
+        workers = await client.get_workers()
+
+        assert [(w.worker_id, w.status, w.current_job_id) for w in workers] == [
+            ("worker-1", "idle", None), ("worker-2", "busy", "job-2"),
+        ]
+        assert (workers[1].provider, workers[1].capacity, workers[1].jobs_completed) == ("runpod", 2, 1)
+        assert await client.count_live_workers() == 2
+        assert await client.is_worker_alive("worker-1") is True
+
+    @pytest.mark.asyncio
+    async def test_silent_workers_offline(self, fake_async_client):
+        """Test workers past the heartbeat timeout are offline, then forgotten"""
+        client, server = fake_async_client
+        now = time.time()
+        await client.update_worker_heartbeat("worker-1")
+        await server.zadd(client.WORKERS_ALIVE, {"worker-2": now - 120, "worker-3": now - 3600})
+
+        assert [w.worker_id for w in await client.get_workers()] == ["worker-1"]
+        offline = await client.get_workers(include_offline=True)
+        assert [(w.worker_id, w.status) for w in offline] == [("worker-1", "idle"), ("worker-2", "offline")]
+        assert await client.count_live_workers() == 1
+        assert await client.is_worker_alive("worker-2") is False
+
+        await client.update_worker_heartbeat("worker-1")
+        assert await server.zscore(client.WORKERS_ALIVE, "worker-3") is None
+
+
+class TestAsyncTraces:
+    """Test trace spans through the async client"""
+
+    @staticmethod
+    def span(name, start):
+        return TraceSpan(
+            name=name, service="queue-manager", trace_id="0" * 31 + "1", span_id="0" * 15 + "1",
+            start_time=start, end_time=start + timedelta(seconds=1),
+        )
+
+    @pytest.mark.asyncio
+    async def test_record_and_read_spans(self, fake_async_client):
+        """Test spans are appended in order and expire after the retention period"""
+        client, server = fake_async_client
+        now = datetime.now(timezone.utc)
+
+        assert await client.record_spans("job-1", [self.span("queue.submit", now)], 3600)
+        assert await client.record_spans("job-1", [self.span("queue.wait", now)], 3600)
+        assert await client.record_spans("job-1", [], 3600)
+
+        assert [span.name for span in await client.get_spans("job-1")] == ["queue.submit", "queue.wait"]
+        assert 0 < await server.ttl(client.JOB_SPANS.format(job_id="job-1")) <= 3600
+        assert await client.get_spans("job-2") == []
+
+
+class TestAsyncArchive:
+    """Test the archive operations of the async client"""
+
+    @pytest.mark.asyncio
+    async def test_finished_jobs_replaced_by_tombstones(self, fake_async_client):
+        """Test finished jobs are listed by age and removed once archived"""
+        client, server = fake_async_client
+        for i in range(3):
+            await client.create_job(make_job(f"job-{i}"))
+        for _ in range(2):
+            await client.claim_next_job("worker-1")
+        await client.move_job_to_completed("job-0", {"ok": True})
+        await client.move_job_to_failed("job-1", "boom")
+
+        assert await client.get_finished_jobs(time.time() - 3600) == []
+        finished = await client.get_finished_jobs(time.time() + 1)
+        assert [job.id for job in finished] == ["job-0", "job-1"]
+        assert finished[0].workflow == {"1": {"class_type": "test"}}
+
+        assert await client.remove_archived_jobs(finished) == 2
+
+        assert await client.is_archived("job-0") and await client.is_archived("job-1")
+        assert not await client.is_archived("job-2")
+        assert not await server.exists("job:job-0", "job:job-1")
+        assert await client.get_all_queue_stats() == {
+            "pending": 1, "leased": 0, "running": 0, "completed": 1, "failed": 1,
+        }
+        assert await client.remove_archived_jobs(finished) == 0
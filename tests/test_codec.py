@@ -0,0 +1,96 @@
+"""
+Tests for the job payload codec
+"""
+import pytest
+import json
+
+from codec import PayloadCodec, MAGIC, VERSION, FORMAT_JSON, FORMAT_MSGPACK, FLAG_ZSTD
+
+pytest.importorskip("msgpack")
+pytest.importorskip("zstandard")
+
+
+@pytest.fixture
+def codec():
+    return PayloadCodec("msgpack", compression_threshold=1024)
+
+
+def video_result(frames=240):
+    """Output manifest shaped like a ComfyUI history entry for a video job"""
+    return {
+        "prompt_id": "9f1c",
+        "status": "completed",
+        "outputs": {
+            "75": {"images": [
+                {"filename": f"ltx2_{i:05d}_.png", "subfolder": "user001", "type": "output"}
+                for i in range(frames)
+            ]},
+            "76": {"gifs": [{"filename": "ltx2_00001.mp4", "subfolder": "user001", "format": "video/h264-mp4"}]},
+        },
+        "execution_time": 182.4,
+    }
+
+
+class TestPayloadCodec:
+    """Test encoding, compression and legacy reads"""
+
+    def test_small_payload_msgpack_uncompressed(self, codec):
+        """Test small payloads get the header and a plain msgpack body"""
+        data = codec.encode({"a": 1})
+        assert data[:3] == bytes((MAGIC, VERSION, FORMAT_MSGPACK))
+        assert codec.decode(data) == {"a": 1}
+
+    def test_large_payload_compressed(self, codec):
+        """Test payloads above the threshold are zstd-compressed"""
+        result = video_result()
+        data = codec.encode(result)
+
+        assert data[2] == FORMAT_MSGPACK | FLAG_ZSTD
+        assert len(data) * 5 < len(json.dumps(result))
+        assert codec.decode(data) == result
+
+    def test_reads_legacy_json(self, codec):
+        """Test plain JSON written before the codec is still read"""
+        assert codec.decode('{"a": [1, 2]}') == {"a": [1, 2]}
+        assert codec.decode(b'{"a": []}') == {"a": []}
+
+    def test_reads_surrogateescaped_str(self, codec):
+        """Test binary values returned as str by the Redis client decode"""
+        data = codec.encode(video_result())
+        assert codec.decode(data.decode("utf-8", "surrogateescape")) == video_result()
+
+    def test_preserves_json_values(self, codec):
+        """Test large seeds, unicode, floats and empty containers round-trip"""
+        value = {"seed": 0xFFFFFFFFFFFFFFFF, "neg": -2 ** 63, "text": "café ☕", "x": 0.1, "e": [], "d": {}}
+        assert codec.decode(codec.encode(value)) == value
+
+    def test_oversized_int_falls_back_to_json(self, codec):
+        """Test integers msgpack cannot hold are stored as JSON"""
+        value = {"seed": 2 ** 70}
+        data = codec.encode(value)
+        assert data[2] == FORMAT_JSON
+        assert codec.decode(data) == value
+
+    def test_json_codec(self):
+        """Test the json body format (msgpack disabled)"""
+        codec = PayloadCodec("json", compression_threshold=0)
+        data = codec.encode({"a": "é"})
+        assert data[2] == FORMAT_JSON
+        assert codec.decode(data) == {"a": "é"}
+        # Other codecs can still read it
+        assert PayloadCodec().decode(data) == {"a": "é"}
+
+    def test_unknown_version_rejected(self, codec):
+        """Test values from a newer format version are refused, not misread"""
+        with pytest.raises(ValueError):
+            codec.decode(bytes((MAGIC, VERSION + 1, FORMAT_MSGPACK)) + b"\x80")
+
+    def test_corrupt_compressed_payload(self, codec):
+        """Test corrupt compressed data raises ValueError"""
+        with pytest.raises(ValueError):
+            codec.decode(bytes((MAGIC, VERSION, FORMAT_MSGPACK | FLAG_ZSTD)) + b"garbage")
+
+    def test_unknown_codec_name(self):
+        """Test a misconfigured codec name fails fast"""
+        with pytest.raises(ValueError):
+            PayloadCodec("pickle")
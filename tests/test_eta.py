@@ -0,0 +1,84 @@
+"""
+Tests for workflow signatures and the ETA schedule
+"""
+import pytest
+import copy
+import json
+from pathlib import Path
+
+from eta import workflow_signature, quantile, estimate_starts
+
+WORKFLOWS = Path(__file__).resolve().parent.parent / "data" / "workflows"
+
+
+def api_workflow(steps=20, width=1024, seed=1, prompt="a cat"):
+    return {
+        "3": {"class_type": "KSampler", "inputs": {"steps": steps, "seed": seed, "cfg": 7.5, "model": ["4", 0]}},
+        "4": {"class_type": "CheckpointLoaderSimple", "inputs": {"ckpt_name": "sdxl.safetensors"}},
+        "5": {"class_type": "EmptyLatentImage", "inputs": {"width": width, "height": 1024, "batch_size": 1}},
+        "6": {"class_type": "CLIPTextEncode", "inputs": {"text": prompt, "clip": ["4", 1]}},
+    }
+
+
+def ui_workflow(name):
+    return json.loads((WORKFLOWS / name).read_text())
+
+
+class TestWorkflowSignature:
+    """Test which workflow edits change the runtime statistics key"""
+
+    def test_prompt_and_seed_ignored(self):
+        """Test resubmissions with a new prompt or seed share a signature"""
+        assert workflow_signature(api_workflow()) == workflow_signature(api_workflow(seed=99, prompt="a dog"))
+
+    def test_size_inputs_change_signature(self):
+        """Test steps and resolution are part of the signature"""
+        base = workflow_signature(api_workflow())
+        assert workflow_signature(api_workflow(steps=40)) != base
+        assert workflow_signature(api_workflow(width=512)) != base
+
+    def test_ui_workflows_differ(self):
+        """Test the shipped workflows (UI format) get distinct signatures"""
+        names = ["flux2_klein_4b_text_to_image.json", "flux2_klein_9b_text_to_image.json",
+                 "ltx2_text_to_video.json", "ltx2_text_to_video_distilled.json"]
+        signatures = {workflow_signature(ui_workflow(name)) for name in names}
+        assert len(signatures) == len(names)
+
+    def test_ui_widget_edits(self):
+        """Test UI-format prompt and seed edits keep the signature, a resolution edit does not"""
+        workflow = ui_workflow("flux2_klein_4b_text_to_image.json")
+        edited = copy.deepcopy(workflow)
+        for node in edited["nodes"]:
+            if node["type"] == "PrimitiveStringMultiline":
+                node["widgets_values"][0] = "A fox in the snow"
+        edited["nodes"][2]["widgets_values"][3] = 987654321  # seed
+        assert workflow_signature(edited) == workflow_signature(workflow)
+
+        edited["nodes"][2]["widgets_values"][1] = 512  # width
+        assert workflow_signature(edited) != workflow_signature(workflow)
+
+
+class TestQuantile:
+    """Test quantile interpolation"""
+
+    def test_quantiles(self):
+        assert quantile([10, 20, 30, 40], 0.5) == 25
+        assert quantile([30, 10, 20], 0.9) == pytest.approx(28)
+        assert quantile([5], 0.9) == 5
+        assert quantile([], 0.5) == 0.0
+
+
+class TestEstimateStarts:
+    """Test replaying the queue across workers"""
+
+    def test_single_worker_serial(self):
+        assert estimate_starts([10, 20, 30], [], 1) == [0, 10, 30]
+
+    def test_jobs_take_first_free_worker(self):
+        assert estimate_starts([10, 20, 30, 5], [], 2) == [0, 0, 10, 20]
+
+    def test_running_jobs_occupy_workers(self):
+        """Test queued jobs wait for the remaining time of running jobs"""
+        assert estimate_starts([10, 10], [15], 2) == [0, 10]
+        # More running jobs than reported workers: every one holds a worker
+        assert estimate_starts([10], [15, 5], 1) == [5]
@@ -0,0 +1,192 @@
+"""
+Tests for the load generator (scripts/load_test.py)
+"""
+import pytest
+import functools
+import json
+import os
+import sys
+import time
+import urllib.request
+from argparse import Namespace
+
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+
+import load_test
+
+
+WORKFLOWS = {"small": {"1": {"class_type": "small"}}, "large": {"1": {"class_type": "large"}}}
+
+
+def run_args(**overrides):
+    args = dict(
+        url="http://queue-manager", users=4, jobs_per_user=2, mix={"small": 1.0, "large": 1.0}, think_time=0.0,
+        burst_fraction=1.0, burst_at=0.0, burst_window=0.0, ramp=0.0, poll_interval=0.001,
+        sample_interval=0.01, timeout=5.0, http_timeout=5.0, max_connections=10, seed=1, keep=False,
+    )
+    args.update(overrides)
+    return Namespace(**args)
+
+
+def fake_queue_manager(fail_every=0):
+    """httpx handler standing in for the queue manager: every job finishes on its first poll"""
+    jobs = {}
+
+    def handle(request):
+        path = request.url.path
+        if request.method == "POST" and path == "/api/jobs":
+            job_id = f"job-{len(jobs) + 1}"
+            failed = fail_every and (len(jobs) + 1) % fail_every == 0
+            jobs[job_id] = "failed" if failed else "completed"
+            return httpx.Response(201, json={"id": job_id, "status": "pending"})
+        if path == "/api/queue/status":
+            return httpx.Response(200, json={"pending_jobs": len(jobs), "running_jobs": 0})
+        if path.endswith("/timeline"):
+            return httpx.Response(200, json={"spans": [
+                {"name": "queue.wait", "duration_seconds": 1.5},
+                {"name": "queue.dispatch", "duration_seconds": 0.002},
+            ]})
+        job_id = path.rsplit("/", 1)[-1]
+        return httpx.Response(200, json={"id": job_id, "status": jobs[job_id]})
+
+    return handle
+
+
+async def run(args, handler):
+    """run_load against handler instead of a network queue manager"""
+    plan = load_test.build_plan(
+        args.users, args.jobs_per_user, args.mix, args.think_time,
+        args.burst_fraction, args.burst_at, args.burst_window, args.ramp, args.seed
+    )
+    client = functools.partial(httpx.AsyncClient, transport=httpx.MockTransport(handler))
+    with pytest.MonkeyPatch.context() as patched:
+        patched.setattr(httpx, "AsyncClient", client)
+        return await load_test.run_load(args, plan, WORKFLOWS)
+
+
+class TestStatistics:
+    """Test percentiles and latency summaries"""
+
+    def test_percentile_interpolates(self):
+        """Test percentiles interpolate linearly between samples"""
+        values = [4.0, 1.0, 3.0, 2.0]
+
+        assert load_test.percentile(values, 0) == 1.0
+        assert load_test.percentile(values, 50) == 2.5
+        assert load_test.percentile(values, 90) == pytest.approx(3.7)
+        assert load_test.percentile(values, 100) == 4.0
+        assert load_test.percentile([], 99) == 0.0
+
+    def test_summarize(self):
+        """Test a summary has count, mean, max and every reported percentile"""
+        summary = load_test.summarize([float(n) for n in range(1, 101)])
+
+        assert summary["count"] == 100
+        assert summary["mean"] == 50.5
+        assert summary["max"] == 100.0
+        assert summary["p50"] == pytest.approx(50.5)
+        assert summary["p99"] == pytest.approx(99.01)
+        assert set(summary) == {"count", "mean", "max", *(f"p{p}" for p in load_test.PERCENTILES)}
+
+    def test_summarize_empty(self):
+        """Test an operation with no samples reports zeros"""
+        assert load_test.summarize([]) == {"count": 0, "mean": 0.0, "p50": 0.0, "p90": 0.0, "p95": 0.0,
+                                           "p99": 0.0, "max": 0.0}
+
+
+class TestScenario:
+    """Test the user plan"""
+
+    def test_plan_is_reproducible(self):
+        """Test the same seed gives the same plan, and another seed a different one"""
+        plan = functools.partial(load_test.build_plan, 10, 3, {"small": 3.0, "large": 1.0}, 5.0, 0.5, 10.0, 2.0, 30.0)
+
+        assert plan(seed=7) == plan(seed=7)
+        assert plan(seed=7) != plan(seed=8)
+
+    def test_burst_users_start_together(self):
+        """Test burst_fraction of the users start within the burst window"""
+        plan = load_test.build_plan(10, 1, {"small": 1.0}, 0.0, 0.5, 10.0, 2.0, 5.0, seed=1)
+
+        bursting = [user for user in plan if 10.0 <= user.start <= 12.0]
+        assert len(bursting) == 5
+        assert all(user.start <= 5.0 for user in plan if user not in bursting)
+
+    def test_parse_mix(self):
+        """Test weights default to 1 and unknown workflows are rejected"""
+        assert load_test.parse_mix(["small=3", "large"], list(WORKFLOWS)) == {"small": 3.0, "large": 1.0}
+        assert load_test.parse_mix([], list(WORKFLOWS)) == {"small": 1.0, "large": 1.0}
+        with pytest.raises(SystemExit):
+            load_test.parse_mix(["missing"], list(WORKFLOWS))
+
+
+class TestRun:
+    """Smoke runs against a stand-in queue manager"""
+
+    @pytest.mark.asyncio
+    async def test_report(self, capsys):
+        """Test a run counts jobs and requests and summarises their latencies"""
+        result = await run(run_args(), fake_queue_manager())
+
+        assert result["jobs"]["submitted"] == 8
+        assert result["jobs"]["completed"] == 8
+        assert result["jobs"]["unfinished"] == 0
+        assert result["requests"]["submit"] == {"count": 8, "errors": 0, "error_rate": 0.0}
+        latency = result["latency_seconds"]
+        assert latency["submit"]["count"] == 8
+        assert latency["end_to_end"]["count"] == 8
+        assert latency["queue_wait"]["p50"] == 1.5
+        assert latency["dispatch"]["max"] == 0.002
+        assert result["queue_depth"]
+        json.dumps(result)
+
+        load_test.print_summary(result)
+        output = capsys.readouterr().out
+        assert "8 submitted, 8 completed, 0 failed" in output
+        assert "queue_wait" in output and "p99" in output
+
+    @pytest.mark.asyncio
+    async def test_failed_jobs_and_errors_counted(self):
+        """Test failed jobs and server errors show up in the report"""
+        handler = fake_queue_manager(fail_every=2)
+
+        def flaky(request):
+            if request.url.path == "/api/queue/status":
+                return httpx.Response(503)
+            return handler(request)
+
+        result = await run(run_args(users=2), flaky)
+
+        assert result["jobs"]["failed"] == 2
+        assert result["jobs"]["completed"] == 2
+        assert result["requests"]["queue_status"]["error_rate"] == 1.0
+        assert result["max_queue_depth"] == 0
+
+
+class TestFakeComfyUI:
+    """Test the stand-in ComfyUI API"""
+
+    def test_prompt_runs_to_history(self):
+        """Test a queued prompt executes and reports success in /history"""
+        workflow = WORKFLOWS["small"]
+        fake = load_test.FakeComfyUI({load_test.workflow_digest(workflow): 0.01})
+        server = fake.serve("127.0.0.1", 0)
+        base = f"http://127.0.0.1:{server.server_address[1]}"
+        try:
+            request = urllib.request.Request(
+                f"{base}/prompt", data=json.dumps({"prompt": workflow}).encode(), method="POST"
+            )
+            prompt_id = json.load(urllib.request.urlopen(request))["prompt_id"]
+
+            deadline = time.monotonic() + 5
+            history = {}
+            while prompt_id not in history and time.monotonic() < deadline:
+                time.sleep(0.01)
+                history = json.load(urllib.request.urlopen(f"{base}/history/{prompt_id}"))
+
+            assert history[prompt_id]["status"]["status_str"] == "success"
+            assert json.load(urllib.request.urlopen(f"{base}/queue")) == {"queue_running": [], "queue_pending": []}
+        finally:
+            server.shutdown()
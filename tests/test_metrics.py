@@ -0,0 +1,107 @@
+"""
+Tests for the Prometheus metrics
+"""
+import pytest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+import metrics
+from models import Job, JobStatus
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+class TestJobLifecycle:
+    """Test queue wait and run time observations"""
+
+    def test_job_started_observes_queue_wait(self):
+        """Test the wait from submission to start is observed"""
+        created = datetime.now(timezone.utc)
+        job = Job(user_id="alice", workflow={}, created_at=created, started_at=created + timedelta(seconds=42))
+        count = sample("comfy_job_queue_wait_seconds_count")
+        total = sample("comfy_job_queue_wait_seconds_sum")
+
+        metrics.job_started(job)
+
+        assert sample("comfy_job_queue_wait_seconds_count") == count + 1
+        assert sample("comfy_job_queue_wait_seconds_sum") == pytest.approx(total + 42)
+
+    def test_job_finished_labels_status(self):
+        """Test run time is observed per final status, and unstarted jobs are skipped"""
+        started = datetime.now(timezone.utc)
+        job = Job(
+            user_id="alice", workflow={}, status=JobStatus.FAILED,
+            started_at=started, completed_at=started + timedelta(seconds=5),
+        )
+        count = sample("comfy_job_run_seconds_count", status="failed")
+
+        metrics.job_finished(job)
+        metrics.job_finished(Job(user_id="alice", workflow={}, status=JobStatus.FAILED))
+
+        assert sample("comfy_job_run_seconds_count", status="failed") == count + 1
+
+
+class TestTimedOperations:
+    """Test Redis client methods are timed by name"""
+
+    def test_public_methods_wrapped(self):
+        """Test public methods are timed and blocking ones are left alone"""
+        from redis_client import RedisClient
+        assert hasattr(RedisClient.get_job, "__wrapped__")
+        assert not hasattr(RedisClient.claim_next_job, "__wrapped__")
+        assert not hasattr(RedisClient._claim_job, "__wrapped__")
+
+    @pytest.mark.asyncio
+    async def test_async_methods_awaited(self):
+        """Test coroutine methods are timed until they finish, and keep their result"""
+        @metrics.timed_operations()
+        class Client:
+            async def probe(self):
+                return "ok"
+
+        count = sample("comfy_redis_operation_seconds_count", operation="probe")
+
+        assert await Client().probe() == "ok"
+        assert sample("comfy_redis_operation_seconds_count", operation="probe") == count + 1
+
+    def test_claim_records_dispatch_and_wait(self):
+        """Test a claim through the client observes dispatch latency and queue wait"""
+        fakeredis = pytest.importorskip("fakeredis")
+        pytest.importorskip("lupa")
+        server = fakeredis.FakeRedis(decode_responses=True, encoding_errors="surrogateescape")
+        with patch('redis_client.Redis', return_value=server):
+            from redis_client import RedisClient
+            client = RedisClient()
+        client.create_job(Job(id="job-1", user_id="alice", workflow={"1": {}}))
+        dispatch = sample("comfy_job_dispatch_seconds_count")
+        wait = sample("comfy_job_queue_wait_seconds_count")
+        run = sample("comfy_job_run_seconds_count", status="completed")
+
+        client.claim_next_job("worker-1")
+        client.move_job_to_completed("job-1", {"ok": True})
+
+        assert sample("comfy_job_dispatch_seconds_count") == dispatch + 1
+        assert sample("comfy_job_queue_wait_seconds_count") == wait + 1
+        assert sample("comfy_job_run_seconds_count", status="completed") == run + 1
+
+
+class TestRequestMetrics:
+    """Test HTTP request latency labels"""
+
+    def test_route_template_label(self, mock_async_redis_client):
+        """Test requests are labelled by route template, not by the raw path"""
+        labels = {"method": "GET", "route": "/api/jobs/{job_id}", "status": "404"}
+        count = sample("comfy_http_request_seconds_count", **labels)
+
+        with patch('main.redis_client', mock_async_redis_client):
+            from main import app
+            client = TestClient(app)
+            client.get("/api/jobs/job-a")
+            client.get("/api/jobs/job-b")
+
+        assert sample("comfy_http_request_seconds_count", **labels) == count + 2
@@ -5,22 +5,33 @@ import pytest
 from unittest.mock import patch, MagicMock, AsyncMock
 from fastapi.testclient import TestClient
 from fastapi import FastAPI, WebSocket
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 import json
 
 from models import (
     Job, JobStatus, JobPriority, QueueMode,
-    HealthCheck, QueueStatus
+    HealthCheck, QueueStatus, RuntimeStats, WorkerStatus, TraceSpan
 )
 
+FRONTEND_TRACEPARENT = "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"
+JOB_TRACEPARENT = "00-4bf92f3577b34da6a3ce929d0e0e4736-b7ad6b7169203331-01"
+
+
+def trace_span(name, start, seconds, service="queue-manager"):
+    return TraceSpan(
+        name=name, service=service, trace_id="4bf92f3577b34da6a3ce929d0e0e4736",
+        span_id="a" * 16, parent_span_id="b7ad6b7169203331",
+        start_time=start, end_time=start + timedelta(seconds=seconds),
+    )
+
 
 @pytest.fixture
-def app_with_mocks(mock_redis_client, mock_ws_manager):
+def app_with_mocks(mock_async_redis_client, mock_ws_manager):
     """Create FastAPI app with mocked dependencies"""
     from fastapi.testclient import TestClient
 
     # Create app
-    with patch('main.redis_client', mock_redis_client):
+    with patch('main.redis_client', mock_async_redis_client):
         with patch('main.ws_manager', mock_ws_manager):
             with patch('main.app_start_time', datetime.now(timezone.utc)):
                 from main import app
@@ -30,12 +41,12 @@ def app_with_mocks(mock_redis_client, mock_ws_manager):
 class TestHealthEndpoint:
     """Test health check endpoint"""
 
-    def test_health_check_healthy(self, mock_redis_client):
+    def test_health_check_healthy(self, mock_async_redis_client):
         """Test health check when system is healthy"""
-        mock_redis_client.ping.return_value = True
-        mock_redis_client.get_queue_depth.return_value = 5
+        mock_async_redis_client.ping.return_value = True
+        mock_async_redis_client.get_queue_depth.return_value = 5
 
-        with patch('main.redis_client', mock_redis_client):
+        with patch('main.redis_client', mock_async_redis_client):
             from main import app
             client = TestClient(app)
             response = client.get("/health")
@@ -45,11 +56,22 @@ class TestHealthEndpoint:
             assert data["status"] == "healthy"
             assert data["redis_connected"] is True
 
-    def test_health_check_unhealthy(self, mock_redis_client):
+    def test_health_counts_live_workers(self, mock_async_redis_client):
+        """Test workers_active comes from the worker registry"""
+        mock_async_redis_client.count_live_workers.return_value = 3
+
+        with patch('main.redis_client', mock_async_redis_client):
+            from main import app
+            client = TestClient(app)
+            response = client.get("/health")
+
+            assert response.json()["workers_active"] == 3
+
+    def test_health_check_unhealthy(self, mock_async_redis_client):
         """Test health check when Redis is down"""
-        mock_redis_client.ping.return_value = False
+        mock_async_redis_client.ping.return_value = False
 
-        with patch('main.redis_client', mock_redis_client):
+        with patch('main.redis_client', mock_async_redis_client):
             from main import app
             client = TestClient(app)
             response = client.get("/health")
@@ -58,12 +80,12 @@ class TestHealthEndpoint:
             data = response.json()
             assert data["status"] == "unhealthy"
 
-    def test_health_check_response_format(self, mock_redis_client):
+    def test_health_check_response_format(self, mock_async_redis_client):
         """Test health check response includes required fields"""
-        mock_redis_client.ping.return_value = True
-        mock_redis_client.get_queue_depth.return_value = 0
+        mock_async_redis_client.ping.return_value = True
+        mock_async_redis_client.get_queue_depth.return_value = 0
 
-        with patch('main.redis_client', mock_redis_client):
+        with patch('main.redis_client', mock_async_redis_client):
             from main import app
             client = TestClient(app)
             response = client.get("/health")
@@ -77,19 +99,49 @@ class TestHealthEndpoint:
             assert "uptime_seconds" in data
 
 
+    @pytest.mark.asyncio
+    async def test_health_responsive_while_listener_idle(self, mock_async_redis_client):
+        """Test /health is served promptly while the event listener waits on Redis"""
+        import asyncio
+        import time
+        import httpx
+        from websocket_manager import WebSocketManager
+
+        mock_async_redis_client.ping.return_value = True
+        mock_async_redis_client.get_queue_depth.return_value = 0
+        manager = WebSocketManager(mock_async_redis_client)
+
+        with patch('main.redis_client', mock_async_redis_client), patch('main.ws_manager', manager):
+            from main import app
+            await manager.connect(AsyncMock())
+            await asyncio.sleep(0.01)  # listener is now blocked reading the stream
+            mock_async_redis_client.read_events.assert_awaited()
+
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                await client.get("/health")  # warm up
+                start = time.perf_counter()
+                response = await client.get("/health")
+                elapsed = time.perf_counter() - start
+            await manager.close()
+
+        assert response.status_code == 200
+        assert elapsed < 0.05
+
+
 class TestQueueStatusEndpoint:
     """Test queue status endpoint"""
 
-    def test_queue_status_success(self, mock_redis_client):
+    def test_queue_status_success(self, mock_async_redis_client):
         """Test getting queue status"""
-        mock_redis_client.get_all_queue_stats.return_value = {
+        mock_async_redis_client.get_all_queue_stats.return_value = {
             "pending": 10,
             "running": 2,
             "completed": 50,
             "failed": 3
         }
 
-        with patch('main.redis_client', mock_redis_client):
+        with patch('main.redis_client', mock_async_redis_client):
             from main import app
             client = TestClient(app)
             response = client.get("/api/queue/status")
@@ -102,32 +154,64 @@ class TestQueueStatusEndpoint:
             assert data["failed_jobs"] == 3
             assert "mode" in data
 
-    def test_queue_status_error_handling(self, mock_redis_client):
+    def test_queue_status_error_handling(self, mock_async_redis_client):
         """Test queue status error handling"""
-        mock_redis_client.get_all_queue_stats.side_effect = Exception("Redis error")
+        mock_async_redis_client.get_all_queue_stats.side_effect = Exception("Redis error")
 
-        with patch('main.redis_client', mock_redis_client):
+        with patch('main.redis_client', mock_async_redis_client):
             from main import app
             client = TestClient(app)
             response = client.get("/api/queue/status")
 
             assert response.status_code == 500
 
+    def test_runtime_stats(self, mock_async_redis_client):
+        """Test runtime statistics are listed, with the limit capped"""
+        mock_async_redis_client.get_runtime_stats.return_value = [
+            RuntimeStats(signature="3f2a9c1d0b7e4a65", count=12, ewma=41.5, p50=40.0, p90=55.2)
+        ]
+
+        with patch('main.redis_client', mock_async_redis_client):
+            from main import app
+            client = TestClient(app)
+            response = client.get("/api/queue/runtimes?limit=100000")
+
+            assert response.status_code == 200
+            assert response.json()[0]["ewma"] == 41.5
+            mock_async_redis_client.get_runtime_stats.assert_awaited_once_with(500)
+
+    def test_metrics_reads_queue_depths(self, mock_async_redis_client):
+        """Test /metrics serves the Prometheus text format with per-state depths read at scrape time"""
+        mock_async_redis_client.get_all_queue_stats.return_value = {
+            "pending": 7, "leased": 1, "running": 2, "completed": 50, "failed": 3
+        }
+        mock_async_redis_client.count_live_workers.return_value = 2
+
+        with patch('main.redis_client', mock_async_redis_client):
+            from main import app
+            client = TestClient(app)
+            response = client.get("/metrics")
+
+            assert response.status_code == 200
+            assert response.headers["content-type"].startswith("text/plain")
+            assert 'comfy_queue_jobs{state="pending"} 7.0' in response.text
+            assert "comfy_workers_live 2.0" in response.text
+
 
 class TestJobSubmissionEndpoint:
     """Test job submission endpoint"""
 
-    def test_submit_job_success(self, mock_redis_client, sample_workflow):
+    def test_submit_job_success(self, mock_async_redis_client, sample_workflow):
         """Test successful job submission"""
         created_job = Job(
             user_id="user-1",
             workflow=sample_workflow,
             priority=JobPriority.NORMAL
         )
-        mock_redis_client.create_job.return_value = True
-        mock_redis_client.get_pending_jobs.return_value = [created_job]
+        mock_async_redis_client.create_job.return_value = True
+        mock_async_redis_client.get_pending_jobs.return_value = [created_job]
 
-        with patch('main.redis_client', mock_redis_client):
+        with patch('main.redis_client', mock_async_redis_client):
             from main import app
             client = TestClient(app)
             response = client.post(
@@ -145,9 +229,9 @@ class TestJobSubmissionEndpoint:
             assert data["user_id"] == "user-1"
             assert data["status"] == "pending"
 
-    def test_submit_job_invalid_user_id(self, mock_redis_client):
+    def test_submit_job_invalid_user_id(self, mock_async_redis_client):
         """Test job submission with invalid user_id"""
-        with patch('main.redis_client', mock_redis_client):
+        with patch('main.redis_client', mock_async_redis_client):
             from main import app
             client = TestClient(app)
             response = client.post(
@@ -160,9 +244,9 @@ class TestJobSubmissionEndpoint:
 
             assert response.status_code == 422  # Validation error
 
-    def test_submit_job_empty_workflow(self, mock_redis_client):
+    def test_submit_job_empty_workflow(self, mock_async_redis_client):
         """Test job submission with empty workflow"""
-        with patch('main.redis_client', mock_redis_client):
+        with patch('main.redis_client', mock_async_redis_client):
             from main import app
             client = TestClient(app)
             response = client.post(
@@ -175,12 +259,11 @@ class TestJobSubmissionEndpoint:
 
             assert response.status_code == 422  # Validation error
 
-    def test_submit_job_queue_full(self, mock_redis_client, sample_workflow):
+    def test_submit_job_queue_full(self, mock_async_redis_client, sample_workflow):
         """Test job submission when queue is full"""
-        mock_redis_client.get_queue_depth.return_value = 100  # Max depth
-        mock_redis_client.create_job.return_value = True
+        mock_async_redis_client.create_job.return_value = False  # the enqueue script refused it
 
-        with patch('main.redis_client', mock_redis_client):
+        with patch('main.redis_client', mock_async_redis_client):
             with patch('main.settings') as mock_settings:
                 mock_settings.max_queue_depth = 100
                 mock_settings.queue_mode = "fifo"
@@ -195,17 +278,103 @@ class TestJobSubmissionEndpoint:
                 )
 
                 assert response.status_code == 429  # Too many requests
+                assert mock_async_redis_client.create_job.await_args.args[1] == 100
+                mock_async_redis_client.get_queue_depth.assert_not_awaited()
+
+    def test_submit_job_continues_trace(self, mock_async_redis_client, sample_workflow):
+        """Test a traceparent header makes the job's trace a child of the caller's span"""
+        with patch('main.redis_client', mock_async_redis_client):
+            from main import app
+            client = TestClient(app)
+            response = client.post(
+                "/api/jobs",
+                json={"user_id": "user-1", "workflow": sample_workflow},
+                headers={"traceparent": FRONTEND_TRACEPARENT},
+            )
+
+            assert response.status_code == 201
+            job = mock_async_redis_client.create_job.await_args.args[0]
+            assert job.metadata["traceparent"].startswith("00-4bf92f3577b34da6a3ce929d0e0e4736-")
+            job_id, spans, _ = mock_async_redis_client.record_spans.await_args.args
+            assert job_id == job.id
+            assert spans[0].name == "queue.submit"
+            assert spans[0].parent_span_id == "00f067aa0ba902b7"
+
+
+class TestBatchSubmissionEndpoint:
+    """Test batch job submission endpoint"""
+
+    def batch(self, workflow, n=3):
+        return {"jobs": [{"user_id": f"user-{i}", "workflow": workflow} for i in range(n)]}
+
+    def test_submit_batch_success(self, mock_async_redis_client, sample_workflow):
+        """Test a batch is created in one call and returned with positions"""
+        mock_async_redis_client.get_queue_estimates.side_effect = lambda ids: {
+            job_id: (i, i * 30) for i, job_id in enumerate(ids)
+        }
+
+        with patch('main.redis_client', mock_async_redis_client):
+            from main import app
+            client = TestClient(app)
+            response = client.post("/api/jobs/batch", json=self.batch(sample_workflow))
+
+            assert response.status_code == 201
+            data = response.json()
+            assert [job["user_id"] for job in data] == ["user-0", "user-1", "user-2"]
+            assert [job["position_in_queue"] for job in data] == [0, 1, 2]
+            assert len({job["id"] for job in data}) == 3
+            mock_async_redis_client.create_jobs.assert_awaited_once()
+            mock_async_redis_client.create_job.assert_not_called()
+
+    def test_submit_batch_queue_full(self, mock_async_redis_client, sample_workflow):
+        """Test a batch that does not fit is rejected whole"""
+        mock_async_redis_client.create_jobs.return_value = False
+
+        with patch('main.redis_client', mock_async_redis_client):
+            from main import app
+            client = TestClient(app)
+            response = client.post("/api/jobs/batch", json=self.batch(sample_workflow))
+
+            assert response.status_code == 429
+
+    def test_submit_batch_redis_error(self, mock_async_redis_client, sample_workflow):
+        """Test Redis failure returns 500"""
+        mock_async_redis_client.create_jobs.return_value = None
+
+        with patch('main.redis_client', mock_async_redis_client):
+            from main import app
+            client = TestClient(app)
+            response = client.post("/api/jobs/batch", json=self.batch(sample_workflow))
+
+            assert response.status_code == 500
+
+    def test_submit_batch_validation(self, mock_async_redis_client, sample_workflow):
+        """Test empty, oversized and invalid batches are rejected before Redis"""
+        from models import MAX_BATCH_JOBS
+
+        with patch('main.redis_client', mock_async_redis_client):
+            from main import app
+            client = TestClient(app)
+            invalid = self.batch(sample_workflow, 2)
+            invalid["jobs"][1]["user_id"] = "../admin"
+
+            assert client.post("/api/jobs/batch", json={"jobs": []}).status_code == 422
+            assert client.post(
+                "/api/jobs/batch", json=self.batch({"1": {}}, MAX_BATCH_JOBS + 1)
+            ).status_code == 422
+            assert client.post("/api/jobs/batch", json=invalid).status_code == 422
+            mock_async_redis_client.create_jobs.assert_not_called()
 
 
 class TestGetJobEndpoint:
     """Test get job endpoint"""
 
-    def test_get_job_success(self, mock_redis_client, sample_job):
+    def test_get_job_success(self, mock_async_redis_client, sample_job):
         """Test getting existing job"""
-        mock_redis_client.get_job.return_value = sample_job
-        mock_redis_client.get_pending_jobs.return_value = [sample_job]
+        mock_async_redis_client.get_job.return_value = sample_job
+        mock_async_redis_client.get_queue_estimates.return_value = {sample_job.id: (150, 9000)}
 
-        with patch('main.redis_client', mock_redis_client):
+        with patch('main.redis_client', mock_async_redis_client):
             from main import app
             client = TestClient(app)
             response = client.get(f"/api/jobs/{sample_job.id}")
@@ -214,12 +383,31 @@ class TestGetJobEndpoint:
             data = response.json()
             assert data["id"] == sample_job.id
             assert data["user_id"] == "user-1"
+            assert data["position_in_queue"] == 150
+            assert data["estimated_wait_time"] == 9000
+            # Position comes from ZRANK, not from loading the pending queue
+            mock_async_redis_client.get_queue_estimates.assert_awaited_once_with([sample_job.id])
+            mock_async_redis_client.get_pending_jobs.assert_not_awaited()
+
+    def test_get_running_job_has_no_position(self, mock_async_redis_client, sample_job):
+        """Test non-pending jobs skip the position lookup"""
+        running_job = sample_job.model_copy(update={"status": JobStatus.RUNNING})
+        mock_async_redis_client.get_job.return_value = running_job
+
+        with patch('main.redis_client', mock_async_redis_client):
+            from main import app
+            client = TestClient(app)
+            response = client.get(f"/api/jobs/{sample_job.id}")
+
+            assert response.status_code == 200
+            assert response.json()["position_in_queue"] is None
+            mock_async_redis_client.get_queue_estimates.assert_not_awaited()
 
-    def test_get_job_not_found(self, mock_redis_client):
+    def test_get_job_not_found(self, mock_async_redis_client):
         """Test getting nonexistent job"""
-        mock_redis_client.get_job.return_value = None
+        mock_async_redis_client.get_job.return_value = None
 
-        with patch('main.redis_client', mock_redis_client):
+        with patch('main.redis_client', mock_async_redis_client):
             from main import app
             client = TestClient(app)
             response = client.get("/api/jobs/nonexistent-id")
@@ -228,15 +416,72 @@ class TestGetJobEndpoint:
             data = response.json()
             assert "not found" in data["detail"].lower()
 
+    def test_get_archived_job(self, mock_async_redis_client, sample_job):
+        """Test a job moved out of Redis is served from the archive"""
+        sample_job.status = JobStatus.COMPLETED
+        sample_job.result = {"images": ["out.png"]}
+        archive = MagicMock()
+        archive.get.return_value = sample_job
+        mock_async_redis_client.get_job.return_value = None
+
+        with patch('main.redis_client', mock_async_redis_client), patch('main.job_archive', archive):
+            from main import app
+            client = TestClient(app)
+
+            assert client.get(f"/api/jobs/{sample_job.id}").status_code == 404
+            archive.get.assert_not_called()  # no tombstone, no disk read
+
+            mock_async_redis_client.is_archived.return_value = True
+            response = client.get(f"/api/jobs/{sample_job.id}")
+
+            assert response.status_code == 200
+            assert response.json()["status"] == "completed"
+            assert response.json()["result"] == {"images": ["out.png"]}
+            archive.get.assert_called_once_with(sample_job.id)
+
+
+    def test_get_job_timeline(self, mock_async_redis_client, sample_job):
+        """Test the timeline lists spans in start order with offsets from submission"""
+        sample_job.metadata["traceparent"] = JOB_TRACEPARENT
+        created = sample_job.created_at
+        mock_async_redis_client.get_job.return_value = sample_job
+        mock_async_redis_client.get_spans.return_value = [
+            trace_span("comfyui.execute", created + timedelta(seconds=12), 40, service="worker:worker-1"),
+            trace_span("queue.submit", created, 0.01),
+            trace_span("queue.wait", created, 10),
+        ]
+
+        with patch('main.redis_client', mock_async_redis_client):
+            from main import app
+            client = TestClient(app)
+            response = client.get(f"/api/jobs/{sample_job.id}/timeline")
+
+            assert response.status_code == 200
+            data = response.json()
+            assert data["trace_id"] == "4bf92f3577b34da6a3ce929d0e0e4736"
+            assert [span["name"] for span in data["spans"]] == ["queue.submit", "queue.wait", "comfyui.execute"]
+            assert data["spans"][2]["offset_seconds"] == 12
+            assert data["spans"][2]["duration_seconds"] == 40
+
+    def test_get_job_timeline_not_found(self, mock_async_redis_client):
+        """Test the timeline of an unknown job is a 404"""
+        mock_async_redis_client.get_job.return_value = None
+
+        with patch('main.redis_client', mock_async_redis_client):
+            from main import app
+            client = TestClient(app)
+
+            assert client.get("/api/jobs/missing/timeline").status_code == 404
+
 
 class TestListJobsEndpoint:
     """Test list jobs endpoint"""
 
-    def test_list_all_jobs(self, mock_redis_client, multiple_jobs):
+    def test_list_all_jobs(self, mock_async_redis_client, multiple_jobs):
         """Test listing all jobs"""
-        mock_redis_client.get_pending_jobs.return_value = multiple_jobs[:3]
+        mock_async_redis_client.get_job_page.return_value = (multiple_jobs[:3], None)
 
-        with patch('main.redis_client', mock_redis_client):
+        with patch('main.redis_client', mock_async_redis_client):
             from main import app
             client = TestClient(app)
             response = client.get("/api/jobs")
@@ -244,13 +489,15 @@ class TestListJobsEndpoint:
             assert response.status_code == 200
             data = response.json()
             assert len(data) == 3
+            assert "x-next-cursor" not in response.headers
+            mock_async_redis_client.get_job_page.assert_awaited_once_with(None, None, None, 100)
 
-    def test_list_user_jobs(self, mock_redis_client, multiple_jobs):
+    def test_list_user_jobs(self, mock_async_redis_client, multiple_jobs):
         """Test listing jobs for specific user"""
         user_jobs = [j for j in multiple_jobs if j.user_id == "user-1"]
-        mock_redis_client.get_user_jobs.return_value = user_jobs
+        mock_async_redis_client.get_job_page.return_value = (user_jobs, None)
 
-        with patch('main.redis_client', mock_redis_client):
+        with patch('main.redis_client', mock_async_redis_client):
             from main import app
             client = TestClient(app)
             response = client.get("/api/jobs?user_id=user-1")
@@ -259,12 +506,13 @@ class TestListJobsEndpoint:
             data = response.json()
             for job in data:
                 assert job["user_id"] == "user-1"
+            mock_async_redis_client.get_job_page.assert_awaited_once_with("user-1", None, None, 100)
 
-    def test_list_jobs_with_limit(self, mock_redis_client, multiple_jobs):
-        """Test listing jobs with limit"""
-        mock_redis_client.get_pending_jobs.return_value = multiple_jobs[:2]
+    def test_list_jobs_with_limit(self, mock_async_redis_client, multiple_jobs):
+        """Test a full page returns the next page's cursor in a header"""
+        mock_async_redis_client.get_job_page.return_value = (multiple_jobs[:2], "1767225600.5:job-2")
 
-        with patch('main.redis_client', mock_redis_client):
+        with patch('main.redis_client', mock_async_redis_client):
             from main import app
             client = TestClient(app)
             response = client.get("/api/jobs?limit=2")
@@ -272,57 +520,133 @@ class TestListJobsEndpoint:
             assert response.status_code == 200
             data = response.json()
             assert len(data) <= 2
+            assert response.headers["x-next-cursor"] == "1767225600.5:job-2"
+
+    def test_list_jobs_with_cursor(self, mock_async_redis_client):
+        """Test the cursor is passed through and oversized limits are capped"""
+        with patch('main.redis_client', mock_async_redis_client):
+            from main import app
+            client = TestClient(app)
+            response = client.get("/api/jobs?cursor=1767225600.5:job-2&limit=100000")
+
+            assert response.status_code == 200
+            mock_async_redis_client.get_job_page.assert_awaited_once_with(None, None, "1767225600.5:job-2", 500)
 
-    def test_list_jobs_with_status_filter(self, mock_redis_client):
+    def test_list_jobs_invalid_cursor(self, mock_async_redis_client):
+        """Test a malformed cursor is a client error"""
+        mock_async_redis_client.get_job_page.side_effect = ValueError("Invalid cursor: 'x'")
+
+        with patch('main.redis_client', mock_async_redis_client):
+            from main import app
+            client = TestClient(app)
+            response = client.get("/api/jobs?cursor=x")
+
+            assert response.status_code == 400
+
+    def test_list_jobs_with_status_filter(self, mock_async_redis_client):
         """Test listing jobs with status filter"""
         pending_jobs = [
             Job(user_id="user-1", workflow={"test": 1}, status=JobStatus.PENDING),
             Job(user_id="user-2", workflow={"test": 1}, status=JobStatus.PENDING),
         ]
-        mock_redis_client.get_pending_jobs.return_value = pending_jobs
+        mock_async_redis_client.get_job_page.return_value = (pending_jobs, None)
 
-        with patch('main.redis_client', mock_redis_client):
+        with patch('main.redis_client', mock_async_redis_client):
             from main import app
             client = TestClient(app)
             response = client.get("/api/jobs?status=pending")
 
             assert response.status_code == 200
+            mock_async_redis_client.get_job_page.assert_awaited_once_with(None, JobStatus.PENDING, None, 100)
+
+
+class TestBulkJobStatusEndpoint:
+    """Test bulk job status endpoint"""
+
+    def test_bulk_status(self, mock_async_redis_client, multiple_jobs):
+        """Test many jobs are returned from one bulk lookup"""
+        mock_async_redis_client.get_jobs.return_value = multiple_jobs[:3]
+        mock_async_redis_client.get_queue_estimates.return_value = {multiple_jobs[0].id: (4, 240)}
+
+        with patch('main.redis_client', mock_async_redis_client):
+            from main import app
+            client = TestClient(app)
+            response = client.post(
+                "/api/jobs/status",
+                json={"job_ids": [j.id for j in multiple_jobs[:3]] + ["unknown", multiple_jobs[0].id]}
+            )
+
+            assert response.status_code == 200
+            data = response.json()
+            assert [j["id"] for j in data] == [j.id for j in multiple_jobs[:3]]
+            assert data[0]["position_in_queue"] == 4
+            assert data[0]["estimated_wait_time"] == 240
+            # Duplicate IDs are collapsed before the lookup
+            mock_async_redis_client.get_jobs.assert_awaited_once_with(
+                [j.id for j in multiple_jobs[:3]] + ["unknown"], include_workflow=False
+            )
+            mock_async_redis_client.get_job.assert_not_awaited()
+
+    def test_bulk_status_empty_request(self, mock_async_redis_client):
+        """Test an empty ID list is rejected"""
+        with patch('main.redis_client', mock_async_redis_client):
+            from main import app
+            client = TestClient(app)
+            response = client.post("/api/jobs/status", json={"job_ids": []})
+
+            assert response.status_code == 422
 
 
 class TestCancelJobEndpoint:
     """Test cancel job endpoint"""
 
-    def test_cancel_pending_job(self, mock_redis_client, sample_job):
+    def test_cancel_pending_job(self, mock_async_redis_client, sample_job):
         """Test canceling a pending job"""
-        mock_redis_client.get_job.return_value = sample_job
-        mock_redis_client.delete_job.return_value = True
+        mock_async_redis_client.get_job.return_value = sample_job
+        mock_async_redis_client.delete_job.return_value = True
 
-        with patch('main.redis_client', mock_redis_client):
+        with patch('main.redis_client', mock_async_redis_client):
             from main import app
             client = TestClient(app)
             response = client.delete(f"/api/jobs/{sample_job.id}")
 
             assert response.status_code == 204
 
-    def test_cancel_running_job(self, mock_redis_client, sample_job):
+    def test_cancel_running_job(self, mock_async_redis_client, sample_job):
         """Test canceling a running job"""
         running_job = sample_job.copy()
         running_job.status = JobStatus.RUNNING
-        mock_redis_client.get_job.return_value = running_job
-        mock_redis_client.update_job.return_value = True
+        mock_async_redis_client.get_job.return_value = running_job
+        mock_async_redis_client.cancel_running_job.return_value = True
 
-        with patch('main.redis_client', mock_redis_client):
+        with patch('main.redis_client', mock_async_redis_client):
             from main import app
             client = TestClient(app)
             response = client.delete(f"/api/jobs/{running_job.id}")
 
             assert response.status_code == 204
+            mock_async_redis_client.cancel_running_job.assert_awaited_once_with(running_job)
+            mock_async_redis_client.update_job.assert_not_called()
+
+    def test_cancel_job_finished_meanwhile(self, mock_async_redis_client, sample_job):
+        """Test a running job that finishes before the cancel lands is left alone"""
+        running_job = sample_job.copy()
+        running_job.status = JobStatus.RUNNING
+        mock_async_redis_client.get_job.return_value = running_job
+        mock_async_redis_client.cancel_running_job.return_value = False
+
+        with patch('main.redis_client', mock_async_redis_client):
+            from main import app
+            client = TestClient(app)
+            response = client.delete(f"/api/jobs/{running_job.id}")
 
-    def test_cancel_completed_job_error(self, mock_redis_client, job_with_result):
+            assert response.status_code == 409
+
+    def test_cancel_completed_job_error(self, mock_async_redis_client, job_with_result):
         """Test canceling completed job returns error"""
-        mock_redis_client.get_job.return_value = job_with_result
+        mock_async_redis_client.get_job.return_value = job_with_result
 
-        with patch('main.redis_client', mock_redis_client):
+        with patch('main.redis_client', mock_async_redis_client):
             from main import app
             client = TestClient(app)
             response = client.delete(f"/api/jobs/{job_with_result.id}")
@@ -331,11 +655,11 @@ class TestCancelJobEndpoint:
             data = response.json()
             assert "cannot cancel" in data["detail"].lower()
 
-    def test_cancel_nonexistent_job(self, mock_redis_client):
+    def test_cancel_nonexistent_job(self, mock_async_redis_client):
         """Test canceling nonexistent job"""
-        mock_redis_client.get_job.return_value = None
+        mock_async_redis_client.get_job.return_value = None
 
-        with patch('main.redis_client', mock_redis_client):
+        with patch('main.redis_client', mock_async_redis_client):
             from main import app
             client = TestClient(app)
             response = client.delete("/api/jobs/nonexistent-id")
@@ -346,12 +670,12 @@ class TestCancelJobEndpoint:
 class TestPriorityUpdateEndpoint:
     """Test priority update endpoint"""
 
-    def test_update_job_priority_success(self, mock_redis_client, sample_job):
+    def test_update_job_priority_success(self, mock_async_redis_client, sample_job):
         """Test successfully updating job priority"""
-        mock_redis_client.get_job.return_value = sample_job
-        mock_redis_client.update_job.return_value = True
+        mock_async_redis_client.get_job.return_value = sample_job
+        mock_async_redis_client.update_job.return_value = True
 
-        with patch('main.redis_client', mock_redis_client):
+        with patch('main.redis_client', mock_async_redis_client):
             from main import app
             client = TestClient(app)
             response = client.patch(
@@ -363,13 +687,13 @@ class TestPriorityUpdateEndpoint:
             data = response.json()
             assert data["status"] == "success"
 
-    def test_update_priority_running_job_error(self, mock_redis_client, sample_job):
+    def test_update_priority_running_job_error(self, mock_async_redis_client, sample_job):
         """Test updating priority of running job returns error"""
         running_job = sample_job.copy()
         running_job.status = JobStatus.RUNNING
-        mock_redis_client.get_job.return_value = running_job
+        mock_async_redis_client.get_job.return_value = running_job
 
-        with patch('main.redis_client', mock_redis_client):
+        with patch('main.redis_client', mock_async_redis_client):
             from main import app
             client = TestClient(app)
             response = client.patch(
@@ -379,11 +703,11 @@ class TestPriorityUpdateEndpoint:
 
             assert response.status_code == 400
 
-    def test_update_priority_nonexistent_job(self, mock_redis_client):
+    def test_update_priority_nonexistent_job(self, mock_async_redis_client):
         """Test updating priority of nonexistent job"""
-        mock_redis_client.get_job.return_value = None
+        mock_async_redis_client.get_job.return_value = None
 
-        with patch('main.redis_client', mock_redis_client):
+        with patch('main.redis_client', mock_async_redis_client):
             from main import app
             client = TestClient(app)
             response = client.patch(
@@ -397,13 +721,12 @@ class TestPriorityUpdateEndpoint:
 class TestWorkerEndpoints:
     """Test worker-related endpoints"""
 
-    def test_get_next_job_success(self, mock_redis_client, sample_job):
+    def test_get_next_job_success(self, mock_async_redis_client, sample_job):
         """Test getting next job for worker"""
-        mock_redis_client.get_next_job.return_value = sample_job
-        mock_redis_client.move_job_to_running.return_value = True
-        mock_redis_client.update_worker_heartbeat.return_value = True
+        mock_async_redis_client.claim_next_job.return_value = sample_job
+        mock_async_redis_client.update_worker_heartbeat.return_value = True
 
-        with patch('main.redis_client', mock_redis_client):
+        with patch('main.redis_client', mock_async_redis_client):
             from main import app
             client = TestClient(app)
             response = client.get("/api/workers/next-job?worker_id=worker-1")
@@ -412,13 +735,14 @@ class TestWorkerEndpoints:
             data = response.json()
             assert data["job"] is not None
             assert data["job"]["id"] == sample_job.id
+            mock_async_redis_client.claim_next_job.assert_called_once_with("worker-1", QueueMode.FIFO, wait=0)
 
-    def test_get_next_job_empty_queue(self, mock_redis_client):
+    def test_get_next_job_empty_queue(self, mock_async_redis_client):
         """Test getting next job when queue is empty"""
-        mock_redis_client.get_next_job.return_value = None
-        mock_redis_client.update_worker_heartbeat.return_value = True
+        mock_async_redis_client.claim_next_job.return_value = None
+        mock_async_redis_client.update_worker_heartbeat.return_value = True
 
-        with patch('main.redis_client', mock_redis_client):
+        with patch('main.redis_client', mock_async_redis_client):
             from main import app
             client = TestClient(app)
             response = client.get("/api/workers/next-job?worker_id=worker-1")
@@ -427,55 +751,208 @@ class TestWorkerEndpoints:
             data = response.json()
             assert data["job"] is None
 
-    def test_complete_job_success(self, mock_redis_client, sample_job, job_completion_request):
+    def test_get_next_job_long_poll_capped(self, mock_async_redis_client):
+        """Test the long-poll wait is passed through, capped at the configured maximum"""
+        mock_async_redis_client.claim_next_job.return_value = None
+
+        with patch('main.redis_client', mock_async_redis_client):
+            from main import app, settings
+            client = TestClient(app)
+            client.get("/api/workers/next-job?worker_id=worker-1&wait=5")
+            client.get("/api/workers/next-job?worker_id=worker-1&wait=86400")
+
+            waits = [c.kwargs["wait"] for c in mock_async_redis_client.claim_next_job.call_args_list]
+            assert waits == [5, settings.worker_max_wait]
+
+    def test_get_next_job_registers_worker(self, mock_async_redis_client):
+        """Test the provider and capacity a worker reports reach the registry"""
+        with patch('main.redis_client', mock_async_redis_client):
+            from main import app
+            client = TestClient(app)
+            client.get("/api/workers/next-job?worker_id=worker-1&provider=verda&capacity=2")
+
+            mock_async_redis_client.update_worker_heartbeat.assert_awaited_once_with("worker-1", "verda", 2)
+
+    def test_list_workers(self, mock_async_redis_client):
+        """Test listing workers from the registry"""
+        mock_async_redis_client.get_workers.return_value = [WorkerStatus(
+            worker_id="worker-1", status="busy", current_job_id="job-1", jobs_completed=4,
+            last_heartbeat=datetime.now(timezone.utc), provider="verda",
+        )]
+
+        with patch('main.redis_client', mock_async_redis_client):
+            from main import app
+            client = TestClient(app)
+            response = client.get("/api/workers?include_offline=true")
+
+            assert response.status_code == 200
+            assert response.json()[0]["current_job_id"] == "job-1"
+            mock_async_redis_client.get_workers.assert_awaited_once_with(True)
+
+    def test_lease_jobs_capped(self, mock_async_redis_client, sample_job):
+        """Test leasing returns jobs to prefetch, with count capped at the configured maximum"""
+        mock_async_redis_client.lease_jobs.return_value = [sample_job]
+
+        with patch('main.redis_client', mock_async_redis_client):
+            from main import app, settings
+            client = TestClient(app)
+            response = client.post("/api/workers/lease-jobs?worker_id=worker-1&count=100")
+
+            assert response.status_code == 200
+            data = response.json()
+            assert [job["id"] for job in data["jobs"]] == [sample_job.id]
+            assert data["jobs"][0]["workflow"] == sample_job.workflow
+            assert data["lease_seconds"] == settings.worker_lease_seconds
+            mock_async_redis_client.lease_jobs.assert_awaited_once_with(
+                "worker-1", settings.worker_max_prefetch, QueueMode.FIFO, settings.worker_lease_seconds
+            )
+
+    def test_start_leased_job(self, mock_async_redis_client, sample_job):
+        """Test starting a leased job, and the conflict when the lease was lost"""
+        with patch('main.redis_client', mock_async_redis_client):
+            from main import app
+            client = TestClient(app)
+            url = f"/api/workers/start-job?job_id={sample_job.id}&worker_id=worker-1"
+
+            mock_async_redis_client.start_leased_job.return_value = sample_job
+            assert client.post(url).status_code == 200
+
+            mock_async_redis_client.start_leased_job.return_value = None
+            assert client.post(url).status_code == 409
+
+    def test_record_job_spans(self, mock_async_redis_client, sample_job):
+        """Test worker spans are stored for the job, and spans from another trace are rejected"""
+        sample_job.metadata["traceparent"] = JOB_TRACEPARENT
+        sample_job.worker_id = "worker-1"
+        mock_async_redis_client.get_job.return_value = sample_job
+        span = trace_span("comfyui.execute", datetime.now(timezone.utc), 30, service="worker:worker-1")
+        foreign = span.model_copy(update={"trace_id": "f" * 32})
+
+        with patch('main.redis_client', mock_async_redis_client):
+            from main import app
+            client = TestClient(app)
+            url = f"/api/workers/job-spans?job_id={sample_job.id}&worker_id=worker-1"
+
+            response = client.post(url, json={"spans": [span.model_dump(mode="json")]})
+            assert response.status_code == 204
+            mock_async_redis_client.record_spans.assert_awaited_once()
+
+            response = client.post(url, json={"spans": [foreign.model_dump(mode="json")]})
+            assert response.status_code == 400
+
+    def test_record_job_spans_other_worker(self, mock_async_redis_client, sample_job):
+        """Test spans from a worker that no longer holds the job are rejected"""
+        sample_job.metadata["traceparent"] = JOB_TRACEPARENT
+        sample_job.worker_id = "worker-2"
+        mock_async_redis_client.get_job.return_value = sample_job
+        span = trace_span("comfyui.execute", datetime.now(timezone.utc), 30, service="worker:worker-1")
+
+        with patch('main.redis_client', mock_async_redis_client):
+            from main import app
+            client = TestClient(app)
+            response = client.post(
+                f"/api/workers/job-spans?job_id={sample_job.id}&worker_id=worker-1",
+                json={"spans": [span.model_dump(mode="json")]}
+            )
+            assert response.status_code == 409
+            response = client.post(
+                f"/api/workers/job-spans?job_id={sample_job.id}", json={"spans": [span.model_dump(mode="json")]}
+            )
+            assert response.status_code == 422
+            mock_async_redis_client.record_spans.assert_not_awaited()
+
+    def test_renew_leases(self, mock_async_redis_client):
+        """Test renewal returns the job IDs the worker still holds"""
+        mock_async_redis_client.renew_leases.return_value = ["job-1"]
+
+        with patch('main.redis_client', mock_async_redis_client):
+            from main import app, settings
+            client = TestClient(app)
+            response = client.post(
+                "/api/workers/renew-leases?worker_id=worker-1",
+                json={"job_ids": ["job-1", "job-2"]}
+            )
+
+            assert response.status_code == 200
+            assert response.json()["job_ids"] == ["job-1"]
+            assert response.json()["job_lease_seconds"] == settings.job_lease_seconds
+
+    def test_complete_job_success(self, mock_async_redis_client, sample_job, job_completion_request):
         """Test completing a job"""
-        mock_redis_client.move_job_to_completed.return_value = True
+        sample_job.status = JobStatus.COMPLETED
+        mock_async_redis_client.move_job_to_completed.return_value = sample_job
 
-        with patch('main.redis_client', mock_redis_client):
+        with patch('main.redis_client', mock_async_redis_client):
             from main import app
             client = TestClient(app)
             response = client.post(
-                f"/api/workers/complete-job?job_id={sample_job.id}",
+                f"/api/workers/complete-job?job_id={sample_job.id}&worker_id=worker-1",
                 json=job_completion_request.model_dump()
             )
 
             assert response.status_code == 200
             data = response.json()
             assert data["status"] == "success"
+            mock_async_redis_client.move_job_to_completed.assert_awaited_once_with(
+                sample_job.id, job_completion_request.result, "worker-1"
+            )
 
-    def test_complete_job_not_found(self, mock_redis_client, job_completion_request):
+    def test_complete_job_not_found(self, mock_async_redis_client, job_completion_request):
         """Test completing nonexistent job"""
-        mock_redis_client.move_job_to_completed.return_value = False
+        mock_async_redis_client.move_job_to_completed.return_value = None
+        mock_async_redis_client.get_job.return_value = None
 
-        with patch('main.redis_client', mock_redis_client):
+        with patch('main.redis_client', mock_async_redis_client):
             from main import app
             client = TestClient(app)
             response = client.post(
-                "/api/workers/complete-job?job_id=nonexistent",
+                "/api/workers/complete-job?job_id=nonexistent&worker_id=worker-1",
                 json=job_completion_request.model_dump()
             )
 
             assert response.status_code == 404
 
-    def test_fail_job_success(self, mock_redis_client, sample_job, job_failure_request):
+    def test_complete_job_lease_lost(self, mock_async_redis_client, sample_job, job_completion_request):
+        """Test a worker can only complete a job it still runs"""
+        sample_job.status = JobStatus.RUNNING
+        sample_job.worker_id = "worker-2"  # requeued and claimed by another worker
+        mock_async_redis_client.move_job_to_completed.return_value = None
+        mock_async_redis_client.get_job.return_value = sample_job
+
+        with patch('main.redis_client', mock_async_redis_client):
+            from main import app
+            client = TestClient(app)
+            url = f"/api/workers/complete-job?job_id={sample_job.id}"
+            response = client.post(url + "&worker_id=worker-1", json=job_completion_request.model_dump())
+
+            assert response.status_code == 409
+            mock_async_redis_client.record_spans.assert_not_called()
+            # The holder check is the lease-aware endpoints' only way in
+            assert client.post(url, json=job_completion_request.model_dump()).status_code == 422
+
+    def test_fail_job_success(self, mock_async_redis_client, sample_job, job_failure_request):
         """Test marking job as failed"""
-        mock_redis_client.move_job_to_failed.return_value = True
+        sample_job.status = JobStatus.FAILED
+        mock_async_redis_client.move_job_to_failed.return_value = sample_job
 
-        with patch('main.redis_client', mock_redis_client):
+        with patch('main.redis_client', mock_async_redis_client):
             from main import app
             client = TestClient(app)
             response = client.post(
-                f"/api/workers/fail-job?job_id={sample_job.id}",
+                f"/api/workers/fail-job?job_id={sample_job.id}&worker_id=worker-1",
                 json=job_failure_request.model_dump()
             )
 
             assert response.status_code == 200
             data = response.json()
             assert data["status"] == "success"
+            mock_async_redis_client.move_job_to_failed.assert_awaited_once_with(
+                sample_job.id, job_failure_request.error, "worker-1"
+            )
 
-    def test_fail_job_invalid_error_message(self, mock_redis_client, sample_job):
+    def test_fail_job_invalid_error_message(self, mock_async_redis_client, sample_job):
         """Test failing job with invalid error message"""
-        with patch('main.redis_client', mock_redis_client):
+        with patch('main.redis_client', mock_async_redis_client):
             from main import app
             client = TestClient(app)
             response = client.post(
@@ -486,15 +963,36 @@ class TestWorkerEndpoints:
             assert response.status_code == 422  # Validation error
 
 
+class TestWebSocketEndpoint:
+    """Test the /ws endpoint"""
+
+    def test_topics_from_query_string(self, mock_async_redis_client):
+        """Test ?topics= subscribes the connection and messages change subscriptions"""
+        from websocket_manager import WebSocketManager
+        manager = WebSocketManager(mock_async_redis_client)
+
+        with patch('main.redis_client', mock_async_redis_client), patch('main.ws_manager', manager):
+            from main import app
+            client = TestClient(app)
+            with client.websocket_connect("/ws?topics=user:user001,job:job-1") as websocket:
+                websocket.send_text(json.dumps({"unsubscribe": ["job:job-1"], "subscribe": ["queue:stats"]}))
+                reply = json.loads(websocket.receive_text())
+                websocket.send_text("ping")
+                pong = websocket.receive_text()
+
+        assert reply == {"type": "subscribed", "topics": ["queue:stats", "user:user001"]}
+        assert pong == "pong: ping"
+
+
 class TestCORSConfiguration:
     """Test CORS configuration"""
 
-    def test_cors_allowed_origin(self, mock_redis_client):
+    def test_cors_allowed_origin(self, mock_async_redis_client):
         """Test CORS with allowed origin"""
-        mock_redis_client.ping.return_value = True
-        mock_redis_client.get_queue_depth.return_value = 0
+        mock_async_redis_client.ping.return_value = True
+        mock_async_redis_client.get_queue_depth.return_value = 0
 
-        with patch('main.redis_client', mock_redis_client):
+        with patch('main.redis_client', mock_async_redis_client):
             from main import app
             client = TestClient(app)
             response = client.get(
@@ -504,9 +1002,9 @@ class TestCORSConfiguration:
 
             assert response.status_code == 200
 
-    def test_options_request(self, mock_redis_client):
+    def test_options_request(self, mock_async_redis_client):
         """Test OPTIONS request for CORS"""
-        with patch('main.redis_client', mock_redis_client):
+        with patch('main.redis_client', mock_async_redis_client):
             from main import app
             client = TestClient(app)
             response = client.options(
@@ -521,9 +1019,9 @@ class TestCORSConfiguration:
 class TestErrorHandling:
     """Test error handling"""
 
-    def test_invalid_request_body(self, mock_redis_client):
+    def test_invalid_request_body(self, mock_async_redis_client):
         """Test handling of invalid request body"""
-        with patch('main.redis_client', mock_redis_client):
+        with patch('main.redis_client', mock_async_redis_client):
             from main import app
             client = TestClient(app)
             response = client.post(
@@ -533,9 +1031,9 @@ class TestErrorHandling:
 
             assert response.status_code == 422
 
-    def test_missing_required_fields(self, mock_redis_client):
+    def test_missing_required_fields(self, mock_async_redis_client):
         """Test handling of missing required fields"""
-        with patch('main.redis_client', mock_redis_client):
+        with patch('main.redis_client', mock_async_redis_client):
             from main import app
             client = TestClient(app)
             response = client.post(
@@ -545,9 +1043,9 @@ class TestErrorHandling:
 
             assert response.status_code == 422
 
-    def test_method_not_allowed(self, mock_redis_client):
+    def test_method_not_allowed(self, mock_async_redis_client):
         """Test 405 method not allowed"""
-        with patch('main.redis_client', mock_redis_client):
+        with patch('main.redis_client', mock_async_redis_client):
             from main import app
             client = TestClient(app)
             response = client.put("/api/jobs")  # PUT not allowed
@@ -3,11 +3,36 @@ Tests for Redis client operations
 """
 import pytest
 import json
-from datetime import datetime, timezone
-from unittest.mock import MagicMock, patch, call
+import time
+from datetime import datetime, timedelta, timezone
+from unittest.mock import ANY, MagicMock, patch, call
 from redis.exceptions import RedisError
 
 from models import Job, JobStatus, JobPriority, QueueMode
+from redis_client import RedisClientBase
+
+
+def job_hash(job):
+    """Job as stored in its Redis hash (the workflow is referenced by digest)"""
+    RedisClientBase._assign_workflow_hash(job)
+    return RedisClientBase._job_to_hash(job)[0]
+
+
+def stored_workflow(job):
+    """Workflow as stored in the workflow store"""
+    return RedisClientBase.codec.encode(job.workflow)
+
+
+def hash_pairs(job):
+    """Job hash as a flat field/value list (HGETALL reply inside a script)"""
+    return [item for pair in job_hash(job).items() for item in pair]
+
+
+def stub_job(mock_redis, job):
+    """Make the mocked job hash reads (HGETALL and summary HMGET) return job"""
+    data = job_hash(job) if job else {}
+    mock_redis.hgetall.return_value = data
+    mock_redis.hmget.return_value = [data.get(field) for field in RedisClientBase.JOB_SUMMARY_FIELDS]
 
 
 # We'll use a mock redis instead of fakeredis for more control
@@ -57,31 +82,57 @@ class TestJobCRUDOperations:
     def test_create_job_success(self, redis_client_with_mock, sample_job):
         """Test successful job creation"""
         client, mock_redis = redis_client_with_mock
-        mock_redis.set.return_value = True
-        mock_redis.zadd.return_value = 1
-        mock_redis.sadd.return_value = 1
+        client._enqueue_jobs_script = MagicMock(return_value=[3])
 
         result = client.create_job(sample_job)
         assert result is True
 
-        # Verify Redis calls
-        mock_redis.set.assert_called_once()
-        mock_redis.zadd.assert_called_once()
-        mock_redis.sadd.assert_called_once()
+        # Job data, pending queue, user jobs and round-robin index are
+        # written by one atomic script call
+        client._enqueue_jobs_script.assert_called_once()
+        kwargs = client._enqueue_jobs_script.call_args.kwargs
+        assert kwargs["keys"] == [
+            client.QUEUE_PENDING,
+            client.QUEUE_ROUND_ROBIN,
+            client.QUEUE_WAKEUP,
+            "job:job-001",
+            "user:user-1:pending",
+            "user:user-1:jobs",
+            "user:user-1:completed",
+            f"workflow:{sample_job.workflow_hash}",
+        ]
+        args = kwargs["args"]
+        assert args[0] == 0  # no depth limit
+        assert args[1] == sample_job.id
+        assert args[2] == client._get_priority_score(sample_job)
+        assert args[3] == sample_job.user_id
+        assert args[4] == sample_job.created_at.timestamp()  # history index score
+        assert client.codec.decode(args[5]) == sample_job.workflow
+        assert args[6] == len(args) - 7
+        fields = dict(zip(args[7::2], args[8::2]))
+        assert fields == job_hash(sample_job)
+        assert "workflow" not in fields
+        mock_redis.xadd.assert_called_once()
+        event = json.loads(mock_redis.xadd.call_args.args[1]["event"])
+        assert event["type"] == "job_created"
+        assert event["data"] == {
+            "id": "job-001", "user_id": "user-1", "version": 0, "status": "pending", "worker_id": None,
+            "priority": sample_job.priority.value, "created_at": sample_job.created_at.isoformat().replace("+00:00", "Z"),
+            "changed": ["priority", "created_at"], "position": 3,
+        }
 
     def test_create_job_redis_error(self, redis_client_with_mock, sample_job):
         """Test job creation with Redis error"""
         client, mock_redis = redis_client_with_mock
-        mock_redis.set.side_effect = RedisError("Connection error")
+        client._enqueue_jobs_script = MagicMock(side_effect=RedisError("Connection error"))
 
         result = client.create_job(sample_job)
-        assert result is False
+        assert result is None
 
     def test_get_job_success(self, redis_client_with_mock, sample_job):
         """Test successful job retrieval"""
         client, mock_redis = redis_client_with_mock
-        job_json = sample_job.model_dump_json()
-        mock_redis.get.return_value = job_json
+        stub_job(mock_redis, sample_job)
 
         result = client.get_job(sample_job.id)
         assert result is not None
@@ -90,7 +141,7 @@ class TestJobCRUDOperations:
     def test_get_job_not_found(self, redis_client_with_mock):
         """Test job retrieval when not found"""
         client, mock_redis = redis_client_with_mock
-        mock_redis.get.return_value = None
+        stub_job(mock_redis, None)
 
         result = client.get_job("nonexistent-id")
         assert result is None
@@ -98,7 +149,7 @@ class TestJobCRUDOperations:
     def test_get_job_invalid_json(self, redis_client_with_mock):
         """Test job retrieval with invalid JSON"""
         client, mock_redis = redis_client_with_mock
-        mock_redis.get.return_value = "invalid json"
+        mock_redis.hgetall.return_value = {"id": "job-id", "metadata": "invalid json"}
 
         result = client.get_job("job-id")
         assert result is None
@@ -106,18 +157,42 @@ class TestJobCRUDOperations:
     def test_update_job_success(self, redis_client_with_mock, sample_job):
         """Test successful job update"""
         client, mock_redis = redis_client_with_mock
-        mock_redis.set.return_value = True
+
+        client._update_job_script = MagicMock(return_value=1)
 
         sample_job.status = JobStatus.RUNNING
         result = client.update_job(sample_job)
         assert result is True
-        mock_redis.set.assert_called_once()
+        # Only state fields are written - never the workflow
+        kwargs = client._update_job_script.call_args.kwargs
+        assert kwargs["keys"] == ["job:job-001"]
+        assert "running" in kwargs["args"]
+        assert "workflow" not in kwargs["args"]
+        mock_redis.set.assert_not_called()
+
+    def test_update_job_selected_fields(self, redis_client_with_mock, sample_job):
+        """Test a transition writes only the named fields, deleting None values"""
+        client, _ = redis_client_with_mock
+        client._update_job_script = MagicMock(return_value=1)
+
+        sample_job.priority = JobPriority.HIGH
+        assert client.update_job(sample_job, ["priority", "worker_id"]) is True
+
+        args = client._update_job_script.call_args.kwargs["args"]
+        assert args == [1, "worker_id", "priority", "1"]
+
+    def test_update_deleted_job(self, redis_client_with_mock, sample_job):
+        """Test updating a job that no longer exists fails without publishing"""
+        client, mock_redis = redis_client_with_mock
+        client._update_job_script = MagicMock(return_value=0)
+
+        assert client.update_job(sample_job) is False
+        mock_redis.xadd.assert_not_called()
 
     def test_delete_job_success(self, redis_client_with_mock, sample_job):
         """Test successful job deletion"""
         client, mock_redis = redis_client_with_mock
-        job_json = sample_job.model_dump_json()
-        mock_redis.get.return_value = job_json
+        stub_job(mock_redis, sample_job)
         mock_redis.zrem.return_value = 1
         mock_redis.srem.return_value = 1
         mock_redis.delete.return_value = 1
@@ -131,7 +206,7 @@ class TestJobCRUDOperations:
     def test_delete_job_not_found(self, redis_client_with_mock):
         """Test deletion of nonexistent job"""
         client, mock_redis = redis_client_with_mock
-        mock_redis.get.return_value = None
+        stub_job(mock_redis, None)
 
         result = client.delete_job("nonexistent-id")
         assert result is False
@@ -161,7 +236,7 @@ class TestQueueOperations:
         client, mock_redis = redis_client_with_mock
         # Mock pipeline
         pipe = MagicMock()
-        pipe.execute.return_value = [5, 2, 10, 1]  # pending, running, completed, failed
+        pipe.execute.return_value = [5, 2, 10, 1, [None, None], 3]  # pending, running, completed, failed, archived, leased
         mock_redis.pipeline.return_value = pipe
 
         stats = client.get_all_queue_stats()
@@ -169,13 +244,15 @@ class TestQueueOperations:
         assert stats["running"] == 2
         assert stats["completed"] == 10
         assert stats["failed"] == 1
+        assert stats["leased"] == 3
 
     def test_get_pending_jobs(self, redis_client_with_mock, sample_job):
         """Test getting pending jobs"""
         client, mock_redis = redis_client_with_mock
         mock_redis.zrange.return_value = [sample_job.id]
-        job_json = sample_job.model_dump_json()
-        mock_redis.get.return_value = job_json
+        mock_redis.pipeline.return_value.execute.side_effect = [
+            [job_hash(sample_job)], [stored_workflow(sample_job)]
+        ]
 
         jobs = client.get_pending_jobs(limit=10)
         assert len(jobs) == 1
@@ -185,8 +262,9 @@ class TestQueueOperations:
         """Test getting jobs for a user"""
         client, mock_redis = redis_client_with_mock
         mock_redis.smembers.return_value = {sample_job.id}
-        job_json = sample_job.model_dump_json()
-        mock_redis.get.return_value = job_json
+        mock_redis.pipeline.return_value.execute.side_effect = [
+            [job_hash(sample_job)], [stored_workflow(sample_job)]
+        ]
 
         jobs = client.get_user_jobs("user-1")
         assert len(jobs) == 1
@@ -196,88 +274,71 @@ class TestQueueOperations:
 class TestJobStateTransitions:
     """Test job state transitions"""
 
-    def test_move_job_to_running(self, redis_client_with_mock, sample_job):
-        """Test moving job to running state"""
-        client, mock_redis = redis_client_with_mock
-        job_json = sample_job.model_dump_json()
-        mock_redis.get.return_value = job_json
-        mock_redis.set.return_value = True
-        mock_redis.zadd.return_value = 1
-
-        result = client.move_job_to_running(sample_job.id, "worker-1")
-        assert result is True
-
     def test_move_job_to_completed(self, redis_client_with_mock, sample_job):
-        """Test moving job to completed state"""
+        """Test completion is one script call that checks the worker"""
         client, mock_redis = redis_client_with_mock
-        job_json = sample_job.model_dump_json()
-        mock_redis.get.return_value = job_json
-        mock_redis.set.return_value = True
-        mock_redis.zrem.return_value = 1
-        mock_redis.zadd.return_value = 1
-        mock_redis.incr.return_value = 1
+        sample_job.status = JobStatus.COMPLETED
+        sample_job.result = {"result": "data"}
+        client._finish_job_script = MagicMock(return_value=hash_pairs(sample_job))
 
-        result = client.move_job_to_completed(sample_job.id, {"result": "data"})
-        assert result is True
-        # Should increment user completed count
-        mock_redis.incr.assert_called_once()
+        job = client.move_job_to_completed(sample_job.id, {"result": "data"}, "worker-1")
+
+        assert job.status == JobStatus.COMPLETED
+        assert job.result == {"result": "data"}
+        kwargs = client._finish_job_script.call_args.kwargs
+        assert kwargs["keys"][2] == client.QUEUE_COMPLETED
+        assert kwargs["args"][:3] == [sample_job.id, "completed", "worker-1"]
+        mock_redis.hmget.assert_not_called()
 
     def test_move_job_to_failed(self, redis_client_with_mock, sample_job):
-        """Test moving job to failed state"""
-        client, mock_redis = redis_client_with_mock
-        job_json = sample_job.model_dump_json()
-        mock_redis.get.return_value = job_json
-        mock_redis.set.return_value = True
-        mock_redis.zrem.return_value = 1
-        mock_redis.zadd.return_value = 1
+        """Test failure is one script call, for any worker unless one is given"""
+        client, _ = redis_client_with_mock
+        sample_job.status = JobStatus.FAILED
+        sample_job.error = "Error message"
+        client._finish_job_script = MagicMock(return_value=hash_pairs(sample_job))
 
-        result = client.move_job_to_failed(sample_job.id, "Error message")
-        assert result is True
+        job = client.move_job_to_failed(sample_job.id, "Error message")
 
-    def test_move_job_nonexistent(self, redis_client_with_mock):
-        """Test moving nonexistent job"""
-        client, mock_redis = redis_client_with_mock
-        mock_redis.get.return_value = None
+        assert job.error == "Error message"
+        kwargs = client._finish_job_script.call_args.kwargs
+        assert kwargs["keys"][2] == client.QUEUE_FAILED
+        assert kwargs["args"][:3] == [sample_job.id, "failed", ""]
 
-        result = client.move_job_to_running("nonexistent", "worker-1")
-        assert result is False
+    def test_move_job_not_held(self, redis_client_with_mock):
+        """Test a job that is missing or not running is not finished"""
+        client, _ = redis_client_with_mock
+        for reply in (0, 1):
+            client._finish_job_script = MagicMock(return_value=reply)
+            assert client.move_job_to_completed("job-1", {}, "worker-1") is None
 
 
 class TestQueueModes:
     """Test different queue modes"""
 
-    @pytest.mark.asyncio
-    async def test_get_next_job_fifo_mode(self, redis_client_with_mock, sample_job):
-        """Test FIFO mode next job selection"""
-        client, mock_redis = redis_client_with_mock
-        # zpopmin returns list of tuples: [(job_id, score)]
-        mock_redis.zpopmin.return_value = [(sample_job.id, 0)]
-        job_json = sample_job.model_dump_json()
-        mock_redis.get.return_value = job_json
+    def test_claim_fifo_mode(self, redis_client_with_mock, sample_job):
+        """Test FIFO mode claims the job the script picks"""
+        client, _ = redis_client_with_mock
+        client._claim_job_script = MagicMock(return_value=[hash_pairs(sample_job), 1])
 
-        job = client.get_next_job(QueueMode.FIFO)
+        job = client.claim_next_job("worker-1", QueueMode.FIFO)
         assert job is not None
         assert job.id == sample_job.id
 
-    @pytest.mark.asyncio
-    async def test_get_next_job_fifo_no_jobs(self, redis_client_with_mock):
-        """Test FIFO mode with no jobs"""
-        client, mock_redis = redis_client_with_mock
-        mock_redis.zpopmin.return_value = []
+    def test_claim_no_jobs(self, redis_client_with_mock):
+        """Test claiming from an empty queue"""
+        client, _ = redis_client_with_mock
+        client._claim_job_script = MagicMock(return_value=None)
 
-        job = client.get_next_job(QueueMode.FIFO)
-        assert job is None
+        assert client.claim_next_job("worker-1", QueueMode.FIFO) is None
 
-    @pytest.mark.asyncio
-    async def test_get_next_job_priority_mode(self, redis_client_with_mock, sample_job):
-        """Test PRIORITY mode next job selection"""
-        client, mock_redis = redis_client_with_mock
-        mock_redis.zpopmin.return_value = [(sample_job.id, 0)]
-        job_json = sample_job.model_dump_json()
-        mock_redis.get.return_value = job_json
+    def test_claim_passes_mode(self, redis_client_with_mock, sample_job):
+        """Test the queue mode is passed to the claim script"""
+        client, _ = redis_client_with_mock
+        client._claim_job_script = MagicMock(return_value=[hash_pairs(sample_job), 1])
 
-        job = client.get_next_job(QueueMode.PRIORITY)
-        assert job is not None
+        for mode in QueueMode:
+            client.claim_next_job("worker-1", mode)
+            assert client._claim_job_script.call_args.kwargs["args"][9] == mode.value
 
 
 class TestWorkerHeartbeat:
@@ -286,16 +347,17 @@ class TestWorkerHeartbeat:
     def test_update_worker_heartbeat(self, redis_client_with_mock):
         """Test updating worker heartbeat"""
         client, mock_redis = redis_client_with_mock
-        mock_redis.setex.return_value = True
+        pipe = mock_redis.pipeline.return_value
 
-        result = client.update_worker_heartbeat("worker-1")
+        result = client.update_worker_heartbeat("worker-1", provider="verda")
         assert result is True
-        mock_redis.setex.assert_called_once()
+        pipe.zadd.assert_called_once_with(client.WORKERS_ALIVE, {"worker-1": ANY})
+        pipe.hset.assert_called_once_with("worker:worker-1:status", mapping={"provider": "verda"})
 
     def test_is_worker_alive_true(self, redis_client_with_mock):
         """Test worker alive check when alive"""
         client, mock_redis = redis_client_with_mock
-        mock_redis.exists.return_value = 1
+        mock_redis.zscore.return_value = time.time() - 5
 
         result = client.is_worker_alive("worker-1")
         assert result is True
@@ -303,12 +365,85 @@ class TestWorkerHeartbeat:
     def test_is_worker_alive_false(self, redis_client_with_mock):
         """Test worker alive check when dead"""
         client, mock_redis = redis_client_with_mock
-        mock_redis.exists.return_value = 0
+        mock_redis.zscore.return_value = time.time() - 3600
 
         result = client.is_worker_alive("worker-1")
         assert result is False
 
 
+class TestWorkerRegistry:
+    """Test the worker registry against fakeredis"""
+
+    @pytest.fixture
+    def fake_client(self):
+        fakeredis = pytest.importorskip("fakeredis")
+        pytest.importorskip("lupa")
+        server = fakeredis.FakeRedis(decode_responses=True, encoding_errors="surrogateescape")
+        with patch('redis_client.Redis', return_value=server):
+            from redis_client import RedisClient
+            client = RedisClient()
+        return client, server
+
+    def test_live_workers(self, fake_client):
+        """Test heartbeats register workers with what they report, and running jobs make them busy"""
+        client, server = fake_client
+        client.update_worker_heartbeat("worker-1", provider="verda", capacity=1)
+        client.update_worker_heartbeat("worker-2", provider="runpod", capacity=2)
+        client.create_job(Job(id="job-1", user_id="alice", workflow={"1": {}}))
+        client.claim_next_job("worker-2")
+
+        workers = client.get_workers()
+
+        assert [(w.worker_id, w.status, w.current_job_id) for w in workers] == [
+            ("worker-1", "idle", None), ("worker-2", "busy", "job-1"),
+        ]
+        assert (workers[1].provider, workers[1].capacity) == ("runpod", 2)
+        assert client.count_live_workers() == 2
+
+    def test_job_counts(self, fake_client):
+        """Test completions and failures are counted per worker"""
+        client, server = fake_client
+        client.update_worker_heartbeat("worker-1")
+        for i in range(3):
+            client.create_job(Job(id=f"job-{i}", user_id="alice", workflow={"1": {}}))
+            client.claim_next_job("worker-1")
+        client.move_job_to_completed("job-0", {})
+        client.move_job_to_completed("job-1", {})
+        client.move_job_to_failed("job-2", "boom")
+
+        worker = client.get_workers()[0]
+
+        assert (worker.jobs_completed, worker.jobs_failed) == (2, 1)
+        assert worker.provider == "unknown"
+
+    def test_silent_workers_offline(self, fake_client):
+        """Test workers past the heartbeat timeout are offline, then forgotten"""
+        client, server = fake_client
+        now = time.time()
+        client.update_worker_heartbeat("worker-1")
+        server.zadd(client.WORKERS_ALIVE, {"worker-2": now - 120, "worker-3": now - 3600})
+
+        assert [w.worker_id for w in client.get_workers()] == ["worker-1"]
+        offline = client.get_workers(include_offline=True)
+        assert [(w.worker_id, w.status) for w in offline] == [("worker-1", "idle"), ("worker-2", "offline")]
+        assert client.count_live_workers() == 1
+        assert client.is_worker_alive("worker-2") is False
+
+        client.update_worker_heartbeat("worker-1")
+        assert server.zscore(client.WORKERS_ALIVE, "worker-3") is None
+
+    def test_eta_uses_capacity(self, fake_client):
+        """Test queue ETAs spread jobs over the live workers' capacity"""
+        client, server = fake_client
+        client.update_worker_heartbeat("worker-1", capacity=3)
+        for i in range(4):
+            client.create_job(Job(id=f"job-{i}", user_id="alice", workflow={"1": {}}))
+
+        estimates = client.get_queue_estimates(["job-2", "job-3"])
+
+        assert estimates == {"job-2": (2, 0), "job-3": (3, 60)}
+
+
 class TestPriorityScoring:
     """Test priority scoring logic"""
 
@@ -341,6 +476,7 @@ class TestCleanupOperations:
         client, mock_redis = redis_client_with_mock
         old_job_id = "old-job-1"
         mock_redis.zrangebyscore.return_value = [old_job_id]
+        mock_redis.zmscore.return_value = [None]  # No running lease
         job_data = {
             "id": old_job_id,
             "user_id": "user-1",
@@ -355,25 +491,39 @@ class TestCleanupOperations:
             "error": None,
             "metadata": {}
         }
-        job_json = json.dumps(job_data)
-        mock_redis.get.return_value = job_json
-        mock_redis.set.return_value = True
-        mock_redis.zrem.return_value = 1
-        mock_redis.zadd.return_value = 1
+        job = Job(**job_data)
+        job.status = JobStatus.FAILED
+        client._finish_job_script = MagicMock(return_value=hash_pairs(job))
 
         count = client.cleanup_stale_jobs(timeout_seconds=3600)
         assert count == 1
+        assert client._finish_job_script.call_args.kwargs["args"][0] == old_job_id
 
 
 class TestPubSubOperations:
-    """Test pub/sub operations"""
+    """Test event publishing and pub/sub operations"""
 
     def test_publish_event(self, redis_client_with_mock):
-        """Test publishing event"""
+        """Test events go to the capped stream, not pub/sub by default"""
         client, mock_redis = redis_client_with_mock
-        mock_redis.publish.return_value = 1
 
         client._publish_event("job_created", {"job_id": "job-1"})
+
+        mock_redis.xadd.assert_called_once()
+        args, kwargs = mock_redis.xadd.call_args
+        assert args[0] == client.EVENT_STREAM
+        assert json.loads(args[1]["event"])["type"] == "job_created"
+        assert kwargs == {"maxlen": 10000, "approximate": True}
+        mock_redis.publish.assert_not_called()
+
+    def test_publish_event_pubsub_enabled(self, redis_client_with_mock):
+        """Test the optional pub/sub fast path"""
+        client, mock_redis = redis_client_with_mock
+
+        with patch('redis_client.settings.event_pubsub', True):
+            client._publish_event("job_created", {"job_id": "job-1"})
+
+        mock_redis.xadd.assert_called_once()
         mock_redis.publish.assert_called_once()
 
     def test_subscribe_to_updates(self, redis_client_with_mock):
@@ -387,20 +537,1241 @@ class TestPubSubOperations:
         mock_pubsub.subscribe.assert_called_once()
 
 
-class TestAtomicOperations:
-    """Test atomic operations for race condition prevention"""
+class TestAtomicClaim:
+    """Test single round-trip job claim via server-side script"""
+
+    def test_claim_next_job_fifo(self, redis_client_with_mock, sample_job):
+        """Test claim returns the stamped job from the script"""
+        client, mock_redis = redis_client_with_mock
+        sample_job.status = JobStatus.RUNNING
+        sample_job.worker_id = "worker-1"
+        client._claim_job_script = MagicMock(return_value=[hash_pairs(sample_job), 1])
+
+        job = client.claim_next_job("worker-1", QueueMode.FIFO)
+
+        assert job is not None
+        assert job.status == JobStatus.RUNNING
+        assert job.worker_id == "worker-1"
+        client._claim_job_script.assert_called_once()
+        kwargs = client._claim_job_script.call_args.kwargs
+        assert kwargs["keys"] == [
+            client.QUEUE_PENDING, client.QUEUE_RUNNING, client.QUEUE_ROUND_ROBIN, client.QUEUE_LEASED,
+            client.QUEUE_RUNNING_LEASES,
+        ]
+        assert kwargs["args"][0] == ""  # Pop queue head
+        assert kwargs["args"][11] == ""  # Run, not lease
+        # No separate read/write round trips
+        mock_redis.hgetall.assert_not_called()
+        mock_redis.pipeline.assert_not_called()
+
+    def test_claim_next_job_empty_queue(self, redis_client_with_mock):
+        """Test claim returns None when nothing is pending"""
+        client, _ = redis_client_with_mock
+        client._claim_job_script = MagicMock(return_value=None)
+
+        assert client.claim_next_job("worker-1", QueueMode.FIFO) is None
+
+    def test_claim_next_job_redis_error(self, redis_client_with_mock):
+        """Test claim handles Redis errors"""
+        client, _ = redis_client_with_mock
+        client._claim_job_script = MagicMock(side_effect=RedisError("Connection error"))
+
+        assert client.claim_next_job("worker-1", QueueMode.FIFO) is None
+
+    def test_claim_legacy_layout_is_stamped(self, redis_client_with_mock, sample_job):
+        """Test jobs still stored as a JSON string are stamped and converted client-side"""
+        client, mock_redis = redis_client_with_mock
+        client._claim_job_script = MagicMock(return_value=[sample_job.model_dump_json(), 0])
+
+        job = client.claim_next_job("worker-1", QueueMode.PRIORITY)
+
+        assert job.status == JobStatus.RUNNING
+        assert job.worker_id == "worker-1"
+        assert job.started_at is not None
+        pipe = mock_redis.pipeline.return_value
+        pipe.delete.assert_called_once_with("job:job-001")
+        stored = pipe.hset.call_args.kwargs["mapping"]
+        assert stored["status"] == "running"
+        assert stored["worker_id"] == "worker-1"
 
-    def test_move_job_atomic(self, redis_client_with_mock, sample_job):
-        """Test that job moves are atomic"""
+    def test_claim_round_robin_selects_in_script(self, redis_client_with_mock, sample_job):
+        """Test round-robin selection is delegated to the script in one call"""
         client, mock_redis = redis_client_with_mock
-        job_json = sample_job.model_dump_json()
-        mock_redis.get.return_value = job_json
-        mock_redis.set.return_value = True
-        mock_redis.zadd.return_value = 1
+        client._claim_job_script = MagicMock(return_value=[hash_pairs(sample_job), 1])
 
-        # Verify zpopmin is used (atomic operation)
-        mock_redis.zpopmin.return_value = [(sample_job.id, 0)]
-        job = client.get_next_job(QueueMode.FIFO)
+        job = client.claim_next_job("worker-1", QueueMode.ROUND_ROBIN)
 
-        # zpopmin should be called (atomic pop)
-        mock_redis.zpopmin.assert_called_once()
+        assert job.id == sample_job.id
+        client._claim_job_script.assert_called_once()
+        kwargs = client._claim_job_script.call_args.kwargs
+        assert kwargs["keys"][2] == client.QUEUE_ROUND_ROBIN
+        assert kwargs["args"][0] == ""
+        assert kwargs["args"][9] == "round_robin"
+        # No scan of the pending queue
+        mock_redis.zrange.assert_not_called()
+
+
+class TestAtomicClaimScript:
+    """Run the claim script against fakeredis to verify its Redis-side behaviour"""
+
+    @pytest.fixture
+    def fake_client(self):
+        fakeredis = pytest.importorskip("fakeredis")
+        pytest.importorskip("lupa")
+        server = fakeredis.FakeRedis(decode_responses=True, encoding_errors="surrogateescape")
+        with patch('redis_client.Redis', return_value=server):
+            from redis_client import RedisClient
+            client = RedisClient()
+        return client, server
+
+    def test_claim_moves_job_atomically(self, fake_client):
+        """Test job leaves pending, enters running and is stamped in place"""
+        client, server = fake_client
+        workflow = {"3": {"inputs": {"seed": 156680208700286, "images": []}, "class_type": "KSampler"}}
+        job = Job(id="job-claim", user_id="user-1", workflow=workflow, metadata={"note": ',"workflow":'})
+        client.create_job(job)
+
+        claimed = client.claim_next_job("worker-7", QueueMode.FIFO)
+
+        assert claimed.id == "job-claim"
+        assert claimed.status == JobStatus.RUNNING
+        assert claimed.worker_id == "worker-7"
+        assert claimed.started_at is not None
+        # Workflow body is preserved byte-for-byte (large ints, empty arrays)
+        assert claimed.workflow == workflow
+        assert server.zcard(client.QUEUE_PENDING) == 0
+        assert server.zscore(client.QUEUE_RUNNING, "job-claim") is not None
+        stored = client.get_job("job-claim")
+        assert stored.status == JobStatus.RUNNING
+        assert stored.metadata == {"note": ',"workflow":'}
+
+    def test_claim_empty_queue(self, fake_client):
+        """Test claiming from an empty queue returns None"""
+        client, _ = fake_client
+        assert client.claim_next_job("worker-1", QueueMode.FIFO) is None
+
+
+class TestRoundRobinIndex:
+    """Test the indexed round-robin scheduler against fakeredis"""
+
+    @pytest.fixture
+    def fake_client(self):
+        fakeredis = pytest.importorskip("fakeredis")
+        pytest.importorskip("lupa")
+        server = fakeredis.FakeRedis(decode_responses=True, encoding_errors="surrogateescape")
+        with patch('redis_client.Redis', return_value=server):
+            from redis_client import RedisClient
+            client = RedisClient()
+        return client, server
+
+    def _submit(self, client, job_id, user_id, priority=JobPriority.NORMAL):
+        job = Job(id=job_id, user_id=user_id, workflow={"1": {"class_type": "test"}}, priority=priority)
+        client.create_job(job)
+        return job
+
+    def test_fewest_completed_user_goes_first(self, fake_client):
+        """Test the user with the fewest completed jobs is served first"""
+        client, server = fake_client
+        server.set("user:alice:completed", 3)
+        self._submit(client, "a-1", "alice")
+        self._submit(client, "a-2", "alice")
+        self._submit(client, "b-1", "bob")
+
+        job = client.claim_next_job("worker-1", QueueMode.ROUND_ROBIN)
+        assert job.id == "b-1"
+        # Bob has nothing left pending, so he leaves the index
+        assert server.zrange(client.QUEUE_ROUND_ROBIN, 0, -1) == ["alice"]
+
+        job = client.claim_next_job("worker-1", QueueMode.ROUND_ROBIN)
+        assert job.id == "a-1"
+        assert server.zcard(client.QUEUE_PENDING) == 1
+
+    def test_completion_updates_fairness_score(self, fake_client):
+        """Test completing a job re-ranks the user in the index"""
+        client, server = fake_client
+        self._submit(client, "a-1", "alice")
+        self._submit(client, "a-2", "alice")
+        self._submit(client, "b-1", "bob")
+        self._submit(client, "b-2", "bob")
+
+        first = client.claim_next_job("worker-1", QueueMode.ROUND_ROBIN)
+        assert first.id == "a-1"
+        client.move_job_to_completed(first.id, {"ok": True})
+        assert server.zscore(client.QUEUE_ROUND_ROBIN, "alice") == 1
+
+        second = client.claim_next_job("worker-1", QueueMode.ROUND_ROBIN)
+        assert second.user_id == "bob"
+
+    def test_priority_respected_within_user(self, fake_client):
+        """Test a user's higher-priority job is picked before their older one"""
+        client, _ = fake_client
+        self._submit(client, "a-low", "alice", JobPriority.LOW)
+        self._submit(client, "a-high", "alice", JobPriority.HIGH)
+
+        job = client.claim_next_job("worker-1", QueueMode.ROUND_ROBIN)
+        assert job.id == "a-high"
+
+    def test_fifo_claim_keeps_index_consistent(self, fake_client):
+        """Test claims in other modes also maintain the per-user index"""
+        client, server = fake_client
+        self._submit(client, "a-1", "alice")
+
+        client.claim_next_job("worker-1", QueueMode.FIFO)
+
+        assert server.zcard("user:alice:pending") == 0
+        assert server.zcard(client.QUEUE_ROUND_ROBIN) == 0
+
+    def test_delete_removes_from_index(self, fake_client):
+        """Test cancelling a pending job removes it from the index"""
+        client, server = fake_client
+        self._submit(client, "a-1", "alice")
+
+        client.delete_job("a-1")
+
+        assert server.zcard("user:alice:pending") == 0
+        assert server.zcard(client.QUEUE_ROUND_ROBIN) == 0
+        assert client.claim_next_job("worker-1", QueueMode.ROUND_ROBIN) is None
+
+    def test_rebuild_index_for_legacy_queue(self, fake_client):
+        """Test jobs queued before the index existed are indexed at startup"""
+        client, server = fake_client
+        job = Job(id="old-1", user_id="carol", workflow={"1": {}})
+        server.set("job:old-1", job.model_dump_json())
+        server.zadd(client.QUEUE_PENDING, {"old-1": 5.0})
+
+        assert client.rebuild_round_robin_index() == 1
+
+        assert server.zrange(client.QUEUE_ROUND_ROBIN, 0, -1) == ["carol"]
+        claimed = client.claim_next_job("worker-1", QueueMode.ROUND_ROBIN)
+        assert claimed.id == "old-1"
+
+
+class TestQueueEstimates:
+    """Test ZRANK-based queue position and ETA against fakeredis"""
+
+    @pytest.fixture
+    def fake_client(self):
+        fakeredis = pytest.importorskip("fakeredis")
+        pytest.importorskip("lupa")
+        server = fakeredis.FakeRedis(decode_responses=True, encoding_errors="surrogateescape")
+        with patch('redis_client.Redis', return_value=server):
+            from redis_client import RedisClient
+            client = RedisClient()
+        return client, server
+
+    def test_position_beyond_first_hundred(self, fake_client):
+        """Test positions are exact at any queue depth"""
+        client, server = fake_client
+        for i in range(150):
+            server.zadd(client.QUEUE_PENDING, {f"job-{i:03d}": i})
+
+        estimates = client.get_queue_estimates(["job-000", "job-149", "missing"])
+
+        assert estimates["job-000"][0] == 0
+        assert estimates["job-149"][0] == 149
+        assert "missing" not in estimates
+
+    def test_no_pending_jobs(self, fake_client):
+        """Test jobs claimed since their status was read get no estimate"""
+        client, server = fake_client
+        client.create_job(Job(id="claimed", user_id="alice", workflow={"1": {}}))
+        client.claim_next_job("worker-1")
+
+        assert client.get_queue_estimates(["claimed"]) == {}
+
+    def test_wait_time_uses_default_runtime(self, fake_client):
+        """Test ETA falls back to default_job_runtime with no history"""
+        client, server = fake_client
+        server.zadd(client.QUEUE_PENDING, {"a": 1, "b": 2, "c": 3})
+
+        with patch('redis_client.settings.default_job_runtime', 60), patch('redis_client.settings.num_workers', 1):
+            estimates = client.get_queue_estimates(["c"])
+
+        assert estimates["c"] == (2, 120)
+
+    @staticmethod
+    def run_job(client, server, runtime):
+        """Claim and complete the next job, as if it had run for runtime seconds"""
+        job = client.claim_next_job("worker-1")
+        started = datetime.now(timezone.utc) - timedelta(seconds=runtime)
+        server.hset(client.JOB_KEY.format(job_id=job.id), "started_at", started.isoformat())
+        client.move_job_to_completed(job.id, {"ok": True})
+
+    def test_wait_time_uses_workflow_runtimes(self, fake_client):
+        """Test each job ahead counts with its own workflow's runtime"""
+        client, server = fake_client
+        slow, fast = {"1": {"class_type": "Slow"}}, {"1": {"class_type": "Fast"}}
+        client.create_job(Job(id="slow-1", user_id="alice", workflow=slow))
+        self.run_job(client, server, 90)
+        client.create_job(Job(id="fast-1", user_id="alice", workflow=fast))
+        self.run_job(client, server, 10)
+        for job_id, workflow in (("slow-2", slow), ("fast-2", fast), ("fast-3", fast), ("new-1", {"1": {}})):
+            client.create_job(Job(id=job_id, user_id="bob", workflow=workflow))
+
+        with patch('redis_client.settings.num_workers', 1):
+            estimates = client.get_queue_estimates(["slow-2", "fast-2", "fast-3", "new-1"])
+
+        assert estimates == {"slow-2": (0, 0), "fast-2": (1, 90), "fast-3": (2, 100), "new-1": (3, 110)}
+
+    def test_wait_time_counts_running_jobs_and_live_workers(self, fake_client):
+        """Test queued jobs wait for running ones, spread over the workers that heartbeat"""
+        client, server = fake_client
+        for i in range(4):
+            client.create_job(Job(id=f"job-{i}", user_id="alice", workflow={"1": {}}))
+        self.run_job(client, server, 60)
+        client.claim_next_job("worker-1")
+        client.update_worker_heartbeat("worker-1")
+        client.update_worker_heartbeat("worker-2")
+
+        with patch('redis_client.settings.num_workers', 1):
+            estimates = client.get_queue_estimates(["job-2", "job-3"])
+
+        assert estimates["job-2"] == (0, 0)  # worker-2 is idle
+        assert 58 <= estimates["job-3"][1] <= 60  # waits for job-1 on worker-1
+
+    def test_runtime_statistics(self, fake_client):
+        """Test completed runtimes feed a per-signature EWMA and quantiles"""
+        client, server = fake_client
+        for i, runtime in enumerate((10, 20, 30)):
+            client.create_job(Job(id=f"job-{i}", user_id="alice", workflow={"1": {"class_type": "A"}}))
+            self.run_job(client, server, runtime)
+
+        stats = client.get_runtime_stats()
+
+        assert len(stats) == 1
+        assert stats[0].signature == client.get_job("job-0").signature
+        assert stats[0].count == 3
+        assert stats[0].ewma == pytest.approx(10 + 0.3 * 10 + 0.3 * (30 - 13), abs=0.1)
+        assert stats[0].p50 == pytest.approx(20, abs=0.1)
+        assert server.hget(client.STATS_JOB_RUNTIME, "count") == "3"
+
+
+class TestBulkHydration:
+    """Test bulk job loading"""
+
+    def test_get_jobs_single_round_trip(self, redis_client_with_mock, multiple_jobs):
+        """Test jobs are loaded with one pipelined HGETALL per job, then each distinct workflow once"""
+        client, mock_redis = redis_client_with_mock
+        pipe = mock_redis.pipeline.return_value
+        ids = [j.id for j in multiple_jobs]
+        digest = client._workflow_digest(multiple_jobs[0].workflow)
+        pipe.execute.side_effect = [
+            [
+                job_hash(multiple_jobs[0]),
+                {},
+                job_hash(multiple_jobs[2]),
+                {"id": ids[3], "metadata": "not json"},
+                job_hash(multiple_jobs[4]),
+            ],
+            [stored_workflow(multiple_jobs[0])],
+        ]
+
+        jobs = client.get_jobs(ids)
+
+        assert [j.id for j in jobs] == [ids[0], ids[2], ids[4]]
+        assert all(j.workflow == multiple_jobs[0].workflow for j in jobs)
+        assert pipe.hgetall.call_count == 5
+        # All five jobs share one workflow - it is read once
+        pipe.hget.assert_called_once_with(f"workflow:{digest}", "data")
+        assert pipe.execute.call_count == 2
+        mock_redis.hgetall.assert_not_called()
+
+    def test_get_jobs_without_workflow(self, redis_client_with_mock, multiple_jobs):
+        """Test summary reads skip the workflow field"""
+        client, mock_redis = redis_client_with_mock
+        pipe = mock_redis.pipeline.return_value
+        data = job_hash(multiple_jobs[0])
+        pipe.execute.return_value = [[data.get(f) for f in client.JOB_SUMMARY_FIELDS]]
+
+        jobs = client.get_jobs([multiple_jobs[0].id], include_workflow=False)
+
+        assert jobs[0].id == multiple_jobs[0].id
+        assert jobs[0].workflow == {}
+        pipe.hmget.assert_called_once_with("job:job-000", client.JOB_SUMMARY_FIELDS)
+        assert "workflow" not in client.JOB_SUMMARY_FIELDS
+
+    def test_get_jobs_empty(self, redis_client_with_mock):
+        """Test no Redis call is made for an empty ID list"""
+        client, mock_redis = redis_client_with_mock
+        assert client.get_jobs([]) == []
+        mock_redis.pipeline.assert_not_called()
+
+    def test_get_pending_jobs_uses_bulk_load(self, redis_client_with_mock, multiple_jobs):
+        """Test pending listing hydrates all jobs at once"""
+        client, mock_redis = redis_client_with_mock
+        mock_redis.zrange.return_value = [j.id for j in multiple_jobs]
+        mock_redis.pipeline.return_value.execute.side_effect = [
+            [job_hash(j) for j in multiple_jobs], [stored_workflow(multiple_jobs[0])]
+        ]
+
+        jobs = client.get_pending_jobs(limit=100)
+
+        assert len(jobs) == 5
+        assert jobs[4].workflow == multiple_jobs[4].workflow
+        mock_redis.hgetall.assert_not_called()
+
+
+class TestHashStorage:
+    """Test field-level job storage and legacy migration against fakeredis"""
+
+    @pytest.fixture
+    def fake_client(self):
+        fakeredis = pytest.importorskip("fakeredis")
+        pytest.importorskip("lupa")
+        server = fakeredis.FakeRedis(decode_responses=True, encoding_errors="surrogateescape")
+        with patch('redis_client.Redis', return_value=server):
+            from redis_client import RedisClient
+            client = RedisClient()
+        return client, server
+
+    def test_job_stored_as_hash(self, fake_client):
+        """Test jobs round-trip through their hash, large ints and empty arrays intact"""
+        client, server = fake_client
+        workflow = {"3": {"inputs": {"seed": 156680208700286, "images": []}}}
+        client.create_job(Job(id="job-1", user_id="alice", workflow=workflow, metadata={"a": 1}))
+
+        assert server.type("job:job-1") == "hash"
+        assert server.hget("job:job-1", "status") == "pending"
+        assert "started_at" not in server.hkeys("job:job-1")
+        job = client.get_job("job-1")
+        assert job.workflow == workflow
+        assert job.metadata == {"a": 1}
+
+    def test_transitions_never_rewrite_workflow(self, fake_client):
+        """Test running/completed transitions send only the changed fields"""
+        client, server = fake_client
+        workflow = {"blob": "x" * 100_000}
+        client.create_job(Job(id="job-1", user_id="alice", workflow=workflow))
+
+        sent = []
+        original = server.execute_command
+
+        def recording(*args, **kwargs):
+            sent.append(sum(len(str(a)) for a in args))
+            return original(*args, **kwargs)
+
+        server.execute_command = recording
+        client.claim_next_job("worker-1")
+        client.move_job_to_completed("job-1", {"images": ["out.png"]})
+        server.execute_command = original
+
+        assert max(sent) < 10_000
+        job = client.get_job("job-1")
+        assert job.status == JobStatus.COMPLETED
+        assert job.worker_id == "worker-1"
+        assert job.result == {"images": ["out.png"]}
+        assert job.workflow == workflow
+
+    def test_update_deleted_job_not_resurrected(self, fake_client):
+        """Test a late transition on a deleted job does not recreate it"""
+        client, server = fake_client
+        job = Job(id="job-1", user_id="alice", workflow={"1": {}})
+        client.create_job(job)
+        client.delete_job("job-1")
+
+        job.status = JobStatus.CANCELLED
+        assert client.update_job(job) is False
+        assert not server.exists("job:job-1")
+
+    def test_legacy_string_job_migrated_on_read(self, fake_client):
+        """Test a JSON-string job is converted to a hash when first read"""
+        client, server = fake_client
+        legacy = Job(id="old-1", user_id="carol", workflow={"1": {"seed": 2 ** 60}})
+        server.set("job:old-1", legacy.model_dump_json())
+
+        job = client.get_job("old-1", include_workflow=False)
+
+        assert job.id == "old-1"
+        assert server.type("job:old-1") == "hash"
+        assert client.get_job("old-1").workflow == {"1": {"seed": 2 ** 60}}
+
+    def test_legacy_jobs_in_bulk_read(self, fake_client):
+        """Test bulk reads convert legacy jobs alongside hash jobs"""
+        client, server = fake_client
+        client.create_job(Job(id="new-1", user_id="alice", workflow={"1": {}}))
+        server.set("job:old-1", Job(id="old-1", user_id="carol", workflow={"1": {}}).model_dump_json())
+
+        jobs = client.get_jobs(["new-1", "old-1", "missing"])
+
+        assert [j.id for j in jobs] == ["new-1", "old-1"]
+        assert server.type("job:old-1") == "hash"
+
+    def test_migrate_job_storage(self, fake_client):
+        """Test the startup migration converts every legacy job"""
+        client, server = fake_client
+        for i in range(3):
+            server.set(f"job:old-{i}", Job(id=f"old-{i}", user_id="carol", workflow={"1": {}}).model_dump_json())
+        client.create_job(Job(id="new-1", user_id="alice", workflow={"1": {}}))
+
+        assert client.migrate_job_storage() == 3
+        assert all(server.type(f"job:old-{i}") == "hash" for i in range(3))
+        assert client.migrate_job_storage() == 0
+
+    def test_claim_legacy_string_job(self, fake_client):
+        """Test a legacy job in the pending queue is claimed and converted"""
+        client, server = fake_client
+        legacy = Job(id="old-1", user_id="carol", workflow={"1": {}})
+        server.set("job:old-1", legacy.model_dump_json())
+        server.zadd(client.QUEUE_PENDING, {"old-1": 1.0})
+
+        job = client.claim_next_job("worker-1")
+
+        assert job.id == "old-1"
+        assert job.status == JobStatus.RUNNING
+        assert server.type("job:old-1") == "hash"
+        assert server.hget("job:old-1", "worker_id") == "worker-1"
+
+
+class TestWorkflowStore:
+    """Test content-addressed workflow storage against fakeredis"""
+
+    @pytest.fixture
+    def fake_client(self):
+        fakeredis = pytest.importorskip("fakeredis")
+        pytest.importorskip("lupa")
+        server = fakeredis.FakeRedis(decode_responses=True, encoding_errors="surrogateescape")
+        with patch('redis_client.Redis', return_value=server):
+            from redis_client import RedisClient
+            client = RedisClient()
+        return client, server
+
+    def workflow_keys(self, server):
+        return list(server.scan_iter(match="workflow:*"))
+
+    def test_identical_workflows_stored_once(self, fake_client):
+        """Test resubmissions share one workflow entry, regardless of key order"""
+        client, server = fake_client
+        client.create_job(Job(id="job-1", user_id="alice", workflow={"a": 1, "b": {"c": [1, 2]}}))
+        client.create_job(Job(id="job-2", user_id="bob", workflow={"b": {"c": [1, 2]}, "a": 1}))
+        client.create_job(Job(id="job-3", user_id="bob", workflow={"a": 2}))
+
+        keys = self.workflow_keys(server)
+        assert len(keys) == 2
+        first, second = client.get_job("job-1"), client.get_job("job-2")
+        assert first.workflow_hash == second.workflow_hash
+        assert server.hget(f"workflow:{first.workflow_hash}", "refs") == "2"
+        assert "workflow" not in server.hkeys("job:job-1")
+        assert second.workflow == {"a": 1, "b": {"c": [1, 2]}}
+
+    def test_delete_releases_workflow(self, fake_client):
+        """Test the workflow is dropped with its last job, and only once per job"""
+        client, server = fake_client
+        workflow = {"1": {"class_type": "test"}}
+        for job_id in ("job-1", "job-2"):
+            client.create_job(Job(id=job_id, user_id="alice", workflow=workflow))
+        digest = client.get_job("job-1").workflow_hash
+
+        client.delete_job("job-1")
+        client.delete_job("job-1")
+        assert server.hget(f"workflow:{digest}", "refs") == "1"
+
+        client.delete_job("job-2")
+        assert self.workflow_keys(server) == []
+
+    def test_claim_returns_stored_workflow(self, fake_client):
+        """Test the claim script loads the workflow from the store"""
+        client, _ = fake_client
+        workflow = {"3": {"inputs": {"seed": 156680208700286, "images": []}}}
+        client.create_job(Job(id="job-1", user_id="alice", workflow=workflow))
+
+        job = client.claim_next_job("worker-1")
+
+        assert job.workflow == workflow
+        assert job.workflow_hash == client._workflow_digest(workflow)
+
+    def test_bulk_read_loads_each_workflow_once(self, fake_client):
+        """Test get_jobs reads shared workflows once"""
+        client, server = fake_client
+        for i in range(4):
+            client.create_job(Job(id=f"job-{i}", user_id="alice", workflow={"1": {"n": i % 2}}))
+
+        jobs = client.get_jobs([f"job-{i}" for i in range(4)])
+
+        assert [job.workflow for job in jobs] == [{"1": {"n": i % 2}} for i in range(4)]
+
+    def test_legacy_jobs_interned_on_migration(self, fake_client):
+        """Test converted legacy jobs reference the store too"""
+        client, server = fake_client
+        workflow = {"1": {"class_type": "test"}}
+        client.create_job(Job(id="new-1", user_id="alice", workflow=workflow))
+        server.set("job:old-1", Job(id="old-1", user_id="carol", workflow=workflow).model_dump_json())
+
+        assert client.migrate_job_storage() == 1
+
+        digest = client._workflow_digest(workflow)
+        assert server.hget("job:old-1", "workflow_hash") == digest
+        assert server.hget(f"workflow:{digest}", "refs") == "2"
+        assert client.get_job("old-1").workflow == workflow
+
+    def test_inline_workflow_hash_still_readable(self, fake_client):
+        """Test job hashes written before the store (inline workflow) still load"""
+        client, server = fake_client
+        server.hset("job:old-1", mapping={
+            "id": "old-1", "user_id": "carol", "workflow": '{"1": {}}',
+            "status": "pending", "priority": "2", "created_at": "2026-01-01T00:00:00+00:00",
+            "metadata": "{}",
+        })
+
+        assert client.get_job("old-1").workflow == {"1": {}}
+        assert client.delete_job("old-1") is True
+        assert not server.exists("job:old-1")
+
+
+class TestPayloadStorage:
+    """Test codec-encoded payload fields against fakeredis"""
+
+    @pytest.fixture
+    def fake_client(self):
+        fakeredis = pytest.importorskip("fakeredis")
+        pytest.importorskip("lupa")
+        pytest.importorskip("msgpack")
+        server = fakeredis.FakeRedis(decode_responses=True, encoding_errors="surrogateescape")
+        with patch('redis_client.Redis', return_value=server):
+            from redis_client import RedisClient
+            client = RedisClient()
+        return client, server
+
+    def test_result_stored_encoded(self, fake_client):
+        """Test results are stored binary and read back intact"""
+        client, server = fake_client
+        client.create_job(Job(id="job-1", user_id="alice", workflow={"1": {}}))
+        client.claim_next_job("worker-1")
+        result = {"outputs": {"9": {"images": [{"filename": f"{i}.png"} for i in range(500)]}}}
+
+        assert client.move_job_to_completed("job-1", result).result == result
+
+        raw = server.hget("job:job-1", "result").encode("utf-8", "surrogateescape")
+        assert raw[0] == 0xC1
+        assert len(raw) < len(json.dumps(result))
+        assert client.get_job("job-1").result == result
+        assert client.get_job("job-1", include_workflow=False).result == result
+
+    def test_large_workflow_claimed_intact(self, fake_client):
+        """Test a compressed stored workflow comes back from the claim script"""
+        client, server = fake_client
+        workflow = {str(i): {"class_type": "KSampler", "inputs": {"seed": 2 ** 60 + i}} for i in range(2000)}
+        client.create_job(Job(id="job-1", user_id="alice", workflow=workflow))
+
+        job = client.claim_next_job("worker-1")
+
+        assert job.workflow == workflow
+
+    def test_legacy_json_payloads_still_read(self, fake_client):
+        """Test hashes with JSON workflow/result (previous layout) are read"""
+        client, server = fake_client
+        server.hset("job:old-1", mapping={
+            "id": "old-1", "user_id": "carol", "workflow": '{"1": {}}', "status": "completed",
+            "priority": "2", "created_at": "2026-01-01T00:00:00+00:00", "metadata": "{}",
+            "result": '{"outputs": []}',
+        })
+
+        job = client.get_job("old-1")
+
+        assert job.workflow == {"1": {}}
+        assert job.result == {"outputs": []}
+
+
+class TestBatchCreation:
+    """Test atomic batch job creation against fakeredis"""
+
+    @pytest.fixture
+    def fake_client(self):
+        fakeredis = pytest.importorskip("fakeredis")
+        pytest.importorskip("lupa")
+        server = fakeredis.FakeRedis(decode_responses=True, encoding_errors="surrogateescape")
+        with patch('redis_client.Redis', return_value=server):
+            from redis_client import RedisClient
+            client = RedisClient()
+        return client, server
+
+    def test_create_jobs(self, fake_client):
+        """Test a batch is queued, indexed and announced with one event"""
+        client, server = fake_client
+        jobs = [Job(id=f"job-{i}", user_id=f"user-{i % 2}", workflow={"1": {"seed": i % 2}}) for i in range(4)]
+        client._publish_event = MagicMock()
+
+        assert client.create_jobs(jobs) is True
+
+        assert server.zrange(client.QUEUE_PENDING, 0, -1) == [f"job-{i}" for i in range(4)]
+        assert server.zrange(client.QUEUE_ROUND_ROBIN, 0, -1) == ["user-0", "user-1"]
+        assert server.hget(f"workflow:{jobs[0].workflow_hash}", "refs") == "2"
+        assert [j.workflow for j in client.get_jobs([j.id for j in jobs])] == [j.workflow for j in jobs]
+        client._publish_event.assert_called_once()
+        event_type, data = client._publish_event.call_args.args
+        assert event_type == "jobs_created"
+        assert [j["id"] for j in data["jobs"]] == [f"job-{i}" for i in range(4)]
+
+    def test_shared_workflow_sent_once(self, fake_client):
+        """Test a workflow repeated in a batch is only sent with its first job"""
+        client, _ = fake_client
+        jobs = [Job(user_id="alice", workflow={"1": {"class_type": "test"}}) for _ in range(3)]
+
+        _, args = client._enqueue_params(jobs)
+
+        assert sum(isinstance(arg, bytes) for arg in args) == 1
+        assert args.count("") == 2
+
+    def test_create_jobs_respects_max_depth(self, fake_client):
+        """Test a batch that would overflow the queue is rejected whole"""
+        client, server = fake_client
+        client.create_job(Job(id="job-0", user_id="alice", workflow={"1": {}}))
+        batch = [Job(id=f"job-{i}", user_id="bob", workflow={"1": {}}) for i in range(1, 4)]
+
+        assert client.create_jobs(batch, max_depth=3) is False
+        assert server.zcard(client.QUEUE_PENDING) == 1
+        assert not server.exists("job:job-1")
+        assert server.hget(f"workflow:{batch[0].workflow_hash}", "refs") == "1"
+
+        assert client.create_jobs(batch[:2], max_depth=3) is True
+        assert server.zcard(client.QUEUE_PENDING) == 3
+
+    def test_create_job_respects_max_depth(self, fake_client):
+        """Test a single job is refused by the enqueue script once the queue is at max depth"""
+        client, server = fake_client
+        for i in range(2):
+            assert client.create_job(Job(id=f"job-{i}", user_id="alice", workflow={"1": {}}), max_depth=2) is True
+
+        assert client.create_job(Job(id="job-2", user_id="bob", workflow={"1": {}}), max_depth=2) is False
+        assert server.zcard(client.QUEUE_PENDING) == 2
+        assert not server.exists("job:job-2")
+
+    def test_create_jobs_redis_error(self, fake_client):
+        """Test Redis errors return None"""
+        client, _ = fake_client
+        client._enqueue_jobs_script = MagicMock(side_effect=RedisError("down"))
+
+        assert client.create_jobs([Job(user_id="alice", workflow={"1": {}})]) is None
+
+
+class TestPrefetchLeases:
+    """Test prefetch leases against fakeredis"""
+
+    @pytest.fixture
+    def fake_client(self):
+        fakeredis = pytest.importorskip("fakeredis")
+        pytest.importorskip("lupa")
+        server = fakeredis.FakeRedis(decode_responses=True, encoding_errors="surrogateescape")
+        with patch('redis_client.Redis', return_value=server):
+            from redis_client import RedisClient
+            client = RedisClient()
+        return client, server
+
+    def test_lease_jobs(self, fake_client):
+        """Test leased jobs leave the pending queue but stay pending"""
+        client, server = fake_client
+        for i in range(3):
+            client.create_job(Job(id=f"job-{i}", user_id="alice", workflow={"1": {"seed": i}}))
+
+        leased = client.lease_jobs("worker-1", 2)
+
+        assert [job.id for job in leased] == ["job-0", "job-1"]
+        assert [job.workflow for job in leased] == [{"1": {"seed": 0}}, {"1": {"seed": 1}}]
+        assert server.zrange(client.QUEUE_PENDING, 0, -1) == ["job-2"]
+        assert server.zcard(client.QUEUE_RUNNING) == 0
+        assert server.zcard(client.QUEUE_LEASED) == 2
+        stored = client.get_job("job-0", include_workflow=False)
+        assert stored.status == JobStatus.PENDING
+        assert stored.worker_id == "worker-1"
+        assert stored.started_at is None
+
+    def test_lease_jobs_stops_when_empty(self, fake_client):
+        """Test leasing more jobs than are pending returns what there is"""
+        client, _ = fake_client
+        client.create_job(Job(id="job-0", user_id="alice", workflow={"1": {}}))
+
+        assert [job.id for job in client.lease_jobs("worker-1", 4)] == ["job-0"]
+        assert client.lease_jobs("worker-1", 4) == []
+
+    def test_start_leased_job(self, fake_client):
+        """Test only the lease holder can start a leased job"""
+        client, server = fake_client
+        client.create_job(Job(id="job-0", user_id="alice", workflow={"1": {}}))
+        client.lease_jobs("worker-1", 1)
+
+        assert client.start_leased_job("job-0", "worker-2") is None
+        job = client.start_leased_job("job-0", "worker-1")
+
+        assert job.status == JobStatus.RUNNING
+        assert job.started_at is not None
+        assert server.zcard(client.QUEUE_LEASED) == 0
+        assert server.zscore(client.QUEUE_RUNNING, "job-0") is not None
+        assert client.start_leased_job("job-0", "worker-1") is None
+
+    def test_renew_leases(self, fake_client):
+        """Test a worker can only renew the leases it holds"""
+        client, server = fake_client
+        for i in range(2):
+            client.create_job(Job(id=f"job-{i}", user_id="alice", workflow={"1": {}}))
+        client.lease_jobs("worker-1", 1, lease_seconds=10)
+        client.lease_jobs("worker-2", 1, lease_seconds=10)
+        expiry = server.zscore(client.QUEUE_LEASED, "job-0")
+
+        renewed = client.renew_leases("worker-1", ["job-0", "job-1", "job-missing"], lease_seconds=60)
+
+        assert renewed == ["job-0"]
+        assert server.zscore(client.QUEUE_LEASED, "job-0") > expiry + 40
+        assert server.zscore(client.QUEUE_LEASED, "job-1") < expiry + 1
+
+    def test_requeue_expired_leases(self, fake_client):
+        """Test expired leases go back to their old place in the queue"""
+        client, server = fake_client
+        for i in range(3):
+            client.create_job(Job(id=f"job-{i}", user_id=f"user-{i}", workflow={"1": {}}))
+        score = server.zscore(client.QUEUE_PENDING, "job-0")
+        client.lease_jobs("worker-1", 1, lease_seconds=-1)
+        client.lease_jobs("worker-1", 1, lease_seconds=60)
+        server.delete(client.QUEUE_WAKEUP)
+
+        assert client.requeue_expired_leases() == 1
+
+        assert server.zrange(client.QUEUE_PENDING, 0, -1) == ["job-0", "job-2"]
+        assert server.zscore(client.QUEUE_PENDING, "job-0") == score
+        assert server.zrange(client.QUEUE_LEASED, 0, -1) == ["job-1"]
+        assert "user-0" in server.zrange(client.QUEUE_ROUND_ROBIN, 0, -1)
+        assert server.llen(client.QUEUE_WAKEUP) == 1
+        assert client.get_job("job-0").worker_id is None
+        assert client.claim_next_job("worker-2", QueueMode.ROUND_ROBIN).id == "job-0"
+
+    def test_delete_leased_job(self, fake_client):
+        """Test cancelling a leased job removes the lease"""
+        client, server = fake_client
+        client.create_job(Job(id="job-0", user_id="alice", workflow={"1": {}}))
+        client.lease_jobs("worker-1", 1)
+
+        assert client.delete_job("job-0") is True
+        assert server.zcard(client.QUEUE_LEASED) == 0
+        assert client.start_leased_job("job-0", "worker-1") is None
+
+
+class TestRunningLeases:
+    """Test running-job leases against fakeredis"""
+
+    @pytest.fixture
+    def fake_client(self):
+        fakeredis = pytest.importorskip("fakeredis")
+        pytest.importorskip("lupa")
+        server = fakeredis.FakeRedis(decode_responses=True, encoding_errors="surrogateescape")
+        with patch('redis_client.Redis', return_value=server):
+            from redis_client import RedisClient
+            client = RedisClient()
+        return client, server
+
+    def expire(self, client, server, job_id):
+        """Let a running job's lease run out"""
+        server.zadd(client.QUEUE_RUNNING_LEASES, {job_id: time.time() - 1})
+
+    def test_claim_takes_lease(self, fake_client):
+        """Test claimed and started jobs hold a running lease"""
+        client, server = fake_client
+        for i in range(2):
+            client.create_job(Job(id=f"job-{i}", user_id="alice", workflow={"1": {}}))
+
+        client.claim_next_job("worker-1")
+        client.lease_jobs("worker-1", 1)
+        assert server.zrange(client.QUEUE_RUNNING_LEASES, 0, -1) == ["job-0"]
+        client.start_leased_job("job-1", "worker-1")
+
+        expiry = server.zscore(client.QUEUE_RUNNING_LEASES, "job-1")
+        assert time.time() + 20 < expiry <= time.time() + 30  # JOB_LEASE_SECONDS
+
+    def test_renew_running_lease(self, fake_client):
+        """Test only the worker running a job can renew its lease"""
+        client, server = fake_client
+        client.create_job(Job(id="job-0", user_id="alice", workflow={"1": {}}))
+        client.claim_next_job("worker-1")
+        self.expire(client, server, "job-0")
+
+        assert client.renew_leases("worker-2", ["job-0"]) == []
+        assert client.renew_leases("worker-1", ["job-0"]) == ["job-0"]
+        assert server.zscore(client.QUEUE_RUNNING_LEASES, "job-0") > time.time() + 20
+        assert client.requeue_expired_jobs() == 0
+
+    def test_requeue_expired_jobs(self, fake_client):
+        """Test a running job whose lease ran out goes back to its old place"""
+        client, server = fake_client
+        for i in range(2):
+            client.create_job(Job(id=f"job-{i}", user_id=f"user-{i}", workflow={"1": {}}))
+        score = server.zscore(client.QUEUE_PENDING, "job-0")
+        client.claim_next_job("worker-1")
+        self.expire(client, server, "job-0")
+        server.delete(client.QUEUE_WAKEUP)
+
+        assert client.requeue_expired_jobs() == 1
+
+        job = client.get_job("job-0")
+        assert job.status == JobStatus.PENDING
+        assert job.attempts == 1
+        assert job.worker_id is None and job.started_at is None
+        assert server.zscore(client.QUEUE_PENDING, "job-0") == score
+        assert server.zcard(client.QUEUE_RUNNING) == 0
+        assert server.zcard(client.QUEUE_RUNNING_LEASES) == 0
+        assert server.llen(client.QUEUE_WAKEUP) == 1
+        assert client.claim_next_job("worker-2", QueueMode.ROUND_ROBIN).id == "job-0"
+
+        _, entry = server.xrange(client.EVENT_STREAM)[-2]
+        event = json.loads(entry["event"])["data"]
+        assert event["status"] == "pending" and event["attempts"] == 1
+        assert set(event["changed"]) == {"status", "started_at", "worker_id", "attempts"}
+
+    def test_requeue_fails_after_max_attempts(self, fake_client):
+        """Test a job that keeps losing its worker fails instead of requeueing"""
+        client, server = fake_client
+        client.create_job(Job(id="job-0", user_id="alice", workflow={"1": {}}))
+        server.hset(client.JOB_KEY.format(job_id="job-0"), "attempts", 2)
+        client.claim_next_job("worker-1")
+        self.expire(client, server, "job-0")
+
+        assert client.requeue_expired_jobs(max_attempts=3) == 0
+
+        job = client.get_job("job-0")
+        assert job.status == JobStatus.FAILED
+        assert job.attempts == 3
+        assert "lease expired" in job.error
+        assert server.zcard(client.QUEUE_PENDING) == 0
+        assert server.zcard(client.QUEUE_RUNNING) == 0
+        assert server.zrange(client.QUEUE_FAILED, 0, -1) == ["job-0"]
+
+    def test_completion_releases_lease(self, fake_client):
+        """Test completed and failed jobs give up their lease"""
+        client, server = fake_client
+        for i in range(2):
+            client.create_job(Job(id=f"job-{i}", user_id="alice", workflow={"1": {}}))
+        client.claim_next_job("worker-1")
+        client.claim_next_job("worker-2")
+
+        client.move_job_to_completed("job-0", {"images": []})
+        client.move_job_to_failed("job-1", "boom")
+
+        assert server.zcard(client.QUEUE_RUNNING_LEASES) == 0
+
+    def test_finish_checks_holder(self, fake_client):
+        """Test only the worker running a job can complete or fail it"""
+        client, server = fake_client
+        client.create_job(Job(id="job-0", user_id="alice", workflow={"1": {}}))
+        client.claim_next_job("worker-1")
+
+        assert client.move_job_to_completed("job-0", {"images": []}, "worker-2") is None
+        assert client.move_job_to_failed("job-0", "boom", "worker-2") is None
+        assert client.get_job("job-0").status == JobStatus.RUNNING
+        assert server.get(client.USER_COMPLETED_COUNT.format(user_id="alice")) is None
+
+        job = client.move_job_to_completed("job-0", {"images": []}, "worker-1")
+        assert job.status == JobStatus.COMPLETED and job.worker_id == "worker-1"
+        assert server.zrange(client.QUEUE_COMPLETED, 0, -1) == ["job-0"]
+        assert server.zrange(client.JOB_INDEX.format(status="completed"), 0, -1) == ["job-0"]
+        assert server.hget(client.WORKER_STATUS.format(worker_id="worker-1"), "jobs_completed") == "1"
+        assert server.get(client.USER_COMPLETED_COUNT.format(user_id="alice")) == "1"
+        assert client.move_job_to_failed("job-0", "late", "worker-1") is None
+        assert client.move_job_to_completed("job-missing", {}) is None
+
+    def test_cancel_then_lease_expiry(self, fake_client):
+        """Test a cancelled job loses its lease and is never requeued or finished"""
+        client, server = fake_client
+        for i in range(2):
+            client.create_job(Job(id=f"job-{i}", user_id="alice", workflow={"1": {}}))
+            client.claim_next_job("worker-1")
+        job = client.get_job("job-0", include_workflow=False)
+
+        assert client.cancel_running_job(job) is True
+        assert job.status == JobStatus.CANCELLED
+        assert server.zrange(client.QUEUE_RUNNING, 0, -1) == ["job-1"]
+        assert server.zrange(client.QUEUE_RUNNING_LEASES, 0, -1) == ["job-1"]
+        assert client.renew_leases("worker-1", ["job-0", "job-1"]) == ["job-1"]
+        assert client.cancel_running_job(job) is False
+
+        # A cancel that left its lease behind (set directly) is not requeued either
+        server.hset(client.JOB_KEY.format(job_id="job-1"), "status", "cancelled")
+        self.expire(client, server, "job-1")
+        assert client.requeue_expired_jobs() == 0
+        assert server.zcard(client.QUEUE_PENDING) == 0
+        assert server.zcard(client.QUEUE_RUNNING) == 0
+        assert server.zcard(client.QUEUE_RUNNING_LEASES) == 0
+        assert client.get_job("job-1").status == JobStatus.CANCELLED
+
+        assert client.move_job_to_completed("job-0", {"images": []}, "worker-1") is None
+        assert client.get_job("job-0").status == JobStatus.CANCELLED
+
+    def test_cleanup_skips_leased_jobs(self, fake_client):
+        """Test job_timeout only fails running jobs without a lease"""
+        client, server = fake_client
+        for i in range(2):
+            client.create_job(Job(id=f"job-{i}", user_id="alice", workflow={"1": {}}))
+        client.claim_next_job("worker-1")
+        client.claim_next_job("worker-2")
+        server.zrem(client.QUEUE_RUNNING_LEASES, "job-1")  # no lease
+
+        assert client.cleanup_stale_jobs(timeout_seconds=-1) == 1
+
+        assert client.get_job("job-0").status == JobStatus.RUNNING
+        assert client.get_job("job-1").status == JobStatus.FAILED
+
+
+class TestEventStream:
+    """Test the event stream and consumer groups against fakeredis"""
+
+    @pytest.fixture
+    def fake_client(self):
+        fakeredis = pytest.importorskip("fakeredis")
+        pytest.importorskip("lupa")
+        server = fakeredis.FakeRedis(decode_responses=True, encoding_errors="surrogateescape")
+        with patch('redis_client.Redis', return_value=server):
+            from redis_client import RedisClient
+            client = RedisClient()
+        return client, server
+
+    def test_groups_each_see_every_event(self, fake_client):
+        """Test every replica's group receives all events, including ones from the claim script"""
+        client, _ = fake_client
+        client.ensure_event_group("replica-a")
+        client.ensure_event_group("replica-b")
+        client.ensure_event_group("replica-a")  # already exists
+
+        client.create_job(Job(id="job-1", user_id="alice", workflow={"1": {}}))
+        client.claim_next_job("worker-1")
+
+        for group in ("replica-a", "replica-b"):
+            events = client.read_events(group, "listener", block_ms=10)
+            assert [event["type"] for _, event in events] == ["job_created", "job_updated"]
+            assert events[1][1]["data"]["status"] == "running"
+
+    def test_events_survive_listener_downtime(self, fake_client):
+        """Test events published while nobody reads are delivered later, and acks advance the lag"""
+        client, _ = fake_client
+        client.ensure_event_group("replica-a")
+        client._publish_event("job_created", {"job_id": "job-1"})
+        client._publish_event("job_created", {"job_id": "job-2"})
+
+        events = client.read_events("replica-a", "listener", block_ms=10)
+        assert [event["data"]["job_id"] for _, event in events] == ["job-1", "job-2"]
+        assert client.get_event_lag("replica-a") == 2  # read, not yet acknowledged
+
+        client.ack_events("replica-a", [entry_id for entry_id, _ in events])
+        assert client.get_event_lag("replica-a") == 0
+        assert client.get_event_lag("missing-group") is None
+
+    def test_group_lag(self):
+        """Test lag counts unread and unacknowledged entries"""
+        groups = [
+            {"name": "replica-a", "lag": 3, "pending": 2},
+            {"name": "replica-b", "lag": None, "pending": 0},
+        ]
+
+        assert RedisClientBase._group_lag(groups, "replica-a") == 5
+        assert RedisClientBase._group_lag(groups, "replica-b") is None
+        assert RedisClientBase._group_lag(groups, "replica-c") is None
+
+    def test_stream_is_capped(self, fake_client):
+        """Test the stream is trimmed to about event_stream_maxlen entries"""
+        client, server = fake_client
+
+        with patch('redis_client.settings.event_stream_maxlen', 10):
+            for i in range(50):
+                client._publish_event("job_created", {"job_id": f"job-{i}"})
+
+        assert server.xlen(client.EVENT_STREAM) <= 20
+
+    def test_undecodable_event(self, fake_client):
+        """Test a malformed entry is returned as None so it can still be acknowledged"""
+        client, server = fake_client
+        client.ensure_event_group("replica-a")
+        server.xadd(client.EVENT_STREAM, {"event": "not json"})
+
+        assert [event for _, event in client.read_events("replica-a", "listener", block_ms=10)] == [None]
+
+
+class TestJobEvents:
+    """Test delta job events and versions against fakeredis"""
+
+    @pytest.fixture
+    def fake_client(self):
+        fakeredis = pytest.importorskip("fakeredis")
+        pytest.importorskip("lupa")
+        server = fakeredis.FakeRedis(decode_responses=True, encoding_errors="surrogateescape")
+        with patch('redis_client.Redis', return_value=server):
+            from redis_client import RedisClient
+            client = RedisClient()
+        client.ensure_event_group("test")
+        return client, server
+
+    def events(self, client):
+        return [event for _, event in client.read_events("test", "listener", block_ms=10)]
+
+    def test_events_carry_deltas_and_versions(self, fake_client):
+        """Test each transition publishes only the changed fields, with a rising version"""
+        client, _ = fake_client
+        workflow = {"1": {"inputs": {"text": "x" * 10000}}}
+        client.create_job(Job(id="job-1", user_id="alice", workflow=workflow, metadata={"big": "y" * 1000}))
+        job = client.claim_next_job("worker-1")
+        job.status = JobStatus.COMPLETED
+        job.result = {"images": ["z" * 10000]}
+        client.update_job(job, ("status", "result"))
+
+        created, claimed, completed = [event["data"] for event in self.events(client)]
+        assert created["position"] == 0
+        assert created["changed"] == ["priority", "created_at"]
+        assert claimed == {
+            "id": "job-1", "user_id": "alice", "version": 1, "status": "running", "worker_id": "worker-1",
+            "started_at": job.started_at.isoformat(), "changed": ["status", "started_at", "worker_id"],
+        }
+        assert completed["version"] == 2
+        assert completed["changed"] == ["status", "result"]
+        assert "result" not in completed
+        for data in (created, claimed, completed):
+            assert "workflow" not in data and "metadata" not in data
+            assert len(json.dumps(data)) < 400
+
+        assert client.get_job("job-1").version == 2
+
+    def test_batch_positions(self, fake_client):
+        """Test jobs_created reports each job's place in the pending queue"""
+        client, _ = fake_client
+        client.create_job(Job(id="job-0", user_id="alice", workflow={"1": {}}))
+        client.create_jobs([Job(id=f"job-{i}", user_id="bob", workflow={"1": {}}) for i in (1, 2)])
+
+        batch = self.events(client)[1]["data"]["jobs"]
+        assert [(job["id"], job["position"]) for job in batch] == [("job-1", 1), ("job-2", 2)]
+
+    def test_lease_transitions_bump_version(self, fake_client):
+        """Test leasing, starting and requeueing each bump the version"""
+        client, server = fake_client
+        client.create_job(Job(id="job-1", user_id="alice", workflow={"1": {}}))
+        client.lease_jobs("worker-1", 1)
+        server.zadd(client.QUEUE_LEASED, {"job-1": 0})  # expire the lease
+        client.requeue_expired_leases()
+        client.lease_jobs("worker-2", 1)
+        client.start_leased_job("job-1", "worker-2")
+
+        updates = [event["data"] for event in self.events(client)[1:]]
+        assert [(data["version"], data["changed"]) for data in updates] == [
+            (1, ["worker_id"]),
+            (2, ["worker_id"]),
+            (3, ["worker_id"]),
+            (4, ["status", "started_at"]),
+        ]
+        assert updates[0]["status"] == "pending"
+        assert updates[1]["worker_id"] is None
+
+
+class TestJobHistoryIndex:
+    """Test the history indexes and cursor pagination against fakeredis"""
+
+    @pytest.fixture
+    def fake_client(self):
+        fakeredis = pytest.importorskip("fakeredis")
+        pytest.importorskip("lupa")
+        server = fakeredis.FakeRedis(decode_responses=True, encoding_errors="surrogateescape")
+        with patch('redis_client.Redis', return_value=server):
+            from redis_client import RedisClient
+            client = RedisClient()
+        return client, server
+
+    def create(self, client, job_id, user_id="alice", created=0):
+        job = Job(
+            id=job_id, user_id=user_id, workflow={"1": {}},
+            created_at=datetime.fromtimestamp(1767225600 + created, timezone.utc),
+        )
+        client.create_job(job)
+        return job
+
+    def pages(self, client, limit, **filters):
+        """Job IDs of every page, following cursors"""
+        pages, cursor = [], None
+        while True:
+            jobs, cursor = client.get_job_page(cursor=cursor, limit=limit, **filters)
+            pages.append([job.id for job in jobs])
+            if cursor is None:
+                return pages
+
+    def test_pages_newest_first(self, fake_client):
+        """Test pages follow each other without repeats or gaps"""
+        client, _ = fake_client
+        for i in range(5):
+            self.create(client, f"job-{i}", created=i)
+
+        assert self.pages(client, 2) == [["job-4", "job-3"], ["job-2", "job-1"], ["job-0"]]
+        assert self.pages(client, 5) == [["job-4", "job-3", "job-2", "job-1", "job-0"]]
+
+    def test_pages_split_ties(self, fake_client):
+        """Test jobs created in the same instant are paged by ID"""
+        client, _ = fake_client
+        for i in range(4):
+            self.create(client, f"job-{i}")
+
+        assert self.pages(client, 3) == [["job-3", "job-2", "job-1"], ["job-0"]]
+        assert self.pages(client, 1) == [["job-3"], ["job-2"], ["job-1"], ["job-0"]]
+
+    def test_stable_under_inserts(self, fake_client):
+        """Test jobs created while paging do not shift later pages"""
+        client, _ = fake_client
+        for i in range(4):
+            self.create(client, f"job-{i}", created=i)
+
+        first, cursor = client.get_job_page(limit=2)
+        self.create(client, "job-new", created=10)
+        second, cursor = client.get_job_page(cursor=cursor, limit=2)
+
+        assert [job.id for job in first + second] == ["job-3", "job-2", "job-1", "job-0"]
+        assert cursor is None
+
+    def test_status_transitions_move_jobs(self, fake_client):
+        """Test claims, completions and failures move jobs between indexes"""
+        client, server = fake_client
+        for i in range(4):
+            self.create(client, f"job-{i}", user_id="alice" if i % 2 else "bob", created=i)
+        for _ in range(3):
+            client.claim_next_job("worker-1")
+        client.move_job_to_completed("job-0", {"images": []})
+        client.move_job_to_failed("job-1", "boom")
+
+        def ids(**filters):
+            return [job.id for job in client.get_job_page(**filters)[0]]
+
+        assert ids() == ["job-3", "job-2", "job-1", "job-0"]
+        assert ids(status=JobStatus.PENDING) == ["job-3"]
+        assert ids(status=JobStatus.RUNNING) == ["job-2"]
+        assert ids(status=JobStatus.COMPLETED) == ["job-0"]
+        assert ids(user_id="alice") == ["job-3", "job-1"]
+        assert ids(user_id="alice", status=JobStatus.FAILED) == ["job-1"]
+        assert ids(user_id="bob", status=JobStatus.PENDING) == []
+        assert server.zscore("jobs:index:completed", "job-0") == 1767225600
+
+    def test_lease_requeue_and_delete(self, fake_client):
+        """Test requeued jobs return to pending and deleted jobs leave every index"""
+        client, server = fake_client
+        self.create(client, "job-0")
+        self.create(client, "job-1", created=1)
+        client.claim_next_job("worker-1")
+        server.zadd(client.QUEUE_RUNNING_LEASES, {"job-0": time.time() - 1})
+        client.requeue_expired_jobs()
+        client.lease_jobs("worker-1", 2)
+        client.start_leased_job("job-1", "worker-1")
+
+        assert server.zrange("jobs:index:pending", 0, -1) == ["job-0"]
+        assert server.zrange("user:alice:index:running", 0, -1) == ["job-1"]
+
+        client.delete_job("job-0")
+        client.delete_job("job-1")
+        assert not server.keys("*index*")
+
+    def test_rebuild_indexes(self, fake_client):
+        """Test jobs created before the indexes existed are backfilled once"""
+        client, server = fake_client
+        for i in range(3):
+            self.create(client, f"job-{i}", created=i)
+        client.claim_next_job("worker-1")
+        server.delete(*server.keys("*index*"))
+
+        assert client.rebuild_job_indexes() == 3
+        assert client.rebuild_job_indexes() == 0
+
+        assert [job.id for job in client.get_job_page()[0]] == ["job-2", "job-1", "job-0"]
+        assert server.zrange("user:alice:index:running", 0, -1) == ["job-0"]
+
+    def test_invalid_cursor(self, fake_client):
+        """Test a malformed cursor is rejected"""
+        client, _ = fake_client
+
+        with pytest.raises(ValueError):
+            client.get_job_page(cursor="not-a-cursor")
+        with pytest.raises(ValueError):
+            client.get_job_page(cursor="abc:job-1")
@@ -0,0 +1,114 @@
+"""
+Tests for job traces and spans
+"""
+import pytest
+import json
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+import tracing
+from models import Job, JobStatus, TraceSpan
+
+FRONTEND = "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"
+
+
+def traced_job(**fields):
+    trace_id, span_id, _ = tracing.start_trace()
+    return Job(
+        user_id="alice", workflow={"1": {}},
+        metadata={"traceparent": tracing.format_traceparent(trace_id, span_id)}, **fields
+    )
+
+
+class TestTraceContext:
+    """Test traceparent parsing and new traces"""
+
+    def test_continues_caller_trace(self):
+        """Test a valid traceparent keeps its trace ID and becomes the submit span's parent"""
+        trace_id, span_id, parent = tracing.start_trace(FRONTEND)
+
+        assert trace_id == "4bf92f3577b34da6a3ce929d0e0e4736"
+        assert parent == "00f067aa0ba902b7"
+        assert span_id != parent
+
+    @pytest.mark.parametrize("value", [None, "", "garbage", "00-" + "0" * 32 + "-00f067aa0ba902b7-01"])
+    def test_invalid_traceparent_starts_new_trace(self, value):
+        """Test a missing or malformed traceparent starts a new trace"""
+        trace_id, span_id, parent = tracing.start_trace(value)
+
+        assert len(trace_id) == 32 and len(span_id) == 16
+        assert parent is None
+
+    def test_untraced_job_has_no_spans(self):
+        """Test jobs submitted before tracing get no spans"""
+        now = datetime.now(timezone.utc)
+        job = Job(user_id="alice", workflow={}, started_at=now)
+
+        assert tracing.job_trace(job) is None
+        assert tracing.started_spans(job, dispatch_start=now) == []
+
+
+class TestLifecycleSpans:
+    """Test spans derived from job timestamps"""
+
+    def test_started_spans(self):
+        """Test queue wait covers submission to start, and dispatch starts no earlier than submission"""
+        job = traced_job()
+        job.started_at = job.created_at + timedelta(seconds=30)
+
+        wait, dispatch = tracing.started_spans(job, dispatch_start=job.created_at - timedelta(seconds=10))
+
+        assert wait.name == "queue.wait"
+        assert (wait.end_time - wait.start_time).total_seconds() == 30
+        assert dispatch.start_time == job.created_at
+        assert wait.parent_span_id == tracing.job_trace(job)[1]
+
+    def test_finished_spans(self):
+        """Test completion records the report and the run"""
+        job = traced_job(status=JobStatus.COMPLETED)
+        job.started_at = job.created_at + timedelta(seconds=5)
+        job.completed_at = job.started_at + timedelta(seconds=60)
+
+        names = [span.name for span in tracing.finished_spans(job, job.completed_at, job.completed_at)]
+
+        assert names == ["queue.report", "queue.run"]
+
+
+class TestSpanStorage:
+    """Test spans kept per job in Redis and exported to a file"""
+
+    @pytest.fixture
+    def fake_client(self):
+        fakeredis = pytest.importorskip("fakeredis")
+        server = fakeredis.FakeRedis(decode_responses=True, encoding_errors="surrogateescape")
+        with patch('redis_client.Redis', return_value=server):
+            from redis_client import RedisClient
+            client = RedisClient()
+        return client, server
+
+    def test_record_and_read_spans(self, fake_client):
+        """Test spans are appended in order and expire after the retention period"""
+        client, server = fake_client
+        job = traced_job()
+        now = datetime.now(timezone.utc)
+        submit = tracing.submit_span(job, None, now, now)
+        wait = tracing.job_span(job, "queue.wait", now, now + timedelta(seconds=2))
+
+        assert client.record_spans(job.id, [submit], 3600)
+        assert client.record_spans(job.id, [wait], 3600)
+
+        assert [span.name for span in client.get_spans(job.id)] == ["queue.submit", "queue.wait"]
+        assert 0 < server.ttl(client.JOB_SPANS.format(job_id=job.id)) <= 3600
+
+    def test_exporter_writes_json_lines(self, tmp_path):
+        """Test exported spans are one JSON object per line"""
+        job = traced_job()
+        now = datetime.now(timezone.utc)
+        exporter = tracing.SpanExporter(str(tmp_path / "traces" / "spans.jsonl"))
+        exporter.export([tracing.submit_span(job, None, now, now)])
+        exporter.export([tracing.job_span(job, "queue.wait", now, now)])
+        exporter.close()
+
+        lines = (tmp_path / "traces" / "spans.jsonl").read_text().splitlines()
+        assert [json.loads(line)["name"] for line in lines] == ["queue.submit", "queue.wait"]
+        assert TraceSpan.model_validate_json(lines[0]).trace_id == tracing.job_trace(job)[0]
@@ -2,19 +2,61 @@
 Tests for WebSocket Manager functionality
 """
 import pytest
+import pytest_asyncio
 import asyncio
 import json
 from unittest.mock import AsyncMock, MagicMock, patch, call
 from datetime import datetime, timezone
 
 
-@pytest.fixture
-def websocket_manager_with_mock(mock_redis_client, mocker):
-    """Create WebSocketManager with mocked Redis"""
-    with patch('websocket_manager.RedisClient', return_value=mock_redis_client):
+def stream_reads(batches):
+    """read_events() stand-in: returns each batch in turn, then blocks like an idle stream"""
+    batches = list(batches)
+
+    async def read_events(group, consumer, last_id=">", **kwargs):
+        if batches:
+            return batches.pop(0)
+        await asyncio.Event().wait()
+
+    return read_events
+
+
+async def run_listener(manager, timeout=0.1):
+    """Run the listener and dispatcher until they block on an idle stream"""
+    try:
+        await asyncio.wait_for(
+            asyncio.gather(manager._listen_to_redis(), manager._dispatch_events()), timeout=timeout
+        )
+    except asyncio.TimeoutError:
+        pass  # Expected - listener runs indefinitely
+
+
+async def drain(manager):
+    """Let the client writer tasks send what broadcast() queued"""
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+
+def add_client(manager, websocket, topics=("admin:*",)):
+    """Register a client and its writer without starting the listener"""
+    from websocket_manager import ClientConnection
+    client = ClientConnection(websocket, 100, "drop_oldest")
+    client.writer_task = asyncio.create_task(manager._write(client))
+    manager.connections[websocket] = client
+    manager.subscribe(websocket, topics)
+
+
+@pytest_asyncio.fixture
+async def websocket_manager_with_mock(mock_async_redis_client, mocker):
+    """Create WebSocketManager with mocked Redis, sending each event at once; closed on teardown"""
+    import websocket_manager
+    mocker.patch.object(websocket_manager.settings, "ws_coalesce_ms", 0)
+    mocker.patch.object(websocket_manager.settings, "queue_stats_interval_ms", 0)
+    with patch('websocket_manager.AsyncRedisClient', return_value=mock_async_redis_client):
         from websocket_manager import WebSocketManager
-        manager = WebSocketManager(mock_redis_client)
-        return manager, mock_redis_client
+        manager = WebSocketManager(mock_async_redis_client, group="queue-manager")
+    yield manager, mock_async_redis_client
+    await manager.close()
 
 
 class TestWebSocketConnectionManagement:
@@ -91,6 +133,7 @@ class TestBroadcasting:
 
         message = {"type": "job_status", "data": {"job_id": "job-1", "status": "completed"}}
         await manager.broadcast(message)
+        await drain(manager)
 
         mock_ws1.send_text.assert_called_once()
         mock_ws2.send_text.assert_called_once()
@@ -104,6 +147,7 @@ class TestBroadcasting:
 
         message = {"type": "test", "data": {"key": "value"}}
         await manager.broadcast(message)
+        await drain(manager)
 
         # Verify message was sent as JSON string
         call_args = mock_ws.send_text.call_args[0][0]
@@ -119,6 +163,7 @@ class TestBroadcasting:
         # Should not raise error
         message = {"type": "test", "data": {}}
         await manager.broadcast(message)
+        await drain(manager)
 
     @pytest.mark.asyncio
     async def test_broadcast_handles_disconnected_client(self, websocket_manager_with_mock):
@@ -135,6 +180,7 @@ class TestBroadcasting:
 
         message = {"type": "test", "data": {}}
         await manager.broadcast(message)
+        await drain(manager)
 
         # ws1 should be removed
         assert mock_ws1 not in manager.active_connections
@@ -161,6 +207,7 @@ class TestMessageTypes:
             }
         }
         await manager.broadcast(message)
+        await drain(manager)
 
         mock_ws.send_text.assert_called_once()
         sent_data = json.loads(mock_ws.send_text.call_args[0][0])
@@ -182,6 +229,7 @@ class TestMessageTypes:
             }
         }
         await manager.broadcast(message)
+        await drain(manager)
 
         mock_ws.send_text.assert_called_once()
 
@@ -201,12 +249,13 @@ class TestMessageTypes:
             }
         }
         await manager.broadcast(message)
+        await drain(manager)
 
         mock_ws.send_text.assert_called_once()
 
 
-class TestPubSubListener:
-    """Test Redis pub/sub listener"""
+class TestEventListener:
+    """Test the Redis event stream listener"""
 
     @pytest.mark.asyncio
     async def test_listener_initialization(self, websocket_manager_with_mock):
@@ -214,41 +263,115 @@ class TestPubSubListener:
         manager, mock_redis = websocket_manager_with_mock
         mock_ws = AsyncMock()
 
-        # Mock the listen to avoid blocking
-        mock_pubsub = MagicMock()
-        mock_pubsub.listen.return_value = []
-        mock_redis.subscribe_to_updates.return_value = mock_pubsub
+        mock_redis.read_events.side_effect = stream_reads([])
 
         await manager.connect(mock_ws)
 
-        # Listener task should be created
+        # Listener and dispatcher tasks should be created
         assert manager.listener_task is not None
+        assert manager.dispatch_task is not None
+        await manager.close()
+        assert manager.listener_task is None
+        assert manager.dispatch_task is None
 
     @pytest.mark.asyncio
     async def test_listener_reconnection_logic(self, websocket_manager_with_mock):
         """Test listener reconnection on failure"""
         manager, mock_redis = websocket_manager_with_mock
+        mock_redis.ensure_event_group.side_effect = [Exception("Connection failed"), None]
+        mock_redis.read_events.side_effect = stream_reads([])
 
-        # Mock subscription failure then success
-        mock_pubsub = MagicMock()
-        call_count = [0]
+        with patch('websocket_manager.asyncio.sleep', AsyncMock()) as mock_sleep:
+            await run_listener(manager)
 
-        def subscribe_side_effect():
-            call_count[0] += 1
-            if call_count[0] == 1:
-                raise Exception("Connection failed")
-            # Return empty listener on second call to avoid blocking
-            mock_pubsub.listen.return_value = iter([])
-            return mock_pubsub
+        mock_sleep.assert_awaited_once_with(2)
+        assert mock_redis.ensure_event_group.await_count == 2
+        mock_redis.ensure_event_group.assert_awaited_with("queue-manager")
 
-        mock_redis.subscribe_to_updates.side_effect = subscribe_side_effect
+    def test_default_group_is_per_host(self):
+        """Test replicas without a configured consumer group each get their own"""
+        import socket
+        from config import Settings
 
-        # Create listener task with timeout to prevent hanging
-        try:
-            await asyncio.wait_for(manager._listen_to_redis(), timeout=0.5)
-        except asyncio.TimeoutError:
-            # Expected - listener runs indefinitely
-            pass
+        assert Settings(event_consumer_group="").event_consumer_group == f"queue-manager-{socket.gethostname()}"
+        assert Settings(event_consumer_group="replica-a").event_consumer_group == "replica-a"
+
+    @pytest.mark.asyncio
+    async def test_listener_broadcasts_and_acks(self, websocket_manager_with_mock):
+        """Test unacknowledged entries are redelivered first, then new events are read and acknowledged"""
+        manager, mock_redis = websocket_manager_with_mock
+        mock_ws = AsyncMock()
+        add_client(manager, mock_ws)
+        mock_redis.read_events.side_effect = stream_reads([
+            [("1-0", {"type": "job_created"})],  # pending from before a restart
+            [],
+            [("2-0", {"type": "job_updated"}), ("3-0", {"type": "job_deleted"})],
+        ])
+
+        await run_listener(manager)
+
+        sent = [json.loads(c.args[0])["type"] for c in mock_ws.send_text.call_args_list]
+        assert sent == ["job_created", "job_updated", "job_deleted"]
+        last_ids = [c.args[2] for c in mock_redis.read_events.call_args_list]
+        assert last_ids == ["0", "1-0", ">", ">"]
+        assert mock_redis.ack_events.call_args_list == [
+            call("queue-manager", ["1-0"]),
+            call("queue-manager", ["2-0", "3-0"]),
+        ]
+
+    @pytest.mark.asyncio
+    async def test_reconnect_skips_queued_entries(self, websocket_manager_with_mock):
+        """Test a reconnected listener replays only pending entries it had not handed to the dispatcher"""
+        manager, mock_redis = websocket_manager_with_mock
+        mock_ws = AsyncMock()
+        add_client(manager, mock_ws)
+        idle = stream_reads([])
+        replies = [
+            [],
+            [("1-0", {"type": "job_created"}), ("2-0", {"type": "job_updated"})],
+            ConnectionError("connection lost"),
+            [("3-0", {"type": "job_deleted"})],  # delivered as the connection dropped
+            [],
+        ]
+
+        async def read_events(group, consumer, last_id=">", **kwargs):
+            if not replies:
+                return await idle(group, consumer, last_id)
+            reply = replies.pop(0)
+            if isinstance(reply, Exception):
+                raise reply
+            return reply
+
+        mock_redis.read_events.side_effect = read_events
+        with patch('websocket_manager.asyncio.sleep', AsyncMock()):
+            await run_listener(manager)
+
+        last_ids = [c.args[2] for c in mock_redis.read_events.call_args_list]
+        assert last_ids == ["0", ">", ">", "2-0", "3-0", ">"]
+        sent = [json.loads(c.args[0])["type"] for c in mock_ws.send_text.call_args_list]
+        assert sent == ["job_created", "job_updated", "job_deleted"]
+
+    @pytest.mark.asyncio
+    async def test_stalled_client_does_not_hold_up_events(self, websocket_manager_with_mock):
+        """Test a stalled WebSocket send delays neither the stream nor other clients"""
+        manager, mock_redis = websocket_manager_with_mock
+        stalled_ws, fast_ws = AsyncMock(), AsyncMock()
+
+        async def stalled_send(text):
+            await asyncio.Event().wait()
+
+        stalled_ws.send_text.side_effect = stalled_send
+        add_client(manager, stalled_ws)
+        add_client(manager, fast_ws)
+        mock_redis.read_events.side_effect = stream_reads(
+            [[]] + [[(f"{i}-0", {"type": "job_updated"})] for i in range(1, 4)]
+        )
+
+        await run_listener(manager)
+
+        assert fast_ws.send_text.await_count == 3
+        assert mock_redis.ack_events.await_count == 3
+        assert manager.events.qsize() == 0
 
 
 class TestMessageBroadcastFromPubSub:
@@ -271,6 +394,7 @@ class TestMessageBroadcastFromPubSub:
 
         # Broadcast message
         await manager.broadcast(test_message)
+        await drain(manager)
 
         # Verify it was sent
         mock_ws.send_text.assert_called_once()
@@ -294,6 +418,7 @@ class TestConnectionErrorHandling:
 
         message = {"type": "test"}
         await manager.broadcast(message)
+        await drain(manager)
 
         # Second connection should still receive message
         mock_ws2.send_text.assert_called_once()
@@ -317,6 +442,8 @@ class TestConnectionErrorHandling:
 
         await manager.broadcast({"type": "test"})
 
+        await drain(manager)
+
         # Only the healthy connection remains
         assert len(manager.active_connections) == 1
         assert mocks[2] in manager.active_connections
@@ -351,6 +478,7 @@ class TestConcurrency:
         ]
 
         await asyncio.gather(*[manager.broadcast(m) for m in messages])
+        await drain(manager)
 
         # All messages should be sent
         assert mock_ws.send_text.call_count == 3
@@ -365,51 +493,40 @@ class TestConcurrency:
         await asyncio.gather(*[manager.connect(m) for m in mocks])
         assert len(manager.active_connections) == 5
 
-        # Disconnect all concurrently
-        await asyncio.gather(*[
-            asyncio.to_thread(manager.disconnect, m) for m in mocks
-        ])
+        # Disconnect all
+        for m in mocks:
+            manager.disconnect(m)
 
         assert len(manager.active_connections) == 0
 
 
-class TestPubSubListenerErrorHandling:
-    """Test pub/sub listener error handling"""
+class TestEventListenerErrorHandling:
+    """Test event listener error handling"""
 
     @pytest.mark.asyncio
     async def test_listener_decode_error(self, websocket_manager_with_mock):
-        """Test listener handles invalid JSON"""
+        """Test an undecodable event is acknowledged without being broadcast"""
         manager, mock_redis = websocket_manager_with_mock
+        mock_ws = AsyncMock()
+        add_client(manager, mock_ws)
+        mock_redis.read_events.side_effect = stream_reads([[], [("1-0", None)]])
 
-        mock_pubsub = MagicMock()
-        # Return invalid JSON
-        mock_pubsub.listen.return_value = iter([
-            {"type": "message", "data": "not json"}
-        ])
-        mock_redis.subscribe_to_updates.return_value = mock_pubsub
+        await run_listener(manager)
 
-        # Should handle gracefully without raising
-        try:
-            await asyncio.wait_for(manager._listen_to_redis(), timeout=0.1)
-        except (asyncio.TimeoutError, StopAsyncIteration):
-            pass  # Expected
+        mock_ws.send_text.assert_not_called()
+        mock_redis.ack_events.assert_awaited_once_with("queue-manager", ["1-0"])
 
     @pytest.mark.asyncio
-    async def test_listener_closes_pubsub_on_exit(self, websocket_manager_with_mock):
-        """Test that listener properly closes pubsub connection"""
+    async def test_listener_gives_up_after_max_retries(self, websocket_manager_with_mock):
+        """Test the listener stops after repeated Redis failures"""
         manager, mock_redis = websocket_manager_with_mock
+        mock_redis.ensure_event_group.side_effect = Exception("Connection refused")
 
-        mock_pubsub = MagicMock()
-        mock_pubsub.listen.return_value = iter([])
-        mock_pubsub.close = MagicMock()
-        mock_redis.subscribe_to_updates.return_value = mock_pubsub
+        with patch('websocket_manager.asyncio.sleep', AsyncMock()):
+            await manager._listen_to_redis()
 
-        try:
-            await asyncio.wait_for(manager._listen_to_redis(), timeout=0.1)
-        except (asyncio.TimeoutError, StopAsyncIteration):
-            pass
-
-        # Note: pubsub.close() is called in finally block
+        assert mock_redis.ensure_event_group.await_count == 5
+        assert manager.listener_task is None
 
 
 class TestWebSocketMessageStructure:
@@ -429,6 +546,8 @@ class TestWebSocketMessageStructure:
 
         await manager.broadcast(message)
 
+        await drain(manager)
+
         # Verify message structure
         sent = json.loads(mock_ws.send_text.call_args[0][0])
         assert "type" in sent
@@ -445,5 +564,342 @@ class TestWebSocketMessageStructure:
 
         await manager.broadcast(message)
 
+        await drain(manager)
+
         sent = json.loads(mock_ws.send_text.call_args[0][0])
         assert sent["data"] == {}
+
+
+class TestClientSendQueues:
+    """Test per-client outbound queues and slow consumer handling"""
+
+    @pytest.mark.parametrize("policy,expected", [
+        ("drop_oldest", ["b", "c"]),
+        ("drop_newest", ["a", "b"]),
+        ("coalesce", ["a2", "b"]),
+    ])
+    def test_overflow_policy(self, policy, expected):
+        """Test each overflow policy when a client's queue is full"""
+        from websocket_manager import ClientConnection
+        client = ClientConnection(AsyncMock(), 2, policy)
+
+        client.enqueue("a", "job_updated:job-a")
+        client.enqueue("b", "job_updated:job-b")
+        client.enqueue("a2" if policy == "coalesce" else "c", "job_updated:job-a")
+
+        assert [text for _, text in client.pending] == expected
+        assert client.dropped == 1
+
+    def test_coalesce_without_match_drops_oldest(self):
+        """Test coalescing falls back to dropping the oldest message"""
+        from websocket_manager import ClientConnection
+        client = ClientConnection(AsyncMock(), 2, "coalesce")
+
+        for text in ["a", "b", "c"]:
+            client.enqueue(text, f"job_updated:job-{text}")
+
+        assert [text for _, text in client.pending] == ["b", "c"]
+
+    def test_coalesce_key(self):
+        """Test updates for the same job share a coalescing key"""
+        from websocket_manager import WebSocketManager
+        key = WebSocketManager._coalesce_key
+
+        assert key({"type": "job_updated", "data": {"id": "job-1"}}) == "job_updated:job-1"
+        assert key({"type": "job_deleted", "data": {"job_id": "job-1"}}) == "job_deleted:job-1"
+        assert key({"type": "jobs_created", "data": {"jobs": []}}) is None
+        assert key({"type": "ping"}) is None
+
+    @pytest.mark.asyncio
+    async def test_broadcast_does_not_wait_for_sends(self, websocket_manager_with_mock):
+        """Test broadcast returns while a client's send is still in progress"""
+        manager, _ = websocket_manager_with_mock
+        mock_ws = AsyncMock()
+
+        async def stalled_send(text):
+            await asyncio.Event().wait()
+
+        mock_ws.send_text.side_effect = stalled_send
+        add_client(manager, mock_ws)
+
+        await asyncio.wait_for(manager.broadcast({"type": "first"}), timeout=0.1)
+        await asyncio.wait_for(manager.broadcast({"type": "second"}), timeout=0.1)
+        await drain(manager)
+
+        # The first send is stuck in the writer; the second waits in the queue
+        mock_ws.send_text.assert_awaited_once()
+        assert len(manager.connections[mock_ws].pending) == 1
+
+    @pytest.mark.asyncio
+    async def test_slow_client_disconnected(self, websocket_manager_with_mock):
+        """Test a client that keeps overflowing is disconnected and closed"""
+        import websocket_manager
+        manager, _ = websocket_manager_with_mock
+        slow_ws, fast_ws = AsyncMock(), AsyncMock()
+
+        async def stalled_send(text):
+            await asyncio.Event().wait()
+
+        slow_ws.send_text.side_effect = stalled_send
+        with patch.object(websocket_manager.settings, "ws_max_dropped", 2):
+            add_client(manager, slow_ws)
+            add_client(manager, fast_ws)
+            await drain(manager)
+            manager.connections[slow_ws].queue_size = 1
+
+            for i in range(5):
+                await manager.broadcast({"type": "job_updated", "data": {"id": f"job-{i}"}})
+                await drain(manager)
+
+        assert slow_ws not in manager.active_connections
+        slow_ws.close.assert_awaited_once_with(code=1013)
+        assert fast_ws.send_text.await_count == 5
+
+    @pytest.mark.asyncio
+    async def test_send_timeout_disconnects(self, websocket_manager_with_mock):
+        """Test a send that exceeds ws_send_timeout disconnects the client"""
+        import websocket_manager
+        manager, _ = websocket_manager_with_mock
+        mock_ws = AsyncMock()
+
+        async def stalled_send(text):
+            await asyncio.Event().wait()
+
+        mock_ws.send_text.side_effect = stalled_send
+        with patch.object(websocket_manager.settings, "ws_send_timeout", 0.01):
+            add_client(manager, mock_ws)
+            await manager.broadcast({"type": "test"})
+            await asyncio.sleep(0.05)
+
+        assert mock_ws not in manager.active_connections
+
+
+class TestTopicSubscriptions:
+    """Test topic-filtered delivery"""
+
+    def sent_types(self, websocket):
+        return [json.loads(c.args[0])["type"] for c in websocket.send_text.call_args_list]
+
+    @pytest.mark.asyncio
+    async def test_connect_defaults_to_firehose(self, websocket_manager_with_mock):
+        """Test a client that names no topics receives every event"""
+        manager, _ = websocket_manager_with_mock
+        mock_ws = AsyncMock()
+
+        await manager.connect(mock_ws)
+
+        assert manager.connections[mock_ws].topics == {"admin:*"}
+        await manager.close()
+
+    @pytest.mark.asyncio
+    async def test_events_routed_by_user_and_job(self, websocket_manager_with_mock):
+        """Test user and job subscribers only receive matching events"""
+        manager, _ = websocket_manager_with_mock
+        user_ws, job_ws, other_ws, admin_ws = AsyncMock(), AsyncMock(), AsyncMock(), AsyncMock()
+        add_client(manager, user_ws, ["user:user001"])
+        add_client(manager, job_ws, ["job:job-2"])
+        add_client(manager, other_ws, ["user:user002"])
+        add_client(manager, admin_ws)
+
+        await manager.broadcast({"type": "job_created", "data": {"id": "job-1", "user_id": "user001"}})
+        await manager.broadcast({"type": "job_updated", "data": {"id": "job-2", "user_id": "user003"}})
+        await manager.broadcast({"type": "job_deleted", "data": {"job_id": "job-1", "user_id": "user001"}})
+        await drain(manager)
+
+        assert self.sent_types(user_ws) == ["job_created", "job_deleted"]
+        assert self.sent_types(job_ws) == ["job_updated"]
+        other_ws.send_text.assert_not_called()
+        assert self.sent_types(admin_ws) == ["job_created", "job_updated", "job_deleted"]
+
+    @pytest.mark.asyncio
+    async def test_batch_event_split_per_subscriber(self, websocket_manager_with_mock):
+        """Test a user only receives their own jobs from a batch event"""
+        manager, _ = websocket_manager_with_mock
+        user_ws, admin_ws = AsyncMock(), AsyncMock()
+        add_client(manager, user_ws, ["user:user001"])
+        add_client(manager, admin_ws)
+
+        await manager.broadcast({"type": "jobs_created", "data": {"jobs": [
+            {"id": "job-1", "user_id": "user001"},
+            {"id": "job-2", "user_id": "user002"},
+        ]}})
+        await drain(manager)
+
+        user_jobs = json.loads(user_ws.send_text.call_args.args[0])["data"]["jobs"]
+        assert [job["id"] for job in user_jobs] == ["job-1"]
+        admin_jobs = json.loads(admin_ws.send_text.call_args.args[0])["data"]["jobs"]
+        assert len(admin_jobs) == 2
+
+    @pytest.mark.asyncio
+    async def test_overlapping_topics_deliver_once(self, websocket_manager_with_mock):
+        """Test a client matching several topics gets the event once"""
+        manager, _ = websocket_manager_with_mock
+        mock_ws = AsyncMock()
+        add_client(manager, mock_ws, ["user:user001", "job:job-1", "admin:*"])
+
+        await manager.broadcast({"type": "job_updated", "data": {"id": "job-1", "user_id": "user001"}})
+        await drain(manager)
+
+        mock_ws.send_text.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_queue_stats_topic(self, websocket_manager_with_mock):
+        """Test queue snapshots go to queue:stats subscribers only"""
+        manager, _ = websocket_manager_with_mock
+        stats_ws, user_ws = AsyncMock(), AsyncMock()
+        add_client(manager, stats_ws, ["queue:stats"])
+        add_client(manager, user_ws, ["user:user001"])
+
+        await manager.broadcast({"type": "queue_stats", "data": {"pending": 3}})
+        await manager.broadcast({"type": "job_updated", "data": {"id": "job-1", "user_id": "user001"}})
+        await drain(manager)
+
+        assert self.sent_types(stats_ws) == ["queue_stats"]
+        assert self.sent_types(user_ws) == ["job_updated"]
+
+    @pytest.mark.asyncio
+    async def test_subscribe_unsubscribe_updates_index(self, websocket_manager_with_mock):
+        """Test subscriptions change, unknown topics are ignored and disconnect cleans up"""
+        manager, _ = websocket_manager_with_mock
+        mock_ws = AsyncMock()
+        add_client(manager, mock_ws, [])
+
+        assert manager.subscribe(mock_ws, ["user:user001", "bogus", "job:"]) == ["user:user001"]
+        assert manager.subscribe(mock_ws, ["job:job-1"]) == ["job:job-1", "user:user001"]
+        assert manager.unsubscribe(mock_ws, ["user:user001"]) == ["job:job-1"]
+        assert "user:user001" not in manager.subscribers
+
+        manager.disconnect(mock_ws)
+
+        assert manager.subscribers == {}
+
+
+class TestEventCoalescing:
+    """Test the coalescing window and queue_stats snapshots"""
+
+    def test_coalescer_merges_per_job(self):
+        """Test a job's events in one window become one event with accumulated changes"""
+        from websocket_manager import EventCoalescer
+        coalescer = EventCoalescer()
+
+        coalescer.add({"type": "job_created", "data": {"id": "job-1", "version": 0, "status": "pending",
+                                                       "changed": ["priority", "created_at"]}})
+        coalescer.add({"type": "job_updated", "data": {"id": "job-2", "version": 3, "status": "running",
+                                                       "changed": ["status"]}})
+        coalescer.add({"type": "job_updated", "data": {"id": "job-1", "version": 1, "status": "running",
+                                                       "changed": ["status", "worker_id"]}})
+        coalescer.add({"type": "queue_stats", "data": {"pending": 2}})
+        coalescer.add({"type": "queue_stats", "data": {"pending": 1}})
+
+        events = coalescer.drain()
+        assert [event["type"] for event in events] == ["job_created", "job_updated", "queue_stats"]
+        assert events[0]["data"] == {
+            "id": "job-1", "version": 1, "status": "running",
+            "changed": ["priority", "created_at", "status", "worker_id"],
+        }
+        assert events[2]["data"] == {"pending": 1}
+        assert len(coalescer) == 0
+
+    def test_coalescer_splits_batches_and_keeps_deletes(self):
+        """Test batch events are merged per job and a delete supersedes earlier events"""
+        from websocket_manager import EventCoalescer
+        coalescer = EventCoalescer()
+
+        coalescer.add({"type": "jobs_created", "data": {"jobs": [{"id": "job-1"}, {"id": "job-2"}]}})
+        coalescer.add({"type": "job_deleted", "data": {"job_id": "job-1", "user_id": "alice"}})
+
+        events = coalescer.drain()
+        assert [(event["type"], event["data"]) for event in events] == [
+            ("job_deleted", {"job_id": "job-1", "user_id": "alice"}),
+            ("job_created", {"id": "job-2"}),
+        ]
+
+    @pytest.mark.asyncio
+    async def test_window_sends_one_message_and_acks_after(self, websocket_manager_with_mock):
+        """Test a burst inside the window reaches each client as one batch, acknowledged after sending"""
+        import websocket_manager
+        manager, mock_redis = websocket_manager_with_mock
+        admin_ws, user_ws = AsyncMock(), AsyncMock()
+        add_client(manager, admin_ws)
+        add_client(manager, user_ws, ["user:alice"])
+        mock_redis.read_events.side_effect = stream_reads([[]] + [
+            [(f"{i}-0", {"type": "job_created", "data": {"id": f"job-{i}", "user_id": "bob" if i % 2 else "alice"}})]
+            for i in range(1, 11)
+        ])
+
+        with patch.object(websocket_manager.settings, "ws_coalesce_ms", 50):
+            await run_listener(manager, timeout=0.03)
+            mock_redis.ack_events.assert_not_called()
+            await asyncio.sleep(0.05)
+            await drain(manager)
+
+        admin_message = json.loads(admin_ws.send_text.call_args.args[0])
+        assert admin_ws.send_text.await_count == 1
+        assert admin_message["type"] == "batch"
+        assert len(admin_message["events"]) == 10
+        user_message = json.loads(user_ws.send_text.call_args.args[0])
+        assert [event["data"]["id"] for event in user_message["events"]] == ["job-2", "job-4", "job-6", "job-8", "job-10"]
+        mock_redis.ack_events.assert_awaited_once_with("queue-manager", [f"{i}-0" for i in range(1, 11)])
+
+    @pytest.mark.asyncio
+    async def test_single_event_sent_unwrapped(self, websocket_manager_with_mock):
+        """Test a client with one event in the window receives it as is"""
+        manager, _ = websocket_manager_with_mock
+        mock_ws = AsyncMock()
+        add_client(manager, mock_ws)
+
+        await manager.broadcast_batch([{"type": "job_updated", "data": {"id": "job-1"}}])
+        await drain(manager)
+
+        assert json.loads(mock_ws.send_text.call_args.args[0])["type"] == "job_updated"
+
+    @pytest.mark.asyncio
+    async def test_full_queue_coalesces_batches(self, websocket_manager_with_mock):
+        """Test with coalescing on, a window's message replaces a queued one for the same jobs"""
+        import websocket_manager
+        from websocket_manager import ClientConnection
+        manager, mock_redis = websocket_manager_with_mock
+        mock_ws = AsyncMock()
+        client = ClientConnection(mock_ws, 2, "coalesce")
+        manager.connections[mock_ws] = client
+        manager.subscribe(mock_ws, ["admin:*"])
+        mock_redis.read_events.side_effect = stream_reads([[]] + [
+            [("1-0", {"type": "job_updated", "data": {"id": "job-1", "status": "running"}}),
+             ("2-0", {"type": "job_updated", "data": {"id": "job-2", "status": "running"}})],
+        ])
+
+        with patch.object(websocket_manager.settings, "ws_coalesce_ms", 10), \
+                patch.object(websocket_manager.settings, "ws_overflow_policy", "coalesce"):
+            await manager.broadcast_batch([{"type": "job_updated", "data": {"id": "job-1", "status": "pending"}},
+                                           {"type": "job_updated", "data": {"id": "job-2", "status": "pending"}}])
+            await manager.broadcast_batch([{"type": "job_updated", "data": {"id": "job-3"}}])
+            await run_listener(manager, timeout=0.05)
+
+        assert client.dropped == 1
+        assert len(client.pending) == 2
+        batch = json.loads(client.pending[0][1])
+        assert [event["data"]["status"] for event in batch["events"]] == ["running", "running"]
+        assert json.loads(client.pending[1][1])["data"]["id"] == "job-3"
+
+    @pytest.mark.asyncio
+    async def test_queue_stats_throttled(self, websocket_manager_with_mock):
+        """Test job events trigger at most one queue_stats snapshot per interval"""
+        import websocket_manager
+        manager, mock_redis = websocket_manager_with_mock
+        stats_ws = AsyncMock()
+        add_client(manager, stats_ws, ["queue:stats"])
+        mock_redis.get_all_queue_stats.return_value = {"pending": 4, "running": 1, "completed": 0, "failed": 0}
+        mock_redis.read_events.side_effect = stream_reads([[]] + [
+            [(f"{i}-0", {"type": "job_created", "data": {"id": f"job-{i}"}})] for i in range(5)
+        ])
+
+        with patch.object(websocket_manager.settings, "queue_stats_interval_ms", 1000):
+            stats_task = asyncio.create_task(manager._push_queue_stats())
+            await run_listener(manager)
+            await drain(manager)
+            stats_task.cancel()
+
+        stats_ws.send_text.assert_awaited_once()
+        message = json.loads(stats_ws.send_text.call_args.args[0])
+        assert message["type"] == "queue_stats"
+        assert message["data"]["pending"] == 4
@@ -15,10 +15,10 @@ class TestWorkerJobPolling:
     @pytest.mark.asyncio
     async def test_worker_poll_gets_next_job(self, mock_redis_client, sample_job):
         """Test worker successfully polls for next job"""
-        mock_redis_client.get_next_job.return_value = sample_job
+        mock_redis_client.claim_next_job.return_value = sample_job
 
         # Simulate worker polling
-        job = mock_redis_client.get_next_job()
+        job = mock_redis_client.claim_next_job()
 
         assert job is not None
         assert job.id == sample_job.id
@@ -26,9 +26,9 @@ class TestWorkerJobPolling:
     @pytest.mark.asyncio
     async def test_worker_poll_empty_queue(self, mock_redis_client):
         """Test worker poll returns None when queue is empty"""
-        mock_redis_client.get_next_job.return_value = None
+        mock_redis_client.claim_next_job.return_value = None
 
-        job = mock_redis_client.get_next_job()
+        job = mock_redis_client.claim_next_job()
 
         assert job is None
 
@@ -48,12 +48,12 @@ class TestWorkerJobExecution:
 
     @pytest.mark.asyncio
     async def test_worker_start_job_execution(self, mock_redis_client, sample_job):
-        """Test worker marks job as running"""
-        mock_redis_client.move_job_to_running.return_value = True
+        """Test worker starts a prefetched job"""
+        mock_redis_client.start_leased_job.return_value = sample_job
 
-        result = mock_redis_client.move_job_to_running(sample_job.id, "worker-1")
+        job = mock_redis_client.start_leased_job(sample_job.id, "worker-1")
 
-        assert result is True
+        assert job.id == sample_job.id
 
     @pytest.mark.asyncio
     async def test_worker_complete_job_success(self, mock_redis_client, sample_job):
@@ -132,9 +132,9 @@ class TestWorkerErrorHandling:
     async def test_worker_handles_invalid_job(self, mock_redis_client):
         """Test worker handles invalid job gracefully"""
         # Mock returns invalid job (None)
-        mock_redis_client.get_next_job.return_value = None
+        mock_redis_client.claim_next_job.return_value = None
 
-        job = mock_redis_client.get_next_job()
+        job = mock_redis_client.claim_next_job()
 
         assert job is None
 
@@ -170,9 +170,9 @@ class TestWorkerJobPriority:
             workflow={"test": 1},
             priority=JobPriority.HIGH
         )
-        mock_redis_client.get_next_job.return_value = high_priority_job
+        mock_redis_client.claim_next_job.return_value = high_priority_job
 
-        job = mock_redis_client.get_next_job()
+        job = mock_redis_client.claim_next_job()
 
         assert job is not None
         assert job.priority == JobPriority.HIGH
@@ -185,9 +185,9 @@ class TestWorkerJobPriority:
             workflow={"test": 1},
             priority=JobPriority.INSTRUCTOR
         )
-        mock_redis_client.get_next_job.return_value = instructor_job
+        mock_redis_client.claim_next_job.return_value = instructor_job
 
-        job = mock_redis_client.get_next_job()
+        job = mock_redis_client.claim_next_job()
 
         assert job is not None
         assert job.priority == JobPriority.INSTRUCTOR
@@ -201,11 +201,11 @@ class TestWorkerConcurrency:
         """Test that multiple workers don't process same job"""
         # Setup mock to return different jobs for different workers
         job_queue = list(multiple_jobs)
-        mock_redis_client.get_next_job.side_effect = job_queue
+        mock_redis_client.claim_next_job.side_effect = job_queue
 
         # Simulate 2 workers getting jobs
-        job1 = mock_redis_client.get_next_job()
-        job2 = mock_redis_client.get_next_job()
+        job1 = mock_redis_client.claim_next_job()
+        job2 = mock_redis_client.claim_next_job()
 
         # Jobs should be different
         assert job1 is not None
@@ -305,12 +305,12 @@ class TestWorkerLoadBalancing:
     async def test_round_robin_distribution(self, mock_redis_client, multiple_jobs):
         """Test round-robin job distribution"""
         # Setup mock to simulate round-robin
-        mock_redis_client.get_next_job.side_effect = multiple_jobs
+        mock_redis_client.claim_next_job.side_effect = multiple_jobs
 
         # Get jobs from different workers
         jobs = []
         for _ in range(3):
-            job = mock_redis_client.get_next_job()
+            job = mock_redis_client.claim_next_job()
             if job:
                 jobs.append(job)
 
@@ -325,23 +325,21 @@ class TestWorkerStatusTracking:
     @pytest.mark.asyncio
     async def test_worker_idle_status(self, mock_redis_client):
         """Test worker idle status when no jobs available"""
-        mock_redis_client.get_next_job.return_value = None
+        mock_redis_client.claim_next_job.return_value = None
 
-        job = mock_redis_client.get_next_job()
+        job = mock_redis_client.claim_next_job()
 
         assert job is None
 
     @pytest.mark.asyncio
     async def test_worker_busy_status(self, mock_redis_client, sample_job):
         """Test worker busy status when processing job"""
-        mock_redis_client.get_next_job.return_value = sample_job
-        mock_redis_client.move_job_to_running.return_value = True
+        running_job = sample_job.model_copy(update={"status": JobStatus.RUNNING, "worker_id": "worker-1"})
+        mock_redis_client.claim_next_job.return_value = running_job
 
-        job = mock_redis_client.get_next_job()
+        job = mock_redis_client.claim_next_job("worker-1")
         assert job is not None
-
-        result = mock_redis_client.move_job_to_running(job.id, "worker-1")
-        assert result is True
+        assert job.status == JobStatus.RUNNING
 
 
 class TestWorkerJobCompletion:
@@ -356,18 +354,13 @@ class TestWorkerJobCompletion:
     ):
         """Test complete workflow of job execution and completion"""
         # Setup
-        mock_redis_client.get_job.return_value = sample_job
-        mock_redis_client.move_job_to_running.return_value = True
+        mock_redis_client.claim_next_job.return_value = sample_job
         mock_redis_client.move_job_to_completed.return_value = True
 
-        # Get job
-        job = mock_redis_client.get_job(sample_job.id)
+        # Claim job (now running)
+        job = mock_redis_client.claim_next_job("worker-1")
         assert job is not None
 
-        # Mark as running
-        running = mock_redis_client.move_job_to_running(job.id, "worker-1")
-        assert running is True
-
         # Complete with result
         completed = mock_redis_client.move_job_to_completed(
             job.id,
@@ -384,18 +377,13 @@ class TestWorkerJobCompletion:
     ):
         """Test workflow for failed job"""
         # Setup
-        mock_redis_client.get_job.return_value = sample_job
-        mock_redis_client.move_job_to_running.return_value = True
+        mock_redis_client.claim_next_job.return_value = sample_job
         mock_redis_client.move_job_to_failed.return_value = True
 
-        # Get job
-        job = mock_redis_client.get_job(sample_job.id)
+        # Claim job (now running)
+        job = mock_redis_client.claim_next_job("worker-1")
         assert job is not None
 
-        # Mark as running
-        running = mock_redis_client.move_job_to_running(job.id, "worker-1")
-        assert running is True
-
         # Mark as failed
         failed = mock_redis_client.move_job_to_failed(job.id, job_failure_request.error)
         assert failed is True